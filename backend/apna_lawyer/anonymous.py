@@ -0,0 +1,54 @@
+"""
+Ids for anonymous visitors without server-side session state
+
+Anonymous users' images, documents and summary jobs are keyed by an id kept
+in a signed cookie. Deriving it never touches the session table: the id is
+read from the cookie, or generated and then set on the response by
+AnonymousIdMiddleware.
+"""
+
+import re
+import secrets
+
+from django.conf import settings
+
+ANONYMOUS_ID_SALT = 'apna_lawyer.anonymous_id'
+
+_ANONYMOUS_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def _django_request(request):
+    # DRF's Request keeps attributes set on it to itself
+    return getattr(request, '_request', request)
+
+
+def anonymous_id(request) -> str:
+    """The visitor's anonymous id, generating one if the request has none"""
+    request = _django_request(request)
+    value = getattr(request, '_anonymous_id', None)
+    if value is not None:
+        return value
+    value = request.get_signed_cookie(
+        settings.ANONYMOUS_ID_COOKIE_NAME, default=None, salt=ANONYMOUS_ID_SALT,
+        max_age=settings.ANONYMOUS_ID_COOKIE_AGE,
+    )
+    if value is None or not _ANONYMOUS_ID.fullmatch(value):
+        value = secrets.token_hex(16)
+        request._anonymous_id_is_new = True
+    request._anonymous_id = value
+    return value
+
+
+def set_anonymous_id_cookie(request, response):
+    """Send the id generated during this request to the client"""
+    request = _django_request(request)
+    if not getattr(request, '_anonymous_id_is_new', False):
+        return
+    response.set_signed_cookie(
+        settings.ANONYMOUS_ID_COOKIE_NAME, request._anonymous_id, salt=ANONYMOUS_ID_SALT,
+        max_age=settings.ANONYMOUS_ID_COOKIE_AGE,
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
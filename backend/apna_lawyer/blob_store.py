@@ -0,0 +1,421 @@
+"""
+Content-addressed storage for documents kept out of the database
+
+Blobs are addressed by the SHA-256 of their bytes; model columns such as
+``UserChat.chatbot_document`` or ``Lawyer.education_document`` hold only that
+64-character reference. Storing the same bytes twice is a no-op.
+
+Backends (``BLOB_STORE_BACKEND``):
+
+- ``local``: files under BLOB_STORE_DIR, fanned out by hash prefix, with a
+  small JSON sidecar for the content type
+- ``s3``: an S3-compatible bucket via boto3. BLOB_STORE_S3_ENDPOINT_URL
+  points it at a local stand-in such as MinIO in development.
+
+``blob_response`` serves a blob with ETag and single-range ``Range`` support.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .utils import LazyService
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+_REF = re.compile(r'[0-9a-f]{64}')
+_DATA_URL = re.compile(r'data:(?P<type>[\w.+-]+/[\w.+-]+)?(?:;[\w-]+=[^;,]*)*;base64,(?P<data>.*)', re.DOTALL)
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class BlobNotFound(KeyError):
+    """Raised for a reference that is not in the store"""
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised for a Range header that selects no bytes of the blob"""
+
+
+@dataclass
+class BlobInfo:
+    ref: str
+    size: int
+    content_type: str
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, str) and _REF.fullmatch(value) is not None
+
+
+def _chunks(data) -> Iterator[bytes]:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        yield bytes(data)
+        return
+    if hasattr(data, 'chunks'):
+        # Django UploadedFile
+        yield from data.chunks(READ_CHUNK_SIZE)
+        return
+    while True:
+        chunk = data.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    def put(self, data, content_type: Optional[str] = None) -> BlobInfo:
+        """Store bytes, a file object or an uploaded file; returns its reference"""
+
+    @abstractmethod
+    def info(self, ref: str) -> BlobInfo:
+        """Size and content type of a blob; raises BlobNotFound"""
+
+    @abstractmethod
+    def read(self, ref: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Chunks of the blob from byte start up to and including end"""
+
+    @abstractmethod
+    def delete(self, ref: str):
+        """Remove a blob; removing a missing blob is not an error"""
+
+    def exists(self, ref: str) -> bool:
+        try:
+            self.info(ref)
+            return True
+        except BlobNotFound:
+            return False
+
+    def read_bytes(self, ref: str) -> bytes:
+        return b''.join(self.read(ref))
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, ref: str) -> str:
+        if not is_blob_ref(ref):
+            raise BlobNotFound(ref)
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def put(self, data, content_type=None) -> BlobInfo:
+        digest = hashlib.sha256()
+        size = 0
+        # Written to a temporary file first, so a blob is never visible half written
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in _chunks(data):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    handle.write(chunk)
+            info = BlobInfo(digest.hexdigest(), size, content_type or DEFAULT_CONTENT_TYPE)
+            path = self._path(info.ref)
+            if os.path.exists(path):
+                return self.info(info.ref)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.json', 'w') as handle:
+                json.dump({'content_type': info.content_type}, handle)
+            os.replace(temp_path, path)
+            return info
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def info(self, ref: str) -> BlobInfo:
+        path = self._path(ref)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            raise BlobNotFound(ref)
+        try:
+            with open(path + '.json') as handle:
+                content_type = json.load(handle).get('content_type') or DEFAULT_CONTENT_TYPE
+        except (OSError, ValueError):
+            content_type = DEFAULT_CONTENT_TYPE
+        return BlobInfo(ref, size, content_type)
+
+    def read(self, ref, start=0, end=None) -> Iterator[bytes]:
+        try:
+            handle = open(self._path(ref), 'rb')
+        except OSError:
+            raise BlobNotFound(ref)
+        return self._read_file(handle, start, end)
+
+    @staticmethod
+    def _read_file(handle, start, end):
+        with handle:
+            handle.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = handle.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, ref: str):
+        path = self._path(ref)
+        for name in (path, path + '.json'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region_name: Optional[str] = None, client=None):
+        if client is None:
+            if not BOTO3_AVAILABLE:
+                raise RuntimeError('BLOB_STORE_BACKEND=s3 needs the boto3 package')
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region_name)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, ref: str) -> str:
+        if not is_blob_ref(ref):
+            raise BlobNotFound(ref)
+        return f"{self.prefix}{ref[:2]}/{ref}"
+
+    def put(self, data, content_type=None) -> BlobInfo:
+        # The key depends on the hash, so the upload is spooled to a temporary file first
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile() as spool:
+            for chunk in _chunks(data):
+                digest.update(chunk)
+                size += len(chunk)
+                spool.write(chunk)
+            info = BlobInfo(digest.hexdigest(), size, content_type or DEFAULT_CONTENT_TYPE)
+            if self.exists(info.ref):
+                return self.info(info.ref)
+            spool.seek(0)
+            self.client.put_object(Bucket=self.bucket, Key=self._key(info.ref), Body=spool,
+                                   ContentType=info.content_type, ContentLength=size)
+        return info
+
+    def info(self, ref: str) -> BlobInfo:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(ref))
+        except ClientError:
+            raise BlobNotFound(ref)
+        return BlobInfo(ref, head['ContentLength'], head.get('ContentType') or DEFAULT_CONTENT_TYPE)
+
+    def read(self, ref, start=0, end=None) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(ref), Range=byte_range)
+        except ClientError:
+            raise BlobNotFound(ref)
+        return response['Body'].iter_chunks(READ_CHUNK_SIZE)
+
+    def delete(self, ref: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(ref))
+
+
+class MemoryBlobStore(BlobStore):
+    """
+    Blobs held in memory for the lifetime of the store
+
+    Lets blob_response serve content that is not in the configured store,
+    such as a document column not yet moved out of the database.
+    """
+
+    def __init__(self):
+        self._blobs = {}
+
+    def put(self, data, content_type=None) -> BlobInfo:
+        data = b''.join(_chunks(data))
+        info = BlobInfo(hashlib.sha256(data).hexdigest(), len(data), content_type or DEFAULT_CONTENT_TYPE)
+        self._blobs.setdefault(info.ref, (info, data))
+        return self._blobs[info.ref][0]
+
+    def info(self, ref: str) -> BlobInfo:
+        try:
+            return self._blobs[ref][0]
+        except KeyError:
+            raise BlobNotFound(ref)
+
+    def read(self, ref, start=0, end=None) -> Iterator[bytes]:
+        try:
+            data = self._blobs[ref][1]
+        except KeyError:
+            raise BlobNotFound(ref)
+        return iter([data[start:None if end is None else end + 1]])
+
+    def delete(self, ref: str):
+        self._blobs.pop(ref, None)
+
+
+def create_blob_store() -> BlobStore:
+    backend = getattr(settings, 'BLOB_STORE_BACKEND', 'local')
+    if backend == 's3':
+        return S3BlobStore(
+            settings.BLOB_STORE_S3_BUCKET,
+            prefix=getattr(settings, 'BLOB_STORE_S3_PREFIX', ''),
+            endpoint_url=getattr(settings, 'BLOB_STORE_S3_ENDPOINT_URL', None) or None,
+            region_name=getattr(settings, 'BLOB_STORE_S3_REGION', None) or None,
+        )
+    return LocalBlobStore(getattr(settings, 'BLOB_STORE_DIR', os.path.join(settings.BASE_DIR, 'blob_store')))
+
+
+blob_store = LazyService(create_blob_store)
+
+
+def offload_value(value: Optional[str], store: Optional[BlobStore] = None,
+                  verify_refs: bool = False) -> Optional[str]:
+    """
+    Reference for a document column value, storing inline content first
+
+    References and empty values are returned unchanged. ``data:`` URLs are
+    stored decoded with their content type; any other text as UTF-8.
+
+    With verify_refs (values sent by clients), a value shaped like a
+    reference only counts as one when the store has that blob; otherwise it
+    is stored as text like any other value.
+    """
+    if not value:
+        return None
+    store = store or blob_store
+    if is_blob_ref(value) and (not verify_refs or store.exists(value)):
+        return value
+    return store.put(*decode_value(value)).ref
+
+
+def decode_value(value: str) -> Tuple[bytes, str]:
+    """(bytes, content type) of an inline column value: a decoded data: URL, or the text as UTF-8"""
+    match = _DATA_URL.fullmatch(value.strip())
+    if match:
+        try:
+            return base64.b64decode(match.group('data'), validate=False), match.group('type') or DEFAULT_CONTENT_TYPE
+        except (binascii.Error, ValueError):
+            pass
+    return value.encode('utf-8'), 'text/plain; charset=utf-8'
+
+
+def restore_value(value: Optional[str], store: Optional[BlobStore] = None) -> Optional[str]:
+    """Inline column value for a reference: the text itself, or a data: URL for binary content"""
+    if not is_blob_ref(value):
+        return value
+    store = store or blob_store
+    info = store.info(value)
+    data = store.read_bytes(value)
+    if info.content_type.startswith('text/'):
+        return data.decode('utf-8')
+    return f"data:{info.content_type};base64,{base64.b64encode(data).decode()}"
+
+
+def convert_columns(queryset, fields, convert, batch_size: int = 200) -> int:
+    """
+    Rewrite the values of fields with convert, in batches that commit
+    separately (used by the data migrations that move documents to the
+    blob store and back). Returns the number of rows changed.
+    """
+    changed = 0
+    last_pk = None
+    while True:
+        rows = queryset.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        batch = list(rows.values_list('pk', *fields)[:batch_size])
+        if not batch:
+            return changed
+        with transaction.atomic(using=queryset.db):
+            for pk, *values in batch:
+                updates = {}
+                for field, value in zip(fields, values):
+                    converted = convert(value) if value else value
+                    if converted != value:
+                        updates[field] = converted
+                if updates:
+                    queryset.model._default_manager.using(queryset.db).filter(pk=pk).update(**updates)
+                    changed += 1
+        last_pk = batch[-1][0]
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte of a single-range ``Range`` header, or None to send
+    the whole blob (no header, or one this parser does not handle)
+    """
+    if not header:
+        return None
+    match = _RANGE.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        # Multiple or malformed ranges: serving the full body is always allowed
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = size - 1 if last == '' else min(int(last), size - 1)
+    if first >= size or first > last:
+        raise RangeNotSatisfiable(header)
+    return first, last
+
+
+def blob_response(request, ref: str, filename: Optional[str] = None, store: Optional[BlobStore] = None):
+    """
+    Stream a blob, honouring If-None-Match, Range and If-Range
+
+    Blobs never change, so the reference doubles as a strong ETag and
+    responses may be cached for a year. Raises BlobNotFound.
+    """
+    store = store or blob_store
+    info = store.info(ref)
+    etag = f'"{info.ref}"'
+
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), info.size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{info.size}"
+                response['Accept-Ranges'] = 'bytes'
+                return response
+
+        if byte_range is None:
+            response = StreamingHttpResponse(store.read(ref), content_type=info.content_type)
+            response['Content-Length'] = str(info.size)
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(store.read(ref, first, last), content_type=info.content_type,
+                                             status=206)
+            response['Content-Length'] = str(last - first + 1)
+            response['Content-Range'] = f"bytes {first}-{last}/{info.size}"
+        if filename:
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,470 @@
+"""
+Two-tier cache shared by the chats and lawyers services
+
+- L1: a per-process LRU bounded by the pickled size of its entries. Entries
+  live at most CACHE_L1_TTL seconds, so a value another worker deleted or
+  replaced in L2 stops being served quickly.
+- L2: a store shared by all gunicorn workers. A SQLite file by default (no
+  extra service to run), Redis when CACHE_L2_BACKEND='redis' and the redis
+  package is installed, or nothing ('none').
+
+get_or_set() recomputes a hot value slightly before it expires, with a
+probability that grows as expiry approaches and with the time the value took
+to compute (probabilistic early expiration, "XFetch"). On a real miss a short
+lock in L2 lets one worker compute while the others wait for its result, so
+an expired popular key does not send every worker upstream at once.
+
+Values are returned as stored in L1 and must be treated as read-only.
+
+Usage:
+    from apna_lawyer.cache import shared_cache
+
+    lawyers = shared_cache.get_or_set('lawyers', 'list', fetch_lawyers, ttl=60)
+    shared_cache.clear('lawyers')  # after a write
+"""
+
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from apna_lawyer.metrics import record_cache
+from apna_lawyer.utils import LazyService
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+MB = 1024 * 1024
+
+# value: the cached object (L1) or its pickle (L2); expires_at: wall-clock
+# seconds; delta: seconds the value took to compute, drives early refresh
+CacheEntry = namedtuple('CacheEntry', 'value expires_at delta')
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by total entry size in bytes"""
+
+    def __init__(self, max_bytes=32 * MB, max_entries=100_000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries = OrderedDict()  # key -> (CacheEntry, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live CacheEntry for key (marking it recently used) or None"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0].expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, entry, size):
+        """Store entry, evicting least recently used ones to stay within bounds"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (entry, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, size = self._entries.pop(key)
+        self.size_bytes -= size
+
+
+class L2Store:
+    """
+    Shared store interface; this base keeps nothing and locks in-process only
+
+    Stores hold CacheEntry tuples whose value is the pickled bytes.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, entry):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def acquire_lock(self, name, ttl):
+        """Return a token if the lock was taken, else None"""
+        token = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._locks_guard:
+            held = self._locks.get(name)
+            if held is not None and held[1] > now:
+                return None
+            self._locks[name] = (token, now + ttl)
+        return token
+
+    def release_lock(self, name, token):
+        with self._locks_guard:
+            if self._locks.get(name, (None,))[0] == token:
+                del self._locks[name]
+
+
+class SQLiteStore(L2Store):
+    """L2 in a SQLite file shared by all processes on the host (WAL mode)"""
+
+    PURGE_EVERY = 500  # Writes between sweeps of expired rows
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # One connection per thread and process; never reuse one across fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, delta REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_locks ('
+                'name TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at, delta FROM cache_entries WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return CacheEntry(bytes(row[0]), row[1], row[2]) if row else None
+
+    def set(self, key, entry):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, delta) VALUES (?, ?, ?, ?)',
+            (key, entry.value, entry.expires_at, entry.delta)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def delete_prefix(self, prefix):
+        # Range on the primary key instead of LIKE, which would scan the table
+        self._connection().execute(
+            'DELETE FROM cache_entries WHERE key >= ? AND key < ?', (prefix, prefix + '\U0010ffff')
+        )
+
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_locks WHERE name = ? AND expires_at <= ?', (name, now))
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO cache_locks (name, token, expires_at) VALUES (?, ?, ?)',
+            (name, token, now + ttl)
+        )
+        return token if cursor.rowcount == 1 else None
+
+    def release_lock(self, name, token):
+        self._connection().execute('DELETE FROM cache_locks WHERE name = ? AND token = ?', (name, token))
+
+
+class RedisStore(L2Store):
+    """L2 in Redis (or any server speaking its protocol)"""
+
+    # Delete the lock only if this caller still owns it
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url, prefix='apna:'):
+        super().__init__()
+        if not REDIS_AVAILABLE:
+            raise ImportError("CACHE_L2_BACKEND='redis' needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        expires_at, delta, value = pickle.loads(raw)
+        return CacheEntry(value, expires_at, delta)
+
+    def set(self, key, entry):
+        ttl_ms = int((entry.expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            raw = pickle.dumps((entry.expires_at, entry.delta, entry.value), pickle.HIGHEST_PROTOCOL)
+            self.client.set(self.prefix + key, raw, px=ttl_ms)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.prefix + prefix + '*', count=500))
+        for start in range(0, len(keys), 500):
+            self.client.delete(*keys[start:start + 500])
+
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        if self.client.set(f"{self.prefix}lock:{name}", token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_lock(self, name, token):
+        self.client.eval(self.RELEASE_SCRIPT, 1, f"{self.prefix}lock:{name}", token)
+
+
+class TwoTierCache:
+    """
+    Namespaced cache with an in-process L1 in front of a shared L2
+
+    Errors from L2 are counted and treated as misses, so a broken or missing
+    shared store only costs recomputation.
+    """
+
+    def __init__(self, l1=None, l2=None, l1_ttl=10.0, beta=1.0, lock_timeout=30.0, poll_interval=0.05):
+        self.l1 = l1 if l1 is not None else LRUCache()
+        self.l2 = l2 if l2 is not None else L2Store()
+        self.l1_ttl = l1_ttl
+        self.beta = beta  # > 1 refreshes earlier, 0 disables early refresh
+        self.lock_timeout = lock_timeout  # Longest a computation may hold the stampede lock
+        self.poll_interval = poll_interval
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        """Return the cached value or default"""
+        entry = self._lookup(namespace, self._key(namespace, key), record=True)
+        return default if entry is None else entry.value
+
+    def set(self, namespace, key, value, ttl, delta=0.0):
+        """Cache value for ttl seconds in both tiers"""
+        full_key = self._key(namespace, key)
+        entry = CacheEntry(value, time.time() + ttl, delta)
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._fill_l1(full_key, entry, len(payload))
+        self._l2(namespace, self.l2.set, full_key, entry._replace(value=payload))
+
+    def delete(self, namespace, key):
+        full_key = self._key(namespace, key)
+        self.l1.delete(full_key)
+        self._l2(namespace, self.l2.delete, full_key)
+
+    def clear(self, namespace):
+        """Drop every key of a namespace"""
+        prefix = self._key(namespace, '')
+        self.l1.delete_prefix(prefix)
+        self._l2(namespace, self.l2.delete_prefix, prefix)
+
+    def get_or_set(self, namespace, key, compute, ttl, wait_timeout=None):
+        """
+        Return the cached value, computing and storing it when missing
+
+        Args:
+            namespace (str): Cache namespace, also the label of hit/miss stats
+            key (str): Key within the namespace
+            compute (callable): Zero-argument callable producing the value;
+                exceptions propagate and nothing is cached
+            ttl (float): Seconds the computed value stays fresh
+            wait_timeout (float): Longest time to wait for another worker
+                computing the same key (defaults to lock_timeout)
+
+        Returns:
+            The cached or freshly computed value
+        """
+        full_key = self._key(namespace, key)
+        entry = self._lookup(namespace, full_key, record=True)
+        if entry is not None and not self._should_refresh(entry):
+            return entry.value
+
+        try:
+            token = self.l2.acquire_lock(full_key, self.lock_timeout)
+        except Exception as e:
+            # Without a working lock just compute; waiting would stall every miss
+            print(f"Shared cache error ({namespace}): {e}")
+            self._incr(namespace, 'l2_errors')
+            token = uuid.uuid4().hex
+            locked = False
+        else:
+            locked = token is not None
+        if token is None and entry is not None:
+            # Someone else is refreshing early; keep serving the current value
+            return entry.value
+        if entry is not None:
+            self._incr(namespace, 'early_refreshes')
+        elif token is None:
+            self._incr(namespace, 'lock_waits')
+            entry = self._wait_for(namespace, full_key, self.lock_timeout if wait_timeout is None else wait_timeout)
+            if entry is not None:
+                return entry.value
+
+        try:
+            started = time.perf_counter()
+            value = compute()
+            self.set(namespace, key, value, ttl, delta=time.perf_counter() - started)
+            return value
+        finally:
+            if locked:
+                self._l2(namespace, self.l2.release_lock, full_key, token)
+
+    def stats(self):
+        """Return hit/miss counters per namespace for this process"""
+        with self._stats_lock:
+            stats = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+        for counters in stats.values():
+            lookups = counters['l1_hits'] + counters['l2_hits'] + counters['misses']
+            counters['hit_ratio'] = round((lookups - counters['misses']) / lookups, 4) if lookups else None
+        return {
+            'namespaces': stats,
+            'l1_entries': len(self.l1),
+            'l1_bytes': self.l1.size_bytes,
+            'l1_max_bytes': self.l1.max_bytes,
+            'l2_backend': type(self.l2).__name__,
+            'pid': os.getpid(),
+        }
+
+    @staticmethod
+    def _key(namespace, key):
+        return f"{namespace}:{key}"
+
+    def _lookup(self, namespace, full_key, record=False):
+        entry = self.l1.get(full_key)
+        if entry is not None:
+            if record:
+                self._incr(namespace, 'l1_hits')
+                record_cache(namespace, hit=True)
+            return entry
+
+        stored = self._l2(namespace, self.l2.get, full_key)
+        if stored is not None:
+            entry = CacheEntry(pickle.loads(stored.value), stored.expires_at, stored.delta)
+            self._fill_l1(full_key, entry, len(stored.value))
+            if record:
+                self._incr(namespace, 'l2_hits')
+                record_cache(namespace, hit=True)
+            return entry
+
+        if record:
+            self._incr(namespace, 'misses')
+            record_cache(namespace, hit=False)
+        return None
+
+    def _fill_l1(self, full_key, entry, payload_size):
+        l1_entry = entry._replace(expires_at=min(entry.expires_at, time.time() + self.l1_ttl))
+        self.l1.set(full_key, l1_entry, payload_size + len(full_key))
+
+    def _should_refresh(self, entry):
+        """XFetch: refresh when now - delta * beta * ln(U) passes the expiry"""
+        if not entry.delta or not self.beta:
+            return False
+        return time.time() - entry.delta * self.beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+    def _wait_for(self, namespace, full_key, timeout):
+        """Poll for a value another caller is computing"""
+        deadline = time.monotonic() + max(timeout, 0)
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = self._lookup(namespace, full_key)
+            if entry is not None:
+                return entry
+        return None
+
+    def _l2(self, namespace, operation, *args):
+        try:
+            return operation(*args)
+        except Exception as e:
+            print(f"Shared cache error ({namespace}): {e}")
+            self._incr(namespace, 'l2_errors')
+            return None
+
+    def _incr(self, namespace, name):
+        with self._stats_lock:
+            counters = self._stats.get(namespace)
+            if counters is None:
+                counters = self._stats[namespace] = dict.fromkeys(
+                    ('l1_hits', 'l2_hits', 'misses', 'early_refreshes', 'lock_waits', 'l2_errors'), 0
+                )
+            counters[name] += 1
+
+
+def create_l2_store():
+    """Build the shared store configured by CACHE_L2_BACKEND"""
+    from django.conf import settings
+
+    backend = getattr(settings, 'CACHE_L2_BACKEND', 'sqlite')
+    if backend == 'redis':
+        return RedisStore(getattr(settings, 'CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    if backend == 'sqlite':
+        return SQLiteStore(getattr(settings, 'CACHE_SQLITE_PATH', 'cache.sqlite3'))
+    if backend == 'none':
+        return L2Store()
+    raise ValueError(f"Unknown CACHE_L2_BACKEND: {backend}")
+
+
+def create_cache():
+    from django.conf import settings
+
+    return TwoTierCache(
+        l1=LRUCache(max_bytes=getattr(settings, 'CACHE_L1_MAX_BYTES', 32 * MB)),
+        l2=create_l2_store(),
+        l1_ttl=getattr(settings, 'CACHE_L1_TTL', 10.0),
+        beta=getattr(settings, 'CACHE_EARLY_EXPIRY_BETA', 1.0),
+        lock_timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT', 30.0),
+    )
+
+
+# Process-wide cache used by the chats and lawyers services
+shared_cache = LazyService(create_cache)
@@ -0,0 +1,304 @@
+"""
+Staff-only runtime diagnostics: request profiling and memory-leak hunting
+
+- Request profiling is triggered per request with the ``X-Profile`` header
+  (``sample`` or ``cprofile``) and handled by ProfilingMiddleware. Sampled
+  stacks are written in folded format (``frame;frame;frame count``) which
+  flamegraph.pl, speedscope and inferno read directly.
+- ``/diagnostics/tracemalloc/`` starts tracing, takes snapshots and diffs
+  each snapshot against the previous one.
+- ``/diagnostics/objects/`` reports live object counts per type and their
+  growth since the previous report.
+
+All state is per worker process; responses include the pid that served them.
+"""
+
+import cProfile
+import gc
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+_state_lock = threading.Lock()
+_last_snapshot = None
+_last_object_counts = None
+
+
+class StackSampler:
+    """
+    Statistical profiler sampling one thread's stack at a fixed interval
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        """Return samples in flamegraph folded-stack format"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_directory():
+    directory = str(getattr(settings, 'PROFILE_DIR'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def profile_filename(request, extension):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return f"{timestamp}-{os.getpid()}-{request.method.lower()}-{slug[:60]}.{extension}"
+
+
+def run_profiled(request, mode, get_response):
+    """
+    Run get_response(request) under the requested profiler
+
+    Returns:
+        tuple: (response, profile file name)
+    """
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        response = profiler.runcall(get_response, request)
+        filename = profile_filename(request, 'prof')
+        profiler.dump_stats(os.path.join(profile_directory(), filename))
+        return response, filename
+
+    sampler = StackSampler(
+        threading.get_ident(), getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+    ).start()
+    try:
+        response = get_response(request)
+    finally:
+        sampler.stop()
+    filename = profile_filename(request, 'folded')
+    with open(os.path.join(profile_directory(), filename), 'w') as fh:
+        fh.write(sampler.folded())
+    return response, filename
+
+
+def is_staff_request(request):
+    """
+    Check staff status from the session user or a JWT bearer token
+
+    request.user is not trusted: CustomUserDataMiddleware sets it from the
+    unauthenticated X-User-Data header.
+    """
+    if hasattr(request, 'session'):
+        user = get_user(request)
+        if user.is_authenticated:
+            return user.is_staff
+    try:
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        result = JWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def _format_stat(stat):
+    frame = stat.traceback[0]
+    return {
+        'location': f"{frame.filename}:{frame.lineno}",
+        'size_kb': round(stat.size / 1024, 2),
+        'count': stat.count,
+        'traceback': [f"{f.filename}:{f.lineno}" for f in stat.traceback] if len(stat.traceback) > 1 else None,
+    }
+
+
+def _format_diff(stat):
+    formatted = _format_stat(stat)
+    formatted['size_diff_kb'] = round(stat.size_diff / 1024, 2)
+    formatted['count_diff'] = stat.count_diff
+    return formatted
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def tracemalloc_view(request):
+    """
+    Control tracemalloc in this worker
+
+    POST {"action": "start", "frames": 10}  - start tracing
+    POST {"action": "snapshot", "limit": 25} - snapshot, diffed against the previous one
+    POST {"action": "stop"}                 - stop tracing and drop snapshots
+    GET                                     - tracing status
+    """
+    global _last_snapshot
+
+    if request.method == 'GET':
+        current, peak = tracemalloc.get_traced_memory()
+        return Response({
+            'pid': os.getpid(),
+            'tracing': tracemalloc.is_tracing(),
+            'traced_current_kb': round(current / 1024, 2),
+            'traced_peak_kb': round(peak / 1024, 2),
+            'has_baseline': _last_snapshot is not None,
+        })
+
+    action = request.data.get('action')
+    try:
+        limit = int(request.data.get('limit', 25))
+        frames = int(request.data.get('frames', 10))
+        if limit < 1 or frames < 1:
+            raise ValueError(limit, frames)
+    except (TypeError, ValueError):
+        return Response({'error': 'limit and frames must be positive integers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    key_type = request.data.get('key_type', 'lineno')
+
+    if action == 'start':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return Response({'pid': os.getpid(), 'tracing': True})
+
+    if action == 'stop':
+        tracemalloc.stop()
+        with _state_lock:
+            _last_snapshot = None
+        return Response({'pid': os.getpid(), 'tracing': False})
+
+    if action == 'snapshot':
+        if not tracemalloc.is_tracing():
+            return Response({'error': 'tracemalloc is not running; start it first'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            return Response({'error': 'key_type must be lineno, filename or traceback'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        with _state_lock:
+            previous, _last_snapshot = _last_snapshot, snapshot
+
+        data = {
+            'pid': os.getpid(),
+            'top': [_format_stat(stat) for stat in snapshot.statistics(key_type)[:limit]],
+            'diff': None,
+        }
+        if previous is not None:
+            data['diff'] = [_format_diff(stat) for stat in snapshot.compare_to(previous, key_type)[:limit]]
+        return Response(data)
+
+    return Response({'error': 'action must be start, snapshot or stop'},
+                    status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def object_counts_view(request):
+    """
+    Report live objects per type and their growth since the previous report
+
+    Query params:
+        limit (int): Number of types to return (default 50)
+        collect (bool): Run a full gc.collect() first (default true)
+    """
+    global _last_object_counts
+
+    try:
+        limit = int(request.query_params.get('limit', 50))
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return Response({'error': 'limit must be a positive integer'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if request.query_params.get('collect', 'true').lower() != 'false':
+        gc.collect()
+
+    started = time.perf_counter()
+    counts = Counter(
+        f"{type(obj).__module__}.{type(obj).__qualname__}" for obj in gc.get_objects()
+    )
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    with _state_lock:
+        previous, _last_object_counts = _last_object_counts, counts
+
+    growth = None
+    if previous is not None:
+        growth = [
+            {'type': name, 'delta': delta, 'count': counts[name]}
+            for name, delta in (counts - previous).most_common(limit)
+        ]
+
+    return Response({
+        'pid': os.getpid(),
+        'total_objects': sum(counts.values()),
+        'scan_ms': elapsed_ms,
+        'gc_counts': gc.get_count(),
+        'top_types': [{'type': name, 'count': count} for name, count in counts.most_common(limit)],
+        'growth': growth,
+        'services': _service_sizes(),
+    })
+
+
+def _service_sizes():
+    """Sizes of long-lived in-process stores that are known leak suspects"""
+    sizes = {}
+    try:
+        from chats.image_chat_service import image_chat_service
+        if not image_chat_service.is_initialized():
+            return sizes
+        sizes['image_chat_service.user_images'] = {
+            'sessions': len(image_chat_service.user_images),
+            'images': sum(len(images) for images in image_chat_service.user_images.values()),
+        }
+    except Exception:
+        pass
+    return sizes
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiles_view(request):
+    """List profile files written by ProfilingMiddleware, newest first"""
+    directory = profile_directory()
+    files = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name)
+        files.append({'name': name, 'size_kb': round(os.path.getsize(path) / 1024, 2)})
+    return Response({'directory': directory, 'profiles': files})
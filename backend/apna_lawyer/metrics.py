@@ -0,0 +1,395 @@
+"""
+Lightweight Prometheus metrics with a file-backed multi-process registry
+
+Every gunicorn worker keeps its metrics in memory and periodically flushes
+them to ``<METRICS_DIR>/<pid>.json``. The /metrics endpoint merges all worker
+files (plus an archive of exited workers) and renders Prometheus text format,
+so counters and histograms are aggregated across workers without a shared
+server.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ARCHIVE_FILE = 'archive.json'
+
+
+class Metric:
+    """Base class for a labelled metric stored in a MetricsRegistry"""
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        missing = set(self.labelnames) - set(labels)
+        if missing:
+            raise ValueError(f"Missing labels for {self.name}: {sorted(missing)}")
+        return json.dumps([str(labels[name]) for name in self.labelnames])
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry._update(self, self._key(labels), lambda value: (value or 0) + amount)
+
+
+class Gauge(Metric):
+    """Per-process gauge; only reported for live workers"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.registry._update(self, self._key(labels), lambda _: value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        def update(state):
+            # Layout: [count per bucket..., +Inf count, sum]
+            state = state or [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+            return state
+
+        self.registry._update(self, self._key(labels), update)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the wrapped block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class MetricsRegistry:
+    """
+    In-process metric store that flushes to a shared directory
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory or os.getenv(
+            'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'apna_lawyer_metrics')
+        )
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self._values = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _update(self, metric, key, update):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: values inherited from the master belong to the master
+                self._pid = os.getpid()
+                self._values = {}
+            series = self._values.setdefault(metric.name, {})
+            series[key] = update(series.get(key))
+
+    # --- Multi-process persistence -------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def flush(self, force=False):
+        """Write this process' values to its file if the flush interval elapsed"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+
+        with self._lock:
+            snapshot = json.dumps(self._values)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(f"{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as fh:
+                fh.write(snapshot)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Metrics flush failed: {e}")
+
+    def mark_process_dead(self, pid):
+        """Fold an exited worker's counters and histograms into the archive file"""
+        path = self._path(f"{pid}.json")
+        values = self._read(path)
+        if values is None:
+            return
+        archive = self._read(self._path(ARCHIVE_FILE)) or {}
+        self._merge(archive, values, include_gauges=False)
+        try:
+            tmp_path = self._path(f"{ARCHIVE_FILE}.tmp")
+            with open(tmp_path, 'w') as fh:
+                json.dump(archive, fh)
+            os.replace(tmp_path, self._path(ARCHIVE_FILE))
+            os.remove(path)
+        except OSError as e:
+            print(f"Metrics archive failed: {e}")
+
+    def reset_directory(self):
+        """Remove all worker files; called once when the server starts"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') or name.endswith('.tmp'):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def _read(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _merge(self, target, values, include_gauges=True):
+        for name, series in values.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not include_gauges):
+                continue
+            merged = target.setdefault(name, {})
+            for key, value in series.items():
+                if metric.kind == 'histogram':
+                    current = merged.get(key) or [0] * len(value)
+                    merged[key] = [a + b for a, b in zip(current, value)]
+                elif metric.kind == 'counter':
+                    merged[key] = merged.get(key, 0) + value
+                else:
+                    merged[key] = value
+
+    def collect(self):
+        """Return values aggregated across every worker file"""
+        self.flush(force=True)
+        aggregated = {}
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith('.json'):
+                    continue
+                values = self._read(self._path(name))
+                if values is not None:
+                    self._merge(aggregated, values)
+        else:
+            with self._lock:
+                self._merge(aggregated, json.loads(json.dumps(self._values)))
+        return aggregated
+
+    # --- Exposition ----------------------------------------------------
+
+    def render(self):
+        """Render all metrics in Prometheus text exposition format"""
+        aggregated = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(aggregated.get(name, {}).items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                if metric.kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.extend(self._render_cache_ratios(aggregated))
+        return '\n'.join(lines) + '\n'
+
+    def _render_cache_ratios(self, aggregated):
+        totals = {}
+        for key, value in aggregated.get(CACHE_REQUESTS.name, {}).items():
+            cache, result = json.loads(key)
+            hits, total = totals.get(cache, (0, 0))
+            totals[cache] = (hits + (value if result == 'hit' else 0), total + value)
+
+        lines = [
+            "# HELP cache_hit_ratio Share of cache lookups served without recomputation",
+            "# TYPE cache_hit_ratio gauge",
+        ]
+        for cache, (hits, total) in sorted(totals.items()):
+            ratio = hits / total if total else 0.0
+            lines.append(f"cache_hit_ratio{_format_labels([('cache', cache)])} {_format_value(ratio)}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+# Global registry and the metrics shared across the project
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds',
+    'Django request latency by endpoint',
+    ('method', 'endpoint', 'status'),
+)
+UPSTREAM_LATENCY = registry.histogram(
+    'upstream_call_duration_seconds',
+    'Latency of calls to external dependencies',
+    ('dependency', 'operation', 'outcome'),
+)
+DB_QUERY_LATENCY = registry.histogram(
+    'db_query_duration_seconds',
+    'Latency of Django ORM queries',
+    ('alias', 'operation'),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+UPSTREAM_EVENTS = registry.counter(
+    'upstream_events_total',
+    'Retries, hedged requests and fallbacks for external dependencies',
+    ('dependency', 'event'),
+)
+PROMPT_TOKENS = registry.histogram(
+    'ai_prompt_tokens',
+    'Estimated input tokens per AI prompt',
+    ('part',),
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result',
+    ('cache', 'result'),
+)
+PROCESS_MEMORY = registry.gauge(
+    'process_resident_memory_bytes',
+    'Resident memory of each live worker',
+    ('pid',),
+)
+
+
+@contextmanager
+def track_upstream(dependency, operation):
+    """
+    Time a call to an external dependency
+
+    Usage:
+        with track_upstream('gemini', 'generate_content'):
+            requests.post(...)
+    """
+    started = time.perf_counter()
+    outcome = 'success'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(
+            time.perf_counter() - started,
+            dependency=dependency, operation=operation, outcome=outcome
+        )
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup for the cache_hit_ratio gauge"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+_SQL_OPERATION = re.compile(r'^\s*(\w+)')
+
+
+def _db_query_wrapper(execute, sql, params, many, context):
+    match = _SQL_OPERATION.match(sql or '')
+    operation = match.group(1).upper() if match else 'OTHER'
+    with DB_QUERY_LATENCY.time(alias=context['connection'].alias, operation=operation):
+        return execute(sql, params, many, context)
+
+
+def _instrument_connection(sender=None, connection=None, **kwargs):
+    if _db_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_query_wrapper)
+
+
+def install_db_instrumentation():
+    """Time every ORM query on current and future database connections"""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_instrument_connection, dispatch_uid='apna_lawyer.metrics.db')
+    for connection in connections.all():
+        _instrument_connection(connection=connection)
+
+
+def instrument_supabase_client(client):
+    """
+    Attach httpx event hooks to a Supabase client's PostgREST session
+
+    Latency is measured until response headers arrive, labelled by table.
+    """
+    try:
+        session = client.postgrest.session
+    except AttributeError:
+        return client
+
+    def on_request(request):
+        request.extensions['metrics_started'] = time.perf_counter()
+
+    def on_response(response):
+        started = response.request.extensions.get('metrics_started')
+        if started is None:
+            return
+        table = response.request.url.path.rstrip('/').rsplit('/', 1)[-1] or 'root'
+        UPSTREAM_LATENCY.observe(
+            time.perf_counter() - started,
+            dependency='supabase',
+            operation=f"{response.request.method} {table}",
+            outcome='success' if response.status_code < 400 else 'error',
+        )
+
+    session.event_hooks['request'].append(on_request)
+    session.event_hooks['response'].append(on_response)
+    return client
@@ -1,6 +1,19 @@
+import gzip
 import json
+import time
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from . import diagnostics, metrics
+from .anonymous import set_anonymous_id_cookie
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 User = get_user_model()
 
@@ -34,4 +47,151 @@ class CustomUserDataMiddleware(MiddlewareMixin):
                 # Invalid user data, keep as anonymous
                 pass
         
-        return None
\ No newline at end of file
+        return None
+
+class MetricsMiddleware:
+    """
+    Middleware recording per-endpoint request latency for the /metrics endpoint
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install_db_instrumentation()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            endpoint = match.route if match is not None and match.route else 'unmatched'
+            metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                method=request.method, endpoint=endpoint, status=status_code
+            )
+            metrics.registry.flush()
+
+
+class AnonymousIdMiddleware:
+    """
+    Middleware setting the signed anonymous-visitor cookie when a view
+    generated a new id (see apna_lawyer/anonymous.py)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        set_anonymous_id_cookie(request, response)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Middleware profiling a single request when a staff user sends ``X-Profile``
+
+    ``X-Profile: sample`` writes folded stacks for flamegraphs,
+    ``X-Profile: cprofile`` writes a pstats file. The file name is returned
+    in the ``X-Profile-File`` response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.META.get('HTTP_X_PROFILE', '').strip().lower()
+        if mode not in diagnostics.PROFILE_MODES or not diagnostics.is_staff_request(request):
+            return self.get_response(request)
+
+        response, filename = diagnostics.run_profiled(request, mode, self.get_response)
+        response['X-Profile-File'] = filename
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Middleware compressing large API responses with brotli or gzip
+
+    Responses of at least COMPRESSION_MIN_BYTES with a compressible content
+    type are encoded with brotli when the client accepts it and the brotli
+    package is installed, otherwise gzip. Streaming responses (batch chat)
+    are left alone so every line is still flushed as soon as it is ready.
+
+    Responses carrying secrets are never compressed (BREACH): the account
+    endpoints (login, signup, token refresh, profile) and any body holding a
+    JWT. Compressed next to text an attacker controls, their length would
+    leak the secret byte by byte.
+    """
+
+    COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'application/x-ndjson', 'text/')
+    SECRET_URL_NAMES = frozenset({
+        'api_signup', 'api_login', 'api_logout', 'api_profile', 'api_change_password', 'token_refresh',
+        'legacy_login', 'legacy_signup', 'legacy_logout', 'legacy_profile',
+    })
+    # Every JWT starts with the base64 of '{"' (its JSON header)
+    JWT_PREFIX = b'eyJ'
+    _ACCEPT_ENCODING = _lazy_re_compile(r'\s*([\w*]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*(?:,|$)')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(self.COMPRESSIBLE_TYPES):
+            return response
+
+        # The response depends on Accept-Encoding even when it is sent uncompressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_BYTES', 1024):
+            return response
+        if self.carries_secrets(request, response):
+            return response
+
+        encoding = self.choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+        else:
+            compressed = gzip.compress(response.content, getattr(settings, 'COMPRESSION_GZIP_LEVEL', 4), mtime=0)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body changed, so a strong ETag no longer identifies it
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    @classmethod
+    def carries_secrets(cls, request, response):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name in cls.SECRET_URL_NAMES:
+            return True
+        return cls.JWT_PREFIX in response.content
+
+    @classmethod
+    def choose_encoding(cls, accept_encoding):
+        """Preferred supported encoding from an Accept-Encoding header, or None"""
+        accepted = {}
+        for name, quality in cls._ACCEPT_ENCODING.findall(accept_encoding.lower()):
+            try:
+                accepted[name] = float(quality) if quality else 1.0
+            except ValueError:
+                continue
+        wildcard = accepted.get('*', 0.0)
+        candidates = (['br'] if BROTLI_AVAILABLE else []) + ['gzip']
+        for encoding in candidates:
+            if accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return None
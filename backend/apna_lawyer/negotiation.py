@@ -0,0 +1,14 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FirstRendererNegotiation(DefaultContentNegotiation):
+    """
+    Always render with the view's first renderer
+
+    For views whose successful response is not produced by a renderer (file
+    downloads, streamed exports): the client's Accept header or ``format``
+    parameter must not turn the request into a 406, and errors stay JSON.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
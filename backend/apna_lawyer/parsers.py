@@ -0,0 +1,41 @@
+"""
+Fast request parsers for DRF
+
+Chat and OCR requests carry megabytes of base64 image data. ORJSONParser
+decodes the raw request bytes in one orjson call instead of streaming them
+through a text decoder and the stdlib parser.
+"""
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .renderers import MSGPACK_AVAILABLE, MessagePackRenderer, ORJSONRenderer
+
+if MSGPACK_AVAILABLE:
+    import msgpack
+
+
+class ORJSONParser(JSONParser):
+    """JSON parser backed by orjson; NaN and Infinity are rejected like STRICT_JSON"""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """Parser for ``Content-Type: application/msgpack`` request bodies"""
+
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
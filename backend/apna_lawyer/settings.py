@@ -1,5 +1,7 @@
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Build paths inside the project
@@ -36,6 +38,10 @@ INSTALLED_APPS = [
     'lawyers',
 ]
 
+# MessagePack needs the optional msgpack package
+MSGPACK_ENABLED = (os.getenv('MSGPACK_ENABLED', 'True').lower() == 'true'
+                   and importlib.util.find_spec('msgpack') is not None)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Allow anonymous by default, views can override with IsAuthenticated
@@ -45,19 +51,34 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # orjson-backed JSON; MessagePack is negotiated via Accept/Content-Type when enabled
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ],
+        'apna_lawyer.renderers.ORJSONRenderer',
+    ] + (['apna_lawyer.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'apna_lawyer.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['apna_lawyer.parsers.MessagePackParser'] if MSGPACK_ENABLED else []),
 }
 
+# Responses of at least COMPRESSION_MIN_BYTES are sent with brotli (when installed) or gzip
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '4'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
 MIDDLEWARE = [
+    'apna_lawyer.middleware.MetricsMiddleware',  # Request latency histograms for /metrics
+    'apna_lawyer.middleware.CompressionMiddleware',  # brotli/gzip for large responses
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'apna_lawyer.middleware.AnonymousIdMiddleware',  # Signed cookie id for anonymous visitors, no session row
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'apna_lawyer.middleware.CustomUserDataMiddleware',  # Custom middleware for X-User-Data header
+    'apna_lawyer.middleware.ProfilingMiddleware',  # Staff-only per-request profiling via X-Profile header
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,6 +104,7 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'x-user-data',  # Custom header for user data
+    'x-profile',  # Staff-only request profiling
 ]
 
 # CSRF settings for API development
@@ -97,6 +119,14 @@ CSRF_TRUSTED_ORIGINS = [
 CSRF_COOKIE_SECURE = False
 CSRF_COOKIE_HTTPONLY = False
 
+# Sessions are only needed for admin and logged-in users; set to
+# 'django.contrib.sessions.backends.signed_cookies' to keep them out of the
+# database entirely. Anonymous visitors get a signed id cookie instead
+# (apna_lawyer/anonymous.py); clean up old rows with `manage.py prune_sessions`.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+ANONYMOUS_ID_COOKIE_NAME = os.getenv('ANONYMOUS_ID_COOKIE_NAME', 'anon_id')
+ANONYMOUS_ID_COOKIE_AGE = int(os.getenv('ANONYMOUS_ID_COOKIE_AGE', str(90 * 24 * 3600)))
+
 ROOT_URLCONF = 'apna_lawyer.urls'
 
 TEMPLATES = [
@@ -196,6 +226,151 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Gemini call budget: the per-request deadline stays below gunicorn's 30s worker timeout.
+# Calls retry 429/5xx with jittered backoff inside the budget, hedge a second request once
+# latency passes the given percentile, and degrade to FallbackAIService when time runs out.
+AI_REQUEST_BUDGET_SECONDS = float(os.getenv('AI_REQUEST_BUDGET_SECONDS', '25'))
+AI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv('AI_ATTEMPT_TIMEOUT_SECONDS', '20'))
+AI_MAX_ATTEMPTS = int(os.getenv('AI_MAX_ATTEMPTS', '3'))
+AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'True').lower() == 'true'
+AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', '95'))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', '20'))
+
+# Estimated input token budget per Gemini prompt; OCR/document context beyond it is
+# reduced to the passages most relevant to the question
+AI_PROMPT_MAX_TOKENS = int(os.getenv('AI_PROMPT_MAX_TOKENS', '6000'))
+
+# Offline statute knowledge base (chats/statute_index.py): sections from the JSON Lines
+# files in STATUTE_CORPUS_DIR are indexed into STATUTE_INDEX_DIR and the best matches
+# are added to each prompt
+STATUTE_RETRIEVAL_ENABLED = os.getenv('STATUTE_RETRIEVAL_ENABLED', 'True').lower() == 'true'
+STATUTE_CORPUS_DIR = os.getenv('STATUTE_CORPUS_DIR', str(BASE_DIR / 'chats' / 'statutes'))
+STATUTE_INDEX_DIR = os.getenv('STATUTE_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'apna_lawyer_statute_index'))
+STATUTE_TOP_K = int(os.getenv('STATUTE_TOP_K', '3'))
+STATUTE_MIN_SCORE = float(os.getenv('STATUTE_MIN_SCORE', '2.0'))
+STATUTE_RELATIVE_CUTOFF = float(os.getenv('STATUTE_RELATIVE_CUTOFF', '0.5'))
+
+# Document Q&A (chats/document_service.py): uploaded documents are stored as chunks and
+# chat requests with a document_id send only the DOCUMENT_TOP_K most relevant ones
+DOCUMENT_CHUNK_TOKENS = int(os.getenv('DOCUMENT_CHUNK_TOKENS', '250'))
+DOCUMENT_TOP_K = int(os.getenv('DOCUMENT_TOP_K', '6'))
+DOCUMENT_INDEX_DIR = os.getenv('DOCUMENT_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'apna_lawyer_document_index'))
+DOCUMENT_INDEX_CACHE_SIZE = int(os.getenv('DOCUMENT_INDEX_CACHE_SIZE', '16'))
+
+# Document summarization (chats/summarization.py): sections of up to SUMMARY_SECTION_TOKENS
+# are summarized with at most SUMMARY_MAX_CONCURRENCY Gemini calls per job, then merged
+# SUMMARY_FAN_IN at a time
+SUMMARY_SECTION_TOKENS = int(os.getenv('SUMMARY_SECTION_TOKENS', '3000'))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv('SUMMARY_MAX_CONCURRENCY', '4'))
+SUMMARY_FAN_IN = int(os.getenv('SUMMARY_FAN_IN', '6'))
+SUMMARY_MAX_JOBS = int(os.getenv('SUMMARY_MAX_JOBS', '2'))
+SUMMARY_CALL_BUDGET_SECONDS = float(os.getenv('SUMMARY_CALL_BUDGET_SECONDS', '60'))
+SUMMARY_JOB_STALE_SECONDS = int(os.getenv('SUMMARY_JOB_STALE_SECONDS', '300'))
+
+# Offline FAQ (chats/faq_engine.py): FallbackAIService answers from the best match, and
+# short questions matching a curated term, with every content word covered by the entry,
+# skip the Gemini call (never when the client sends its own system prompt)
+FAQ_PATH = os.getenv('FAQ_PATH', str(BASE_DIR / 'chats' / 'faq' / 'faq.jsonl'))
+FAQ_MIN_SCORE = float(os.getenv('FAQ_MIN_SCORE', '2.0'))
+FAQ_FIRST_LINE_ENABLED = os.getenv('FAQ_FIRST_LINE_ENABLED', 'True').lower() == 'true'
+FAQ_FIRST_LINE_MAX_WORDS = int(os.getenv('FAQ_FIRST_LINE_MAX_WORDS', '12'))
+FAQ_FIRST_LINE_MIN_SCORE = float(os.getenv('FAQ_FIRST_LINE_MIN_SCORE', '4.0'))
+FAQ_FIRST_LINE_MIN_COVERAGE = float(os.getenv('FAQ_FIRST_LINE_MIN_COVERAGE', '1.0'))
+
+# Chat history export: rows fetched from the database per round trip
+CHAT_EXPORT_CHUNK_SIZE = int(os.getenv('CHAT_EXPORT_CHUNK_SIZE', '500'))
+
+# Chat search (chats/chat_search.py): maximum results per page
+CHAT_SEARCH_MAX_RESULTS = int(os.getenv('CHAT_SEARCH_MAX_RESULTS', '50'))
+
+# AI answer store (chats/answer_store.py): codec for new answers, 'zstd' (needs
+# the zstandard package, otherwise zlib is used), 'zlib' or 'raw'
+ANSWER_STORE_CODEC = os.getenv('ANSWER_STORE_CODEC', 'zstd')
+ANSWER_STORE_ZSTD_LEVEL = int(os.getenv('ANSWER_STORE_ZSTD_LEVEL', '9'))
+ANSWER_STORE_ZLIB_LEVEL = int(os.getenv('ANSWER_STORE_ZLIB_LEVEL', '9'))
+
+# Blob store for documents (apna_lawyer/blob_store.py): 'local' keeps files in
+# BLOB_STORE_DIR; 's3' uses an S3-compatible bucket (needs boto3; credentials
+# come from the usual AWS_* environment variables)
+BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'local')
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', os.path.join(BASE_DIR, 'blob_store'))
+BLOB_STORE_S3_BUCKET = os.getenv('BLOB_STORE_S3_BUCKET', '')
+BLOB_STORE_S3_PREFIX = os.getenv('BLOB_STORE_S3_PREFIX', 'blobs/')
+BLOB_STORE_S3_ENDPOINT_URL = os.getenv('BLOB_STORE_S3_ENDPOINT_URL', '')
+BLOB_STORE_S3_REGION = os.getenv('BLOB_STORE_S3_REGION', '')
+
+# File uploads (apna_lawyer/uploads.py) are streamed to temporary files in FILE_UPLOAD_TEMP_DIR
+# (system default when unset) and hashed on the way; files whose magic bytes are not an image,
+# PDF, DOC or DOCX, or that grow past the limit for their type, are dropped mid-stream
+FILE_UPLOAD_HANDLERS = ['apna_lawyer.uploads.StreamingUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv('UPLOAD_MAX_IMAGE_BYTES', str(15 * 1024 * 1024)))
+UPLOAD_MAX_DOCUMENT_BYTES = int(os.getenv('UPLOAD_MAX_DOCUMENT_BYTES', str(25 * 1024 * 1024)))
+
+# Chat image derivatives (chats/image_derivatives.py), written next to each stored image by
+# IMAGE_DERIVATIVE_WORKERS background threads: WebP thumbnail and preview (longest side in
+# pixels) and a grayscale PNG capped at IMAGE_OCR_MAX_SIDE that OCR reads instead of the original
+IMAGE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', '256'))
+IMAGE_PREVIEW_SIZE = int(os.getenv('IMAGE_PREVIEW_SIZE', '1280'))
+IMAGE_OCR_MAX_SIDE = int(os.getenv('IMAGE_OCR_MAX_SIDE', '2500'))
+IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '80'))
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', '2'))
+
+# OCR language selection (chats/ocr_languages.py): before OCR each page is checked for
+# Devanagari and Latin text and turned upright. OCR_SCRIPT_DETECTION is 'heuristic' (NumPy on a
+# copy with longest side OCR_SCRIPT_DETECTION_SIDE), 'osd' (Tesseract OSD, needs osd.traineddata;
+# falls back to the heuristic) or 'off' (always eng+hin). A page is OCR'd with one language when
+# at least OCR_SINGLE_SCRIPT_SHARE of its text is in that script
+OCR_SCRIPT_DETECTION = os.getenv('OCR_SCRIPT_DETECTION', 'heuristic')
+OCR_SCRIPT_DETECTION_SIDE = int(os.getenv('OCR_SCRIPT_DETECTION_SIDE', '1600'))
+OCR_SINGLE_SCRIPT_SHARE = float(os.getenv('OCR_SINGLE_SCRIPT_SHARE', '0.9'))
+OCR_OSD_MIN_SCRIPT_CONFIDENCE = float(os.getenv('OCR_OSD_MIN_SCRIPT_CONFIDENCE', '2.0'))
+
+# OCR engine (chats/ocr_engines.py): 'pytesseract' starts a tesseract process per page;
+# 'tesserocr' (needs the tesserocr package) runs Tesseract in process and keeps up to
+# OCR_ENGINE_POOL_SIZE initialised handles per language set in each worker.
+# OCR_TESSDATA_PATH overrides where tesserocr looks for traineddata
+OCR_ENGINE = os.getenv('OCR_ENGINE', 'pytesseract')
+OCR_ENGINE_POOL_SIZE = int(os.getenv('OCR_ENGINE_POOL_SIZE', '2'))
+OCR_TESSDATA_PATH = os.getenv('OCR_TESSDATA_PATH') or None
+
+# Region-parallel OCR (chats/ocr_layout.py): pages of at least OCR_REGION_MIN_PIXELS are split
+# into text blocks (found on a copy with longest side OCR_LAYOUT_ANALYSIS_SIDE) that
+# OCR_REGION_WORKERS threads per worker OCR at the same time; 1 disables splitting
+OCR_REGION_WORKERS = int(os.getenv('OCR_REGION_WORKERS', str(min(4, os.cpu_count() or 1))))
+OCR_REGION_MIN_PIXELS = int(os.getenv('OCR_REGION_MIN_PIXELS', '3000000'))
+OCR_LAYOUT_ANALYSIS_SIDE = int(os.getenv('OCR_LAYOUT_ANALYSIS_SIDE', '1600'))
+
+# Two-tier cache (apna_lawyer/cache.py): a per-process LRU of CACHE_L1_MAX_BYTES in front of
+# a store shared by all workers: 'sqlite' (file at CACHE_SQLITE_PATH), 'redis' (needs the
+# redis package) or 'none'. L1 keeps entries at most CACHE_L1_TTL seconds so other workers'
+# writes show up quickly. CACHE_EARLY_EXPIRY_BETA > 1 refreshes hot keys earlier (0 disables)
+CACHE_L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', str(32 * 1024 * 1024)))
+CACHE_L1_TTL = float(os.getenv('CACHE_L1_TTL', '10'))
+CACHE_L2_BACKEND = os.getenv('CACHE_L2_BACKEND', 'sqlite')
+CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_EARLY_EXPIRY_BETA = float(os.getenv('CACHE_EARLY_EXPIRY_BETA', '1.0'))
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', '30'))
+# Seconds cached per namespace (0 disables): Supabase lawyer reads, Gemini answers
+# for identical prompts, OCR text per image
+LAWYER_CACHE_TTL = int(os.getenv('LAWYER_CACHE_TTL', '60'))
+AI_ANSWER_CACHE_TTL = int(os.getenv('AI_ANSWER_CACHE_TTL', '3600'))
+OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', '86400'))
+
+# Batch chat API: maximum questions per request and concurrent Gemini calls per batch
+BATCH_CHAT_MAX_ITEMS = int(os.getenv('BATCH_CHAT_MAX_ITEMS', '30'))
+BATCH_CHAT_MAX_WORKERS = int(os.getenv('BATCH_CHAT_MAX_WORKERS', '8'))
+
+# Batch OCR API: maximum pages (images, or frames of multi-page TIFFs) per request and pages
+# OCR'd at the same time; large pages are split further across OCR_REGION_WORKERS threads
+OCR_BATCH_MAX_PAGES = int(os.getenv('OCR_BATCH_MAX_PAGES', '30'))
+OCR_BATCH_WORKERS = int(os.getenv('OCR_BATCH_WORKERS', '4'))
+
+# Diagnostics: where ProfilingMiddleware writes profiles and the sampling interval
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,156 @@
+"""
+Streaming, size-capped file uploads
+
+StreamingUploadHandler (installed through FILE_UPLOAD_HANDLERS) writes every
+uploaded file straight to a temporary file while hashing it, so memory per
+upload stays at one request chunk however large the file is. The type is
+sniffed from the magic bytes at the start of the file: anything that is not
+an image or document the API accepts, or that grows past its size limit, is
+dropped as soon as that is known and the rest of it is read and discarded.
+
+Completed uploads carry ``sha256`` and ``size``, and their ``content_type`` is
+the sniffed type rather than the one the client declared. Views find out why
+a file is missing from request.FILES through upload_rejection().
+"""
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+MB = 1024 * 1024
+
+# Bytes needed to recognise every type below
+SNIFF_BYTES = 16
+
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/bmp', 'image/tiff', 'image/webp'}
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+DOCUMENT_TYPES = {'application/pdf', 'application/msword', DOCX_TYPE}
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'%PDF-', 'application/pdf'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),  # OLE2 (.doc)
+    (b'PK\x03\x04', 'application/zip'),
+)
+
+
+class UploadRejected(Exception):
+    """Why an uploaded file was dropped; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def sniff_content_type(head, file_name='', declared_type=None):
+    """
+    Content type of a file from its first bytes
+
+    A ZIP container is only taken for a .docx when the client says it is one;
+    the magic bytes alone cannot tell it apart from other ZIP files.
+
+    Returns:
+        str: Content type, or None when the format is not recognised
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            if content_type == 'application/zip' and (
+                    declared_type == DOCX_TYPE or file_name.lower().endswith('.docx')):
+                return DOCX_TYPE
+            return content_type
+    return None
+
+
+def max_upload_bytes(content_type):
+    """Size limit for an upload of a sniffed content type"""
+    if content_type in IMAGE_TYPES:
+        return getattr(settings, 'UPLOAD_MAX_IMAGE_BYTES', 15 * MB)
+    return getattr(settings, 'UPLOAD_MAX_DOCUMENT_BYTES', 25 * MB)
+
+
+def upload_rejection(request, field_name):
+    """The UploadRejected recorded for a file field of this request, or None"""
+    request = getattr(request, '_request', request)
+    return getattr(request, 'upload_rejections', {}).get(field_name)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Upload handler that streams files to disk, hashing and checking them on the way
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.sniffed_type = None
+        self.limit = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sniffed_type is None:
+            self.head += raw_data[:SNIFF_BYTES]
+            if len(self.head) >= SNIFF_BYTES and not self._check_type():
+                raise SkipFile()
+
+        self.size += len(raw_data)
+        if self.limit is not None and self.size > self.limit:
+            self._reject(f"File exceeds the {self.limit // MB} MB limit", 413)
+            raise SkipFile()
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.sniffed_type is None and not self._check_type():
+            # Files shorter than SNIFF_BYTES are checked only now
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_type = self.sniffed_type
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self._discard()
+
+    def _check_type(self):
+        """Sniff the file type; False (with the reason recorded) when it is not accepted"""
+        sniffed_type = sniff_content_type(self.head, self.file_name or '', self.content_type)
+        if sniffed_type not in IMAGE_TYPES | DOCUMENT_TYPES:
+            self._reject('Unsupported file type; upload an image, PDF, DOC or DOCX file', 415)
+            return False
+        self.sniffed_type = sniffed_type
+        self.limit = max_upload_bytes(sniffed_type)
+        return True
+
+    def _reject(self, message, status_code):
+        """Record why this file is dropped and delete what was written of it"""
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_rejections'):
+                self.request.upload_rejections = {}
+            self.request.upload_rejections[self.field_name] = UploadRejected(message, status_code)
+        self._discard()
+
+    def _discard(self):
+        temp_location = self.file.temporary_file_path()
+        try:
+            self.file.close()
+            os.remove(temp_location)
+        except FileNotFoundError:
+            pass
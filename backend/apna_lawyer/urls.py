@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from chats import views as chat_views
+from . import diagnostics, metrics
 import psutil
 import os
 
@@ -18,11 +19,25 @@ def health_check(request):
     except:
         return JsonResponse({'status': 'healthy', 'memory_info': 'unavailable'})
 
+def metrics_view(request):
+    """Prometheus scrape endpoint aggregated across all gunicorn workers"""
+    try:
+        metrics.PROCESS_MEMORY.set(psutil.Process(os.getpid()).memory_info().rss, pid=os.getpid())
+    except Exception:
+        pass
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Health check endpoint
     path('health/', health_check, name='health_check'),
+    path('metrics', metrics_view, name='metrics'),
+    
+    # Staff-only diagnostics
+    path('diagnostics/tracemalloc/', diagnostics.tracemalloc_view, name='diagnostics_tracemalloc'),
+    path('diagnostics/objects/', diagnostics.object_counts_view, name='diagnostics_objects'),
+    path('diagnostics/profiles/', diagnostics.profiles_view, name='diagnostics_profiles'),
     
     # API authentication endpoints
     path('api/', include('users.urls')),
@@ -36,5 +51,6 @@ urlpatterns = [
     
     # File processing endpoints
     path('api/ocr-image/', chat_views.ocr_image_api, name='ocr_image_api'),
+    path('api/ocr-batch/', chat_views.OCRBatchAPI.as_view(), name='ocr_batch_api'),
     path('api/extract-doc/', chat_views.extract_document_api, name='extract_document_api'),
 ]
\ No newline at end of file
@@ -1,14 +1,73 @@
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def get_supabase_client():
+    from supabase import create_client
+
     supabase_url = os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_KEY")
     return create_client(supabase_url, supabase_key)
 
+
+# Markers asyncio/inspect look up on any object (mock.patch asks whether the target is async)
+_INTROSPECTION_NAMES = frozenset({'_is_coroutine', '_is_coroutine_marker'})
+
+
+class LazyService:
+    """
+    Thread-safe lazy singleton proxy.
+
+    The wrapped service is constructed by ``factory`` on first attribute
+    access, so importing a module that exposes a global service instance has
+    no side effects (no clients, network handles or binary lookups at import).
+    Attribute access is forwarded to the constructed instance. Dunder names
+    are not: inspect, copy, pickle and mock.patch probe them on the proxy, and
+    answering those probes must not build the service.
+
+    Usage:
+        ocr_service = LazyService(OCRService)
+        ocr_service.extract_text_from_base64(data)  # OCRService() built here
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def get(self):
+        """Return the service instance, constructing it on first use"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    def is_initialized(self):
+        return self._instance is not None
+
+    def reset(self):
+        """Drop the instance so the next access constructs a fresh one"""
+        with self._lock:
+            object.__setattr__(self, '_instance', None)
+
+    def __getattr__(self, name):
+        if (name.startswith('__') and name.endswith('__')) or name in _INTROSPECTION_NAMES:
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __repr__(self):
+        state = 'initialized' if self.is_initialized() else 'not initialized'
+        return f"<LazyService {getattr(self._factory, '__name__', self._factory)} ({state})>"
+
 # Example usage in a view:
 """
 def some_view(request):
@@ -0,0 +1,160 @@
+"""
+Memory-aware gunicorn worker lifecycle
+
+- Sizing: worker and thread counts are derived from the memory actually
+  available to the container instead of being hard-coded.
+- Copy-on-write friendly preload: shared read-only data is warmed in the
+  master, then ``gc.freeze()`` moves every preloaded object into the
+  permanent generation so the collector in forked workers never touches
+  (and therefore never copies) those pages.
+- RSS-based recycling: a worker is retired gracefully after the request
+  during which its resident memory crosses the configured budget, instead of
+  after a fixed number of requests.
+
+This module is imported by gunicorn.conf.py before Django is configured, so
+it must not import Django at module level.
+"""
+
+import gc
+import os
+
+import psutil
+
+MB = 1024 * 1024
+
+_warmups = []
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def detect_memory_limit_mb():
+    """
+    Return the memory available to this container in MB
+
+    Order: MEMORY_LIMIT_MB env, cgroup v2 memory.max, cgroup v1 limit, host RAM.
+    """
+    override = os.getenv('MEMORY_LIMIT_MB')
+    if override:
+        return int(override)
+
+    host_mb = psutil.virtual_memory().total // MB
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as fh:
+                raw = fh.read().strip()
+        except OSError:
+            continue
+        if raw.isdigit():
+            # Unlimited cgroups report "max" or a huge sentinel value
+            return min(int(raw) // MB, host_mb)
+    return host_mb
+
+
+def plan_workers(memory_limit_mb=None, cpu_count=None):
+    """
+    Choose worker/thread counts and the per-worker RSS budget
+
+    Memory model: the preloaded master (MASTER_MEMORY_MB) is shared with all
+    workers through copy-on-write; each worker adds roughly WORKER_MEMORY_MB
+    of private memory. MEMORY_HEADROOM_PERCENT of the limit is kept free.
+
+    Returns:
+        dict: workers, threads, worker_class and rss_budget_mb
+    """
+    memory_limit_mb = memory_limit_mb or detect_memory_limit_mb()
+    cpu_count = cpu_count or os.cpu_count() or 1
+
+    master_mb = _env_int('MASTER_MEMORY_MB', 150)
+    worker_mb = _env_int('WORKER_MEMORY_MB', 70)
+    headroom_percent = _env_int('MEMORY_HEADROOM_PERCENT', 15)
+
+    usable_mb = memory_limit_mb * (100 - headroom_percent) // 100 - master_mb
+    cpu_workers = cpu_count * 2 + 1
+    workers = _env_int('GUNICORN_WORKERS', max(1, min(cpu_workers, usable_mb // worker_mb)))
+
+    # When memory caps the worker count, add threads so concurrency still tracks CPUs
+    default_threads = max(1, min(4, -(-cpu_workers // workers)))
+    threads = _env_int('GUNICORN_THREADS', default_threads)
+
+    # A worker's RSS includes the shared preloaded pages it has touched
+    default_budget = master_mb + max(worker_mb, usable_mb // workers)
+    rss_budget_mb = _env_int('WORKER_RSS_BUDGET_MB', default_budget)
+
+    return {
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'rss_budget_mb': rss_budget_mb,
+        'memory_limit_mb': memory_limit_mb,
+    }
+
+
+def register_warmup(fn):
+    """
+    Register a callable that loads shared read-only data in the master
+
+    Warmups run once after the app is preloaded and before workers fork, so
+    their data is shared copy-on-write. Usable as a decorator.
+    """
+    _warmups.append(fn)
+    return fn
+
+
+def warm_shared_data(log=print):
+    """Populate read-only caches in the master process before forking"""
+    try:
+        from django.apps import apps
+        from django.urls import get_resolver
+
+        # Import every view module and build the resolver's reverse dictionaries
+        resolver = get_resolver()
+        resolver.url_patterns
+        resolver.reverse_dict
+        for model in apps.get_models():
+            model._meta.get_fields()
+    except Exception as e:
+        log(f"Warmup of URL resolver/models failed: {e}")
+
+    for warmup in _warmups:
+        try:
+            warmup()
+        except Exception as e:
+            log(f"Warmup {getattr(warmup, '__name__', warmup)} failed: {e}")
+
+
+def freeze_preloaded_heap():
+    """
+    Collect once, then freeze all surviving objects into the permanent generation
+
+    Frozen objects are ignored by every later collection, so workers do not
+    write to (and copy) the pages holding them.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+def current_rss_mb():
+    return psutil.Process(os.getpid()).memory_info().rss / MB
+
+
+def check_worker_memory(worker, rss_budget_mb):
+    """
+    Retire the worker after the current request if its RSS exceeds the budget
+
+    Setting ``worker.alive = False`` lets gunicorn finish in-flight work and
+    exit cleanly; the arbiter then forks a fresh worker from the frozen master.
+
+    Returns:
+        float: Current RSS in MB
+    """
+    rss_mb = current_rss_mb()
+    if rss_mb > rss_budget_mb and worker.alive:
+        worker.log.info(
+            "Worker %s RSS %.1f MB exceeds budget %s MB; recycling", worker.pid, rss_mb, rss_budget_mb
+        )
+        worker.alive = False
+    return rss_mb
@@ -1,9 +1,29 @@
 from django.contrib import admin
-from .models import UserChat
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from .chat_search import matching_chats
+from .models import ChatDocument, UserChat
+
 
 @admin.register(UserChat)
 class UserChatAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['user__name', 'user__email', 'user_text_input']
-    readonly_fields = ['id', 'created_at']
\ No newline at end of file
+    search_fields = ['user__name', 'user__email']
+    readonly_fields = ['id', 'created_at', 'ai_text_output']
+    exclude = ['answer']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Chat text is matched through the full-text index instead of a LIKE scan
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        users = get_user_model().objects.filter(Q(name__icontains=search_term) | Q(email__icontains=search_term))
+        return queryset.filter(matching_chats(search_term) | Q(user__in=users)), False
+
+
+@admin.register(ChatDocument)
+class ChatDocumentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'user', 'chunk_count', 'created_at']
+    list_filter = ['created_at', 'content_type']
+    search_fields = ['name', 'user__email', 'user_session_id']
+    readonly_fields = ['id', 'created_at']
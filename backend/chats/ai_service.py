@@ -3,21 +3,54 @@ AI Service for integrating with Gemini API
 """
 
 import os
+import time
 import requests
 import json
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.conf import settings
 from dotenv import load_dotenv
+from apna_lawyer.cache import shared_cache
+from apna_lawyer.metrics import UPSTREAM_EVENTS, record_cache, track_upstream
+from apna_lawyer.utils import LazyService
+from .prompt_builder import prompt_builder
+from .resilience import Deadline, DeadlineExceeded, LatencyTracker, RetryableError, RetryPolicy, hedged_call
+from .faq_engine import faq_engine
+from .singleflight import ai_request_coalescer, prompt_key
+from .statute_index import relevant_statutes
 
 load_dotenv()
 
+
+class GeminiAPIError(Exception):
+    """Raised when the Gemini API answers with a non-success status"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class EmptyCompletionError(GeminiAPIError):
+    """Raised when Gemini answers 200 without a completion, e.g. a blocked prompt"""
+
+
+# HTTP statuses worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
 class GeminiAIService:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+        self.model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        self.base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
         
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
+        
+        self.retry_policy = RetryPolicy(max_attempts=getattr(settings, 'AI_MAX_ATTEMPTS', 3))
+        self.latency = LatencyTracker(min_samples=getattr(settings, 'AI_HEDGE_MIN_SAMPLES', 20))
     
-    def generate_legal_response(self, user_message, system_prompt=None, image_text=None):
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None,
+                                document_context=None, deadline=None):
         """
         Generate AI response using Gemini API with system and user prompts
         
@@ -25,11 +58,38 @@ class GeminiAIService:
             user_message (str): The user's question/message
             system_prompt (str): System instructions for the AI
             image_text (str): Extracted text from uploaded image (optional)
+            document_context (str): Excerpts of an uploaded document relevant to the question (optional)
+            deadline (Deadline): Time budget of the calling request (optional)
         
         Returns:
-            str: AI generated response
+            str: AI generated response, or a FallbackAIService answer when the
+                budget runs out or retries are exhausted
         """
+        deadline = deadline or Deadline.for_request()
+        full_prompt = self.build_prompt(user_message, system_prompt, image_text, document_context)
         
+        try:
+            return self._complete(full_prompt, deadline)
+            
+        except (DeadlineExceeded, RetryableError, FutureTimeoutError) as e:
+            print(f"Gemini unavailable within budget, using fallback: {e}")
+            UPSTREAM_EVENTS.inc(dependency='gemini', event='fallback')
+            return FallbackAIService().generate_legal_response(user_message, system_prompt, image_text)
+        except EmptyCompletionError as e:
+            print(f"Gemini returned no completion: {e}")
+            return "I apologize, but I couldn't generate a proper response. Please try again."
+        except GeminiAPIError as e:
+            print(f"Gemini API Error: {e}")
+            return "I'm experiencing technical difficulties. Please try again later."
+        except requests.exceptions.RequestException as e:
+            print(f"Request error: {e}")
+            return "I'm having trouble connecting to the AI service. Please try again."
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return "An unexpected error occurred. Please try again."
+
+    def build_prompt(self, user_message, system_prompt=None, image_text=None, document_context=None):
+        """Full prompt for a question: system prompt, context and relevant statutes within the token budget"""
         # Default system prompt for legal assistant
         if not system_prompt:
             system_prompt = """You are a knowledgeable legal assistant specializing in Indian law. 
@@ -38,60 +98,135 @@ class GeminiAIService:
             relevant laws or sections when applicable. If you're unsure about something, 
             acknowledge the limitation and suggest consulting a lawyer."""
         
-        # Construct the full prompt
-        full_prompt = f"{system_prompt}\n\nUser Question: {user_message}"
+        # Construct the full prompt within the token budget (deduplicated, trimmed to fit).
+        # Relevant sections from the local statute index ground the answer
+        return prompt_builder.build(
+            system_prompt, user_message, context=[
+                ('Extracted Text from Image', image_text),
+                ('Relevant Document Excerpts', document_context),
+                ('Relevant Statutes', relevant_statutes(user_message)),
+            ]
+        ).text
+
+    def generate_text(self, prompt, deadline=None):
+        """
+        Complete an already built prompt, raising instead of degrading
         
-        # Add image text if provided
-        if image_text:
-            full_prompt += f"\n\nExtracted Text from Image: {image_text}"
+        For pipelines such as document summarization that store results and
+        must never keep a fallback or error message.
         
-        try:
-            # Prepare request payload
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": full_prompt
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
-            
-            # Make API request
-            url = f"{self.base_url}?key={self.api_key}"
-            headers = {
-                'Content-Type': 'application/json'
+        Raises:
+            DeadlineExceeded, RetryableError, GeminiAPIError, requests.exceptions.RequestException
+        """
+        deadline = deadline or Deadline.for_request()
+        return self._complete(prompt, deadline)
+
+    def _complete(self, full_prompt, deadline):
+        """
+        Completion for a prompt from the shared cache, or from one upstream call
+
+        Identical prompts answered within AI_ANSWER_CACHE_TTL come from the
+        cache; identical prompts already in flight share one upstream call.
+        """
+        key = prompt_key(full_prompt)
+
+        def compute():
+            return ai_request_coalescer.do(
+                key,
+                lambda: self._request_completion(full_prompt, deadline),
+                timeout=deadline.remaining()
+            )
+
+        ttl = getattr(settings, 'AI_ANSWER_CACHE_TTL', 3600)
+        if ttl <= 0:
+            return compute()
+        return shared_cache.get_or_set('ai_answers', key, compute, ttl, wait_timeout=deadline.remaining())
+
+    def _request_completion(self, full_prompt, deadline):
+        """
+        Get a completion within the deadline, retrying and hedging as configured
+        
+        Raises:
+            DeadlineExceeded: If the budget ran out
+            RetryableError: If every attempt hit a retryable failure
+            GeminiAPIError: On non-retryable API errors and responses without a completion
+        """
+        hedge_after = None
+        if getattr(settings, 'AI_HEDGE_ENABLED', True):
+            hedge_after = self.latency.percentile(getattr(settings, 'AI_HEDGE_PERCENTILE', 95))
+        
+        def attempt():
+            return hedged_call(
+                lambda timeout: self._post_prompt(full_prompt, timeout),
+                deadline,
+                hedge_after,
+                on_hedge=lambda: UPSTREAM_EVENTS.inc(dependency='gemini', event='hedge')
+            )
+        
+        return self.retry_policy.call(
+            attempt,
+            deadline,
+            on_retry=lambda attempt_number, error: UPSTREAM_EVENTS.inc(dependency='gemini', event='retry')
+        )
+
+    def _post_prompt(self, full_prompt, timeout):
+        """
+        Send a single prompt to Gemini and return the generated text
+        
+        Raises:
+            RetryableError: On 429/5xx responses, timeouts and connection errors
+            GeminiAPIError: On other non-200 responses
+            EmptyCompletionError: On a 200 response without a completion (blocked
+                by safety filters, for example); it is neither cached nor stored
+        """
+        # Prepare request payload
+        payload = {
+            "contents": [{
+                "parts": [{
+                    "text": full_prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": 0.7,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 1024,
             }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Extract the generated text
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    candidate = result['candidates'][0]
-                    if 'content' in candidate and 'parts' in candidate['content']:
-                        return candidate['content']['parts'][0]['text']
-                
-                return "I apologize, but I couldn't generate a proper response. Please try again."
-            
-            else:
-                print(f"Gemini API Error: {response.status_code} - {response.text}")
-                return "I'm experiencing technical difficulties. Please try again later."
-                
-        except requests.exceptions.Timeout:
-            return "The request timed out. Please try again."
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
-            return "I'm having trouble connecting to the AI service. Please try again."
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return "An unexpected error occurred. Please try again."
+        }
+        
+        # Make API request
+        url = f"{self.base_url}?key={self.api_key}"
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        
+        timeout = min(timeout, getattr(settings, 'AI_ATTEMPT_TIMEOUT_SECONDS', 20))
+        started = time.perf_counter()
+        
+        try:
+            with track_upstream('gemini', 'generate_content'):
+                response = requests.post(url, headers=headers, json=payload, timeout=timeout)
+                if response.status_code in RETRYABLE_STATUSES:
+                    raise RetryableError(
+                        f"{response.status_code} - {response.text[:200]}",
+                        retry_after=_parse_retry_after(response.headers.get('Retry-After'))
+                    )
+                if response.status_code != 200:
+                    raise GeminiAPIError(f"{response.status_code} - {response.text}", response.status_code)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+        
+        self.latency.record(time.perf_counter() - started)
+        result = response.json()
+        
+        # Extract the generated text
+        if 'candidates' in result and len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            if 'content' in candidate and 'parts' in candidate['content']:
+                return candidate['content']['parts'][0]['text']
+        
+        reason = result.get('promptFeedback', {}).get('blockReason') or 'no candidates'
+        raise EmptyCompletionError(f"No completion in the response ({reason})", response.status_code)
 
     def test_connection(self):
         """Test the Gemini API connection"""
@@ -107,23 +242,23 @@ class GeminiAIService:
 
 # Fallback AI service for when Gemini is not available
 class FallbackAIService:
-    def generate_legal_response(self, user_message, system_prompt=None, image_text=None):
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None,
+                                document_context=None, deadline=None):
         """Fallback response when Gemini is not available"""
         
-        # Simple keyword-based responses for common legal topics
-        keywords_responses = {
-            'contract': 'A contract is a legally binding agreement between parties. Key elements include offer, acceptance, consideration, and legal capacity.',
-            'divorce': 'Divorce laws in India are governed by personal laws and the Indian Divorce Act. Grounds include cruelty, desertion, and mutual consent.',
-            'property': 'Property law in India covers ownership, transfer, and rights. The Transfer of Property Act, 1882 is a key legislation.',
-            'criminal': 'Criminal law deals with offenses against society. The Indian Penal Code, 1860 defines various crimes and punishments.',
-            'employment': 'Employment law covers worker rights, contracts, and workplace regulations under various labor laws.',
-        }
-        
-        user_lower = user_message.lower()
+        # Closest curated answer from the offline FAQ
+        try:
+            match = faq_engine.best_match(user_message)
+        except Exception as e:
+            print(f"FAQ lookup failed: {e}")
+            match = None
+        if match:
+            return match.entry.format()
         
-        for keyword, response in keywords_responses.items():
-            if keyword in user_lower:
-                return f"Legal Assistant: {response}\n\nNote: This is a basic response. For detailed legal advice, please consult with a qualified lawyer."
+        # Closest section from the offline statute index
+        statute = relevant_statutes(user_message, k=1)
+        if statute:
+            return f"Legal Assistant: This provision may be relevant:\n\n{statute}\n\nNote: This is a basic response. For detailed legal advice, please consult with a qualified lawyer."
         
         # Default response
         base_response = f"Legal Assistant: Thank you for your question about '{user_message}'. "
@@ -139,15 +274,66 @@ class FallbackAIService:
         return True, "Fallback service is always available"
 
 
-def get_ai_service():
-    """Get the appropriate AI service (Gemini or Fallback)"""
+def _parse_retry_after(value):
+    """Parse a Retry-After header given in seconds; HTTP dates are ignored"""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# Shared Gemini client so latency history (used for hedging) persists across requests
+gemini_service = LazyService(GeminiAIService)
+
+
+class FAQAIService:
+    """Answers a question from a confident offline FAQ match without calling the model"""
+
+    def __init__(self, match):
+        self.match = match
+
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None,
+                                document_context=None, deadline=None):
+        return self.match.entry.format()
+
+    def test_connection(self):
+        return True, "FAQ service is always available"
+
+
+def first_line_answer(user_message):
+    """FAQAIService for short common questions the offline FAQ answers confidently, else None"""
+    if not user_message or not getattr(settings, 'FAQ_FIRST_LINE_ENABLED', True):
+        return None
+    try:
+        match = faq_engine.first_line_match(user_message)
+    except Exception as e:
+        print(f"FAQ lookup failed: {e}")
+        return None
+    record_cache('faq_first_line', match is not None)
+    return FAQAIService(match) if match else None
+
+
+def get_ai_service(user_message=None, system_prompt=None):
+    """
+    Get the appropriate AI service (FAQ, Gemini or Fallback)
+
+    Args:
+        user_message: Plain question without image or document context; when
+            the offline FAQ answers it confidently, no model call is made
+        system_prompt: Client-supplied instructions; the canned FAQ answers
+            cannot follow them, so the question always goes to the model
+    """
+    if not system_prompt:
+        faq_service = first_line_answer(user_message)
+        if faq_service is not None:
+            return faq_service
+
     try:
-        gemini_service = GeminiAIService()
-        success, _ = gemini_service.test_connection()
-        if success:
-            return gemini_service
-    except:
+        # No test call here: availability is handled per request by retries,
+        # the deadline and the fallback in generate_legal_response
+        return gemini_service.get()
+    except ValueError:
         pass
     
-    # Return fallback service if Gemini is not available
-    return FallbackAIService()
\ No newline at end of file
+    # Return fallback service if Gemini is not configured
+    return FallbackAIService()
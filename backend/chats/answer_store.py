@@ -0,0 +1,111 @@
+"""
+Codecs for the content-addressed AI answer store
+
+Every distinct answer text is stored once in ChatAnswer, keyed by the
+SHA-256 of its UTF-8 bytes and compressed with zstd (when the zstandard
+package is installed) or zlib. Answers that do not shrink are kept raw.
+UserChat rows reference the answer by hash, so popular questions that get
+byte-identical answers share one row.
+
+Each answer is full-text indexed in Python when it is first stored
+(chats/chat_search.py), so the database never has to decompress it.
+"""
+
+import hashlib
+import zlib
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+CODEC_RAW = 'raw'
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+
+def answer_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def default_codec() -> str:
+    codec = getattr(settings, 'ANSWER_STORE_CODEC', CODEC_ZSTD)
+    if codec == CODEC_ZSTD and not ZSTD_AVAILABLE:
+        return CODEC_ZLIB
+    return codec
+
+
+def compress_answer(text: str, codec: Optional[str] = None) -> Tuple[str, bytes]:
+    """(codec, body) for text; falls back to raw when compression does not help"""
+    raw = text.encode('utf-8')
+    codec = codec or default_codec()
+    if codec == CODEC_ZSTD:
+        body = zstandard.ZstdCompressor(level=getattr(settings, 'ANSWER_STORE_ZSTD_LEVEL', 9)).compress(raw)
+    elif codec == CODEC_ZLIB:
+        body = zlib.compress(raw, getattr(settings, 'ANSWER_STORE_ZLIB_LEVEL', 9))
+    else:
+        return CODEC_RAW, raw
+    if len(body) >= len(raw):
+        return CODEC_RAW, raw
+    return codec, body
+
+
+def pack_answer(text: str) -> dict:
+    """Field values of the stored answer for text"""
+    codec, body = compress_answer(text)
+    return {'content_hash': answer_hash(text), 'codec': codec, 'body': body, 'size': len(text.encode('utf-8'))}
+
+
+def decompress_answer(codec: Optional[str], body) -> Optional[str]:
+    """Answer text from a stored (codec, body) pair; None for a missing answer"""
+    if body is None:
+        return None
+    body = bytes(body)
+    if codec == CODEC_ZLIB:
+        body = zlib.decompress(body)
+    elif codec == CODEC_ZSTD:
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return body.decode('utf-8')
+
+
+def register_sqlite_functions(dbapi_connection):
+    """chat_answer_text(codec, body) for the search triggers of migration 0010 (replaced by 0012)"""
+    dbapi_connection.create_function('chat_answer_text', 2, decompress_answer, deterministic=True)
+
+
+# The database cannot read compressed bodies, so answers are indexed with
+# their text when first stored: a tsvector column on PostgreSQL (migration
+# 0010), an FTS5 table keyed by the answer's rowid on SQLite (migration 0012)
+_POSTGRES_INDEX_ANSWER = """
+    UPDATE chats_chatanswer SET search_vector = setweight(to_tsvector('simple', %s), 'B')
+    WHERE content_hash = %s AND search_vector IS NULL
+"""
+_SQLITE_INDEX_ANSWER = """
+    INSERT INTO chats_chatanswer_fts(rowid, ai_text_output)
+    SELECT a.rowid, %s FROM chats_chatanswer a
+    WHERE a.content_hash = %s AND NOT EXISTS (SELECT 1 FROM chats_chatanswer_fts f WHERE f.rowid = a.rowid)
+"""
+
+
+def index_answers(connection, answers):
+    """Full-text index (content_hash, text) pairs of newly stored answers; already indexed ones are skipped"""
+    statement = {'postgresql': _POSTGRES_INDEX_ANSWER, 'sqlite': _SQLITE_INDEX_ANSWER}.get(connection.vendor)
+    if statement is None or not answers:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(statement, [(text, content_hash) for content_hash, text in answers])
+
+
+def index_stored_answers(connection, stored, batch_size=2000):
+    """Full-text index stored answers given as (content_hash, codec, body) rows, batch_size at a time"""
+    batch = []
+    for content_hash, codec, body in stored:
+        batch.append((content_hash, decompress_answer(codec, body)))
+        if len(batch) == batch_size:
+            index_answers(connection, batch)
+            batch = []
+    index_answers(connection, batch)
@@ -0,0 +1,86 @@
+"""
+Pages of a batch OCR request
+
+A batch is any number of uploaded images, each counted as one page, except
+multi-page TIFFs, which contribute every frame. Pages are numbered from 1
+in upload order, then frame order. Workers open their page from the
+upload's temporary file themselves, so no decoded page is shared between
+threads or held in memory while it waits for a worker.
+"""
+
+import hashlib
+import io
+from dataclasses import dataclass
+
+from PIL import Image, UnidentifiedImageError
+
+from .ocr_service import ocr_service
+
+
+class InvalidBatch(Exception):
+    """The uploaded files cannot be OCR'd as a batch; the message is safe to return"""
+
+
+@dataclass
+class OCRPage:
+    number: int
+    file_name: str
+    frame: int
+    source: object  # Temporary file path, or the encoded bytes of an in-memory upload
+    digest: str
+    upload: object  # Keeps the temporary file until the response has streamed
+
+
+def collect_pages(uploads, max_pages):
+    """
+    Split uploaded images into pages
+
+    Args:
+        uploads (list): Uploaded files, in the order their pages are numbered
+        max_pages (int): Largest batch accepted
+
+    Returns:
+        list: OCRPage per page
+
+    Raises:
+        InvalidBatch: A file is not an image or the batch has too many pages
+    """
+    pages = []
+    for upload in uploads:
+        if not upload.content_type.startswith('image/'):
+            raise InvalidBatch(f"{upload.name} is not an image")
+        if hasattr(upload, 'temporary_file_path'):
+            source = upload.temporary_file_path()
+        else:
+            upload.seek(0)
+            source = upload.read()
+        digest = getattr(upload, 'sha256', None) or _sha256(upload)
+
+        frames = _frame_count(source, upload.name)
+        if len(pages) + frames > max_pages:
+            raise InvalidBatch(f"A batch can contain at most {max_pages} pages")
+        for frame in range(frames):
+            pages.append(OCRPage(len(pages) + 1, upload.name, frame, source, digest, upload))
+    return pages
+
+
+def _frame_count(source, name):
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+            # Animated GIFs and WebPs are one picture; only TIFF frames are pages
+            return getattr(image, 'n_frames', 1) if image.format == 'TIFF' else 1
+    except (UnidentifiedImageError, OSError):
+        raise InvalidBatch(f"{name} is not a readable image")
+
+
+def _sha256(upload):
+    """Digest of uploads that did not come through StreamingUploadHandler"""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_page(page):
+    """Cleaned text of a page ('' when it has none); raises on OCR errors"""
+    return ocr_service.extract_text_from_page(page.source, frame=page.frame, digest=page.digest)
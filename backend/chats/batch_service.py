@@ -0,0 +1,60 @@
+"""
+Concurrent fan-out for batch chat and batch OCR requests
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from django.db import connections
+
+
+@dataclass
+class BatchItemResult:
+    index: int
+    message: Any
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _run_isolated(handler: Callable[[str], Any], index: int, message: str) -> BatchItemResult:
+    """Run one item; any exception is recorded on the item instead of failing the batch"""
+    try:
+        return BatchItemResult(index=index, message=message, response=handler(message))
+    except Exception as e:
+        return BatchItemResult(index=index, message=message, error=str(e) or type(e).__name__)
+    finally:
+        # Worker threads get their own DB connections (e.g. the coalescing lock table)
+        connections.close_all()
+
+
+def fan_out(messages: Iterable[Any], handler: Callable[[Any], Any], max_workers: int = 8,
+            ordered: bool = False) -> Iterator[BatchItemResult]:
+    """
+    Run handler(message) for every message with bounded concurrency
+
+    Args:
+        messages: Messages (or other work items, e.g. OCR pages) to process
+        handler: Callable producing the response for one message
+        max_workers: Maximum number of concurrent handler calls
+        ordered: Yield in input order; later items keep running while an earlier one finishes
+
+    Yields:
+        BatchItemResult: One result per message, in completion order unless ordered
+    """
+    messages = list(messages)
+    if not messages:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(messages))),
+                            thread_name_prefix='batch-chat') as executor:
+        futures = [
+            executor.submit(_run_isolated, handler, index, message)
+            for index, message in enumerate(messages)
+        ]
+        for future in (futures if ordered else as_completed(futures)):
+            yield future.result()
@@ -0,0 +1,245 @@
+"""
+Full-text search over chat history
+
+Questions are indexed by the database itself, so the index is updated in
+the same transaction as every insert, update and delete. Answers are stored
+compressed (chats/answer_store.py) and indexed once per distinct text, in
+Python, when they are first stored. A chat matches when all query words are
+in its question or all are in its answer.
+
+- SQLite: an external-content FTS5 table (chats_userchat_fts) maintained by
+  triggers. Each row also indexes a ``user_key`` token, so a user's search
+  intersects posting lists instead of filtering every match by owner.
+  Answers have their own FTS5 table (chats_chatanswer_fts, migration 0012).
+- PostgreSQL: a generated ``search_vector`` tsvector column with a GIN index
+  for the question, and one per distinct answer in chats_chatanswer.
+
+Other backends fall back to a case-insensitive substring scan.
+
+Snippets are HTML-escaped with matches wrapped in ``<mark>``.
+
+The FTS5 tables reference chats and answers by rowid. VACUUM may renumber
+them; run ``manage.py rebuild_chat_search_index`` afterwards.
+"""
+
+import html
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .answer_store import index_stored_answers
+from .models import ChatAnswer, UserChat
+
+FTS_TABLE = 'chats_userchat_fts'
+ANSWER_FTS_TABLE = 'chats_chatanswer_fts'
+# Private-use characters mark matches inside snippets until they are escaped
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+MAX_QUERY_TERMS = 16
+
+# Same word boundaries as the FTS5 tokenizer: Devanagari signs stay inside words
+_TERM = re.compile(r'[\w\u0900-\u0963\u0966-\u097F]+', re.UNICODE)
+
+# BM25 weights: user_key, user_text_input; answers count half as much as
+# questions. The user_key term narrows the index scan; ownership is enforced
+# by c.user_id, not the tokenizer. A chat matching in both is ranked on the sum.
+# Each side is read through a single FTS cursor: bm25() recomputes its term
+# statistics per cursor, so the joins must not drive the index row by row
+# (hence CROSS JOIN, and the unary + that keeps the rowid filter out of FTS5).
+_SQLITE_SEARCH = f"""
+    SELECT id, max(user_snippet), max(ai_snippet), sum(score) AS total
+    FROM (
+        SELECT c.id AS id, snippet({FTS_TABLE}, 1, %s, %s, '…', 16) AS user_snippet,
+               NULL AS ai_snippet, bm25({FTS_TABLE}, 0.0, 2.0) AS score
+        FROM {FTS_TABLE} CROSS JOIN chats_userchat c ON c.rowid = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND c.user_id = %s
+        UNION ALL
+        SELECT c.id, NULL, snippet({ANSWER_FTS_TABLE}, 0, %s, %s, '…', 32), bm25({ANSWER_FTS_TABLE})
+        FROM {ANSWER_FTS_TABLE} CROSS JOIN chats_chatanswer a ON a.rowid = {ANSWER_FTS_TABLE}.rowid
+        CROSS JOIN chats_userchat c ON c.answer_id = a.content_hash
+        WHERE {ANSWER_FTS_TABLE} MATCH %s AND c.user_id = %s AND +{ANSWER_FTS_TABLE}.rowid IN (
+            SELECT own.rowid FROM chats_userchat mine JOIN chats_chatanswer own ON own.content_hash = mine.answer_id
+            WHERE mine.user_id = %s
+        )
+    )
+    GROUP BY id
+    ORDER BY total
+    LIMIT %s OFFSET %s
+"""
+
+# Each side is matched through its own GIN index; only the matches are
+# ranked, and headlines are only computed for the page of results. Answers
+# are stored compressed, so their snippets are cut in Python.
+_POSTGRES_SEARCH = """
+    WITH q AS (SELECT websearch_to_tsquery('simple', %s) AS query),
+    matches AS (
+        SELECT c.id FROM chats_userchat c, q
+        WHERE c.user_id = %s AND c.search_vector @@ q.query
+        UNION
+        SELECT c.id FROM chats_chatanswer a JOIN chats_userchat c ON c.answer_id = a.content_hash, q
+        WHERE a.search_vector @@ q.query AND c.user_id = %s
+    ),
+    page AS (
+        SELECT c.id, ts_rank_cd(c.search_vector || coalesce(a.search_vector, ''::tsvector), q.query) AS score
+        FROM matches m
+        JOIN chats_userchat c ON c.id = m.id
+        LEFT JOIN chats_chatanswer a ON a.content_hash = c.answer_id
+        CROSS JOIN q
+        ORDER BY score DESC
+        LIMIT %s OFFSET %s
+    )
+    SELECT c.id, ts_headline('simple', coalesce(c.user_text_input, ''), q.query, %s), page.score
+    FROM page JOIN chats_userchat c ON c.id = page.id CROSS JOIN q
+    ORDER BY page.score DESC
+"""
+_POSTGRES_HEADLINE_OPTIONS = (f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, "
+                              f"MaxWords=24, MinWords=8, MaxFragments=2, FragmentDelimiter=\" … \"")
+
+
+@dataclass
+class ChatSearchHit:
+    id: uuid.UUID
+    timestamp: Optional[datetime]
+    user_message: str
+    ai_response: str
+    score: float
+
+
+def query_terms(query: str) -> List[str]:
+    return _TERM.findall(query.casefold())[:MAX_QUERY_TERMS]
+
+
+def fts_match_expression(query: str, user=None) -> Optional[str]:
+    """
+    FTS5 MATCH expression for a free-text query: every word must match, the
+    last one as a prefix (for search-as-you-type). None when there are no words.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    expression = ' AND '.join(phrases)
+    if user is not None:
+        expression = f'user_key : "u{user.pk.hex}" AND ({expression})'
+    return expression
+
+
+def highlight(snippet: Optional[str]) -> str:
+    """Escape a snippet for HTML and turn the match markers into <mark> tags"""
+    escaped = html.escape(snippet or '', quote=False)
+    return escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+def _substring_snippet(text: Optional[str], terms: List[str], width: int = 120) -> str:
+    text = text or ''
+    lowered = text.casefold()
+    start = min((lowered.find(term) for term in terms if term in lowered), default=0)
+    snippet = text[max(0, start - width // 3):max(0, start - width // 3) + width]
+    for term in terms:
+        snippet = re.sub(re.escape(term), lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_END}",
+                         snippet, flags=re.IGNORECASE)
+    return snippet
+
+
+def _search_rows(user, query: str, limit: int, offset: int):
+    """(id, user snippet, ai snippet, score) rows, best first"""
+    if connection.vendor == 'sqlite':
+        expression = fts_match_expression(query)
+        if expression is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(_SQLITE_SEARCH, [HIGHLIGHT_START, HIGHLIGHT_END, fts_match_expression(query, user),
+                                            user.pk.hex, HIGHLIGHT_START, HIGHLIGHT_END, expression,
+                                            user.pk.hex, user.pk.hex, limit, offset])
+            rows = cursor.fetchall()
+        # A chat matched on one side only gets a plain snippet of the other
+        terms = query_terms(query)
+        missing = [row[0] for row in rows if row[1] is None or row[2] is None]
+        chats = UserChat.objects.in_bulk([uuid.UUID(chat_id) for chat_id in missing])
+        result = []
+        for chat_id, user_snippet, ai_snippet, score in rows:
+            chat_id = uuid.UUID(chat_id)
+            if user_snippet is None:
+                user_snippet = _substring_snippet(chats[chat_id].user_text_input, terms)
+            if ai_snippet is None:
+                ai_snippet = _substring_snippet(chats[chat_id].ai_text_output, terms)
+            # bm25() is lower-is-better; scores are reported higher-is-better
+            result.append((chat_id, user_snippet, ai_snippet, -score))
+        return result
+
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(_POSTGRES_SEARCH, [query, user.pk, user.pk, limit, offset, _POSTGRES_HEADLINE_OPTIONS])
+            rows = cursor.fetchall()
+        answers = {chat.id: chat.ai_text_output for chat in UserChat.objects.filter(id__in=[row[0] for row in rows])}
+        return [(chat_id, user_snippet, _substring_snippet(answers.get(chat_id), terms), score)
+                for chat_id, user_snippet, score in rows]
+
+    # Answers are compressed, so other backends match them in Python
+    rows = []
+    for chat in UserChat.objects.filter(user=user).order_by('-created_at'):
+        text = f"{chat.user_text_input or ''}\n{chat.ai_text_output or ''}".casefold()
+        if all(term in text for term in terms):
+            rows.append((chat.id, _substring_snippet(chat.user_text_input, terms),
+                         _substring_snippet(chat.ai_text_output, terms), 0.0))
+    return rows[offset:offset + limit]
+
+
+def search_chats(user, query: str, limit: int = 20, offset: int = 0) -> List[ChatSearchHit]:
+    """The user's chats matching query, best first, with highlighted snippets"""
+    rows = _search_rows(user, query, limit, offset)
+    timestamps = dict(UserChat.objects.filter(id__in=[row[0] for row in rows]).values_list('id', 'created_at'))
+    return [
+        ChatSearchHit(chat_id, timestamps.get(chat_id), highlight(user_snippet), highlight(ai_snippet), score)
+        for chat_id, user_snippet, ai_snippet, score in rows
+    ]
+
+
+def matching_chats(query: str) -> Q:
+    """Filter for chats of any user whose text matches query (used by the admin)"""
+    if connection.vendor == 'sqlite':
+        expression = fts_match_expression(query)
+        if expression is None:
+            return Q(pk__in=[])
+        # Compares rowids directly instead of joining every match back to its chat id;
+        # one IN list (not an OR) lets a sorted page stop at its last row
+        return Q(RawSQL(
+            f"chats_userchat.rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"UNION ALL SELECT c.rowid FROM {ANSWER_FTS_TABLE} "
+            f"CROSS JOIN chats_chatanswer a ON a.rowid = {ANSWER_FTS_TABLE}.rowid "
+            f"CROSS JOIN chats_userchat c ON c.answer_id = a.content_hash WHERE {ANSWER_FTS_TABLE} MATCH %s)",
+            [expression, expression], output_field=BooleanField()
+        ))
+    if connection.vendor == 'postgresql':
+        # Each side uses its own GIN index, so all words must be in the question or all in the answer
+        return Q(pk__in=RawSQL(
+            "SELECT id FROM chats_userchat WHERE search_vector @@ websearch_to_tsquery('simple', %s)", [query]
+        )) | Q(answer__in=RawSQL(
+            "SELECT content_hash FROM chats_chatanswer WHERE search_vector @@ websearch_to_tsquery('simple', %s)",
+            [query]
+        ))
+    needle = query.casefold()
+    answers = [answer.pk for answer in ChatAnswer.objects.iterator() if needle in answer.text.casefold()]
+    return Q(user_text_input__icontains=query) | Q(answer__in=answers)
+
+
+def rebuild_search_index():
+    """Re-index every chat and answer from the tables (SQLite; PostgreSQL's columns are always current)"""
+    if connection.vendor == 'sqlite':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                cursor.execute(f"DELETE FROM {ANSWER_FTS_TABLE}")
+            answers = ChatAnswer.objects.values_list('content_hash', 'codec', 'body')
+            index_stored_answers(connection, answers.iterator(chunk_size=2000))
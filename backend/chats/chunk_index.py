@@ -0,0 +1,215 @@
+"""
+Hashed BM25 index over text chunks, stored as memory-mapped NumPy arrays
+
+The index is an inverted file:
+
+- ``postings_ptr``    (n_features + 1) start of each feature's posting list
+- ``postings_doc``    chunk id of every posting, grouped by feature
+- ``postings_weight`` BM25 term-frequency weight of every posting
+- ``idf``             inverse document frequency per feature
+- ``text_offsets`` / ``texts.bin``  UTF-8 citation and text of every chunk
+
+Saved indexes are opened with ``mmap_mode='r'``, so gunicorn workers share the
+pages through the OS page cache and a query only touches the posting lists of
+its own terms. Used for the statute corpus and for uploaded documents.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+INDEX_VERSION = 2
+DEFAULT_FEATURES = 2 ** 18
+BM25_K1 = 1.5
+BM25_B = 0.75
+RECORD_SEPARATOR = '\x1f'
+
+# \w alone splits Devanagari words at vowel signs and viramas, so the block (minus the dandas) is added
+_TOKEN = re.compile(r'[\w\u0900-\u0963\u0966-\u097F]+', re.UNICODE)
+STOPWORDS = frozenset("""
+    a an and any are as at be been by can do does for from has have how i if in into is it its me my no
+    not of on or our shall should so such than that the their them then there these this to under upon
+    was what when where which who whom will with would you your
+    का की के को में से है हैं था थी और या पर भी तो ने कि क्या कैसे मेरा मेरी मेरे मुझे हम आप यह वह हो गया गई कर करें लिए
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.casefold()) if len(token) > 1 and token not in STOPWORDS]
+
+
+@lru_cache(maxsize=200_000)
+def _hash_token(token: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(token.encode('utf-8'))
+
+
+class _FeatureIds(dict):
+    """token -> hashed feature id, memoized for the duration of one build"""
+
+    def __init__(self, n_features):
+        super().__init__()
+        self.n_features = n_features
+
+    def __missing__(self, token):
+        feature = self[token] = _hash_token(token) % self.n_features
+        return feature
+
+
+@dataclass
+class Chunk:
+    citation: str
+    text: str
+    keywords: str = ''
+
+
+@dataclass
+class SearchHit:
+    chunk_id: int
+    citation: str
+    text: str
+    score: float
+
+    def format(self) -> str:
+        return f"{self.citation}: {self.text}"
+
+
+class ChunkIndex:
+    """Hashed BM25 index over text chunks"""
+
+    ARRAYS = ('postings_ptr', 'postings_doc', 'postings_weight', 'idf', 'text_offsets')
+
+    def __init__(self, arrays, texts, meta):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.texts = texts
+        self.meta = meta
+        self.n_features = meta['n_features']
+        self.n_chunks = meta['n_chunks']
+
+    @classmethod
+    def build(cls, chunks: Iterable[Chunk], n_features: int = DEFAULT_FEATURES):
+        """Build an in-memory index from chunks"""
+        doc_ids = array('i')
+        features = array('i')
+        frequencies = array('f')
+        lengths = array('f')
+        blob = bytearray()
+        offsets = array('q', [0])
+
+        feature_ids = _FeatureIds(n_features)
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(f"{chunk.citation} {chunk.keywords} {chunk.text}")
+            counts = Counter(map(feature_ids.__getitem__, tokens))
+            lengths.append(sum(counts.values()))
+            doc_ids.extend([chunk_id] * len(counts))
+            features.extend(counts.keys())
+            frequencies.extend(counts.values())
+            blob += f"{chunk.citation}{RECORD_SEPARATOR}{chunk.text}".encode('utf-8')
+            offsets.append(len(blob))
+
+        n_chunks = len(lengths)
+        doc_ids = np.frombuffer(doc_ids, dtype=np.int32)
+        features = np.frombuffer(features, dtype=np.int32)
+        frequencies = np.frombuffer(frequencies, dtype=np.float32)
+        lengths = np.frombuffer(lengths, dtype=np.float32)
+
+        # Term-frequency half of BM25; the idf half is applied at query time
+        average_length = float(lengths.mean()) if n_chunks else 1.0
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average_length, 1.0))
+        weights = frequencies * (BM25_K1 + 1) / (frequencies + norms[doc_ids])
+
+        order = np.argsort(features, kind='stable')
+        document_frequency = np.bincount(features, minlength=n_features)
+        postings_ptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=postings_ptr[1:])
+        idf = np.log1p((n_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        arrays = {
+            'postings_ptr': postings_ptr,
+            'postings_doc': doc_ids[order],
+            'postings_weight': weights[order].astype(np.float32),
+            'idf': idf.astype(np.float32),
+            'text_offsets': np.frombuffer(offsets, dtype=np.int64),
+        }
+        meta = {'version': INDEX_VERSION, 'n_features': n_features, 'n_chunks': n_chunks}
+        return cls(arrays, np.frombuffer(bytes(blob), dtype=np.uint8), meta)
+
+    def save(self, directory):
+        """Write the index to directory atomically (readers never see a partial index)"""
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=directory.parent))
+        try:
+            for name in self.ARRAYS:
+                np.save(staging / f"{name}.npy", np.asarray(getattr(self, name)))
+            (staging / 'texts.bin').write_bytes(np.asarray(self.texts).tobytes())
+            (staging / 'meta.json').write_text(json.dumps(self.meta))
+            os.rename(staging, directory)
+        except OSError:
+            # Another worker finished the same build first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not (directory / 'meta.json').exists():
+                raise
+
+    @classmethod
+    def load(cls, directory):
+        """Open a saved index with memory-mapped arrays"""
+        directory = Path(directory)
+        meta = json.loads((directory / 'meta.json').read_text())
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r') for name in cls.ARRAYS}
+        texts_path = directory / 'texts.bin'
+        if texts_path.stat().st_size:
+            texts = np.memmap(texts_path, dtype=np.uint8, mode='r')
+        else:
+            texts = np.zeros(0, dtype=np.uint8)
+        return cls(arrays, texts, meta)
+
+    def chunk(self, chunk_id: int) -> Chunk:
+        start, end = self.text_offsets[chunk_id], self.text_offsets[chunk_id + 1]
+        citation, text = bytes(self.texts[start:end]).decode('utf-8').split(RECORD_SEPARATOR, 1)
+        return Chunk(citation, text)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0, relative_cutoff: float = 0.0) -> List[SearchHit]:
+        """
+        Return the top-k chunks for query by BM25 score
+
+        Args:
+            min_score: Hits must score above this
+            relative_cutoff: Hits must score at least this fraction of the best hit
+        """
+        features = {_hash_token(token) % self.n_features for token in tokenize(query)}
+        if not features or not self.n_chunks:
+            return []
+
+        scores = np.zeros(self.n_chunks, dtype=np.float32)
+        for feature in features:
+            start, end = self.postings_ptr[feature], self.postings_ptr[feature + 1]
+            if start != end:
+                # A chunk appears at most once per posting list, so fancy-index += is safe
+                scores[self.postings_doc[start:end]] += self.idf[feature] * self.postings_weight[start:end]
+
+        k = min(k, self.n_chunks)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        hits = []
+        threshold = max(min_score, float(scores[top[0]]) * relative_cutoff)
+        for chunk_id in top:
+            score = float(scores[chunk_id])
+            if score <= 0 or score < threshold or score <= min_score:
+                break
+            chunk = self.chunk(int(chunk_id))
+            hits.append(SearchHit(int(chunk_id), chunk.citation, chunk.text, score))
+        return hits
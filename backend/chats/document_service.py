@@ -0,0 +1,125 @@
+"""
+Document question answering over uploaded files
+
+Text extracted by extract_document_api is split into chunks and stored per
+user/session (ChatDocument, DocumentChunk). Each document gets its own
+ChunkIndex on disk, so a chat request with a document_id sends only the
+chunks most relevant to the question instead of the whole document.
+"""
+
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.db import transaction
+
+from .chunk_index import Chunk, ChunkIndex
+from .models import ChatDocument, DocumentChunk
+from .prompt_builder import split_passages
+
+
+def _index_root() -> Path:
+    return Path(getattr(
+        settings, 'DOCUMENT_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'apna_lawyer_document_index')
+    ))
+
+
+def _feature_count(chunk_count: int) -> int:
+    """Hash space sized to the document: small documents get small posting pointers"""
+    return 1 << max(12, min(18, (chunk_count * 64).bit_length()))
+
+
+def split_document(name: str, pages: Sequence[str], chunk_tokens: Optional[int] = None) -> List[Chunk]:
+    """Split extracted pages into labelled chunks, e.g. "contract.pdf, page 3" """
+    chunk_tokens = chunk_tokens or getattr(settings, 'DOCUMENT_CHUNK_TOKENS', 250)
+    chunks = []
+    for page_number, page in enumerate(pages, 1):
+        label = f"{name}, page {page_number}" if len(pages) > 1 else name
+        for passage in split_passages(page or '', chunk_tokens):
+            chunks.append(Chunk(label, passage))
+    return chunks
+
+
+class DocumentIndexCache:
+    """Per-process LRU of opened document indexes, rebuilt from stored chunks when missing on disk"""
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document: ChatDocument) -> ChunkIndex:
+        key = str(document.id)
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+
+        directory = _index_root() / key
+        if not (directory / 'meta.json').exists():
+            chunks = [Chunk(c.label, c.text) for c in document.chunks.all()]
+            ChunkIndex.build(chunks, _feature_count(len(chunks))).save(directory)
+        index = ChunkIndex.load(directory)
+
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+document_indexes = DocumentIndexCache(getattr(settings, 'DOCUMENT_INDEX_CACHE_SIZE', 16))
+
+
+def store_document(user_session_id: str, user, name: str, content_type: str, pages: Sequence[str]) -> ChatDocument:
+    """Persist a document's chunks and build its index"""
+    chunks = split_document(name, pages)
+    with transaction.atomic():
+        document = ChatDocument.objects.create(
+            user=user if user is not None and user.is_authenticated else None,
+            user_session_id=user_session_id,
+            name=name[:255],
+            content_type=content_type,
+            char_count=sum(len(page or '') for page in pages),
+            chunk_count=len(chunks),
+        )
+        DocumentChunk.objects.bulk_create([
+            DocumentChunk(document=document, position=position, label=chunk.citation[:255], text=chunk.text)
+            for position, chunk in enumerate(chunks)
+        ])
+    ChunkIndex.build(chunks, _feature_count(len(chunks))).save(_index_root() / str(document.id))
+    return document
+
+
+def get_document(document_id, user_session_id: str) -> Optional[ChatDocument]:
+    """Return the document if it exists and belongs to this user/session"""
+    try:
+        document_id = uuid.UUID(str(document_id))
+    except ValueError:
+        return None
+    return ChatDocument.objects.filter(id=document_id, user_session_id=user_session_id).first()
+
+
+def document_context(document: ChatDocument, question: str, k: Optional[int] = None) -> Optional[str]:
+    """
+    Excerpts of document relevant to question, in document order
+
+    Questions without matching terms ("summarise this") get the opening chunks.
+    """
+    k = k or getattr(settings, 'DOCUMENT_TOP_K', 6)
+    index = document_indexes.get(document)
+    hits = sorted(index.search(question, k=k), key=lambda hit: hit.chunk_id)
+    if hits:
+        excerpts = [(hit.citation, hit.text) for hit in hits]
+    else:
+        excerpts = [(chunk.citation, chunk.text) for chunk in map(index.chunk, range(min(k, index.n_chunks)))]
+    return '\n\n'.join(f"[{label}]\n{text}" for label, text in excerpts) or None
@@ -0,0 +1,228 @@
+"""
+Offline answer engine for common legal questions
+
+A curated FAQ base (FAQ_PATH, one ``{"id", "question", "terms", "answer"}``
+JSON object per line) is loaded once per process. Questions are matched in
+two steps, both in memory and well under a millisecond:
+
+1. An Aho-Corasick automaton finds every legal term (English and Hindi) of
+   every entry in one pass over the question.
+2. Candidate entries (those with a matched term or a shared word) are ranked
+   by BM25 over their question and terms, plus a bonus per matched term.
+
+FallbackAIService answers from the best match during Gemini outages, and
+get_ai_service uses confident matches on short questions as a first-line
+answer without calling the model.
+"""
+
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from apna_lawyer.utils import LazyService
+from apna_lawyer.worker_lifecycle import register_warmup
+from .chunk_index import tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Score added per matched term word, so multi-word phrases outweigh single words
+TERM_MATCH_WEIGHT = 1.5
+
+# Words that frame a question ("can I get", "कैसे मिलेगी") rather than say what it is about;
+# they do not count against a match's coverage
+QUESTION_FRAME_WORDS = frozenset("""
+    get got need want know tell explain please help
+    मिलेगी मिलेगा मिलती मिलता चाहिए बताएं बताइए
+""".split())
+
+_SEPARATORS = re.compile(r'[\s\-_/]+')
+NUKTA = '़'
+
+
+def normalize_text(text: str) -> str:
+    """Casefold, unify hyphens/whitespace and drop the Devanagari nukta (ज़ and ज match)"""
+    text = unicodedata.normalize('NFC', text).replace(NUKTA, '').casefold()
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def _is_word_char(char: str) -> bool:
+    # Devanagari vowel signs and viramas are marks, not letters, but belong to the word
+    return char.isalnum() or unicodedata.category(char).startswith('M')
+
+
+class AhoCorasick:
+    """Multi-pattern matcher returning whole-word matches of all patterns in one pass"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        if pattern not in self._output[node]:
+            self._output[node].append(pattern)
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (start, pattern) for every whole-word occurrence of a pattern in text"""
+        node = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        length = len(text)
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in output[node]:
+                start = index - len(pattern) + 1
+                if (start == 0 or not _is_word_char(text[start - 1])) and \
+                        (index + 1 == length or not _is_word_char(text[index + 1])):
+                    yield start, pattern
+
+
+@dataclass
+class FAQEntry:
+    id: str
+    question: str
+    terms: List[str]
+    answer: str
+
+    def format(self) -> str:
+        return (f"Legal Assistant: {self.answer}\n\nNote: This is general information from our offline "
+                f"knowledge base. For advice on your situation, please consult a qualified lawyer.")
+
+
+@dataclass
+class FAQMatch:
+    entry: FAQEntry
+    score: float
+    matched_terms: List[str]
+    coverage: float  # Share of the question's content words found in the entry's question and terms
+
+
+class FAQEngine:
+    def __init__(self, entries: List[FAQEntry]):
+        self.entries = entries
+        self._term_entries = defaultdict(set)
+        for index, entry in enumerate(entries):
+            for term in entry.terms:
+                self._term_entries[normalize_text(term)].add(index)
+        self._matcher = AhoCorasick(self._term_entries)
+
+        # BM25 statistics over each entry's question and terms
+        self._entry_terms = [Counter(tokenize(normalize_text(' '.join([e.question] + e.terms)))) for e in entries]
+        self._lengths = [sum(terms.values()) for terms in self._entry_terms]
+        self._average_length = sum(self._lengths) / len(entries) if entries else 1.0
+        self._word_entries = defaultdict(set)
+        for index, terms in enumerate(self._entry_terms):
+            for word in terms:
+                self._word_entries[word].add(index)
+        self._idf = {
+            word: math.log1p((len(entries) - len(owners) + 0.5) / (len(owners) + 0.5))
+            for word, owners in self._word_entries.items()
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    entries.append(FAQEntry(record['id'], record['question'], record['terms'], record['answer']))
+        return cls(entries)
+
+    def search(self, question: str, k: int = 3) -> List[FAQMatch]:
+        """Rank entries for question; entries without a matched term or shared word are skipped"""
+        text = normalize_text(question)
+        words = tokenize(text)
+
+        matched = defaultdict(set)
+        for _, term in self._matcher.iter_matches(text):
+            for index in self._term_entries[term]:
+                matched[index].add(term)
+
+        candidates = set(matched)
+        for word in words:
+            candidates |= self._word_entries.get(word, set())
+
+        query = set(words)
+        content = query - QUESTION_FRAME_WORDS
+        matches = []
+        for index in candidates:
+            terms = self._entry_terms[index]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / self._average_length)
+            score = sum(
+                self._idf[word] * terms[word] * (BM25_K1 + 1) / (terms[word] + norm)
+                for word in query if word in terms
+            )
+            score += TERM_MATCH_WEIGHT * sum(len(term.split()) for term in matched.get(index, ()))
+            coverage = len(content & terms.keys()) / len(content) if content else 0.0
+            matches.append(FAQMatch(self.entries[index], score, sorted(matched.get(index, ())), coverage))
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:k]
+
+    def best_match(self, question: str, min_score: Optional[float] = None) -> Optional[FAQMatch]:
+        """Best entry scoring at least FAQ_MIN_SCORE with a matched curated term, or None"""
+        min_score = getattr(settings, 'FAQ_MIN_SCORE', 2.0) if min_score is None else min_score
+        matches = self.search(question, k=1)
+        # Shared common words alone ("tell me about...") are not enough to answer
+        if matches and matches[0].matched_terms and matches[0].score >= min_score:
+            return matches[0]
+        return None
+
+    def first_line_match(self, question: str) -> Optional[FAQMatch]:
+        """
+        Match confident enough to answer without the model
+
+        Only short, high-scoring questions whose every content word is covered by
+        the entry qualify, e.g. "how to file fir" or "अग्रिम जमानत कैसे मिलेगी".
+        A word the entry does not cover ("bail for murder", "is dowry illegal")
+        usually makes the question more specific than the curated answer.
+        """
+        if len(question.split()) > getattr(settings, 'FAQ_FIRST_LINE_MAX_WORDS', 12):
+            return None
+        match = self.best_match(question, getattr(settings, 'FAQ_FIRST_LINE_MIN_SCORE', 4.0))
+        if match and match.coverage >= getattr(settings, 'FAQ_FIRST_LINE_MIN_COVERAGE', 1.0):
+            return match
+        return None
+
+
+def load_faq_engine():
+    path = getattr(settings, 'FAQ_PATH', Path(__file__).resolve().parent / 'faq' / 'faq.jsonl')
+    return FAQEngine.from_file(path)
+
+
+# Loaded once per process; the gunicorn master loads it before forking
+faq_engine = LazyService(load_faq_engine)
+register_warmup(faq_engine.get)
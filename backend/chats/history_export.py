@@ -0,0 +1,136 @@
+"""
+Streaming export of a user's chat history
+
+Rows are read oldest first with keyset pagination on (created_at, id) and
+written out batch by batch, so memory use does not grow with the number of
+chats. Every exported row carries an opaque cursor; passing the cursor of
+the last row received resumes an interrupted export right after it.
+"""
+
+import base64
+import csv
+import uuid
+from datetime import datetime, time, timedelta
+from typing import Iterator, Optional
+
+import orjson
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .answer_store import decompress_answer
+from .models import UserChat
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+CSV_COLUMNS = ['id', 'timestamp', 'user_message', 'ai_response', 'cursor']
+
+
+class InvalidExportParameter(ValueError):
+    """Raised for a malformed date filter or cursor"""
+
+
+def encode_cursor(created_at: datetime, chat_id) -> str:
+    raw = f"{created_at.isoformat()}|{chat_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """(created_at, id) of the row the cursor points at"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, chat_id = raw.split('|')
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            raise ValueError(created_at)
+        return parsed, uuid.UUID(chat_id)
+    except ValueError:
+        raise InvalidExportParameter('Invalid cursor')
+
+
+def parse_bound(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """
+    Parse a date filter given as an ISO date or datetime
+
+    A plain date means the start of that day, or with end_of_day the start of
+    the next day, so ``until=2024-05-31`` includes all of May 31st.
+    """
+    if not value:
+        return None
+    try:
+        # parse_datetime would also accept a plain date, as midnight
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(value)
+    except ValueError:
+        raise InvalidExportParameter(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_rows(user, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                cursor: Optional[str] = None, chunk_size: Optional[int] = None) -> Iterator[dict]:
+    """Yield the user's chats in [since, until), oldest first, starting after cursor"""
+    chats = UserChat.objects.filter(user=user)
+    if since is not None:
+        chats = chats.filter(created_at__gte=since)
+    if until is not None:
+        chats = chats.filter(created_at__lt=until)
+    if cursor:
+        created_at, chat_id = decode_cursor(cursor)
+        chats = chats.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=chat_id))
+
+    rows = chats.order_by('created_at', 'id').values_list(
+        'id', 'created_at', 'user_text_input', 'answer__codec', 'answer__body'
+    ).iterator(chunk_size=chunk_size or getattr(settings, 'CHAT_EXPORT_CHUNK_SIZE', 500))
+    for chat_id, created_at, user_message, answer_codec, answer_body in rows:
+        yield {
+            'id': chat_id,
+            'timestamp': created_at,
+            'user_message': user_message,
+            'ai_response': decompress_answer(answer_codec, answer_body),
+            'cursor': encode_cursor(created_at, chat_id),
+        }
+
+
+def _batched(rows: Iterator[dict], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_ndjson(rows: Iterator[dict], batch_size: int = 100) -> Iterator[bytes]:
+    option = orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+    for batch in _batched(rows, batch_size):
+        yield b''.join(orjson.dumps(row, option=option) for row in batch)
+
+
+class _Echo:
+    """File-like object handing csv.writer's output straight back"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows: Iterator[dict], batch_size: int = 100) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for batch in _batched(rows, batch_size):
+        yield ''.join(
+            writer.writerow([row['id'], row['timestamp'].isoformat(), row['user_message'] or '',
+                             row['ai_response'] or '', row['cursor']])
+            for row in batch
+        )
@@ -6,7 +6,12 @@ from dataclasses import dataclass
 from datetime import datetime
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from apna_lawyer.anonymous import anonymous_id
+from apna_lawyer.metrics import track_upstream
+from apna_lawyer.utils import LazyService
+from .image_derivatives import get_derivative, schedule_derivatives
+from .ocr_languages import prepare_for_ocr
+from .ocr_layout import recognize_page
 
 try:
     import pytesseract
@@ -22,6 +27,8 @@ class StoredImage:
     original_name: str
     uploaded_at: datetime
     user_id: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
 
 class ImageChatService:
     """
@@ -44,10 +51,8 @@ class ImageChatService:
         if hasattr(request, 'user') and request.user.is_authenticated:
             return str(request.user.id)
         else:
-            # Use session key for anonymous users
-            if not request.session.session_key:
-                request.session.create()
-            return f"anon_{request.session.session_key}"
+            # Signed cookie id for anonymous users; no session row is written
+            return f"anon_{anonymous_id(request)}"
     
     def store_image(self, image_file, user_session_id: str, original_name: str = None) -> Dict:
         """
@@ -65,8 +70,12 @@ class ImageChatService:
             unique_id = str(uuid.uuid4())
             filename = f"chat_images/{user_session_id}/{unique_id}{file_ext}"
             
-            # Save file
-            file_path = default_storage.save(filename, ContentFile(image_file.read()))
+            # Save file; a streamed upload's temporary file is moved (or copied
+            # chunk by chunk) into storage instead of being read into memory
+            file_path = default_storage.save(filename, image_file)
+            
+            # Thumbnails and the OCR copy are written in the background
+            schedule_derivatives(file_path)
             
             # Create stored image record
             stored_image = StoredImage(
@@ -74,7 +83,9 @@ class ImageChatService:
                 file_path=file_path,
                 original_name=original_name or image_file.name,
                 uploaded_at=datetime.now(),
-                user_id=user_session_id
+                user_id=user_session_id,
+                sha256=getattr(image_file, 'sha256', None),
+                size=image_file.size
             )
             
             # Store in memory (use database in production)
@@ -101,16 +112,20 @@ class ImageChatService:
             return "OCR service not available. Please install easyocr or pytesseract."
         
         try:
+            if not default_storage.exists(image_path):
+                return "Image file not found."
+            
+            # The small grayscale copy decodes much faster than the original
+            image_path = get_derivative(image_path, 'ocr')
+            
             # Get full file path
             full_path = default_storage.path(image_path) if hasattr(default_storage, 'path') else image_path
             
-            if not os.path.exists(full_path):
-                return "Image file not found."
-            
-            # Use Tesseract
+            # Use Tesseract with the languages and rotation script detection picks
             from PIL import Image
-            image = Image.open(full_path)
-            extracted_text = pytesseract.image_to_string(image)
+            prepared = prepare_for_ocr(Image.open(full_path))
+            with track_upstream('tesseract', 'image_to_string'):
+                extracted_text = recognize_page(prepared.image, prepared.lang).text
             
             return extracted_text.strip() if extracted_text.strip() else "No text found in image."
             
@@ -123,6 +138,35 @@ class ImageChatService:
         """
         return self.user_images.get(user_session_id, [])
     
+    def get_image(self, user_session_id: str, image_id: str) -> Optional[StoredImage]:
+        """
+        Get one of the session's images by id
+        """
+        return next((image for image in self.get_user_images(user_session_id) if image.id == image_id), None)
+    
+    def find_image_path(self, user_session_id: str, image_id: str) -> Optional[str]:
+        """
+        Storage path of one of the session's uploads
+
+        Looked up in storage (chat_images/<session>/<id>.<ext>) rather than in
+        this process's memory, so any worker can serve an image another
+        worker received.
+        """
+        image = self.get_image(user_session_id, image_id)
+        if image is not None:
+            return image.file_path
+        try:
+            uuid.UUID(image_id)
+        except ValueError:
+            return None
+        directory = f"chat_images/{user_session_id}"
+        try:
+            _, files = default_storage.listdir(directory)
+        except OSError:
+            return None
+        # Derivatives (<id>.thumb.webp) have a different stem
+        return next((f"{directory}/{name}" for name in files if os.path.splitext(name)[0] == image_id), None)
+
     def get_image_by_reference(self, user_session_id: str, reference: str) -> Optional[StoredImage]:
         """
         Get image by various reference methods
@@ -209,7 +253,8 @@ class ImageChatService:
             return {
                 "type": "image_list",
                 "message": f"Your uploaded images ({len(user_images)} total):",
-                "images": image_list
+                "images": image_list,
+                "image_ids": [img.id for img in user_images]
             }
         
         # Regular chat message - no OCR triggered
@@ -219,5 +264,5 @@ class ImageChatService:
             "user_message": message
         }
 
-# Global service instance
-image_chat_service = ImageChatService()
\ No newline at end of file
+# Global service instance, constructed on first use
+image_chat_service = LazyService(ImageChatService)
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Derivatives of stored chat images
+
+Phones upload multi-megabyte JPEGs, PNG screenshots and TIFF scans. When an
+image is stored, a background worker writes small copies next to it in
+default storage:
+
+- thumb:   WebP, longest side IMAGE_THUMBNAIL_SIZE, for image lists
+- preview: WebP, longest side IMAGE_PREVIEW_SIZE, for viewing in the chat
+- ocr:     grayscale PNG, longest side IMAGE_OCR_MAX_SIDE, what OCR reads
+
+Copies are upright (EXIF orientation applied) and never larger than the
+original. A derivative that is requested before the worker wrote it is
+generated on the spot.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    name: str
+    extension: str
+    content_type: str
+    size_setting: str
+    default_size: int
+
+
+DERIVATIVES = {
+    'thumb': DerivativeSpec('thumb', 'webp', 'image/webp', 'IMAGE_THUMBNAIL_SIZE', 256),
+    'preview': DerivativeSpec('preview', 'webp', 'image/webp', 'IMAGE_PREVIEW_SIZE', 1280),
+    'ocr': DerivativeSpec('ocr', 'png', 'image/png', 'IMAGE_OCR_MAX_SIDE', 2500),
+}
+
+
+def derivative_path(original_path, name):
+    """Storage path of a derivative: chat_images/<session>/<id>.<name>.<ext>"""
+    spec = DERIVATIVES[name]
+    return f"{os.path.splitext(original_path)[0]}.{spec.name}.{spec.extension}"
+
+
+def render_derivatives(image, names=None):
+    """
+    Encode derivatives of an opened image
+
+    Args:
+        image (PIL.Image.Image): Original image (first frame of multi-page files)
+        names (iterable): Derivatives to render, all by default
+
+    Returns:
+        dict: Derivative name -> encoded bytes
+    """
+    names = list(names or DERIVATIVES)
+    largest = max(getattr(settings, DERIVATIVES[name].size_setting, DERIVATIVES[name].default_size)
+                  for name in names)
+    # Let the JPEG decoder downscale by up to 8x while decoding; far faster than a full decode
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    rendered = {}
+    for name in names:
+        spec = DERIVATIVES[name]
+        size = getattr(settings, spec.size_setting, spec.default_size)
+        copy = image.convert('L') if name == 'ocr' else image.copy()
+        copy.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if spec.extension == 'webp':
+            copy.save(buffer, format='WEBP', quality=getattr(settings, 'IMAGE_WEBP_QUALITY', 80), method=4)
+        else:
+            copy.save(buffer, format='PNG', optimize=False, compress_level=3)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def generate_derivatives(original_path, names=None):
+    """
+    Write derivatives of a stored image next to it
+
+    Returns:
+        dict: Derivative name -> storage path
+    """
+    with default_storage.open(original_path, 'rb') as handle:
+        with Image.open(handle) as image:
+            rendered = render_derivatives(image, names)
+
+    paths = {}
+    for name, data in rendered.items():
+        path = derivative_path(original_path, name)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        paths[name] = default_storage.save(path, ContentFile(data))
+    return paths
+
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                               thread_name_prefix='image-derivatives')
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def schedule_derivatives(original_path):
+    """Generate all derivatives of a stored image in the background; returns the Future"""
+    with _pending_lock:
+        future = _executor.submit(_generate_logged, original_path)
+        _pending[original_path] = future
+    future.add_done_callback(lambda done: _forget(original_path, done))
+    return future
+
+
+def _generate_logged(original_path):
+    try:
+        return generate_derivatives(original_path)
+    except Exception as e:
+        print(f"Image derivatives failed for {original_path}: {e}")
+        raise
+
+
+def _forget(original_path, future):
+    with _pending_lock:
+        if _pending.get(original_path) is future:
+            del _pending[original_path]
+
+
+def get_derivative(original_path, name, wait_timeout=30):
+    """
+    Storage path of a derivative, generating it if the background worker has not
+
+    Waits for a pending background run instead of racing it.
+    """
+    path = derivative_path(original_path, name)
+    with _pending_lock:
+        future = _pending.get(original_path)
+    if future is not None:
+        try:
+            future.result(timeout=wait_timeout)
+        except Exception:
+            pass
+    if default_storage.exists(path):
+        return path
+    return generate_derivatives(original_path, [name])[name]
+
@@ -0,0 +1,222 @@
+"""
+Management command to benchmark the compressed answer store.
+
+Creates a throwaway test database with the project's migrations and fills it
+with chats whose answers are built from the FAQ and statute texts, the way
+Gemini answers quote them: popular questions (Zipf) get byte-identical or
+lightly personalised answers. The same rows are also written to a table with
+the old layout (answer text inline) to compare on-disk size and read latency.
+The configured database is not touched.
+"""
+
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chats.answer_store import CODEC_ZLIB, CODEC_ZSTD, ZSTD_AVAILABLE, compress_answer, decompress_answer
+from chats.models import ChatAnswer, UserChat
+
+CHATS_DIR = Path(__file__).resolve().parents[2]
+CITIES = ['Delhi', 'Mumbai', 'Pune', 'Lucknow', 'Jaipur', 'Patna', 'Chennai', 'Kolkata', 'Indore', 'Bhopal']
+DISCLAIMER = ("\n\n**Disclaimer:** This information is for general guidance only and is not legal advice. "
+              "Laws and procedures change and depend on the facts of your case, so please consult a "
+              "qualified lawyer before acting on it.")
+
+LEGACY_TABLE = 'bench_legacy_userchat'
+
+
+def _topics():
+    topics = []
+    with open(CHATS_DIR / 'faq' / 'faq.jsonl', encoding='utf-8') as handle:
+        for line in handle:
+            entry = json.loads(line)
+            topics.append((entry['question'], entry['answer']))
+    for path in sorted((CHATS_DIR / 'statutes').glob('*.jsonl')):
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                entry = json.loads(line)
+                topics.append((f"What does Section {entry['section']} of the {entry['act']} say?",
+                               f"**Section {entry['section']}, {entry['act']} - {entry['title']}**\n\n{entry['text']}"))
+    return topics
+
+
+def _answer(rng, question, body, topics, personalised):
+    related = rng.sample(topics, 2)
+    paragraphs = [
+        f"Thank you for your question about \"{question}\".",
+        body,
+        "**Related provisions:**\n" + '\n'.join(f"- {text}" for _, text in related),
+        "**Next steps:**\n1. Collect all documents related to the matter.\n2. Keep copies of every notice "
+        "you send or receive.\n3. Approach the nearest legal services authority if you cannot afford a lawyer.",
+    ]
+    if personalised:
+        paragraphs[0] = (f"Since you are in {rng.choice(CITIES)} and this happened about "
+                         f"{rng.randint(2, 90)} days ago, here is what applies to your situation.")
+    return '\n\n'.join(paragraphs) + DISCLAIMER
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark table size and read latency of the compressed answer store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--identical', type=float, default=0.4,
+                            help='Share of chats whose answer is the canonical answer for the question')
+        parser.add_argument('--repeats', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        database = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if connection.vendor != 'sqlite':
+                self.stderr.write('Table sizes are measured with SQLite dbstat; run against SQLite')
+                return
+            self._run(random.Random(options['seed']), options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if os.path.exists(database):
+                os.remove(database)
+
+    def _run(self, rng, options):
+        topics = _topics()
+        cum_weights = []
+        total = 0.0
+        for rank in range(len(topics)):
+            total += 1 / (rank + 1)
+            cum_weights.append(total)
+        canonical = {}
+
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f"bench{i}@example.com", email=f"bench{i}@example.com", name=f"Bench {i}")
+            for i in range(options['users'])
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE {LEGACY_TABLE} (
+                    id char(32) NOT NULL PRIMARY KEY, user_id char(32) NOT NULL, user_text_input text NULL,
+                    ai_text_output text NULL, user_document_submission text NULL, chatbot_document text NULL,
+                    created_at datetime NOT NULL
+                )
+            """)
+            cursor.execute(f"CREATE INDEX {LEGACY_TABLE}_user ON {LEGACY_TABLE} (user_id, created_at, id)")
+
+        self.stdout.write(f"Inserting {options['chats']:,} chats...")
+        started = time.perf_counter()
+        batch = []
+        for i in range(options['chats']):
+            index = rng.choices(range(len(topics)), cum_weights=cum_weights)[0]
+            question, body = topics[index]
+            if rng.random() < options['identical']:
+                if index not in canonical:
+                    canonical[index] = _answer(random.Random(index), question, body, topics, False)
+                answer = canonical[index]
+            else:
+                answer = _answer(rng, question, body, topics, True)
+            batch.append(UserChat(user=users[i % len(users)], user_text_input=question, ai_text_output=answer))
+            if len(batch) == 5000 or i == options['chats'] - 1:
+                self._insert(batch)
+                batch = []
+        self.stdout.write(f"Inserted in {time.perf_counter() - started:.0f}s")
+
+        self._report_sizes()
+        self._report_reads(users[0], options['repeats'])
+
+    def _insert(self, chats):
+        legacy_rows = [(chat.id.hex, chat.user_id.hex if hasattr(chat.user_id, 'hex') else chat.user_id,
+                        chat.user_text_input, chat.ai_text_output) for chat in chats]
+        UserChat.objects.bulk_create(chats)
+        created = {chat.id.hex: chat.created_at.isoformat() for chat in chats}
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {LEGACY_TABLE} (id, user_id, user_text_input, ai_text_output, created_at) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                [row + (created[row[0]],) for row in legacy_rows]
+            )
+
+    def _report_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT m.tbl_name, SUM(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name
+                WHERE m.type = 'table' OR m.name LIKE 'sqlite_autoindex_%'
+                GROUP BY m.tbl_name
+            """)
+            sizes = dict(cursor.fetchall())
+        legacy = sizes.get(LEGACY_TABLE, 0)
+        chats = sizes.get('chats_userchat', 0)
+        answers = sizes.get('chats_chatanswer', 0)
+        distinct = ChatAnswer.objects.count()
+        self.stdout.write(f"\nDistinct answers: {distinct:,} of {UserChat.objects.count():,} chats")
+        self.stdout.write("Table size (rows + primary key)")
+        self.stdout.write(f"  inline answers:      {legacy / 1e6:>9.1f} MB")
+        self.stdout.write(f"  chats + answer store:{(chats + answers) / 1e6:>9.1f} MB "
+                          f"(chats {chats / 1e6:.1f} MB, answers {answers / 1e6:.1f} MB) "
+                          f"= {100 * (1 - (chats + answers) / legacy):.0f}% smaller")
+
+        texts = [answer.text for answer in ChatAnswer.objects.all()]
+        raw = sum(len(text.encode('utf-8')) for text in texts)
+        codecs = [CODEC_ZLIB] + ([CODEC_ZSTD] if ZSTD_AVAILABLE else [])
+        codec_sizes = {codec: sum(len(compress_answer(text, codec)[1]) for text in texts) for codec in codecs}
+        self.stdout.write(f"Distinct answer bytes: raw {raw / 1e6:.1f} MB, " + ', '.join(
+            f"{codec} {size / 1e6:.1f} MB" for codec, size in codec_sizes.items()))
+
+    def _report_reads(self, user, repeats):
+        user_key = user.pk.hex if hasattr(user.pk, 'hex') else user.pk
+
+        def legacy_page():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT id, user_text_input, ai_text_output FROM {LEGACY_TABLE} "
+                               f"WHERE user_id = %s ORDER BY created_at DESC LIMIT 20", [user_key])
+                return cursor.fetchall()
+
+        def store_page():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT c.id, c.user_text_input, a.codec, a.body FROM chats_userchat c "
+                               "LEFT JOIN chats_chatanswer a ON a.content_hash = c.answer_id "
+                               "WHERE c.user_id = %s ORDER BY c.created_at DESC LIMIT 20", [user_key])
+                return [(row[0], row[1], decompress_answer(row[2], row[3])) for row in cursor.fetchall()]
+
+        def orm_page():
+            return [chat.ai_text_output for chat in UserChat.objects.filter(user=user).order_by('-created_at')[:20]]
+
+        def legacy_scan():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT ai_text_output FROM {LEGACY_TABLE}")
+                return sum(len(row[0]) for row in cursor.fetchall())
+
+        def store_scan():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT a.codec, a.body FROM chats_userchat c "
+                               "LEFT JOIN chats_chatanswer a ON a.content_hash = c.answer_id")
+                return sum(len(decompress_answer(codec, body)) for codec, body in cursor.fetchall())
+
+        sample = ChatAnswer.objects.order_by('?').first()
+        self.stdout.write("\nReads (warm cache, medians)")
+        self.stdout.write(f"  history page, 20 chats: inline {_median_ms(legacy_page, repeats):.2f} ms, "
+                          f"store {_median_ms(store_page, repeats):.2f} ms, "
+                          f"store via ORM {_median_ms(orm_page, repeats):.2f} ms")
+        self.stdout.write(f"  all answers:            inline {_median_ms(legacy_scan, 3):.0f} ms, "
+                          f"store {_median_ms(store_scan, 3):.0f} ms")
+        self.stdout.write(f"  one answer ({sample.size:,} bytes, {sample.codec}): "
+                          f"{_median_ms(lambda: decompress_answer(sample.codec, sample.body), repeats) * 1000:.0f} us")
@@ -0,0 +1,126 @@
+"""
+Management command to benchmark chat search at scale.
+
+Creates a throwaway test database with the project's migrations, fills it
+with synthetic chats spread over many users and compares full-text search
+(search_chats, the admin filter) with the LIKE scan it replaces. The
+configured database is not touched.
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F, Func, Q, TextField
+
+from chats.answer_store import register_sqlite_functions
+from chats.chat_search import matching_chats, search_chats
+from chats.models import UserChat
+
+WORDS = ('agreement court notice section tenant landlord cheque bail petition evidence police complaint '
+         'contract clause party property divorce maintenance custody employer salary consumer refund '
+         'warranty insurance accident compensation appeal hearing summons warrant arrest custody lawyer '
+         'fee registration stamp duty lease rent deposit eviction will succession partition mutation').split()
+WORDS += [f"term{i}" for i in range(5000)]
+
+
+def _admin_page(queryset):
+    # The admin changelist counts the matches and loads the first page
+    return queryset.count(), list(queryset.order_by('-created_at')[:100])
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text chat search against a LIKE scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--repeats', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        cum_weights = []
+        total = 0.0
+        for rank in range(len(WORDS)):
+            total += 1 / (rank + 1)
+            cum_weights.append(total)
+
+        database = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(rng, cum_weights, options)
+            if connection.vendor == 'sqlite':
+                self.stdout.write(f"Database size: {os.path.getsize(database) / 1e6:,.0f} MB")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if os.path.exists(database):
+                os.remove(database)
+
+    def _run(self, rng, cum_weights, options):
+        # Answers are compressed; the LIKE scan reads them through a SQL function
+        connection.ensure_connection()
+        register_sqlite_functions(connection.connection)
+        chats_with_text = UserChat.objects.annotate(answer_text=Func(
+            F('answer__codec'), F('answer__body'), function='chat_answer_text', output_field=TextField()
+        ))
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f"bench{i}@example.com", email=f"bench{i}@example.com", name=f"Bench {i}")
+            for i in range(options['users'])
+        ])
+
+        self.stdout.write(f"Inserting {options['chats']:,} chats...")
+        started = time.perf_counter()
+        batch = []
+        for i in range(options['chats']):
+            batch.append(UserChat(
+                user=users[i % len(users)],
+                user_text_input=' '.join(rng.choices(WORDS, cum_weights=cum_weights, k=15)),
+                ai_text_output=' '.join(rng.choices(WORDS, cum_weights=cum_weights, k=80)),
+            ))
+            if len(batch) == 5000:
+                UserChat.objects.bulk_create(batch)
+                batch = []
+        UserChat.objects.bulk_create(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Inserted with index maintenance in {elapsed:.0f}s "
+                          f"({options['chats'] / elapsed:,.0f} chats/s)")
+
+        user = users[0]
+        repeats = options['repeats']
+        queries = ['cheque', 'cheque bail', 'term1234', 'eviction deposit refund']
+        self.stdout.write("\nUser search (one user's chats) and admin search (all chats, count + first page)")
+        self.stdout.write(f"{'query':<26}{'search_chats':>14}{'user LIKE':>12}{'admin FTS':>12}{'admin LIKE':>12}")
+        for query in queries:
+            like = Q()
+            for term in query.split():
+                like &= Q(user_text_input__icontains=term) | Q(answer_text__icontains=term)
+            search_ms = _median_ms(lambda: search_chats(user, query), repeats)
+            user_like_ms = _median_ms(
+                lambda: list(chats_with_text.filter(like, user=user).order_by('-created_at')[:20]), repeats)
+            admin_ms = _median_ms(lambda: _admin_page(UserChat.objects.filter(matching_chats(query))), 3)
+            admin_like_ms = _median_ms(lambda: _admin_page(chats_with_text.filter(like)), 3)
+            self.stdout.write(f"{query:<26}{search_ms:>11.1f} ms{user_like_ms:>9.1f} ms"
+                              f"{admin_ms:>9.0f} ms{admin_like_ms:>9.0f} ms")
+
+        chat = UserChat.objects.filter(user=user).first()
+        update_ms = _median_ms(lambda: UserChat.objects.filter(pk=chat.pk).update(
+            ai_text_output=' '.join(rng.choices(WORDS, k=80))), repeats)
+        self.stdout.write(f"\nSingle chat update incl. re-index: {update_ms:.2f} ms")
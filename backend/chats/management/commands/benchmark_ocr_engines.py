@@ -0,0 +1,72 @@
+"""
+Management command to benchmark OCR engines.
+
+Renders A4 pages (300 dpi) of English legal text (Hindi too with
+--devanagari-font) and OCRs them with each engine in chats/ocr_engines.py,
+from 1 and from --threads concurrent threads. Reports the first page (process
+start or handle initialisation) separately from steady-state throughput in
+pages per second. tesserocr runs at most OCR_ENGINE_POOL_SIZE pages of one
+language set at a time, as it does in a worker.
+
+Needs the tesseract binary for 'pytesseract' and the tesserocr package for
+'tesserocr'; engines that cannot run are reported and skipped.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import ImageFont
+
+from chats.management.commands.benchmark_ocr_languages import render_page
+from chats.ocr_engines import create_engine
+
+
+class Command(BaseCommand):
+    help = 'Benchmark OCR throughput (pages/second) of the pytesseract and tesserocr engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=12, help='Pages per run')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent threads for the parallel run')
+        parser.add_argument('--engines', default='pytesseract,tesserocr')
+        parser.add_argument('--lang', default='eng', help="Tesseract languages, e.g. 'eng' or 'eng+hin'")
+        parser.add_argument('--font-size', type=int, default=42, help='Font size in pixels')
+        parser.add_argument('--latin-font', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+        parser.add_argument('--devanagari-font', default=None,
+                            help='Devanagari TrueType font; half of the words are Hindi when given')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        latin_font = ImageFont.truetype(options['latin_font'], options['font_size'])
+        devanagari_font = None
+        if options['devanagari_font']:
+            devanagari_font = ImageFont.truetype(options['devanagari_font'], options['font_size'])
+        rng = random.Random(options['seed'])
+        pages = [render_page(rng, 0.5, latin_font, devanagari_font) for _ in range(options['pages'])]
+        lang = options['lang']
+
+        for name in options['engines'].split(','):
+            try:
+                engine = create_engine(name)
+                engine.describe()
+            except Exception as e:
+                self.stdout.write(f"{name:12s} skipped: {e}")
+                continue
+
+            try:
+                start = time.perf_counter()
+                engine.image_to_string(pages[0], lang=lang)
+                first = time.perf_counter() - start
+
+                for threads in sorted({1, options['threads']}):
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=threads) as executor:
+                        list(executor.map(lambda page: engine.image_to_string(page, lang=lang), pages))
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{name:12s} {threads} thread(s): {len(pages) / elapsed:.2f} pages/s "
+                        f"({elapsed / len(pages) * 1000:.0f} ms/page, first page {first * 1000:.0f} ms)"
+                    )
+            finally:
+                engine.close()
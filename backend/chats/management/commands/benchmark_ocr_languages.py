@@ -0,0 +1,139 @@
+"""
+Management command to benchmark adaptive OCR language selection.
+
+Renders A4 pages (300 dpi) of English, Hindi and mixed legal text, some of
+them rotated, and OCRs each page twice: with the fixed 'eng+hin' the service
+used before and with the languages and rotation prepare_for_ocr() picks.
+Reports script detection accuracy and time, and per-page OCR time for both.
+
+Hindi pages need a Devanagari TrueType font (e.g. Noto Sans Devanagari)
+passed with --devanagari-font; without one only the English corpus runs.
+OCR timings need the tesseract binary with the eng and hin traineddata;
+without it only detection is measured.
+"""
+
+import random
+import shutil
+import statistics
+import time
+
+import pytesseract
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFont
+
+from chats.ocr_languages import BOTH, ENGLISH, HINDI, detect_script, prepare_for_ocr
+
+PAGE_SIZE = (2480, 3508)
+MARGIN = 200
+ROTATIONS = (0, 90, 180, 270)
+
+ENGLISH_TEXT = (
+    "The tenant shall pay the monthly rent on or before the fifth day of each month. "
+    "A landlord must give notice in writing before any increase under Section 106 of the "
+    "Transfer of Property Act. A cheque returned unpaid for insufficient funds is an offence "
+    "under Section 138 of the Negotiable Instruments Act and the payee may send a demand "
+    "notice within thirty days of the bank memo."
+).split()
+
+HINDI_TEXT = (
+    "किरायेदार हर महीने की पांच तारीख तक किराया देगा। मकान मालिक किराया बढ़ाने से पहले "
+    "लिखित नोटिस देगा। अपर्याप्त धनराशि के कारण चेक लौटना परक्राम्य लिखत अधिनियम की धारा "
+    "138 के तहत अपराध है और प्राप्तकर्ता बैंक की सूचना के तीस दिन के भीतर मांग नोटिस भेज सकता है।"
+).split()
+
+
+def _median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+def render_page(rng, hindi_share, latin_font, devanagari_font=None):
+    """Upright A4 page of words, each Hindi with probability hindi_share"""
+    width, height = PAGE_SIZE
+    page = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    line_height = int(latin_font.size * 1.8)
+    space = latin_font.size // 2
+    y = MARGIN
+    while y + line_height < height - MARGIN:
+        x = MARGIN
+        while True:
+            if devanagari_font is not None and rng.random() < hindi_share:
+                word, font = rng.choice(HINDI_TEXT), devanagari_font
+            else:
+                word, font = rng.choice(ENGLISH_TEXT), latin_font
+            word_width = draw.textlength(word, font=font)
+            if x + word_width > width - MARGIN:
+                break
+            draw.text((x, y), word, fill=0, font=font)
+            x += word_width + space
+        y += line_height
+    return page
+
+
+class Command(BaseCommand):
+    help = 'Benchmark OCR with a fixed eng+hin language set against per-page script detection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=4, help='Pages per corpus')
+        parser.add_argument('--font-size', type=int, default=42, help='Font size in pixels')
+        parser.add_argument('--latin-font', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+        parser.add_argument('--devanagari-font', default=None,
+                            help='Devanagari TrueType font for the Hindi and mixed corpora')
+        parser.add_argument('--detection', default=None, help="'heuristic' or 'osd' (default: settings)")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        latin_font = ImageFont.truetype(options['latin_font'], options['font_size'])
+        devanagari_font = None
+        if options['devanagari_font']:
+            devanagari_font = ImageFont.truetype(options['devanagari_font'], options['font_size'])
+
+        corpora = {'English': 0.0}
+        if devanagari_font is not None:
+            corpora.update({'Hindi': 1.0, 'Mixed': 0.5})
+        else:
+            self.stdout.write('No --devanagari-font given: running the English corpus only')
+
+        ocr_available = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+        if not ocr_available:
+            self.stdout.write('tesseract not found: measuring script detection only')
+
+        rng = random.Random(options['seed'])
+        expected_langs = {'English': {ENGLISH}, 'Hindi': {HINDI}, 'Mixed': {BOTH}}
+        for corpus, hindi_share in corpora.items():
+            detect_times, fixed_times, adaptive_times = [], [], []
+            correct = 0
+            chosen = {}
+            for number in range(options['pages']):
+                rotation = ROTATIONS[number % len(ROTATIONS)]
+                upright = render_page(rng, hindi_share, latin_font, devanagari_font)
+                page = upright.rotate(-rotation, expand=True, fillcolor=255)
+
+                start = time.perf_counter()
+                detection = detect_script(page, options['detection'])
+                detect_times.append(time.perf_counter() - start)
+                chosen[detection.lang] = chosen.get(detection.lang, 0) + 1
+                if detection.lang in expected_langs[corpus] and detection.rotation == rotation:
+                    correct += 1
+
+                if ocr_available:
+                    start = time.perf_counter()
+                    pytesseract.image_to_string(page, lang=BOTH)
+                    fixed_times.append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    prepared = prepare_for_ocr(page, options['detection'])
+                    pytesseract.image_to_string(prepared.image, lang=prepared.lang)
+                    adaptive_times.append(time.perf_counter() - start)
+
+            languages = ', '.join(f"{lang} x{count}" for lang, count in sorted(chosen.items()))
+            self.stdout.write(
+                f"{corpus:8s} detection {correct}/{options['pages']} correct ({languages}), "
+                f"median {_median_ms(detect_times):.0f} ms"
+            )
+            if ocr_available:
+                fixed, adaptive = _median_ms(fixed_times), _median_ms(adaptive_times)
+                self.stdout.write(
+                    f"{'':8s} OCR per page: eng+hin {fixed:.0f} ms, adaptive {adaptive:.0f} ms "
+                    f"({fixed / adaptive:.2f}x)"
+                )
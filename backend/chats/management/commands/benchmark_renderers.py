@@ -0,0 +1,122 @@
+"""
+Management command to benchmark response rendering and request parsing.
+
+Renders synthetic payloads shaped like the chat_history and lawyer list
+responses with the stock DRF JSONRenderer and the orjson/MessagePack
+renderers, and reports serialization time and bytes on the wire with and
+without compression. Also times parsing a chat request carrying a large
+base64 image.
+"""
+
+import base64
+import gzip
+import io
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apna_lawyer.middleware import BROTLI_AVAILABLE
+from apna_lawyer.parsers import ORJSONParser
+from apna_lawyer.renderers import MSGPACK_AVAILABLE, MessagePackRenderer, ORJSONRenderer
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+WORDS = ('agreement court notice section tenant landlord cheque bail petition evidence police '
+         'complaint contract clause party property हम अदालत में जमानत याचिका दायर करेंगे').split()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def chat_history_payload(rng, count):
+    now = timezone.now()
+    chats = [{
+        'id': uuid.uuid4(),
+        'user_message': _text(rng, 30),
+        'ai_response': _text(rng, 300),
+        'timestamp': now - timedelta(minutes=i),
+    } for i in range(count)]
+    return {'chats': chats, 'total_count': count}
+
+
+def lawyer_list_payload(rng, count):
+    # Supabase returns rows with every column as JSON scalars
+    return [{
+        'id': str(uuid.uuid4()),
+        'name': f"Advocate {i}",
+        'email': f"advocate{i}@example.com",
+        'phone_number': f"+91 98{i:08d}",
+        'license_number': f"D/{i}/2015",
+        'professional_information': _text(rng, 60),
+        'years_of_experience': rng.randint(1, 30),
+        'primary_practice_area': rng.choice(['Criminal', 'Civil', 'Family', 'Corporate']),
+        'practice_location': rng.choice(['Delhi', 'Mumbai', 'Lucknow', 'Patna']),
+        'working_court': 'District Court',
+        'specialization_document': None,
+        'education_document': None,
+        'created_at': (timezone.now() - timedelta(days=i)).isoformat(),
+    } for i in range(count)]
+
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON/MessagePack rendering, compression and request parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=500, help='Chats in the chat_history payload')
+        parser.add_argument('--lawyers', type=int, default=1000, help='Lawyers in the lawyer list payload')
+        parser.add_argument('--image-kb', type=int, default=4096, help='Size of the base64 image in the parse test')
+        parser.add_argument('--repeats', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeats = options['repeats']
+        gzip_level = settings.COMPRESSION_GZIP_LEVEL
+        brotli_quality = settings.COMPRESSION_BROTLI_QUALITY
+        renderers = [('stock json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+        if MSGPACK_AVAILABLE:
+            renderers.append(('msgpack', MessagePackRenderer()))
+
+        payloads = [
+            (f"chat_history ({options['chats']} chats)", chat_history_payload(rng, options['chats'])),
+            (f"lawyer list ({options['lawyers']} lawyers)", lawyer_list_payload(rng, options['lawyers'])),
+        ]
+        for title, payload in payloads:
+            self.stdout.write(f"\n{title}")
+            self.stdout.write(f"  {'renderer':<12}{'render ms':>10}{'bytes':>12}{'gzip':>12}{'gzip ms':>9}"
+                              + (f"{'br':>12}{'br ms':>8}" if BROTLI_AVAILABLE else ''))
+            for name, renderer in renderers:
+                render_ms, body = _median_ms(lambda: renderer.render(payload), repeats)
+                gzip_ms, gzipped = _median_ms(lambda: gzip.compress(body, gzip_level, mtime=0), repeats)
+                line = f"  {name:<12}{render_ms:>10.2f}{len(body):>12,}{len(gzipped):>12,}{gzip_ms:>9.2f}"
+                if BROTLI_AVAILABLE:
+                    br_ms, brotlied = _median_ms(lambda: brotli.compress(body, quality=brotli_quality), repeats)
+                    line += f"{len(brotlied):>12,}{br_ms:>8.2f}"
+                self.stdout.write(line)
+
+        image = base64.b64encode(os.urandom(options['image_kb'] * 1024)).decode()
+        body = JSONRenderer().render({'message': 'What does this notice say?', 'image': image})
+        self.stdout.write(f"\nParse chat request with {len(body) / 1e6:.1f} MB base64 image")
+        for name, parser in [('stock json', JSONParser()), ('orjson', ORJSONParser())]:
+            parse_ms, _ = _median_ms(lambda: parser.parse(io.BytesIO(body)), repeats)
+            self.stdout.write(f"  {name:<12}{parse_ms:>10.2f} ms")
@@ -0,0 +1,98 @@
+"""
+Management command to benchmark the statute index at scale.
+
+Builds an index over synthetic statute chunks (vocabulary drawn from the real
+corpus with a Zipf distribution) and reports build time, index size, memory
+and query latency.
+"""
+
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import psutil
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chats.chunk_index import Chunk, ChunkIndex, tokenize
+from chats.statute_index import load_corpus
+
+
+def _private_bytes(process):
+    """Anonymous (non file-backed) resident memory of the process"""
+    info = process.memory_info()
+    return info.rss - getattr(info, 'shared', 0)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark statute index build time, memory and query latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunks', type=int, default=100_000, help='Number of synthetic chunks')
+        parser.add_argument('--words', type=int, default=120, help='Words per chunk')
+        parser.add_argument('--queries', type=int, default=500, help='Number of timed queries')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        process = psutil.Process()
+
+        corpus = load_corpus(settings.STATUTE_CORPUS_DIR)
+        vocabulary = sorted({token for chunk in corpus for token in tokenize(chunk.text)})
+        # Pad the vocabulary so document frequencies resemble a real corpus
+        vocabulary += [f"term{i}" for i in range(20_000)]
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        self.stdout.write(f"Generating {options['chunks']:,} chunks of {options['words']} words...")
+        chunks = [
+            Chunk(
+                citation=f"Synthetic Act - Section {i}",
+                text=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=options['words'])),
+            )
+            for i in range(options['chunks'])
+        ]
+
+        rss_before = process.memory_info().rss
+        started = time.perf_counter()
+        index = ChunkIndex.build(chunks)
+        build_seconds = time.perf_counter() - started
+        build_rss = process.memory_info().rss - rss_before
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index')
+            started = time.perf_counter()
+            index.save(path)
+            save_seconds = time.perf_counter() - started
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            del index, chunks
+
+            private_before = _private_bytes(process)
+            started = time.perf_counter()
+            index = ChunkIndex.load(path)
+            load_seconds = time.perf_counter() - started
+
+            queries = [' '.join(rng.choices(vocabulary[:2000], k=rng.randint(3, 8)))
+                       for _ in range(options['queries'])]
+            index.search(queries[0])  # Fault in the posting pointers
+            latencies = []
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, k=5)
+                latencies.append((time.perf_counter() - started) * 1000)
+            # Mapped index pages are shared page cache; only private memory grows per worker
+            query_private = _private_bytes(process) - private_before
+
+        latencies.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"chunks={options['chunks']:,} build={build_seconds:.2f}s (+{build_rss / 2**20:.0f} MB RSS) "
+            f"save={save_seconds:.2f}s size={size / 2**20:.1f} MB load={load_seconds * 1000:.1f}ms "
+            f"(+{query_private / 2**20:.1f} MB private memory after queries)"
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f"query latency p50={statistics.median(latencies):.2f}ms "
+            f"p95={latencies[int(len(latencies) * 0.95)]:.2f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99)]:.2f}ms max={latencies[-1]:.2f}ms"
+        ))
@@ -0,0 +1,38 @@
+"""
+Management command to delete stored AI answers that no chat refers to.
+
+Answers outlive their chats (for example when a user is deleted) because
+they may be shared. Only answers older than --min-age-hours are removed, so
+an answer that is being stored for a new chat is never pruned.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from chats.models import ChatAnswer
+
+
+class Command(BaseCommand):
+    help = 'Delete stored AI answers no chat refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--min-age-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        orphans = ChatAnswer.objects.filter(chats__isnull=True, created_at__lt=cutoff)
+        deleted = 0
+        while True:
+            batch = list(orphans.values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            try:
+                deleted += orphans.filter(pk__in=batch).delete()[0]
+            except ProtectedError:
+                # A chat started using one of these answers meanwhile; try again
+                continue
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced answers"))
@@ -0,0 +1,36 @@
+"""
+Management command to delete expired request-coalescing rows in batches.
+
+The leader of a coalesced AI call deletes its InflightRequest row once
+followers have had the result grace period to read it. Rows outlive that
+only when the worker died in between (or before finishing the call); this
+command removes them. Each batch is a short DELETE by primary key.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chats.models import InflightRequest
+from chats.singleflight import ai_request_coalescer
+
+
+class Command(BaseCommand):
+    help = 'Delete finished and abandoned request-coalescing rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        expired = InflightRequest.objects.filter(ai_request_coalescer.expired(timezone.now()))
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += expired.filter(key__in=keys).delete()[0]
+            time.sleep(options['pause'])
+        self.stdout.write(f"Deleted {deleted} expired coalescing rows")
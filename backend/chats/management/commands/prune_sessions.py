@@ -0,0 +1,55 @@
+"""
+Management command to delete django_session rows in small batches.
+
+Removes expired sessions and, with --anonymous, live sessions without a
+logged-in user: the rows image uploads used to create for every anonymous
+visitor. Each batch is a short DELETE by primary key, so the table is never
+locked for long (unlike ``clearsessions``, which deletes in one statement).
+"""
+
+import time
+
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired (and optionally anonymous) sessions in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Also delete unexpired sessions without a logged-in user')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options['pause'])
+        self.stdout.write(f"Deleted {deleted} expired sessions")
+
+        if options['anonymous']:
+            deleted = 0
+            store = SessionStore()
+            last_key = ''
+            while True:
+                batch = list(Session.objects.filter(session_key__gt=last_key).order_by('session_key')
+                             .values_list('session_key', 'session_data')[:batch_size])
+                if not batch:
+                    break
+                anonymous = [key for key, data in batch if SESSION_KEY not in store.decode(data)]
+                if anonymous:
+                    deleted += Session.objects.filter(session_key__in=anonymous).delete()[0]
+                last_key = batch[-1][0]
+                time.sleep(options['pause'])
+            self.stdout.write(f"Deleted {deleted} anonymous sessions")
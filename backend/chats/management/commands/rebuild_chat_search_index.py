@@ -0,0 +1,21 @@
+"""
+Management command to rebuild the chat full-text search index.
+
+Needed on SQLite after VACUUM, which may renumber the rowids the FTS5 index
+refers to.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from chats.chat_search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over chat history'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt in {time.perf_counter() - started:.1f}s"))
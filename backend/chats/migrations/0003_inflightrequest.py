@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chats", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InflightRequest",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("owner", models.CharField(max_length=64)),
+                ("result", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.5 on 2026-10-19 15:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0004_chatdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkSummary',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('summary', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SummaryJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_session_id', models.CharField(db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('stage', models.CharField(blank=True, max_length=20)),
+                ('total_steps', models.PositiveIntegerField(default=0)),
+                ('completed_steps', models.PositiveIntegerField(default=0)),
+                ('cached_steps', models.PositiveIntegerField(default=0)),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summary_jobs', to='chats.chatdocument')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0005_summaryjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userchat',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='userchat_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Full-text search index over chat text (see chats/chat_search.py)
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Devanagari vowel signs, viramas and nuktas are Unicode marks, which FTS5's
+# unicode61 tokenizer would otherwise treat as word separators
+DEVANAGARI_MARKS = ''.join(
+    chr(code) for code in range(0x0900, 0x0980) if unicodedata.category(chr(code)).startswith('M')
+)
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIEW chats_userchat_search AS
+    SELECT rowid AS chat_rowid, 'u' || user_id AS user_key, user_text_input, ai_text_output
+    FROM chats_userchat
+    """,
+    f"""
+    CREATE VIRTUAL TABLE chats_userchat_fts USING fts5(
+        user_key, user_text_input, ai_text_output,
+        content='chats_userchat_search', content_rowid='chat_rowid',
+        tokenize="porter unicode61 remove_diacritics 2 tokenchars '{DEVANAGARI_MARKS}'"
+    )
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_insert AFTER INSERT ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input, ai_text_output)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input, new.ai_text_output);
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_delete AFTER DELETE ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input, ai_text_output)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input, old.ai_text_output);
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_update AFTER UPDATE OF user_id, user_text_input, ai_text_output
+    ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input, ai_text_output)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input, old.ai_text_output);
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input, ai_text_output)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input, new.ai_text_output);
+    END
+    """,
+    "INSERT INTO chats_userchat_fts(chats_userchat_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS chats_userchat_fts_update",
+    "DROP TRIGGER IF EXISTS chats_userchat_fts_delete",
+    "DROP TRIGGER IF EXISTS chats_userchat_fts_insert",
+    "DROP TABLE IF EXISTS chats_userchat_fts",
+    "DROP VIEW IF EXISTS chats_userchat_search",
+]
+
+# Generated columns are maintained by PostgreSQL on every write. Adding one
+# rewrites the table, so run this migration in a quiet period on large databases.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE chats_userchat ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(user_text_input, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(ai_text_output, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX chats_userchat_search_idx ON chats_userchat USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS chats_userchat_search_idx",
+    "ALTER TABLE chats_userchat DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0006_userchat_export_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userchat',
+            index=models.Index(fields=['created_at'], name='userchat_created_idx'),
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-19 16:10
+
+import importlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+search_0007 = importlib.import_module('chats.migrations.0007_userchat_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0007_userchat_search'),
+    ]
+
+    # The search index is dropped until migration 0010 re-creates it over the
+    # answer store; SQLite cannot rebuild chats_userchat while the view exists
+    operations = [
+        migrations.RunPython(
+            search_0007._run({'sqlite': search_0007.SQLITE_REVERSE, 'postgresql': search_0007.POSTGRES_REVERSE}),
+            search_0007._run({'sqlite': search_0007.SQLITE_FORWARD, 'postgresql': search_0007.POSTGRES_FORWARD}),
+        ),
+        migrations.CreateModel(
+            name='ChatAnswer',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('codec', models.CharField(max_length=8)),
+                ('body', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userchat',
+            name='answer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='chats', to='chats.chatanswer'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Moves existing answer text into the answer store (see chats/answer_store.py)
+
+from collections import defaultdict
+
+from django.db import migrations, transaction
+
+from chats.answer_store import decompress_answer, pack_answer
+
+BATCH_SIZE = 2000
+
+
+def backfill_answers(apps, schema_editor):
+    # Each batch commits on its own, so an interrupted run resumes where it stopped
+    UserChat = apps.get_model('chats', 'UserChat')
+    ChatAnswer = apps.get_model('chats', 'ChatAnswer')
+    db = schema_editor.connection.alias
+    pending = UserChat.objects.using(db).filter(answer__isnull=True, ai_text_output__isnull=False).order_by('pk')
+    last_pk = None
+    while True:
+        chats = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+        batch = list(chats.values_list('pk', 'ai_text_output')[:BATCH_SIZE])
+        if not batch:
+            break
+        answers = {}
+        chats_by_hash = defaultdict(list)
+        for pk, text in batch:
+            values = pack_answer(text)
+            answers.setdefault(values['content_hash'], ChatAnswer(**values))
+            chats_by_hash[values['content_hash']].append(pk)
+        with transaction.atomic(using=db):
+            ChatAnswer.objects.using(db).bulk_create(answers.values(), ignore_conflicts=True)
+            for content_hash, pks in chats_by_hash.items():
+                UserChat.objects.using(db).filter(pk__in=pks).update(answer_id=content_hash)
+        last_pk = batch[-1][0]
+
+
+def restore_answers(apps, schema_editor):
+    UserChat = apps.get_model('chats', 'UserChat')
+    db = schema_editor.connection.alias
+    pending = UserChat.objects.using(db).filter(answer__isnull=False).order_by('pk')
+    last_pk = None
+    while True:
+        chats = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+        batch = list(chats.values_list('pk', 'answer__codec', 'answer__body')[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic(using=db):
+            for pk, codec, body in batch:
+                UserChat.objects.using(db).filter(pk=pk).update(ai_text_output=decompress_answer(codec, body))
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('chats', '0008_chatanswer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_answers, restore_answers),
+    ]
@@ -0,0 +1,112 @@
+# Answer text now lives in chats_chatanswer: the search index reads it from there
+
+import importlib
+
+from django.db import migrations
+
+from chats.answer_store import decompress_answer, index_answers, register_sqlite_functions
+
+search_0007 = importlib.import_module('chats.migrations.0007_userchat_search')
+
+# chat_answer_text() decompresses answers inside SQLite; it is registered on
+# every connection by ChatsConfig.ready()
+SQLITE_FORWARD = [
+    """
+    CREATE VIEW chats_userchat_search AS
+    SELECT c.rowid AS chat_rowid, 'u' || c.user_id AS user_key, c.user_text_input,
+           chat_answer_text(a.codec, a.body) AS ai_text_output
+    FROM chats_userchat c LEFT JOIN chats_chatanswer a ON a.content_hash = c.answer_id
+    """,
+    f"""
+    CREATE VIRTUAL TABLE chats_userchat_fts USING fts5(
+        user_key, user_text_input, ai_text_output,
+        content='chats_userchat_search', content_rowid='chat_rowid',
+        tokenize="porter unicode61 remove_diacritics 2 tokenchars '{search_0007.DEVANAGARI_MARKS}'"
+    )
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_insert AFTER INSERT ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input, ai_text_output)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input,
+                (SELECT chat_answer_text(codec, body) FROM chats_chatanswer WHERE content_hash = new.answer_id));
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_delete AFTER DELETE ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input, ai_text_output)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input,
+                (SELECT chat_answer_text(codec, body) FROM chats_chatanswer WHERE content_hash = old.answer_id));
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_update AFTER UPDATE OF user_id, user_text_input, answer_id
+    ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input, ai_text_output)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input,
+                (SELECT chat_answer_text(codec, body) FROM chats_chatanswer WHERE content_hash = old.answer_id));
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input, ai_text_output)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input,
+                (SELECT chat_answer_text(codec, body) FROM chats_chatanswer WHERE content_hash = new.answer_id));
+    END
+    """,
+    "INSERT INTO chats_userchat_fts(chats_userchat_fts) VALUES ('rebuild')",
+]
+
+# Answers are indexed once per distinct text, when they are stored
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE chats_userchat ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(user_text_input, '')), 'A')
+    ) STORED
+    """,
+    "CREATE INDEX chats_userchat_search_idx ON chats_userchat USING GIN (search_vector)",
+    "ALTER TABLE chats_chatanswer ADD COLUMN search_vector tsvector",
+    "CREATE INDEX chats_chatanswer_search_idx ON chats_chatanswer USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS chats_chatanswer_search_idx",
+    "ALTER TABLE chats_chatanswer DROP COLUMN IF EXISTS search_vector",
+] + search_0007.POSTGRES_REVERSE
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            register_sqlite_functions(schema_editor.connection.connection)
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def index_stored_answers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    ChatAnswer = apps.get_model('chats', 'ChatAnswer')
+    answers = ChatAnswer.objects.using(schema_editor.connection.alias).values_list('content_hash', 'codec', 'body')
+    batch = []
+    for content_hash, codec, body in answers.iterator(chunk_size=2000):
+        batch.append((content_hash, decompress_answer(codec, body)))
+        if len(batch) == 2000:
+            index_answers(schema_editor.connection, batch)
+            batch = []
+    index_answers(schema_editor.connection, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0009_backfill_chat_answers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userchat',
+            name='ai_text_output',
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': search_0007.SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+        migrations.RunPython(index_stored_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Moves inline chat documents to the blob store (apna_lawyer/blob_store.py)
+
+from django.db import migrations
+
+from apna_lawyer.blob_store import convert_columns, offload_value, restore_value
+
+DOCUMENT_FIELDS = ['user_document_submission', 'chatbot_document']
+
+
+def offload_documents(apps, schema_editor):
+    UserChat = apps.get_model('chats', 'UserChat')
+    convert_columns(UserChat.objects.using(schema_editor.connection.alias), DOCUMENT_FIELDS, offload_value)
+
+
+def restore_documents(apps, schema_editor):
+    UserChat = apps.get_model('chats', 'UserChat')
+    convert_columns(UserChat.objects.using(schema_editor.connection.alias), DOCUMENT_FIELDS, restore_value)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('chats', '0010_remove_userchat_ai_text_output'),
+    ]
+
+    operations = [
+        migrations.RunPython(offload_documents, restore_documents),
+    ]
@@ -0,0 +1,95 @@
+# Answers are full-text indexed in Python when they are stored (chats/answer_store.py),
+# so the SQLite search triggers no longer need the chat_answer_text() function and
+# writes from other clients (sqlite3 shell, backup tools) keep working
+
+import importlib
+
+from django.db import migrations
+
+from chats.answer_store import index_stored_answers, register_sqlite_functions
+
+search_0007 = importlib.import_module('chats.migrations.0007_userchat_search')
+search_0010 = importlib.import_module('chats.migrations.0010_remove_userchat_ai_text_output')
+
+SQLITE_FORWARD = search_0007.SQLITE_REVERSE + [
+    """
+    CREATE VIEW chats_userchat_search AS
+    SELECT rowid AS chat_rowid, 'u' || user_id AS user_key, user_text_input
+    FROM chats_userchat
+    """,
+    f"""
+    CREATE VIRTUAL TABLE chats_userchat_fts USING fts5(
+        user_key, user_text_input,
+        content='chats_userchat_search', content_rowid='chat_rowid',
+        tokenize="porter unicode61 remove_diacritics 2 tokenchars '{search_0007.DEVANAGARI_MARKS}'"
+    )
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_insert AFTER INSERT ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input);
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_delete AFTER DELETE ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input);
+    END
+    """,
+    """
+    CREATE TRIGGER chats_userchat_fts_update AFTER UPDATE OF user_id, user_text_input ON chats_userchat BEGIN
+        INSERT INTO chats_userchat_fts(chats_userchat_fts, rowid, user_key, user_text_input)
+        VALUES ('delete', old.rowid, 'u' || old.user_id, old.user_text_input);
+        INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input)
+        VALUES (new.rowid, 'u' || new.user_id, new.user_text_input);
+    END
+    """,
+    "INSERT INTO chats_userchat_fts(chats_userchat_fts) VALUES ('rebuild')",
+    # One row per distinct answer, keyed by the answer's rowid and filled by index_answers()
+    f"""
+    CREATE VIRTUAL TABLE chats_chatanswer_fts USING fts5(
+        ai_text_output,
+        tokenize="porter unicode61 remove_diacritics 2 tokenchars '{search_0007.DEVANAGARI_MARKS}'"
+    )
+    """,
+    """
+    CREATE TRIGGER chats_chatanswer_fts_delete AFTER DELETE ON chats_chatanswer BEGIN
+        DELETE FROM chats_chatanswer_fts WHERE rowid = old.rowid;
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS chats_chatanswer_fts_delete",
+    "DROP TABLE IF EXISTS chats_chatanswer_fts",
+] + search_0007.SQLITE_REVERSE + search_0010.SQLITE_FORWARD
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        register_sqlite_functions(schema_editor.connection.connection)
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def index_answers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    ChatAnswer = apps.get_model('chats', 'ChatAnswer')
+    answers = ChatAnswer.objects.using(schema_editor.connection.alias).values_list('content_hash', 'codec', 'body')
+    index_stored_answers(schema_editor.connection, answers.iterator(chunk_size=2000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0011_offload_chat_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(SQLITE_FORWARD), _run(SQLITE_REVERSE)),
+        migrations.RunPython(index_answers, migrations.RunPython.noop),
+    ]
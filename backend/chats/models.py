@@ -1,17 +1,198 @@
-from django.db import models
+from functools import cached_property
+
+from django.db import connections, models
 import uuid
 
+from .answer_store import decompress_answer, index_answers, pack_answer
+
+_UNSET = object()
+
+class ChatAnswerManager(models.Manager):
+    def intern(self, text):
+        return self.intern_many([text])[0]
+
+    def intern_many(self, texts):
+        """Stored answers for texts, in order, inserting the ones not stored yet"""
+        answers = {}
+        result = []
+        for text in texts:
+            values = pack_answer(text)
+            answer = answers.get(values['content_hash'])
+            if answer is None:
+                answer = answers[values['content_hash']] = self.model(**values)
+                answer.text = text
+            result.append(answer)
+        if answers:
+            self.bulk_create(answers.values(), ignore_conflicts=True)
+            index_answers(connections[self.db], [(answer.pk, answer.text) for answer in answers.values()])
+        return result
+
+class ChatAnswer(models.Model):
+    """AI answer stored once per distinct text, compressed (chats/answer_store.py)"""
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    codec = models.CharField(max_length=8)
+    body = models.BinaryField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChatAnswerManager()
+
+    def __str__(self):
+        return f"Answer {self.content_hash[:12]} ({self.size} bytes)"
+
+    @cached_property
+    def text(self):
+        return decompress_answer(self.codec, self.body)
+
+class UserChatQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        pending = [chat for chat in objs if chat.has_pending_answer]
+        answers = ChatAnswer.objects.db_manager(self.db).intern_many(
+            [chat.ai_text_output for chat in pending if chat.ai_text_output is not None]
+        )
+        answers = iter(answers)
+        for chat in pending:
+            chat.answer = next(answers) if chat.ai_text_output is not None else None
+            chat.__dict__.pop('_pending_ai_text_output')
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'ai_text_output' in kwargs:
+            text = kwargs.pop('ai_text_output')
+            kwargs['answer'] = ChatAnswer.objects.db_manager(self.db).intern(text) if text is not None else None
+        return super().update(**kwargs)
+
+class UserChatManager(models.Manager.from_queryset(UserChatQuerySet)):
+    def get_queryset(self):
+        # Answers are small once compressed; fetch them with the chat
+        return super().get_queryset().select_related('answer')
+
 class UserChat(models.Model):
+    # Text is full-text indexed by the database (migrations 0007 and 0010, chats/chat_search.py)
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey('users.User', on_delete=models.CASCADE)
     user_text_input = models.TextField(null=True, blank=True)
-    ai_text_output = models.TextField(null=True, blank=True)
+    answer = models.ForeignKey(ChatAnswer, on_delete=models.PROTECT, null=True, blank=True, related_name='chats')
+    # Blob store references (apna_lawyer/blob_store.py), not document content
     user_document_submission = models.TextField(null=True, blank=True)
     chatbot_document = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = UserChatManager()
+
     def __str__(self):
         return f"Chat {self.id} - User: {self.user.name}"
 
+    @property
+    def ai_text_output(self):
+        """The answer text; assigned text is stored in the answer store on save"""
+        pending = self.__dict__.get('_pending_ai_text_output', _UNSET)
+        if pending is not _UNSET:
+            return pending
+        return self.answer.text if self.answer_id else None
+
+    @ai_text_output.setter
+    def ai_text_output(self, value):
+        self.__dict__['_pending_ai_text_output'] = value
+
+    @property
+    def has_pending_answer(self):
+        return '_pending_ai_text_output' in self.__dict__
+
+    def save(self, *args, **kwargs):
+        if self.has_pending_answer:
+            text = self.__dict__.pop('_pending_ai_text_output')
+            self.answer = ChatAnswer.objects.db_manager(kwargs.get('using')).intern(text) if text is not None else None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'ai_text_output' in update_fields:
+                kwargs['update_fields'] = [
+                    'answer' if name == 'ai_text_output' else name for name in update_fields
+                ]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination for history export
+            models.Index(fields=['user', 'created_at', 'id'], name='userchat_user_created_idx'),
+            # Newest-first listing in the admin, including full-text search results
+            models.Index(fields=['created_at'], name='userchat_created_idx'),
+        ]
+
+class InflightRequest(models.Model):
+    """Cross-worker lock table used to coalesce identical upstream AI calls"""
+    key = models.CharField(max_length=64, primary_key=True)
+    owner = models.CharField(max_length=64)
+    result = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Inflight {self.key[:12]} - Owner: {self.owner}"
+
+class ChatDocument(models.Model):
+    """Uploaded document whose extracted text is kept as chunks for question answering"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, null=True, blank=True)
+    user_session_id = models.CharField(max_length=64, db_index=True)
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    char_count = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Document {self.id} - {self.name}"
+
+    class Meta:
+        ordering = ['-created_at']
+
+class DocumentChunk(models.Model):
+    document = models.ForeignKey(ChatDocument, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField()
+    label = models.CharField(max_length=255)
+    text = models.TextField()
+
+    def __str__(self):
+        return f"{self.label} ({self.document_id})"
+
+    class Meta:
+        ordering = ['position']
+        unique_together = ['document', 'position']
+
+class ChunkSummary(models.Model):
+    """Summary of one piece of text, keyed by a hash of the text and the summary prompt"""
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Summary {self.content_hash[:12]}"
+
+class SummaryJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(ChatDocument, on_delete=models.CASCADE, related_name='summary_jobs')
+    user_session_id = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stage = models.CharField(max_length=20, blank=True)
+    total_steps = models.PositiveIntegerField(default=0)
+    completed_steps = models.PositiveIntegerField(default=0)
+    cached_steps = models.PositiveIntegerField(default=0)
+    summary = models.TextField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary job {self.id} - {self.status}"
+
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
@@ -0,0 +1,202 @@
+"""
+OCR engines behind OCRService and the image chat
+
+Two backends, chosen by OCR_ENGINE:
+
+- 'pytesseract' (default): every call writes the image to a temporary file,
+  starts a tesseract process and loads the traineddata from disk again.
+- 'tesserocr': Tesseract's C++ API in process (needs the tesserocr
+  package, built against libtesseract). Initialised API handles are kept in
+  a pool per language set, at most OCR_ENGINE_POOL_SIZE per worker process,
+  so a page only pays for recognition. Each handle keeps its traineddata in
+  memory; a request that finds every handle busy waits for one.
+
+Usage:
+    text = ocr_engine.image_to_string(image, lang='eng')
+"""
+
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+
+import pytesseract
+from django.conf import settings
+
+from apna_lawyer.utils import LazyService
+
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+
+class OCREngine(ABC):
+    """Interface of the OCR backends"""
+
+    name = None
+
+    @abstractmethod
+    def image_to_string(self, image, lang='eng'):
+        """Text of a PIL image"""
+
+    @abstractmethod
+    def recognize(self, image, lang='eng'):
+        """Text of a PIL image and its mean word confidence (0-100, None without words)"""
+
+    @abstractmethod
+    def describe(self):
+        """Version, installed languages and location of Tesseract; raises when unusable"""
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """One tesseract process per page"""
+
+    name = 'pytesseract'
+
+    def image_to_string(self, image, lang='eng'):
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def recognize(self, image, lang='eng'):
+        # One tesseract run for both: rebuild the text from the word table
+        data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for index, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            line = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+            lines.setdefault(line, []).append(word)
+            confidence = float(data['conf'][index])
+            if confidence >= 0:
+                confidences.append(confidence)
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else None
+        return text, confidence
+
+    def describe(self):
+        return {
+            'engine': self.name,
+            'version': str(pytesseract.get_tesseract_version()),
+            'languages': pytesseract.get_languages(),
+            'path': pytesseract.pytesseract.tesseract_cmd,
+        }
+
+
+class TesserocrEngine(OCREngine):
+    """In-process Tesseract with pooled API handles per language set"""
+
+    name = 'tesserocr'
+
+    def __init__(self, pool_size, tessdata_path=None):
+        if not TESSEROCR_AVAILABLE:
+            raise ImportError("OCR_ENGINE='tesserocr' needs the tesserocr package")
+        self.pool_size = max(1, pool_size)
+        self.tessdata_path = tessdata_path
+        self._lock = threading.Lock()
+        self._reset_pools()
+
+    def _reset_pools(self):
+        # Handles are not shared with forked workers; each process builds its own
+        self._pid = os.getpid()
+        self._idle = {}
+        self._created = {}
+
+    def image_to_string(self, image, lang='eng'):
+        return self._run(image, lang, lambda api: api.GetUTF8Text())
+
+    def recognize(self, image, lang='eng'):
+        def text_and_confidence(api):
+            text = api.GetUTF8Text()
+            return text, (float(api.MeanTextConf()) if text.strip() else None)
+        return self._run(image, lang, text_and_confidence)
+
+    def _run(self, image, lang, read):
+        api = self._acquire(lang)
+        try:
+            api.SetImage(image)
+            return read(api)
+        finally:
+            api.Clear()
+            self._release(lang, api)
+
+    def _acquire(self, lang):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_pools()
+            idle = self._idle.setdefault(lang, queue.LifoQueue())
+            try:
+                return idle.get_nowait()
+            except queue.Empty:
+                pass
+            create = self._created.get(lang, 0) < self.pool_size
+            if create:
+                self._created[lang] = self._created.get(lang, 0) + 1
+        if not create:
+            return idle.get()
+        try:
+            return self._create_handle(lang)
+        except Exception:
+            with self._lock:
+                self._created[lang] -= 1
+            raise
+
+    def _create_handle(self, lang):
+        kwargs = {'lang': lang}
+        if self.tessdata_path:
+            kwargs['path'] = self.tessdata_path
+        return tesserocr.PyTessBaseAPI(**kwargs)
+
+    def _release(self, lang, api):
+        with self._lock:
+            idle = self._idle.get(lang) if self._pid == os.getpid() else None
+        if idle is None:
+            api.End()
+        else:
+            idle.put(api)
+
+    def pool_stats(self):
+        """Handles created per language set and how many are idle"""
+        with self._lock:
+            return {lang: {'created': created, 'idle': self._idle[lang].qsize()}
+                    for lang, created in self._created.items()}
+
+    def describe(self):
+        if self.tessdata_path:
+            path, languages = tesserocr.get_languages(self.tessdata_path)
+        else:
+            path, languages = tesserocr.get_languages()
+        return {
+            'engine': self.name,
+            'version': tesserocr.tesseract_version(),
+            'languages': languages,
+            'path': path,
+            'pools': self.pool_stats(),
+        }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._created = {}
+        for handles in idle.values():
+            while not handles.empty():
+                handles.get_nowait().End()
+
+
+def create_engine(name=None):
+    """Build the OCR engine configured by OCR_ENGINE"""
+    name = name or getattr(settings, 'OCR_ENGINE', 'pytesseract')
+    if name == 'pytesseract':
+        return PytesseractEngine()
+    if name == 'tesserocr':
+        return TesserocrEngine(getattr(settings, 'OCR_ENGINE_POOL_SIZE', 2),
+                               getattr(settings, 'OCR_TESSDATA_PATH', None))
+    raise ValueError(f"Unknown OCR_ENGINE: {name}")
+
+
+# Process-wide engine used by OCRService and the image chat
+ocr_engine = LazyService(create_engine)
@@ -0,0 +1,330 @@
+"""
+Script and orientation detection ahead of OCR
+
+Running Tesseract with 'eng+hin' makes both recognisers look at every word,
+which is far slower than one language, while English alone garbles Hindi.
+prepare_for_ocr() looks at the page first, picks the smallest language set
+that covers the scripts on it and turns the page upright.
+
+Two detectors, chosen by OCR_SCRIPT_DETECTION:
+
+- 'heuristic' (default): NumPy on a downscaled, binarised copy. Devanagari
+  words hang from a headline (shirorekha) that runs across the whole word;
+  Latin words have no horizontal stroke longer than a letter or two. Each
+  word is classified by its longest horizontal ink run. Which side of the
+  word the headline is on (Devanagari) and whether ascenders or descenders
+  carry more ink (Latin) tell an upright page from an upside-down one, and
+  the direction of the text lines tells 0/180 from 90/270 degrees.
+  Underlines and ruled lines are long horizontal runs too: rows whose run
+  crosses a word gap are dropped, and a run under a word counts as an
+  upside-down headline only when it touches the word's x-height band. The
+  page is turned over only when the votes for it win by MIN_ROTATION_MARGIN.
+- 'osd': Tesseract's orientation and script detection (needs osd.traineddata).
+  It reports one dominant script, so pages where it is unsure get 'eng+hin'.
+- 'off': always 'eng+hin', no rotation.
+
+Usage:
+    prepared = prepare_for_ocr(image)
+    text = ocr_engine.image_to_string(prepared.image, lang=prepared.lang)
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+ENGLISH = 'eng'
+HINDI = 'hin'
+BOTH = 'eng+hin'
+
+MAX_SAMPLED_LINES = 24
+# Share of the orientation votes the turned-over candidate must win by;
+# weaker evidence (a few misread words) leaves the page as it is
+MIN_ROTATION_MARGIN = 0.2
+
+
+@dataclass
+class ScriptDetection:
+    lang: str
+    rotation: int  # Degrees the page is turned counter-clockwise to make it upright
+    devanagari_share: float  # Share of text (by word width) in Devanagari, None if unknown
+    method: str
+
+
+@dataclass
+class PreparedImage:
+    image: Image.Image
+    lang: str
+    detection: ScriptDetection
+
+
+def prepare_for_ocr(image, detection_method=None):
+    """
+    Choose OCR languages for an image and return it upright
+
+    Args:
+        image (PIL.Image.Image): Page to OCR
+        detection_method (str): 'heuristic', 'osd' or 'off'; OCR_SCRIPT_DETECTION by default
+
+    Returns:
+        PreparedImage: Rotated image, Tesseract lang string and the detection
+    """
+    detection = detect_script(image, detection_method)
+    if detection.rotation:
+        image = image.rotate(detection.rotation, expand=True, fillcolor=background_fill(image))
+    return PreparedImage(image, detection.lang, detection)
+
+
+def detect_script(image, detection_method=None):
+    """Detect the scripts and orientation of a page (see module docstring)"""
+    method = detection_method or getattr(settings, 'OCR_SCRIPT_DETECTION', 'heuristic')
+    if method == 'off':
+        return ScriptDetection(BOTH, 0, None, 'off')
+    if method == 'osd':
+        try:
+            return _detect_with_osd(image)
+        except Exception as e:
+            # Missing osd.traineddata or too little text; the heuristic still works
+            print(f"Tesseract OSD failed, using heuristic: {e}")
+    return _detect_with_heuristic(image)
+
+
+def languages_for_share(devanagari_share):
+    """Smallest language set for a page with this share of Devanagari text"""
+    single_script = getattr(settings, 'OCR_SINGLE_SCRIPT_SHARE', 0.9)
+    if devanagari_share is None:
+        return BOTH
+    if devanagari_share >= single_script:
+        return HINDI
+    if devanagari_share <= 1 - single_script:
+        return ENGLISH
+    return BOTH
+
+
+def _detect_with_osd(image):
+    import pytesseract
+
+    osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+    # OSD reports the clockwise rotation that makes the page upright
+    rotation = (-int(osd['rotate'])) % 360
+    if osd.get('script_conf', 0) < getattr(settings, 'OCR_OSD_MIN_SCRIPT_CONFIDENCE', 2.0):
+        return ScriptDetection(BOTH, rotation, None, 'osd')
+    share = 1.0 if osd['script'] == 'Devanagari' else 0.0
+    return ScriptDetection(languages_for_share(share), rotation, share, 'osd')
+
+
+def _detect_with_heuristic(image):
+    ink = ink_mask(image, getattr(settings, 'OCR_SCRIPT_DETECTION_SIDE', 1600))
+    if ink is None:
+        return ScriptDetection(BOTH, 0, None, 'heuristic')
+
+    # Text lines run along the axis whose projection profile is smoother
+    if _line_contrast(ink.T) > 1.3 * _line_contrast(ink):
+        candidates = ((90, np.rot90(ink, 1)), (270, None))
+    else:
+        candidates = ((0, ink), (180, None))
+
+    words = _classify_words(candidates[0][1])
+    if not words:
+        return ScriptDetection(BOTH, 0, None, 'heuristic')
+    # The other candidate is the same page turned 180 degrees: every vote flips
+    # and the script of every word stays the same, so it needs no second pass
+    votes = _upright_votes(words)
+    weight = sum(width * abs(vote) for width, _, vote in words)
+    rotation = candidates[1][0] if votes < -MIN_ROTATION_MARGIN * weight else candidates[0][0]
+
+    deva = sum(width for width, is_deva, _ in words if is_deva)
+    total = sum(width for width, _, _ in words)
+    share = deva / total if total else None
+    return ScriptDetection(languages_for_share(share), rotation, share, 'heuristic')
+
+
+def ink_mask(image, max_side):
+    """
+    Boolean array of ink pixels on a copy reduced to about max_side pixels
+
+    Returns None for blank pages.
+    """
+    gray = image.convert('L')
+    factor = max(gray.size) // max_side
+    if factor > 1:
+        # Box-filtered integer reduction: much faster than resize() on large scans
+        gray = gray.reduce(factor)
+    pixels = np.asarray(gray)
+    threshold = _otsu_threshold(pixels)
+    if threshold is None:
+        return None
+    ink = pixels <= threshold
+    if ink.mean() > 0.5:
+        # Light text on a dark background
+        ink = ~ink
+    return ink
+
+
+def _otsu_threshold(pixels):
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = total - weight_dark
+    mass_dark = np.cumsum(histogram * levels)
+    mean_dark = mass_dark / np.maximum(weight_dark, 1)
+    mean_light = (mass_dark[-1] - mass_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    if not between.any():
+        return None
+    return int(np.argmax(between))
+
+
+def background_fill(image):
+    """Fill colour for the corners uncovered by rotation (white for dark-on-light pages)"""
+    bands = len(image.getbands())
+    return 255 if bands == 1 else (255,) * bands
+
+
+def _line_contrast(ink):
+    """Coefficient of variation of the row profile; high when text lines run horizontally"""
+    profile = ink.sum(axis=1).astype(np.float64)
+    mean = profile.mean()
+    return profile.std() / mean if mean else 0.0
+
+
+def _line_bands(ink):
+    """(top, bottom) row ranges of text lines"""
+    profile = ink.sum(axis=1)
+    rows = profile > max(1, 0.002 * ink.shape[1])
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.view(np.int8), [0]))))
+    return [(top, bottom) for top, bottom in zip(edges[::2], edges[1::2]) if bottom - top >= 6]
+
+
+def _longest_runs(ink):
+    """Length of the longest horizontal ink run in each row"""
+    height, width = ink.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = ink
+    steps = np.diff(padded, axis=1)
+    starts = np.argwhere(steps == 1)
+    ends = np.argwhere(steps == -1)
+    longest = np.zeros(height, dtype=np.int64)
+    if len(starts):
+        np.maximum.at(longest, starts[:, 0], ends[:, 1] - starts[:, 1])
+    return longest
+
+
+def _classify_words(ink):
+    """
+    Split text lines into words and classify them
+
+    Returns:
+        list: (width, is_devanagari, orientation vote) per word; the vote is
+            +1 for upright evidence, -1 for upside-down, 0 for none
+    """
+    words = []
+    bands = _line_bands(ink)
+    # An evenly spaced sample of lines is enough to estimate the script mix
+    step = max(1, len(bands) // MAX_SAMPLED_LINES)
+    for top, bottom in bands[::step]:
+        band = ink[top:bottom]
+        # Bridge letter gaps, keep word gaps (about a third of the line height)
+        gap = max(2, (bottom - top) // 3)
+        band = _without_rules(band, gap)
+        for start, end in _word_spans(band.any(axis=0), gap):
+            word = band[:, start:end]
+            rows = np.flatnonzero(word.any(axis=1))
+            if not len(rows):
+                continue
+            word = word[rows[0]:rows[-1] + 1]
+            word_height, width = word.shape
+            if width < 0.8 * word_height or word_height < 5:
+                continue
+            words.append((width, *_classify_word(word)))
+    return words
+
+
+def _word_spans(columns, gap):
+    """[start, end) column ranges of words: ink columns with letter gaps narrower than gap bridged"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], columns.view(np.int8), [0]))))
+    spans = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if spans and start - spans[-1][1] < gap:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+    return spans
+
+
+def _without_rules(band, gap):
+    """
+    Text line without underlines and ruled lines
+
+    A headline never runs past the end of its word, so rows whose ink runs
+    on across a word gap (longer than the widest word measured without
+    them) are rules, not Devanagari.
+    """
+    runs = _longest_runs(band)
+    long = runs >= 0.5 * np.count_nonzero(band.any(axis=0))
+    if not long.any() or long.all():
+        return band
+    spans = _word_spans(band[~long].any(axis=0), gap)
+    widest = max((end - start for start, end in spans), default=0)
+    ruled = long & (runs >= widest + gap)
+    if not ruled.any():
+        return band
+    band = band.copy()
+    band[ruled] = False
+    return band
+
+
+def _classify_word(word):
+    """(is_devanagari, orientation vote) of a word cropped to its ink"""
+    word_height, width = word.shape
+    # Close one-pixel breaks that downscaling leaves in thin strokes
+    closed = word.copy()
+    closed[:, 1:] |= word[:, :-1]
+    strong = _longest_runs(closed) >= 0.7 * width
+    zone = max(1, int(word_height * 0.4))
+    top = np.flatnonzero(strong[:zone])
+    bottom = word_height - zone + np.flatnonzero(strong[-zone:])
+    if len(top) and _lies_on_letters(word[top[-1] + 1:]):
+        return True, 1
+    if len(bottom) and _lies_on_letters(word[:bottom[0]][::-1]):
+        return True, -1
+    if len(top) or len(bottom):
+        # Underlined (or, upside down, overlined) Latin: vote on the letters alone
+        word = word[top[-1] + 1 if len(top) else 0:bottom[0] if len(bottom) else word_height]
+        rows = np.flatnonzero(word.any(axis=1))
+        if len(rows) < 3:
+            return False, 0
+        return _classify_word(word[rows[0]:rows[-1] + 1])
+    return False, _ascender_vote(word)
+
+
+def _lies_on_letters(letters):
+    """
+    Whether a long horizontal run is a headline rather than an underline
+
+    letters are the word's other rows, ordered outwards from the run. A
+    headline lies against the letter bodies hanging from it; an underline
+    lies below the x-height band of the letters, past the descender gap.
+    """
+    profile = letters.sum(axis=1)
+    if not profile.any():
+        return False
+    core = np.flatnonzero(profile >= 0.5 * profile.max())
+    return core[0] < max(2, 0.1 * (len(letters) + 1))
+
+
+def _ascender_vote(word):
+    """+1 when more ink sits above the x-height band than below it, as in upright Latin"""
+    profile = word.sum(axis=1)
+    core = np.flatnonzero(profile >= 0.5 * profile.max())
+    above = profile[:core[0]].sum()
+    below = profile[core[-1] + 1:].sum()
+    if above == below:
+        return 0
+    return 1 if above > below else -1
+
+
+def _upright_votes(words):
+    return sum(width * vote for width, _, vote in words)
@@ -0,0 +1,260 @@
+"""
+Layout analysis and region-parallel OCR
+
+One Tesseract call reads a page on one core. recognize_page() instead cuts a
+large page into text blocks and OCRs them concurrently:
+
+1. Recursive XY-cut on a downscaled ink mask: a block is split at vertical
+   whitespace gutters (columns) where there are any, otherwise at horizontal
+   gaps taller than a line (paragraphs). Columns are read left to right,
+   blocks top to bottom, which is the reading order of single- and
+   multi-column documents and of headers over columns.
+2. Blocks taller than their share of the page are cut further between text
+   lines, so a dense single-column page still spreads over the workers.
+3. The blocks are OCR'd on OCR_REGION_WORKERS threads and joined in reading
+   order. Both OCR engines run Tesseract outside the GIL (a tesseract
+   process or tesserocr's nogil calls), so threads use all cores without
+   pickling page images to a process pool.
+
+Pages smaller than OCR_REGION_MIN_PIXELS, or with a single block, are read
+with one call as before. With structured=True every block is OCR'd on its
+own and returned with its bounding box and mean word confidence.
+
+Usage:
+    layout = recognize_page(image, 'eng', structured=True)
+    layout.text, [(block.bbox, block.confidence) for block in layout.blocks]
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from django.conf import settings
+from PIL import ImageOps
+
+from .ocr_engines import ocr_engine
+from .ocr_languages import background_fill, ink_mask
+
+# Whitespace (in median line heights) that separates columns and blocks
+COLUMN_GAP_LINES = 1.2
+BLOCK_GAP_LINES = 1.2
+# Narrowest column, in line heights
+MIN_COLUMN_LINES = 5
+# Vertical stripes the line height is measured in
+LINE_HEIGHT_STRIPES = 8
+# Blocks are not cut into strips of fewer lines than this; each OCR call has a fixed cost
+MIN_STRIP_LINES = 4
+# White margin added around each block; Tesseract misses glyphs touching the edge
+BLOCK_BORDER = 10
+
+
+@dataclass
+class TextBlock:
+    bbox: tuple  # (left, top, right, bottom) in pixels of the page passed in
+    text: str = ''
+    confidence: float = None  # Mean word confidence 0-100, None when not measured
+
+
+@dataclass
+class PageLayout:
+    text: str
+    width: int
+    height: int
+    blocks: list = field(default_factory=list)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def recognize_page(image, lang, structured=False):
+    """
+    OCR an upright page, in parallel regions when it is large
+
+    Args:
+        image (PIL.Image.Image): Upright page
+        lang (str): Tesseract languages
+        structured (bool): OCR every block separately and report boxes and confidence
+
+    Returns:
+        PageLayout: Text in reading order and, when structured or split, its blocks
+    """
+    width, height = image.size
+    workers = getattr(settings, 'OCR_REGION_WORKERS', 1)
+    large = width * height >= getattr(settings, 'OCR_REGION_MIN_PIXELS', 3000000)
+    if not structured and (workers <= 1 or not large):
+        return PageLayout(ocr_engine.image_to_string(image, lang=lang), width, height)
+
+    blocks = segment_page(image, workers if large else 1)
+    if not structured and len(blocks) <= 1:
+        return PageLayout(ocr_engine.image_to_string(image, lang=lang), width, height)
+
+    def read(block):
+        crop = ImageOps.expand(image.crop(block.bbox), border=BLOCK_BORDER, fill=background_fill(image))
+        if structured:
+            block.text, block.confidence = ocr_engine.recognize(crop, lang=lang)
+        else:
+            block.text = ocr_engine.image_to_string(crop, lang=lang)
+        return block
+
+    blocks = list(_region_executor().map(read, blocks))
+    text = '\n\n'.join(block.text.strip() for block in blocks if block.text.strip())
+    return PageLayout(text, width, height, blocks)
+
+
+def segment_page(image, parts=1):
+    """
+    Text blocks of an upright page in reading order
+
+    Args:
+        image (PIL.Image.Image): Upright page
+        parts (int): Blocks taller than 1/parts of the text are cut between lines
+
+    Returns:
+        list: TextBlock per block (empty for a blank page)
+    """
+    ink = ink_mask(image, getattr(settings, 'OCR_LAYOUT_ANALYSIS_SIDE', 1600))
+    if ink is None:
+        return []
+    line_height = _median_line_height(ink)
+    boxes = []
+    _xy_cut(ink, (0, 0, ink.shape[0], ink.shape[1]), line_height, boxes)
+    # Specks of dust and scanner noise smaller than a letter are not text
+    boxes = [box for box in boxes if max(box[2] - box[0], box[3] - box[1]) >= 0.5 * line_height]
+    if parts > 1:
+        boxes = _split_tall(ink, boxes, parts, line_height)
+
+    scale_x = image.width / ink.shape[1]
+    scale_y = image.height / ink.shape[0]
+    blocks = []
+    for top, left, bottom, right in boxes:
+        blocks.append(TextBlock((
+            max(0, int(left * scale_x) - 1),
+            max(0, int(top * scale_y) - 1),
+            min(image.width, int(np.ceil(right * scale_x)) + 1),
+            min(image.height, int(np.ceil(bottom * scale_y)) + 1),
+        )))
+    return blocks
+
+
+def _median_line_height(ink):
+    """Median height of text lines, measured in vertical stripes so columns do not blur it"""
+    heights = []
+    for stripe in np.array_split(ink, LINE_HEIGHT_STRIPES, axis=1):
+        rows = stripe.any(axis=1).view(np.int8)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], rows, [0]))))
+        heights.extend(edges[1::2] - edges[::2])
+    heights = [height for height in heights if height >= 3]
+    return float(np.median(heights)) if heights else 10.0
+
+
+def _blank_gaps(profile, extent, min_gap):
+    """(start, end) of runs of blank profile entries at least min_gap long, edges excluded"""
+    blank = profile <= max(1, extent // 200)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], blank.view(np.int8), [0]))))
+    return [(start, end) for start, end in zip(edges[::2], edges[1::2])
+            if end - start >= min_gap and start > 0 and end < len(profile)]
+
+
+def _xy_cut(ink, box, line_height, boxes):
+    """Append the leaf blocks of box = (top, left, bottom, right) to boxes in reading order"""
+    top, left, bottom, right = box
+    region = ink[top:bottom, left:right]
+    rows = np.flatnonzero(region.any(axis=1))
+    if not len(rows):
+        return
+    columns = np.flatnonzero(region.any(axis=0))
+    # Trim to the ink so gaps are only looked for between text
+    top, bottom = top + rows[0], top + rows[-1] + 1
+    left, right = left + columns[0], left + columns[-1] + 1
+    region = ink[top:bottom, left:right]
+
+    gutters = _column_gutters(region, line_height)
+    if gutters:
+        starts = [0] + [end for _, end in gutters]
+        ends = [start for start, _ in gutters] + [right - left]
+        for start, end in zip(starts, ends):
+            _xy_cut(ink, (top, left + start, bottom, left + end), line_height, boxes)
+        return
+
+    gaps = _blank_gaps(region.sum(axis=1), right - left, BLOCK_GAP_LINES * line_height)
+    if gaps:
+        starts = [top] + [top + end for _, end in gaps]
+        ends = [top + start for start, _ in gaps] + [bottom]
+        # Paragraph gaps that line up across columns must not cut the page into rows
+        # (left, right, left, right...): consecutive pieces sharing a column gutter
+        # stay together and are split into columns by the next level
+        groups = [[starts[0], ends[0]]]
+        for start, end in zip(starts[1:], ends[1:]):
+            group = groups[-1]
+            if (_column_gutters(ink[group[0]:group[1], left:right], line_height)
+                    and _column_gutters(ink[start:end, left:right], line_height)
+                    and _column_gutters(ink[group[0]:end, left:right], line_height)):
+                group[1] = end
+            else:
+                groups.append([start, end])
+        for start, end in groups:
+            _xy_cut(ink, (start, left, end, right), line_height, boxes)
+        return
+
+    boxes.append((top, left, bottom, right))
+
+
+def _column_gutters(region, line_height):
+    """
+    Vertical gaps that separate columns
+
+    Gaps next to a strip narrower than MIN_COLUMN_LINES line heights (list
+    numbers, indented labels) are kept inside the block so their text stays
+    next to what it belongs to.
+    """
+    height, width = region.shape
+    min_width = MIN_COLUMN_LINES * line_height
+    gutters = []
+    last_end = 0
+    for start, end in _blank_gaps(region.sum(axis=0), height, COLUMN_GAP_LINES * line_height):
+        if start - last_end >= min_width and width - end >= min_width:
+            gutters.append((start, end))
+            last_end = end
+    return gutters
+
+
+def _split_tall(ink, boxes, parts, line_height):
+    """Cut blocks taller than their share of the text into strips between lines"""
+    target = max(sum(bottom - top for top, _, bottom, _ in boxes) / parts, MIN_STRIP_LINES * line_height)
+    split = []
+    for top, left, bottom, right in boxes:
+        height = bottom - top
+        pieces = int(height // target)
+        if pieces < 2:
+            split.append((top, left, bottom, right))
+            continue
+        # Cut through the middle of the gaps between lines nearest to even divisions
+        gaps = _blank_gaps(ink[top:bottom, left:right].sum(axis=1), right - left, 1)
+        cuts = np.array([(start + end) // 2 for start, end in gaps])
+        chosen = set()
+        if len(cuts):
+            for piece in range(1, pieces):
+                chosen.add(int(cuts[np.argmin(np.abs(cuts - piece * height / pieces))]))
+        edges = [0] + sorted(chosen) + [height]
+        for start, end in zip(edges, edges[1:]):
+            split.append((top + start, left, top + end, right))
+    return split
+
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _region_executor():
+    """Thread pool for block OCR, rebuilt when OCR_REGION_WORKERS changes"""
+    global _executor, _executor_workers
+    workers = max(1, getattr(settings, 'OCR_REGION_WORKERS', 1))
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-regions')
+            _executor_workers = workers
+        return _executor
@@ -7,7 +7,24 @@ import io
 from PIL import Image
 import pytesseract
 import base64
-from django.core.files.uploadedfile import InMemoryUploadedFile
+import hashlib
+from django.conf import settings
+from apna_lawyer.cache import shared_cache
+from apna_lawyer.metrics import track_upstream
+from apna_lawyer.utils import LazyService
+from .ocr_engines import ocr_engine
+from .ocr_languages import prepare_for_ocr
+from .ocr_layout import recognize_page
+
+def normalize_text(text):
+    """Collapse the line breaks and runs of whitespace in OCR output"""
+    # Remove extra whitespace and empty lines
+    lines = [line.strip() for line in (text or '').split('\n') if line.strip()]
+    cleaned_text = '\n'.join(lines)
+    
+    # Remove excessive whitespace
+    return ' '.join(cleaned_text.split())
+
 
 class OCRService:
     def __init__(self):
@@ -47,13 +64,7 @@ class OCRService:
     def check_tesseract_installation(self):
         """Check if Tesseract is properly installed and accessible"""
         try:
-            version = pytesseract.get_tesseract_version()
-            languages = pytesseract.get_languages()
-            return True, {
-                'version': str(version),
-                'languages': languages,
-                'path': pytesseract.pytesseract.tesseract_cmd
-            }
+            return True, ocr_engine.describe()
         except Exception as e:
             return False, str(e)
     
@@ -75,24 +86,19 @@ class OCRService:
                 print(error_msg)
                 return error_msg
             
-            # Handle different input types
-            if isinstance(image_file, InMemoryUploadedFile):
-                # Django uploaded file
-                image = Image.open(image_file)
+            # Upload already hashed while streamed to disk, file path or file-like object
+            digest = getattr(image_file, 'sha256', None)
+            if digest is not None:
+                image_data = image_file
             elif isinstance(image_file, str):
-                # File path
-                image = Image.open(image_file)
+                with open(image_file, 'rb') as handle:
+                    image_data = handle.read()
             else:
-                # File-like object
-                image = Image.open(image_file)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+                image_data = image_file.read()
             
             # Extract text using pytesseract with better error handling
             try:
-                extracted_text = pytesseract.image_to_string(image, lang='eng+hin')
+                extracted_text = self._image_to_string(image_data, digest=digest)
             except pytesseract.TesseractNotFoundError:
                 return "Tesseract OCR engine not found. Please ensure Tesseract is installed on the server."
             except pytesseract.TesseractError as te:
@@ -128,15 +134,8 @@ class OCRService:
             # Decode base64 to bytes
             image_data = base64.b64decode(base64_string)
             
-            # Create PIL Image from bytes
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
             # Extract text using pytesseract
-            extracted_text = pytesseract.image_to_string(image, lang='eng+hin')
+            extracted_text = self._image_to_string(image_data)
             
             # Clean up the text
             cleaned_text = self._clean_extracted_text(extracted_text)
@@ -147,6 +146,114 @@ class OCRService:
             print(f"OCR Error: {e}")
             return f"Error extracting text from image: {str(e)}"
     
+    def extract_text_from_upload(self, upload):
+        """
+        Extract text from an upload streamed to disk by StreamingUploadHandler
+        
+        The image is decoded from its temporary file and the SHA-256 computed
+        while it was received keys the OCR cache, so the upload is never
+        copied into memory.
+        
+        Returns:
+            str: Extracted text from the image
+        """
+        try:
+            upload.seek(0)
+            extracted_text = self._image_to_string(upload, digest=getattr(upload, 'sha256', None))
+            return self._clean_extracted_text(extracted_text)
+        except Exception as e:
+            print(f"OCR Error: {e}")
+            return f"Error extracting text from image: {str(e)}"
+    
+    def extract_text_from_page(self, source, frame=0, digest=None):
+        """
+        Text of one page of an image, for batch OCR
+        
+        Unlike the other extract_* methods, errors are raised rather than
+        returned as text, and a page without text gives ''.
+        
+        Args:
+            source: Encoded image bytes, file path or file object
+            frame (int): Page of a multi-page TIFF
+            digest (str): SHA-256 of the encoded image (computed from bytes when not given)
+            
+        Returns:
+            str: Text with whitespace cleaned as for the other extract_* methods
+        """
+        return normalize_text(self._image_to_string(source, digest=digest, frame=frame))
+    
+    def _image_to_string(self, image_data, lang=None, digest=None, frame=0):
+        """
+        Raw Tesseract text for encoded image bytes or an image file object
+        
+        Without lang, the languages and page rotation are chosen per image
+        by script detection (see chats/ocr_languages.py).
+        
+        Results are cached by image content for OCR_CACHE_TTL seconds, so
+        the same picture uploaded again (or by another user) is not OCR'd
+        twice.
+        """
+        def recognize():
+            image = self._open_image(image_data, frame)
+            ocr_lang = lang
+            if ocr_lang is None:
+                prepared = prepare_for_ocr(image)
+                image, ocr_lang = prepared.image, prepared.lang
+            # Large pages are split into text blocks OCR'd in parallel (chats/ocr_layout.py)
+            with track_upstream('tesseract', 'image_to_string'):
+                return recognize_page(image, ocr_lang).text
+        
+        page = f"#{frame}" if frame else ''
+        return self._cached(image_data, f"{lang or 'auto'}{page}:", digest, recognize)
+    
+    def extract_layout_from_upload(self, upload):
+        """
+        Text blocks of an uploaded image with bounding boxes and confidence
+        
+        Every block is OCR'd on its own (in parallel). Boxes are in pixels
+        of the page after it was turned upright (see 'rotation').
+        
+        Returns:
+            dict: text (cleaned), lang, rotation (degrees counter-clockwise),
+                width, height and blocks (bbox, text, confidence)
+        """
+        def recognize():
+            prepared = prepare_for_ocr(self._open_image(image_data))
+            with track_upstream('tesseract', 'image_to_data'):
+                layout = recognize_page(prepared.image, prepared.lang, structured=True)
+            result = layout.as_dict()
+            result.update(lang=prepared.lang, rotation=prepared.detection.rotation)
+            return result
+        
+        upload.seek(0)
+        digest = getattr(upload, 'sha256', None)
+        image_data = upload if digest is not None else upload.read()
+        result = dict(self._cached(image_data, 'layout:', digest, recognize))
+        result['text'] = self._clean_extracted_text(result['text'])
+        return result
+    
+    def _open_image(self, image_data, frame=0):
+        """PIL image from encoded bytes, a path or a file object, converted to RGB if necessary"""
+        source = io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data
+        image = Image.open(source)
+        if frame:
+            image.seek(frame)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+    
+    def _cached(self, image_data, prefix, digest, recognize):
+        """
+        OCR result cached by image content (digest, the SHA-256 of the encoded
+        image, is computed from bytes when not given) for OCR_CACHE_TTL seconds
+        """
+        ttl = getattr(settings, 'OCR_CACHE_TTL', 86400)
+        if ttl <= 0:
+            return recognize()
+        if digest is None:
+            digest = hashlib.sha256(image_data).hexdigest()
+        return shared_cache.get_or_set('ocr', f"{prefix}{digest}", recognize, ttl)
+    
     def _clean_extracted_text(self, text):
         """
         Clean and format extracted text
@@ -160,12 +267,7 @@ class OCRService:
         if not text:
             return "No text could be extracted from the image."
         
-        # Remove extra whitespace and empty lines
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        cleaned_text = '\n'.join(lines)
-        
-        # Remove excessive whitespace
-        cleaned_text = ' '.join(cleaned_text.split())
+        cleaned_text = normalize_text(text)
         
         if not cleaned_text:
             return "No readable text found in the image."
@@ -205,5 +307,5 @@ class OCRService:
             return False, str(e)
 
 
-# Global OCR service instance
-ocr_service = OCRService()
\ No newline at end of file
+# Global OCR service instance, constructed on first use
+ocr_service = LazyService(OCRService)
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Prompt assembly for Gemini calls
+
+Builds the final prompt from the system prompt, the user's question and any
+context (OCR text, document extracts) while keeping the input inside a token
+budget:
+
+- context passages that repeat each other or the question are dropped
+- when the context is too long, the passages most relevant to the question
+  are kept (in their original order) and the rest are left out
+- the estimated input size of every prompt is recorded in /metrics
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from apna_lawyer.metrics import PROMPT_TOKENS, UPSTREAM_EVENTS
+
+# Gemini tokenizes ASCII text at roughly 4 characters per token; Devanagari
+# and other non-ASCII scripts are much denser
+ASCII_CHARS_PER_TOKEN = 4
+NON_ASCII_CHARS_PER_TOKEN = 1.5
+
+# Passages longer than this are split on sentence boundaries before ranking,
+# and between words where a sentence alone is longer (unpunctuated OCR text)
+MAX_PASSAGE_TOKENS = 200
+# Blank line joining two passages, rounded up
+SEPARATOR_TOKENS = 1
+# A passage that does not fit is cut to the budget left when at least this much is left
+MIN_TRUNCATED_TOKENS = 20
+
+IMAGE_TEXT_MARKER = re.compile(r'\n*\[Image contains text: (.*?)\]\s*$', re.DOTALL)
+_WORD = re.compile(r'[\w\u0900-\u0963\u0966-\u097F]+', re.UNICODE)
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate; errs on the high side for mixed-script text"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    non_ascii_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN + non_ascii_chars / NON_ASCII_CHARS_PER_TOKEN)
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.casefold()) if len(word) > 2]
+
+
+def split_passages(text: str, max_tokens: int = MAX_PASSAGE_TOKENS) -> List[str]:
+    """Split text into paragraphs, breaking long paragraphs into sentence groups"""
+    passages = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            passages.append(paragraph)
+            continue
+
+        current = ''
+        for sentence in _SENTENCE_END.split(paragraph):
+            pieces = split_words(sentence, max_tokens) if estimate_tokens(sentence) > max_tokens else [sentence]
+            for piece in pieces:
+                candidate = f"{current} {piece}".strip()
+                if current and estimate_tokens(candidate) > max_tokens:
+                    passages.append(current)
+                    current = piece
+                else:
+                    current = candidate
+        if current:
+            passages.append(current)
+    return passages
+
+
+def split_words(text: str, max_tokens: int) -> List[str]:
+    """Split text between words into pieces of at most max_tokens (a longer single word stays whole)"""
+    pieces = []
+    words = []
+    ascii_chars = non_ascii_chars = 0
+    for word in text.split():
+        word_ascii = sum(1 for char in word if ord(char) < 128) + 1  # + the joining space
+        word_non_ascii = len(word) + 1 - word_ascii
+        tokens = ((ascii_chars + word_ascii) / ASCII_CHARS_PER_TOKEN
+                  + (non_ascii_chars + word_non_ascii) / NON_ASCII_CHARS_PER_TOKEN)
+        if words and tokens > max_tokens:
+            pieces.append(' '.join(words))
+            words = []
+            ascii_chars = non_ascii_chars = 0
+        words.append(word)
+        ascii_chars += word_ascii
+        non_ascii_chars += word_non_ascii
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
+
+
+def split_image_text_marker(user_message: str) -> Tuple[str, Optional[str]]:
+    """Separate a trailing ``[Image contains text: ...]`` block from the question"""
+    match = IMAGE_TEXT_MARKER.search(user_message)
+    if not match:
+        return user_message, None
+    return user_message[:match.start()].rstrip(), match.group(1)
+
+
+@dataclass
+class Passage:
+    label: str
+    text: str
+    position: int
+    tokens: int
+    score: float = 0.0
+    truncated: bool = False
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    context_tokens: int = 0
+    dropped_passages: int = 0
+    duplicate_passages: int = 0
+    truncated_passages: int = 0
+    sections: List[str] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return self.dropped_passages > 0 or self.truncated_passages > 0
+
+
+class PromptBuilder:
+    """
+    Assemble prompts within a token budget
+
+    Args:
+        max_tokens: Budget for the whole prompt (system + question + context)
+        passage_tokens: Maximum size of one context passage before splitting
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, passage_tokens: int = MAX_PASSAGE_TOKENS):
+        self._max_tokens = max_tokens
+        self.passage_tokens = passage_tokens
+
+    @property
+    def max_tokens(self) -> int:
+        return self._max_tokens or getattr(settings, 'AI_PROMPT_MAX_TOKENS', 6000)
+
+    def build(self, system_prompt: str, user_message: str,
+              context: Sequence[Tuple[str, Optional[str]]] = ()) -> BuiltPrompt:
+        """
+        Build the prompt text
+
+        Args:
+            system_prompt: Instructions for the model
+            user_message: The user's question
+            context: (label, text) pairs, e.g. ('Extracted Text from Image', ocr_text)
+
+        Returns:
+            BuiltPrompt: Prompt text and its size accounting
+        """
+        # OCR text embedded in the question is moved into the context, where it
+        # is deduplicated and budgeted like any other passage
+        user_message, embedded_text = split_image_text_marker(user_message)
+        if embedded_text:
+            context = [('Extracted Text from Image', embedded_text)] + list(context)
+
+        head = f"{system_prompt}\n\nUser Question: {user_message}"
+        head_tokens = estimate_tokens(head)
+
+        passages, duplicates = self._collect_passages(user_message, context)
+        # Section headers ("\n\nLabel: ") count against the budget too
+        header_tokens = sum(estimate_tokens(f"\n\n{label}: ") for label in _ordered_labels(passages))
+        selected = self._select(passages, user_message, self.max_tokens - head_tokens - header_tokens)
+
+        sections = []
+        text = head
+        for label in _ordered_labels(selected):
+            body = '\n\n'.join(p.text for p in selected if p.label == label)
+            sections.append(label)
+            text += f"\n\n{label}: {body}"
+
+        context_tokens = sum(p.tokens for p in selected)
+        built = BuiltPrompt(
+            text=text,
+            tokens=estimate_tokens(text),
+            context_tokens=context_tokens,
+            dropped_passages=len(passages) - len(selected),
+            duplicate_passages=duplicates,
+            truncated_passages=sum(p.truncated for p in selected),
+            sections=sections,
+        )
+        record_prompt_size(built)
+        return built
+
+    def _collect_passages(self, user_message, context):
+        question = _normalize(user_message)
+        seen = set()
+        passages = []
+        duplicates = 0
+        for label, text in context:
+            if not text or not text.strip():
+                continue
+            for chunk in split_passages(text, self.passage_tokens):
+                key = _normalize(chunk)
+                if key in seen or (len(key) > 20 and key in question):
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                passages.append(Passage(label, chunk, len(passages), estimate_tokens(chunk)))
+        return passages, duplicates
+
+    def _select(self, passages: List[Passage], question: str, budget: int) -> List[Passage]:
+        """Keep everything that fits, otherwise the highest-scoring passages"""
+        if budget <= 0 or not passages:
+            return []
+        if sum(p.tokens + SEPARATOR_TOKENS for p in passages) <= budget:
+            return passages
+
+        _score_passages(passages, question)
+        selected = []
+        used = 0
+        truncated = False
+        # Without overlap, earlier passages (headings, parties, dates) win ties
+        for passage in sorted(passages, key=lambda p: (-p.score, p.position)):
+            left = budget - used - SEPARATOR_TOKENS
+            if passage.tokens <= left:
+                selected.append(passage)
+                used += passage.tokens + SEPARATOR_TOKENS
+            elif not truncated and left >= MIN_TRUNCATED_TOKENS:
+                # The best passage that does not fit is cut to the space left, not dropped
+                truncated = passage.truncated = True
+                passage.text = split_words(passage.text, left)[0]
+                passage.tokens = estimate_tokens(passage.text)
+                if passage.tokens <= left:
+                    selected.append(passage)
+                    used += passage.tokens + SEPARATOR_TOKENS
+        return sorted(selected, key=lambda p: p.position)
+
+
+def _score_passages(passages: List[Passage], question: str):
+    """BM25 score of each passage against the question's terms"""
+    k1, b = 1.5, 0.75
+    query_terms = set(_terms(question))
+    passage_terms = [Counter(_terms(p.text)) for p in passages]
+    average_length = sum(sum(terms.values()) for terms in passage_terms) / len(passages) or 1
+    document_frequency = Counter(term for terms in passage_terms for term in terms)
+
+    for passage, terms in zip(passages, passage_terms):
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            frequency = terms.get(term)
+            if not frequency:
+                continue
+            df = document_frequency[term]
+            idf = math.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        passage.score = score
+
+
+def _ordered_labels(passages: List[Passage]) -> List[str]:
+    labels = []
+    for passage in passages:
+        if passage.label not in labels:
+            labels.append(passage.label)
+    return labels
+
+
+def record_prompt_size(built: BuiltPrompt):
+    """Export the prompt's estimated size so input cost is visible per request"""
+    PROMPT_TOKENS.observe(built.tokens, part='total')
+    PROMPT_TOKENS.observe(built.context_tokens, part='context')
+    if built.trimmed:
+        UPSTREAM_EVENTS.inc(dependency='gemini', event='prompt_trimmed')
+    if built.duplicate_passages:
+        UPSTREAM_EVENTS.inc(dependency='gemini', event='context_deduplicated')
+
+
+prompt_builder = PromptBuilder()
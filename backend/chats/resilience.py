@@ -0,0 +1,177 @@
+"""
+Deadlines, retries and hedged requests for upstream AI calls
+
+A Deadline is created when a request enters a view and is passed down to
+the AI client, so every retry, hedge and wait is bounded by the time the
+request has left rather than by fixed per-call timeouts.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is spent"""
+    pass
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def for_request(cls):
+        """Deadline for one API request, kept below the gunicorn worker timeout"""
+        return cls(getattr(settings, 'AI_REQUEST_BUDGET_SECONDS', 25))
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(f"Request budget of {self.budget}s exhausted")
+
+    def timeout(self, cap=None):
+        """Timeout for the next blocking call: the remaining budget, optionally capped"""
+        self.check()
+        remaining = self.remaining()
+        return min(remaining, cap) if cap else remaining
+
+
+class RetryableError(Exception):
+    """Upstream failure worth retrying (throttling, overload, transient network)"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter
+
+    Attempt n (0-based) sleeps uniform(0, min(cap, base * 2**n)) seconds,
+    or the server's Retry-After hint when one is given.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=4.0, min_attempt_time=1.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt_time = min_attempt_time  # Don't start an attempt with less time than this left
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(float(retry_after), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, deadline, on_retry=None):
+        """
+        Call fn() until it succeeds, raises a non-retryable error or the budget runs out
+
+        Raises:
+            DeadlineExceeded: If the budget ran out before a successful attempt
+            RetryableError: If all attempts failed with retryable errors
+        """
+        for attempt in range(self.max_attempts):
+            deadline.check()
+            try:
+                return fn()
+            except RetryableError as e:
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                if deadline.remaining() < delay + self.min_attempt_time:
+                    raise DeadlineExceeded(f"No budget left to retry after: {e}") from e
+                if on_retry is not None:
+                    on_retry(attempt + 1, e)
+                time.sleep(delay)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for percentile-based hedging"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile):
+        """Return the given percentile, or None until enough samples were seen"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='ai-hedge')
+
+
+def _attempt(fn, deadline):
+    """Run one attempt on a pool thread with the budget left when it starts"""
+    return fn(deadline.timeout())
+
+
+def hedged_call(fn, deadline, hedge_after, on_hedge=None):
+    """
+    Call fn(timeout); if it has not answered after hedge_after seconds, race a second call
+
+    The first successful result wins. Losing calls are abandoned and end on
+    their own timeout, which is never longer than the remaining budget. The
+    timeout is taken when an attempt starts, not when it is queued: with the
+    pool busy an attempt may wait, and one that starts after the deadline is
+    not sent at all.
+
+    Args:
+        fn (callable): Performs one upstream attempt; receives the attempt timeout
+        deadline (Deadline): Request deadline
+        hedge_after (float|None): Delay before hedging; None disables hedging
+        on_hedge (callable): Called when the hedge request is sent
+    """
+    pending = {_hedge_executor.submit(_attempt, fn, deadline)}
+    hedged = hedge_after is None
+    last_error = None
+
+    while pending:
+        if not hedged:
+            wait_for = min(hedge_after, deadline.remaining())
+        else:
+            wait_for = deadline.remaining()
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            error = future.exception()
+            if error is None:
+                return future.result()
+            last_error = error
+
+        if deadline.expired:
+            break
+        if not hedged and not done:
+            # Primary is slower than the hedge threshold: race a second request
+            hedged = True
+            if on_hedge is not None:
+                on_hedge()
+            pending.add(_hedge_executor.submit(_attempt, fn, deadline))
+
+    if last_error is not None and not deadline.expired:
+        raise last_error
+    raise DeadlineExceeded("Upstream did not answer within the request budget") from last_error
@@ -0,0 +1,216 @@
+"""
+Single-flight request coalescing for upstream AI calls
+
+Identical prompts that arrive while a Gemini request for the same prompt is
+already in flight wait for that request instead of issuing their own. Inside
+one process duplicates share a Future; across gunicorn workers the leader is
+elected through the InflightRequest lock table and followers poll it for the
+finished result. The leader deletes its row once the result grace period has
+passed; rows left behind by crashed workers are removed by the
+prune_inflight_requests management command.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+
+from apna_lawyer.metrics import record_cache
+
+
+def normalize_prompt(prompt):
+    """
+    Normalize a prompt so trivially different duplicates share a key
+
+    Args:
+        prompt (str): Full prompt text sent upstream
+
+    Returns:
+        str: Case-folded prompt with collapsed whitespace
+    """
+    return ' '.join((prompt or '').split()).casefold()
+
+
+def prompt_key(prompt):
+    """Return the coalescing key (SHA-256 hex digest) for a prompt"""
+    return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single upstream call
+    """
+
+    def __init__(self, use_lock_table=True, lock_ttl=60, result_grace=2.0,
+                 poll_interval=0.1, wait_timeout=35):
+        self.use_lock_table = use_lock_table
+        self.lock_ttl = lock_ttl  # Seconds before an unfinished lock is considered abandoned
+        self.result_grace = result_grace  # Seconds a finished result stays readable for pollers
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {
+            'upstream_calls': 0,
+            'coalesced_local': 0,
+            'coalesced_remote': 0,
+        }
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn() once for all concurrent callers sharing the same key
+
+        Args:
+            key (str): Coalescing key, usually prompt_key(full_prompt)
+            fn (callable): Zero-argument callable performing the upstream call
+            timeout (float): Longest time this caller may wait for another
+                caller's result (defaults to wait_timeout)
+
+        Returns:
+            The value returned by fn(), possibly computed by another caller
+
+        Raises:
+            concurrent.futures.TimeoutError: If the shared result is not ready in time
+        """
+        wait_timeout = self.wait_timeout if timeout is None else min(timeout, self.wait_timeout)
+
+        with self._lock:
+            future = self._flights.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._flights[key] = future
+
+        if not is_leader:
+            self._incr('coalesced_local')
+            record_cache('ai_coalescing', hit=True)
+            return future.result(timeout=wait_timeout)
+
+        try:
+            result = self._run_shared(key, fn, wait_timeout)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def stats(self):
+        """Return coalescing counters for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['saved_calls'] = stats['coalesced_local'] + stats['coalesced_remote']
+        stats['in_flight'] = len(self._flights)
+        stats['pid'] = os.getpid()
+        return stats
+
+    def _incr(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _call_upstream(self, fn):
+        self._incr('upstream_calls')
+        record_cache('ai_coalescing', hit=False)
+        return fn()
+
+    def _run_shared(self, key, fn, wait_timeout):
+        """Elect a leader across workers through the lock table, or wait for one"""
+        if not self.use_lock_table:
+            return self._call_upstream(fn)
+
+        try:
+            from django.db import DatabaseError, IntegrityError, transaction
+            from django.utils import timezone
+            from .models import InflightRequest
+        except Exception:
+            return self._call_upstream(fn)
+
+        deadline = time.monotonic() + wait_timeout
+
+        try:
+            while True:
+                InflightRequest.objects.filter(self.expired(timezone.now()), key=key).delete()
+                try:
+                    with transaction.atomic():
+                        InflightRequest.objects.create(key=key, owner=self.owner)
+                except IntegrityError:
+                    pass
+                else:
+                    break
+
+                # Another worker owns the call; poll for its result
+                while time.monotonic() < deadline:
+                    row = InflightRequest.objects.filter(key=key).values('result', 'completed_at').first()
+                    if row is None:
+                        break  # Leader failed and released the lock; try to take over
+                    if row['completed_at'] is not None:
+                        self._incr('coalesced_remote')
+                        record_cache('ai_coalescing', hit=True)
+                        return row['result']
+                    time.sleep(self.poll_interval)
+                else:
+                    # Leader is too slow; stop waiting and do the call ourselves
+                    return self._call_upstream(fn)
+        except DatabaseError:
+            # Lock table unavailable (e.g. migrations not applied); coalesce in-process only
+            return self._call_upstream(fn)
+
+        try:
+            result = self._call_upstream(fn)
+        except BaseException:
+            self._release(key)
+            raise
+
+        try:
+            InflightRequest.objects.filter(key=key, owner=self.owner).update(
+                result=result, completed_at=timezone.now()
+            )
+        except DatabaseError:
+            self._release(key)
+        else:
+            # Followers only need the row while they poll; drop the answer text afterwards
+            timer = threading.Timer(self.result_grace, self._release_completed, args=(key,))
+            timer.daemon = True
+            timer.start()
+        return result
+
+    def expired(self, now):
+        """Filter for finished rows past the grace period and abandoned locks"""
+        from django.db.models import Q
+
+        return (Q(completed_at__lt=now - timedelta(seconds=self.result_grace))
+                | Q(completed_at__isnull=True, created_at__lt=now - timedelta(seconds=self.lock_ttl)))
+
+    def _release_completed(self, key):
+        """Runs on a timer thread, so closes the connection it opened"""
+        from django.db import connection
+
+        try:
+            self._release(key, completed=True)
+        finally:
+            connection.close()
+
+    def _release(self, key, completed=False):
+        from django.db import DatabaseError
+        from .models import InflightRequest
+
+        rows = InflightRequest.objects.filter(key=key, owner=self.owner)
+        if completed:
+            # A new leader may already hold the key; only our finished row goes
+            rows = rows.filter(completed_at__isnull=False)
+        try:
+            rows.delete()
+        except DatabaseError:
+            pass
+
+
+# Global coalescer shared by all AI service instances in this process
+ai_request_coalescer = SingleFlight()
@@ -0,0 +1,89 @@
+"""
+Offline statute knowledge base
+
+Sections are loaded from the JSON Lines files in STATUTE_CORPUS_DIR (one
+``{"act", "section", "title", "text"}`` object per line, plus optional
+``keywords`` that are indexed but not shown), split into chunks and indexed
+with ChunkIndex. The saved index is keyed by a fingerprint of the corpus
+files, so editing the corpus triggers a rebuild on the next start.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+
+from apna_lawyer.utils import LazyService
+from apna_lawyer.worker_lifecycle import register_warmup
+from .chunk_index import INDEX_VERSION, Chunk, ChunkIndex
+from .prompt_builder import split_passages
+
+
+def load_corpus(corpus_dir, chunk_tokens: int = 200) -> List[Chunk]:
+    """Read every *.jsonl file in corpus_dir and split long sections into chunks"""
+    chunks = []
+    for path in sorted(Path(corpus_dir).glob('*.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                citation = f"{record['act']} - Section {record['section']}: {record['title']}"
+                for passage in split_passages(record['text'], chunk_tokens):
+                    chunks.append(Chunk(citation, passage, record.get('keywords', '')))
+    return chunks
+
+
+def corpus_fingerprint(corpus_dir) -> str:
+    """Hash of corpus file names, sizes and mtimes; changes trigger a rebuild"""
+    digest = hashlib.sha256(f"v{INDEX_VERSION}".encode())
+    for path in sorted(Path(corpus_dir).glob('*.jsonl')):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_statute_index():
+    """Open the index for the configured corpus, building it when the corpus changed"""
+    corpus_dir = getattr(settings, 'STATUTE_CORPUS_DIR', Path(__file__).resolve().parent / 'statutes')
+    index_root = Path(getattr(
+        settings, 'STATUTE_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'apna_lawyer_statute_index')
+    ))
+    directory = index_root / corpus_fingerprint(corpus_dir)
+
+    if not (directory / 'meta.json').exists():
+        chunks = load_corpus(corpus_dir, getattr(settings, 'STATUTE_CHUNK_TOKENS', 200))
+        ChunkIndex.build(chunks).save(directory)
+    return ChunkIndex.load(directory)
+
+
+# Opened once per process; the gunicorn master opens it before forking
+statute_index = LazyService(load_statute_index)
+register_warmup(statute_index.get)
+
+
+def relevant_statutes(query: str, k: Optional[int] = None) -> Optional[str]:
+    """
+    Format the statute sections most relevant to query for the prompt
+
+    Returns:
+        str: One section per paragraph, or None when retrieval is disabled,
+            nothing scores above STATUTE_MIN_SCORE or the index is unavailable
+    """
+    if not getattr(settings, 'STATUTE_RETRIEVAL_ENABLED', True) or not query:
+        return None
+    try:
+        hits = statute_index.search(
+            query,
+            k=k or getattr(settings, 'STATUTE_TOP_K', 3),
+            min_score=getattr(settings, 'STATUTE_MIN_SCORE', 2.0),
+            relative_cutoff=getattr(settings, 'STATUTE_RELATIVE_CUTOFF', 0.5),
+        )
+    except Exception as e:
+        print(f"Statute retrieval failed: {e}")
+        return None
+    return '\n\n'.join(hit.format() for hit in hits) or None
@@ -0,0 +1,221 @@
+"""
+Map-reduce summarization of uploaded documents
+
+A document's stored chunks are grouped into sections, every section is
+summarized concurrently (map) and the partial summaries are merged level by
+level until one summary is left (reduce). Each summary is cached in
+ChunkSummary under a hash of its input text and prompt, so re-summarizing
+an edited document only calls Gemini for the sections that changed.
+
+Section boundaries are content-defined: a section ends after a chunk whose
+hash hits a boundary condition (within size limits), so an edit early in the
+document does not shift every later section.
+
+Jobs run in a background thread of the worker; progress is stored on
+SummaryJob and polled through the job endpoint.
+"""
+
+import hashlib
+import math
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Callable, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .ai_service import gemini_service
+from .models import ChunkSummary, SummaryJob
+from .prompt_builder import estimate_tokens, prompt_builder
+from .resilience import Deadline
+
+SUMMARY_PROMPT_VERSION = 1
+
+SUMMARY_SYSTEM_PROMPT = """You are a legal assistant specializing in Indian law. You summarize legal
+documents such as judgments, contracts and notices accurately and neutrally. Keep parties, dates,
+amounts, cited sections and holdings. Do not add advice or facts that are not in the text."""
+
+SECTION_INSTRUCTION = "Summarize this section of the document in a few concise bullet points."
+MERGE_INSTRUCTION = (
+    "These are summaries of consecutive parts of one document. Merge them into a single coherent "
+    "summary, removing repetition and keeping every key fact, party, date and legal finding."
+)
+
+# A section ends after a chunk whose checksum is divisible by this, once it has MIN tokens
+SECTION_BOUNDARY_DIVISOR = 4
+
+
+def content_hash(instruction: str, text: str) -> str:
+    return hashlib.sha256(f"v{SUMMARY_PROMPT_VERSION}\n{instruction}\n{text}".encode('utf-8')).hexdigest()
+
+
+def split_sections(chunks: Sequence[str], max_tokens: int, min_tokens: Optional[int] = None) -> List[str]:
+    """Group consecutive chunks into sections of at most max_tokens (single oversized chunks excepted)"""
+    min_tokens = min_tokens if min_tokens is not None else max_tokens // 3
+    sections = []
+    current = []
+    size = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk)
+        if current and size + tokens > max_tokens:
+            sections.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(chunk)
+        size += tokens
+        if size >= min_tokens and zlib.crc32(chunk.encode('utf-8')) % SECTION_BOUNDARY_DIVISOR == 0:
+            sections.append('\n\n'.join(current))
+            current, size = [], 0
+    if current:
+        sections.append('\n\n'.join(current))
+    return sections
+
+
+def group_summaries(summaries: Sequence[str], max_tokens: int, fan_in: int) -> List[str]:
+    """Group consecutive summaries for the next merge level; every group but the last has two or more"""
+    groups = []
+    current = []
+    size = 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if len(current) >= 2 and (len(current) >= fan_in or size + tokens > max_tokens):
+            groups.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(summary)
+        size += tokens
+    if current:
+        groups.append('\n\n'.join(current))
+    return groups
+
+
+class Summarizer:
+    """
+    Run the map-reduce over a list of chunk texts
+
+    Args:
+        summarize_fn: Callable (instruction, text) -> summary; must raise on failure
+        max_workers: Concurrent summarize_fn calls
+        section_tokens: Maximum input size of one call
+        fan_in: Maximum summaries merged by one call
+        on_progress: Called with the Summarizer after every finished step
+    """
+
+    def __init__(self, summarize_fn: Callable[[str, str], str], max_workers: int = 4,
+                 section_tokens: int = 3000, fan_in: int = 6, on_progress: Optional[Callable] = None):
+        self.summarize_fn = summarize_fn
+        self.max_workers = max_workers
+        self.section_tokens = section_tokens
+        self.fan_in = fan_in
+        self.on_progress = on_progress
+        self.stage = ''
+        self.total_steps = 0
+        self.completed_steps = 0
+        self.cached_steps = 0
+
+    def estimate_steps(self, sections: int) -> int:
+        steps = sections
+        while sections > 1:
+            sections = math.ceil(sections / self.fan_in)
+            steps += sections
+        return steps
+
+    def summarize(self, chunks: Sequence[str]) -> str:
+        sections = split_sections(chunks, self.section_tokens)
+        if not sections:
+            raise ValueError('Document has no text to summarize')
+        self.total_steps = self.estimate_steps(len(sections))
+
+        self.stage = 'map'
+        level = self._run_level(SECTION_INSTRUCTION, sections)
+        self.stage = 'reduce'
+        while len(level) > 1:
+            level = self._run_level(MERGE_INSTRUCTION, group_summaries(level, self.section_tokens, self.fan_in))
+        self.stage = 'done'
+        return level[0]
+
+    def _run_level(self, instruction: str, texts: List[str]) -> List[str]:
+        keys = [content_hash(instruction, text) for text in texts]
+        cached = dict(ChunkSummary.objects.filter(content_hash__in=set(keys)).values_list('content_hash', 'summary'))
+        results = [cached.get(key) for key in keys]
+
+        hits = sum(result is not None for result in results)
+        self.cached_steps += hits
+        self._advance(hits)
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(missing))),
+                                    thread_name_prefix='summary-chunk') as executor:
+                futures = {executor.submit(self.summarize_fn, instruction, texts[index]): index for index in missing}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    self._advance(1)
+            ChunkSummary.objects.bulk_create(
+                [ChunkSummary(content_hash=keys[index], summary=results[index]) for index in missing],
+                ignore_conflicts=True
+            )
+        return results
+
+    def _advance(self, steps: int):
+        self.completed_steps += steps
+        # The estimate assumes full groups; never report more than 100%
+        self.total_steps = max(self.total_steps, self.completed_steps)
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+
+def gemini_summarize(instruction: str, text: str) -> str:
+    prompt = prompt_builder.build(SUMMARY_SYSTEM_PROMPT, instruction, context=[('Document Text', text)]).text
+    return gemini_service.generate_text(prompt, Deadline(getattr(settings, 'SUMMARY_CALL_BUDGET_SECONDS', 60)))
+
+
+_job_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'SUMMARY_MAX_JOBS', 2),
+                                   thread_name_prefix='summary-job')
+
+
+def start_summary_job(document, user_session_id: str) -> SummaryJob:
+    """Create a job for document and run it in the background"""
+    job = SummaryJob.objects.create(document=document, user_session_id=user_session_id)
+    _job_executor.submit(run_summary_job, job.id)
+    return job
+
+
+def run_summary_job(job_id, summarize_fn: Optional[Callable[[str, str], str]] = None):
+    """Summarize the job's document, recording progress and the result on the job"""
+    jobs = SummaryJob.objects.filter(pk=job_id)
+
+    def save_progress(summarizer):
+        jobs.update(stage=summarizer.stage, total_steps=summarizer.total_steps,
+                    completed_steps=summarizer.completed_steps, cached_steps=summarizer.cached_steps,
+                    updated_at=timezone.now())
+
+    try:
+        job = jobs.select_related('document').get()
+        jobs.update(status='running', updated_at=timezone.now())
+        chunks = list(job.document.chunks.values_list('text', flat=True))
+        summarizer = Summarizer(
+            summarize_fn or gemini_summarize,
+            max_workers=getattr(settings, 'SUMMARY_MAX_CONCURRENCY', 4),
+            section_tokens=getattr(settings, 'SUMMARY_SECTION_TOKENS', 3000),
+            fan_in=getattr(settings, 'SUMMARY_FAN_IN', 6),
+            on_progress=save_progress,
+        )
+        summary = summarizer.summarize(chunks)
+        save_progress(summarizer)
+        jobs.update(status='completed', summary=summary, updated_at=timezone.now())
+    except Exception as e:
+        print(f"Summary job {job_id} failed: {e}")
+        jobs.update(status='failed', error=str(e), updated_at=timezone.now())
+    finally:
+        connections.close_all()
+
+
+def expire_stale_job(job: SummaryJob) -> SummaryJob:
+    """Mark a job failed when its worker stopped updating it (e.g. the worker was recycled)"""
+    stale_after = timedelta(seconds=getattr(settings, 'SUMMARY_JOB_STALE_SECONDS', 300))
+    if job.status in ('pending', 'running') and job.updated_at < timezone.now() - stale_after:
+        job.status = 'failed'
+        job.error = 'Job was interrupted; please start it again'
+        job.save(update_fields=['status', 'error', 'updated_at'])
+    return job
@@ -4,13 +4,22 @@ from . import views
 urlpatterns = [
     path('', views.chatbot, name='chatbot'),
     path('chat/history/', views.chat_history, name='chat_history'),
+    path('chat/search/', views.chat_search, name='chat_search'),
+    path('chat/history/export/', views.ChatHistoryExportAPI.as_view(), name='chat_history_export'),
+    path('chat/<uuid:chat_id>/documents/<str:kind>/', views.ChatDocumentAPI.as_view(), name='chat_document'),
     path('api/', views.ChatbotAPI.as_view(), name='chatbot_api'),
+    path('api/batch/', views.BatchChatAPI.as_view(), name='batch_chat_api'),
     path('extract-text/', views.extract_text_from_image, name='extract_text'),
     path('test-ai/', views.test_ai_service, name='test_ai'),
+    path('ai-stats/', views.ai_coalescing_stats, name='ai_coalescing_stats'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
     path('test-ocr/', views.test_ocr_service, name='test_ocr'),
+    path('documents/<uuid:document_id>/summarize/', views.summarize_document, name='summarize_document'),
+    path('summary-jobs/<uuid:job_id>/', views.summary_job_status, name='summary_job_status'),
     # New image chat endpoints
     path('upload-image/', views.upload_chat_image, name='upload_chat_image'),
     path('chat-with-images/', views.process_chat_with_images, name='chat_with_images'),
+    path('images/<str:image_id>/<str:variant>/', views.ChatImageAPI.as_view(), name='chat_image'),
 ]
 
 
@@ -1,15 +1,36 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from .models import UserChat
-from .ai_service import get_ai_service
+from .ai_service import GeminiAIService, get_ai_service
+from .singleflight import ai_request_coalescer
 from .ocr_service import ocr_service
 from .image_chat_service import image_chat_service
+from .image_derivatives import DERIVATIVES, get_derivative
+from PIL import Image
+from .batch_service import fan_out
+from .batch_ocr import InvalidBatch, collect_pages, read_page
+from .resilience import Deadline
+from .document_service import document_context, get_document, store_document
+from .models import SummaryJob
+from .summarization import expire_stale_job, start_summary_job
+from .history_export import EXPORT_FORMATS, InvalidExportParameter, export_rows, parse_bound, stream_csv, stream_ndjson
+from apna_lawyer.negotiation import FirstRendererNegotiation
+from .chat_search import search_chats
+from apna_lawyer.blob_store import BlobNotFound, blob_response
+from apna_lawyer.cache import shared_cache
+from apna_lawyer.uploads import upload_rejection
 import requests
 import json
+import mimetypes
+import uuid
 
 def chatbot(request):
     return render(request, 'chatbot.html')
@@ -18,37 +39,53 @@ class ChatbotAPI(APIView):
     permission_classes = [AllowAny]  # Allow both authenticated and anonymous users
     
     def post(self, request):
+        deadline = Deadline.for_request()
         try:
             user_message = request.data.get('message', '')
             image_data = request.data.get('image')  # Base64 encoded image
             system_prompt = request.data.get('system_prompt')  # Optional custom system prompt
+            document_id = request.data.get('document_id')  # Optional document from extract_document_api
             
             # Validate input - require a message (image is optional)
             if not user_message:
                 return Response({'error': 'Message is required'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
+            # Only the parts of the document relevant to this question are sent
+            excerpts = None
+            if document_id:
+                document = get_document(document_id, image_chat_service.get_user_session_id(request))
+                if document is None:
+                    return Response({'error': 'Document not found'}, 
+                                  status=status.HTTP_404_NOT_FOUND)
+                excerpts = document_context(document, user_message)
+            
             extracted_text = None
+            stored_message = user_message
             
             # Only process image if user sends a message WITH an image (like ChatGPT/Claude)
             if image_data and user_message:
                 try:
                     extracted_text = ocr_service.extract_text_from_base64(image_data)
                     
-                    # Enhance the user message with extracted text context
+                    # Keep the extracted text with the saved chat; the prompt gets it
+                    # once, through image_text
                     if extracted_text.strip():
-                        user_message = f"{user_message}\n\n[Image contains text: {extracted_text}]"
+                        stored_message = f"{user_message}\n\n[Image contains text: {extracted_text}]"
                     
                 except Exception as e:
                     return Response({'error': f'Image processing failed: {str(e)}'}, 
                                   status=status.HTTP_400_BAD_REQUEST)
             
-            # Get AI service and generate response
-            ai_service = get_ai_service()
+            # Get AI service and generate response; plain questions may be
+            # answered by the offline FAQ
+            ai_service = get_ai_service(None if image_data or document_id else user_message, system_prompt)
             bot_response = ai_service.generate_legal_response(
                 user_message=user_message,
                 system_prompt=system_prompt,
-                image_text=extracted_text
+                image_text=extracted_text,
+                document_context=excerpts,
+                deadline=deadline
             )
             
             # Only save chat to database if user is authenticated
@@ -56,7 +93,7 @@ class ChatbotAPI(APIView):
             if request.user.is_authenticated:
                 chat = UserChat.objects.create(
                     user=request.user,
-                    user_text_input=user_message,
+                    user_text_input=stored_message,
                     ai_text_output=bot_response
                 )
                 chat_id = str(chat.id)
@@ -68,6 +105,9 @@ class ChatbotAPI(APIView):
                 'is_anonymous': not request.user.is_authenticated
             }
             
+            if document_id:
+                response_data['document_id'] = str(document.id)
+            
             # Include extracted text in response if image was processed
             if extracted_text:
                 response_data['extracted_text'] = extracted_text
@@ -80,6 +120,193 @@ class ChatbotAPI(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class BatchChatAPI(APIView):
+    """
+    Answer a list of questions concurrently and stream results as NDJSON
+
+    Expected payload:
+    {
+        "messages": ["What is Section 420 IPC?", "How do I file an FIR?"],
+        "system_prompt": "optional"
+    }
+
+    Each line of the response is a JSON object: one ``{"type": "result", ...}``
+    per message in completion order, then a final ``{"type": "summary", ...}``.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        deadline = Deadline.for_request()
+        messages = request.data.get('messages')
+        system_prompt = request.data.get('system_prompt')
+        max_items = getattr(settings, 'BATCH_CHAT_MAX_ITEMS', 30)
+
+        if not isinstance(messages, list) or not messages:
+            return Response({'error': 'messages must be a non-empty list'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if len(messages) > max_items:
+            return Response({'error': f'A batch can contain at most {max_items} messages'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        messages = [str(message).strip() if message is not None else '' for message in messages]
+        user = request.user if request.user.is_authenticated else None
+
+        response = StreamingHttpResponse(
+            self._stream_results(messages, system_prompt, user, deadline),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'  # Let proxies flush each line
+        return response
+
+    def _stream_results(self, messages, system_prompt, user, deadline):
+        pending_chats = []
+        failed = 0
+
+        def answer(message):
+            if not message:
+                raise ValueError('Message is required')
+            ai_service = get_ai_service(message, system_prompt)
+            if isinstance(ai_service, GeminiAIService):
+                # generate_text raises where generate_legal_response would answer with a
+                # fallback or error text, so the item reports a failure and is not saved
+                return ai_service.generate_text(ai_service.build_prompt(message, system_prompt), deadline)
+            return ai_service.generate_legal_response(
+                user_message=message, system_prompt=system_prompt, deadline=deadline
+            )
+
+        for item in fan_out(messages, answer, getattr(settings, 'BATCH_CHAT_MAX_WORKERS', 8)):
+            result = {'type': 'result', 'index': item.index, 'success': item.ok}
+            if item.ok:
+                result['response'] = item.response
+                if user is not None:
+                    # Ids are assigned up front so results can stream before the bulk insert
+                    chat = UserChat(id=uuid.uuid4(), user=user,
+                                    user_text_input=item.message, ai_text_output=item.response)
+                    pending_chats.append(chat)
+                    result['chat_id'] = str(chat.id)
+            else:
+                failed += 1
+                result['error'] = item.error
+            yield json.dumps(result) + '\n'
+
+        summary = {
+            'type': 'summary',
+            'total': len(messages),
+            'succeeded': len(messages) - failed,
+            'failed': failed,
+            'saved': 0,
+            'is_anonymous': user is None,
+        }
+        if pending_chats:
+            try:
+                UserChat.objects.bulk_create(pending_chats)
+                summary['saved'] = len(pending_chats)
+            except Exception as e:
+                summary['error'] = f'Failed to save chats: {str(e)}'
+        yield json.dumps(summary) + '\n'
+
+class OCRBatchAPI(APIView):
+    """
+    OCR many images (or the pages of a multi-page TIFF) and stream the text as NDJSON
+
+    Expected multipart payload:
+        images: one or more image files, in page order
+        message: optional question; when given, the text of all pages goes to
+            the chat pipeline with it, as for an image sent with a chat message
+        system_prompt: optional, with message
+
+    Pages are OCR'd concurrently and streamed in page order: one
+    ``{"type": "page", ...}`` line per page, a ``{"type": "chat", ...}`` line
+    when a message was sent, then a final ``{"type": "summary", ...}``.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        uploads = request.FILES.getlist('images')
+        if not uploads or upload_rejection(request, 'images') is not None:
+            return missing_upload_response(request, 'images', 'At least one image is required')
+        try:
+            pages = collect_pages(uploads, getattr(settings, 'OCR_BATCH_MAX_PAGES', 30))
+        except InvalidBatch as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        message = str(request.data.get('message') or '').strip()
+        system_prompt = request.data.get('system_prompt')
+        user = request.user if request.user.is_authenticated else None
+
+        response = StreamingHttpResponse(
+            self._stream_results(pages, message, system_prompt, user),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'  # Let proxies flush each line
+        return response
+
+    def _stream_results(self, pages, message, system_prompt, user):
+        texts = []
+        failed = 0
+
+        for item in fan_out(pages, read_page, getattr(settings, 'OCR_BATCH_WORKERS', 4), ordered=True):
+            page = item.message
+            result = {'type': 'page', 'page': page.number, 'file_name': page.file_name,
+                      'frame': page.frame, 'success': item.ok}
+            if item.ok:
+                result['extracted_text'] = item.response
+                if item.response:
+                    texts.append(f"Page {page.number}: {item.response}")
+            else:
+                failed += 1
+                result['error'] = item.error
+            yield json.dumps(result) + '\n'
+
+        if message:
+            yield json.dumps(self._chat(message, system_prompt, '\n\n'.join(texts), user)) + '\n'
+
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(pages),
+            'succeeded': len(pages) - failed,
+            'failed': failed,
+            'is_anonymous': user is None,
+        }) + '\n'
+
+    def _chat(self, message, system_prompt, extracted_text, user):
+        """
+        Answer message with the text of all pages, as ChatbotAPI does for one image
+
+        The AI budget starts here: OCR of a large batch may take longer than
+        AI_REQUEST_BUDGET_SECONDS on its own, and must not leave the model
+        call with no time left.
+        """
+        result = {'type': 'chat', 'success': False, 'chat_id': None}
+        if not extracted_text:
+            result['error'] = 'No text could be extracted from the images.'
+            return result
+        try:
+            ai_service = get_ai_service(None)
+            deadline = Deadline.for_request()
+            if isinstance(ai_service, GeminiAIService):
+                # As in BatchChatAPI: a failed call is reported and not saved as an answer
+                prompt = ai_service.build_prompt(message, system_prompt, image_text=extracted_text)
+                bot_response = ai_service.generate_text(prompt, deadline)
+            else:
+                bot_response = ai_service.generate_legal_response(
+                    user_message=message,
+                    system_prompt=system_prompt,
+                    image_text=extracted_text,
+                    deadline=deadline
+                )
+            if user is not None:
+                chat = UserChat.objects.create(
+                    user=user,
+                    user_text_input=f"{message}\n\n[Image contains text: {extracted_text}]",
+                    ai_text_output=bot_response
+                )
+                result['chat_id'] = str(chat.id)
+            result.update(success=True, response=bot_response)
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_history(request):
@@ -103,6 +330,153 @@ def chat_history(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_search(request):
+    """
+    Search the user's chats; snippets are HTML-escaped with matches in <mark>
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Query parameter q is required'}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        max_results = getattr(settings, 'CHAT_SEARCH_MAX_RESULTS', 50)
+        limit = max(1, min(int(request.query_params.get('limit', 20)), max_results))
+        offset = max(0, int(request.query_params.get('offset', 0)))
+    except ValueError:
+        return Response({'error': 'limit and offset must be integers'}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    # One extra row tells whether there is another page
+    hits = search_chats(request.user, query, limit=limit + 1, offset=offset)
+    
+    return Response({
+        'query': query,
+        'results': [{
+            'id': hit.id,
+            'user_message': hit.user_message,
+            'ai_response': hit.ai_response,
+            'timestamp': hit.timestamp,
+            'score': round(hit.score, 4)
+        } for hit in hits[:limit]],
+        'has_more': len(hits) > limit
+    }, status=status.HTTP_200_OK)
+
+
+# URL name of each document kind -> UserChat column holding its blob reference
+CHAT_DOCUMENT_FIELDS = {
+    'submission': 'user_document_submission',
+    'response': 'chatbot_document',
+}
+
+class ChatDocumentAPI(APIView):
+    """
+    Download a document attached to one of the user's chats (supports Range)
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, chat_id, kind):
+        field = CHAT_DOCUMENT_FIELDS.get(kind)
+        if field is None:
+            return Response({'error': 'Unknown document'}, status=status.HTTP_404_NOT_FOUND)
+        
+        ref = UserChat.objects.filter(pk=chat_id, user=request.user).values_list(field, flat=True).first()
+        if not ref:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            return blob_response(request, ref, filename=f"chat-{chat_id}-{kind}")
+        except BlobNotFound:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+class ChatImageAPI(APIView):
+    """
+    Serve one of the session's uploaded images, or its thumb, preview or ocr derivative
+    
+    Image ids are never reused, so responses are cacheable for a year.
+    """
+    permission_classes = [AllowAny]
+    content_negotiation_class = FirstRendererNegotiation
+    cache_control = 'private, max-age=31536000, immutable'
+
+    def get(self, request, image_id, variant):
+        if variant != 'original' and variant not in DERIVATIVES:
+            return Response({'error': 'Unknown image variant'}, status=status.HTTP_404_NOT_FOUND)
+        
+        user_session_id = image_chat_service.get_user_session_id(request)
+        file_path = image_chat_service.find_image_path(user_session_id, image_id)
+        if file_path is None:
+            return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        etag = f'"{image_id}-{variant}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                path = file_path if variant == 'original' else get_derivative(file_path, variant)
+                handle = default_storage.open(path, 'rb')
+            except FileNotFoundError:
+                return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                # The upload is not a decodable image (UnidentifiedImageError is an OSError)
+                print(f"Image derivative {variant} of {file_path} failed: {e}")
+                return Response({'error': 'Image cannot be displayed'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            response = FileResponse(handle, content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        return response
+
+def image_urls(image_id):
+    """URLs of an uploaded chat image's thumbnail and preview"""
+    return {
+        'thumbnail_url': reverse('chat_image', args=[image_id, 'thumb']),
+        'preview_url': reverse('chat_image', args=[image_id, 'preview']),
+    }
+
+class ChatHistoryExportAPI(APIView):
+    """
+    Stream the user's full chat history as NDJSON or CSV
+
+    Query parameters: ``format`` (ndjson or csv), ``since``/``until`` (ISO
+    date or datetime; ``until`` dates are inclusive) and ``cursor`` (from the
+    last row received, to resume an interrupted export).
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request):
+        export_format = request.query_params.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': 'format must be ndjson or csv'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            rows = export_rows(
+                request.user,
+                since=parse_bound(request.query_params.get('since')),
+                until=parse_bound(request.query_params.get('until'), end_of_day=True),
+                cursor=request.query_params.get('cursor'),
+            )
+            # Validate the cursor before the response starts streaming
+            first = next(rows, None)
+        except InvalidExportParameter as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        def all_rows():
+            if first is not None:
+                yield first
+                yield from rows
+        
+        content_type, extension = EXPORT_FORMATS[export_format]
+        stream = stream_ndjson(all_rows()) if export_format == 'ndjson' else stream_csv(all_rows())
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="chat-history.{extension}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])  # Allow anonymous access
 def extract_text_from_image(request):
@@ -145,6 +519,20 @@ def test_ai_service(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def ai_coalescing_stats(request):
+    """
+    Report how many upstream AI calls this worker saved through request coalescing
+    """
+    return Response(ai_request_coalescer.stats(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    Report this worker's shared cache hits and misses per namespace
+    """
+    return Response(shared_cache.stats(), status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 def test_ocr_service(request):
     """
@@ -173,30 +561,44 @@ def test_ocr_service(request):
             'status': 'ERROR'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def missing_upload_response(request, field_name, message):
+    """Error response for a missing file field; 413/415 when the upload handler dropped it"""
+    rejection = upload_rejection(request, field_name)
+    if rejection is not None:
+        return Response({'error': rejection.message}, status=rejection.status_code)
+    return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])  # Allow anonymous access
 def ocr_image_api(request):
     """
     API endpoint to extract text from uploaded image files
+    
+    With layout=true the response also carries the text blocks in reading
+    order with bounding boxes and per-block confidence.
     """
     try:
         if 'image' not in request.FILES:
-            return Response({'error': 'Image file is required'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
+            return missing_upload_response(request, 'image', 'Image file is required')
         
         image_file = request.FILES['image']
         
-        # Validate file type
+        # Validate file type (sniffed from the file content by the upload handler)
         if not image_file.content_type.startswith('image/'):
             return Response({'error': 'File must be an image'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Convert to base64 for OCR processing
-        import base64
-        image_data = base64.b64encode(image_file.read()).decode('utf-8')
+        # Text blocks with bounding boxes and confidence on request
+        if str(request.data.get('layout', '')).lower() in ('1', 'true', 'yes'):
+            layout = ocr_service.extract_layout_from_upload(image_file)
+            return Response({
+                'extracted_text': layout['text'],
+                'layout': layout,
+                'success': True
+            }, status=status.HTTP_200_OK)
         
-        # Extract text from image
-        extracted_text = ocr_service.extract_text_from_base64(image_data)
+        # Extract text from the image streamed to disk
+        extracted_text = ocr_service.extract_text_from_upload(image_file)
         
         return Response({
             'extracted_text': extracted_text,
@@ -214,8 +616,7 @@ def extract_document_api(request):
     """
     try:
         if 'file' not in request.FILES:
-            return Response({'error': 'File is required'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
+            return missing_upload_response(request, 'file', 'File is required')
         
         uploaded_file = request.FILES['file']
         
@@ -229,18 +630,20 @@ def extract_document_api(request):
         
         # Extract text based on file type
         extracted_text = ""
+        pages = []
         
         if uploaded_file.content_type == 'application/pdf':
             # Handle PDF files
             try:
                 import PyPDF2
-                import io
                 
-                pdf_file = io.BytesIO(uploaded_file.read())
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
+                # Read from the temporary file instead of copying it into memory
+                pdf_reader = PyPDF2.PdfReader(uploaded_file)
                 
                 for page in pdf_reader.pages:
-                    extracted_text += page.extract_text() + "\n"
+                    page_text = page.extract_text()
+                    pages.append(page_text)
+                    extracted_text += page_text + "\n"
                     
             except ImportError:
                 return Response({'error': 'PDF processing not available. PyPDF2 not installed.'}, 
@@ -251,13 +654,12 @@ def extract_document_api(request):
             # Handle DOC/DOCX files
             try:
                 import docx
-                import io
                 
-                doc_file = io.BytesIO(uploaded_file.read())
-                doc = docx.Document(doc_file)
+                doc = docx.Document(uploaded_file)
                 
                 for paragraph in doc.paragraphs:
                     extracted_text += paragraph.text + "\n"
+                pages.append('\n\n'.join(paragraph.text for paragraph in doc.paragraphs))
                     
             except ImportError:
                 return Response({'error': 'Document processing not available. python-docx not installed.'}, 
@@ -267,14 +669,82 @@ def extract_document_api(request):
             return Response({'error': 'No text could be extracted from the document'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
+        # Keep the document as indexed chunks; follow-up questions send its
+        # document_id to ChatbotAPI instead of the full text
+        document = store_document(
+            image_chat_service.get_user_session_id(request), request.user,
+            uploaded_file.name, uploaded_file.content_type, pages
+        )
+        
         return Response({
             'extracted_text': extracted_text.strip(),
+            'document_id': str(document.id),
+            'chunk_count': document.chunk_count,
             'success': True
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def summarize_document(request, document_id):
+    """
+    Start a background map-reduce summary of an uploaded document
+    
+    Returns 202 with the job id; poll summary_job_status for progress and the result.
+    """
+    try:
+        user_session_id = image_chat_service.get_user_session_id(request)
+        document = get_document(document_id, user_session_id)
+        if document is None:
+            return Response({'error': 'Document not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        
+        job = start_summary_job(document, user_session_id)
+        
+        return Response({
+            'job_id': str(job.id),
+            'document_id': str(document.id),
+            'status': job.status,
+            'status_url': request.build_absolute_uri(reverse('summary_job_status', args=[job.id]))
+        }, status=status.HTTP_202_ACCEPTED)
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def summary_job_status(request, job_id):
+    """
+    Progress and result of a summary job
+    """
+    job = SummaryJob.objects.filter(
+        id=job_id, user_session_id=image_chat_service.get_user_session_id(request)
+    ).first()
+    if job is None:
+        return Response({'error': 'Summary job not found'}, 
+                      status=status.HTTP_404_NOT_FOUND)
+    
+    job = expire_stale_job(job)
+    percent = round(100 * job.completed_steps / job.total_steps) if job.total_steps else 0
+    
+    return Response({
+        'job_id': str(job.id),
+        'document_id': str(job.document_id),
+        'status': job.status,
+        'stage': job.stage,
+        'progress': {
+            'completed_steps': job.completed_steps,
+            'total_steps': job.total_steps,
+            'cached_steps': job.cached_steps,
+            'percent': 100 if job.status == 'completed' else percent,
+        },
+        'summary': job.summary,
+        'error': job.error,
+        'updated_at': job.updated_at
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def upload_chat_image(request):
@@ -283,8 +753,7 @@ def upload_chat_image(request):
     """
     try:
         if 'image' not in request.FILES:
-            return Response({'error': 'Image file is required'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
+            return missing_upload_response(request, 'image', 'Image file is required')
         
         image_file = request.FILES['image']
         
@@ -300,7 +769,7 @@ def upload_chat_image(request):
         result = image_chat_service.store_image(image_file, user_session_id)
         
         if result['success']:
-            return Response(result, status=status.HTTP_200_OK)
+            return Response({**result, **image_urls(result['image_id'])}, status=status.HTTP_200_OK)
         else:
             return Response({'error': result['error']}, 
                           status=status.HTTP_400_BAD_REQUEST)
@@ -314,6 +783,7 @@ def process_chat_with_images(request):
     """
     Process chat message with potential OCR requests
     """
+    deadline = Deadline.for_request()
     try:
         message = request.data.get('message', '')
         
@@ -341,13 +811,14 @@ def process_chat_with_images(request):
             return Response({
                 'response': result['message'],
                 'images': result['images'],
+                'thumbnails': [image_urls(image_id)['thumbnail_url'] for image_id in result['image_ids']],
                 'type': 'image_list'
             }, status=status.HTTP_200_OK)
         
         # For regular chat messages, use AI service
         else:
-            ai_service = get_ai_service()
-            bot_response = ai_service.generate_legal_response(user_message=message)
+            ai_service = get_ai_service(message)
+            bot_response = ai_service.generate_legal_response(user_message=message, deadline=deadline)
             
             # Save chat if user is authenticated
             chat_id = None
@@ -1,15 +1,25 @@
-from supabase import create_client
 import os
 from dotenv import load_dotenv
+from apna_lawyer.metrics import instrument_supabase_client
+from apna_lawyer.utils import LazyService
 
 # Load environment variables
 load_dotenv()
 
-# Get environment variables
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('SUPABASE_KEY')
 
-if not supabase_url or not supabase_key:
-    raise Exception("Missing Supabase credentials. Make sure SUPABASE_URL and SUPABASE_KEY are set in .env file")
+def create_supabase_client():
+    """Build the shared Supabase client; raises if credentials are missing"""
+    from supabase import create_client
 
-supabase = create_client(supabase_url, supabase_key)
\ No newline at end of file
+    # Get environment variables
+    supabase_url = os.getenv('SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_KEY')
+
+    if not supabase_url or not supabase_key:
+        raise Exception("Missing Supabase credentials. Make sure SUPABASE_URL and SUPABASE_KEY are set in .env file")
+
+    return instrument_supabase_client(create_client(supabase_url, supabase_key))
+
+
+# Shared client, created on first query so missing credentials only fail the requests that need Supabase
+supabase = LazyService(create_supabase_client)
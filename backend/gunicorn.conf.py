@@ -1,19 +1,24 @@
 # Gunicorn configuration for memory-optimized deployment
 import os
+from apna_lawyer import worker_lifecycle
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
 backlog = 2048
 
-# Worker processes
-workers = 1  # Single worker to minimize memory usage
-worker_class = "sync"
+# Worker processes sized from available memory (see apna_lawyer/worker_lifecycle.py)
+worker_plan = worker_lifecycle.plan_workers()
+workers = worker_plan['workers']
+threads = worker_plan['threads']
+worker_class = worker_plan['worker_class']
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 
 # Memory management
-max_requests = 1000  # Restart worker after 1000 requests to prevent memory leaks
+# Workers are recycled when their RSS crosses worker_plan['rss_budget_mb'] (see post_request);
+# request-count recycling stays available as an opt-in safety net
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
 max_requests_jitter = 50
 preload_app = True  # Load app before forking workers
 
@@ -26,8 +31,25 @@ loglevel = "info"
 proc_name = "apna_lawyer"
 
 # Memory optimization
+def on_starting(server):
+    # Start each deployment with an empty multi-process metrics directory
+    from apna_lawyer.metrics import registry
+    registry.reset_directory()
+
+def child_exit(server, worker):
+    # Keep the exited worker's counters in the /metrics archive
+    from apna_lawyer.metrics import registry
+    registry.mark_process_dead(worker.pid)
+
 def when_ready(server):
-    server.log.info("Server is ready. Spawning workers")
+    # Load shared read-only data once in the master, then freeze it so forked
+    # workers share those pages copy-on-write
+    worker_lifecycle.warm_shared_data(log=server.log.warning)
+    frozen = worker_lifecycle.freeze_preloaded_heap()
+    server.log.info(
+        "Server is ready. Spawning %s workers x %s threads (memory limit %s MB, RSS budget %s MB, %s objects frozen)",
+        workers, threads, worker_plan['memory_limit_mb'], worker_plan['rss_budget_mb'], frozen
+    )
 
 def worker_int(worker):
     worker.log.info("worker received INT or QUIT signal")
@@ -37,6 +59,8 @@ def pre_fork(server, worker):
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
-    # Force garbage collection after fork
-    import gc
-    gc.collect()
\ No newline at end of file
+    # No gc.collect() here: collecting in the child touches every object and
+    # defeats copy-on-write sharing of the frozen preloaded heap
+
+def post_request(worker, req, environ, resp):
+    worker_lifecycle.check_worker_memory(worker, worker_plan['rss_budget_mb'])
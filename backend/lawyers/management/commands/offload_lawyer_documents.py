@@ -0,0 +1,41 @@
+"""
+Management command to move lawyer documents stored inline in Supabase to
+the blob store, leaving only references in the lawyers table.
+
+Local Django rows are converted by migration 0002; this handles the
+Supabase table the API reads from.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apna_lawyer.blob_store import offload_value
+from db.supabase_client import supabase
+from lawyers.views import DOCUMENT_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Move inline lawyer documents in Supabase to the blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        columns = ','.join(['id', *DOCUMENT_FIELDS.values()])
+        batch_size = options['batch_size']
+        start = 0
+        moved = 0
+        while True:
+            rows = supabase.table('lawyers').select(columns).order('id').range(
+                start, start + batch_size - 1).execute().data
+            for row in rows:
+                # Text that only looks like a reference is moved like any other content
+                updates = {field: offload_value(row[field], verify_refs=True) for field in DOCUMENT_FIELDS.values()
+                           if row.get(field)}
+                updates = {field: ref for field, ref in updates.items() if ref != row[field]}
+                if updates:
+                    supabase.table('lawyers').update(updates).eq('id', row['id']).execute()
+                    moved += len(updates)
+            if len(rows) < batch_size:
+                break
+            start += batch_size
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} documents to the blob store"))
@@ -0,0 +1,29 @@
+# Moves inline lawyer documents to the blob store (apna_lawyer/blob_store.py)
+
+from django.db import migrations
+
+from apna_lawyer.blob_store import convert_columns, offload_value, restore_value
+
+DOCUMENT_FIELDS = ['specialization_document', 'education_document']
+
+
+def offload_documents(apps, schema_editor):
+    Lawyer = apps.get_model('lawyers', 'Lawyer')
+    convert_columns(Lawyer.objects.using(schema_editor.connection.alias), DOCUMENT_FIELDS, offload_value)
+
+
+def restore_documents(apps, schema_editor):
+    Lawyer = apps.get_model('lawyers', 'Lawyer')
+    convert_columns(Lawyer.objects.using(schema_editor.connection.alias), DOCUMENT_FIELDS, restore_value)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('lawyers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(offload_documents, restore_documents),
+    ]
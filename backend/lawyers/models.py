@@ -12,6 +12,7 @@ class Lawyer(models.Model):
     primary_practice_area = models.TextField(null=True, blank=True)
     practice_location = models.TextField(null=True, blank=True)
     working_court = models.TextField(null=True, blank=True)
+    # Blob store references (apna_lawyer/blob_store.py), not document content
     specialization_document = models.TextField(null=True, blank=True)
     education_document = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -10,4 +10,5 @@ urlpatterns = [
     path('api/lawyers/', views.lawyer_list, name='lawyer-list'),
     path('api/lawyers/create/', views.create_lawyer, name='lawyer-create'),
     path('api/lawyers/sync-to-supabase/', views.sync_lawyer_to_supabase, name='lawyer-sync-supabase'),
+    path('api/lawyers/<str:pk>/documents/<str:kind>/', views.LawyerDocumentAPI.as_view(), name='lawyer-document'),
 ]
\ No newline at end of file
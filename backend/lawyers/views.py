@@ -1,15 +1,61 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from rest_framework.views import APIView
+from django.conf import settings
 from .models import Lawyer
 from .serializers import LawyerSerializer
 from db.supabase_client import supabase
+from apna_lawyer.blob_store import (
+    BlobNotFound, MemoryBlobStore, blob_response, blob_store, decode_value, is_blob_ref, offload_value,
+)
+from apna_lawyer.cache import shared_cache
+from apna_lawyer.negotiation import FirstRendererNegotiation
+from apna_lawyer.uploads import upload_rejection
 import requests
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Document columns hold blob store references; lists leave them out entirely
+DOCUMENT_FIELDS = {
+    'specialization': 'specialization_document',
+    'education': 'education_document',
+}
+LIST_COLUMNS = ','.join(
+    field.name for field in Lawyer._meta.fields if field.name not in DOCUMENT_FIELDS.values()
+)
+
+def with_document_refs(request):
+    """Request data with uploaded or inline documents replaced by blob store references"""
+    data = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+    for field in DOCUMENT_FIELDS.values():
+        upload = request.FILES.get(field)
+        rejection = upload_rejection(request, field)
+        if rejection is not None:
+            raise rejection
+        if upload is not None:
+            data[field] = blob_store.put(upload, upload.content_type).ref
+        elif isinstance(data.get(field), str):
+            # Clients may send back a reference they were given, but only one to a stored blob
+            data[field] = offload_value(data[field], verify_refs=True)
+    return data
+
+def cached_lawyers(key, fetch):
+    """Rows from a Supabase read, served from the shared cache for LAWYER_CACHE_TTL seconds"""
+    ttl = getattr(settings, 'LAWYER_CACHE_TTL', 60)
+    if ttl <= 0:
+        return fetch()
+    return shared_cache.get_or_set('lawyers', key, fetch, ttl)
+
+def list_lawyers():
+    return cached_lawyers('list', lambda: supabase.table('lawyers').select(LIST_COLUMNS).execute().data)
+
+def invalidate_lawyers():
+    """Drop cached lawyer reads after a write"""
+    shared_cache.clear('lawyers')
+
 class LawyerViewSet(viewsets.ViewSet):
     """
     ViewSet that works directly with Supabase instead of Django ORM
@@ -18,16 +64,16 @@ class LawyerViewSet(viewsets.ViewSet):
     def list(self, request):
         """List all lawyers from Supabase"""
         try:
-            response = supabase.table('lawyers').select("*").execute()
-            return Response(response.data)
+            return Response(list_lawyers())
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     def create(self, request):
         """Create a new lawyer in Supabase"""
         try:
-            data = request.data
+            data = with_document_refs(request)
             response = supabase.table('lawyers').insert(data).execute()
+            invalidate_lawyers()
             if response.data:
                 return Response(response.data[0], status=status.HTTP_201_CREATED)
             else:
@@ -38,9 +84,9 @@ class LawyerViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """Get a specific lawyer from Supabase"""
         try:
-            response = supabase.table('lawyers').select("*").eq('id', pk).execute()
-            if response.data:
-                return Response(response.data[0])
+            rows = cached_lawyers(f"id:{pk}", lambda: supabase.table('lawyers').select("*").eq('id', pk).execute().data)
+            if rows:
+                return Response(rows[0])
             else:
                 return Response({'error': 'Lawyer not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -49,8 +95,9 @@ class LawyerViewSet(viewsets.ViewSet):
     def update(self, request, pk=None):
         """Update a lawyer in Supabase"""
         try:
-            data = request.data
+            data = with_document_refs(request)
             response = supabase.table('lawyers').update(data).eq('id', pk).execute()
+            invalidate_lawyers()
             if response.data:
                 return Response(response.data[0])
             else:
@@ -61,8 +108,9 @@ class LawyerViewSet(viewsets.ViewSet):
     def partial_update(self, request, pk=None):
         """Partially update a lawyer in Supabase"""
         try:
-            data = request.data
+            data = with_document_refs(request)
             response = supabase.table('lawyers').update(data).eq('id', pk).execute()
+            invalidate_lawyers()
             if response.data:
                 return Response(response.data[0])
             else:
@@ -74,6 +122,7 @@ class LawyerViewSet(viewsets.ViewSet):
         """Delete a lawyer from Supabase"""
         try:
             response = supabase.table('lawyers').delete().eq('id', pk).execute()
+            invalidate_lawyers()
             return Response({'message': 'Lawyer deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -82,8 +131,7 @@ class LawyerViewSet(viewsets.ViewSet):
 def lawyer_list(request):
     """Get lawyers directly from Supabase"""
     try:
-        response = supabase.table('lawyers').select("*").execute()
-        return Response(response.data)
+        return Response(list_lawyers())
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
@@ -91,8 +139,9 @@ def lawyer_list(request):
 def create_lawyer(request):
     """Create lawyer directly in Supabase"""
     try:
-        data = request.data
+        data = with_document_refs(request)
         response = supabase.table('lawyers').insert(data).execute()
+        invalidate_lawyers()
         if response.data:
             return Response(response.data[0], status=status.HTTP_201_CREATED)
         else:
@@ -105,14 +154,39 @@ def sync_lawyer_to_supabase(request):
     """Sync lawyer data to Supabase"""
     try:
         # Convert UUID to string for Supabase
-        data = request.data.copy()
+        data = with_document_refs(request)
         if 'id' in data:
             data['id'] = str(data['id'])
         
         response = supabase.table('lawyers').insert(data).execute()
+        invalidate_lawyers()
         return Response({
             'message': 'Lawyer synced to Supabase successfully',
             'supabase_data': response.data
         }, status=status.HTTP_201_CREATED)
     except Exception as e:
-        return Response({'error': str(e)}, status=400)
\ No newline at end of file
+        return Response({'error': str(e)}, status=400)
+
+class LawyerDocumentAPI(APIView):
+    """Download a lawyer's specialization or education document (supports Range)"""
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, pk, kind):
+        field = DOCUMENT_FIELDS.get(kind)
+        if field is None:
+            return Response({'error': 'Unknown document'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            response = supabase.table('lawyers').select(field).eq('id', pk).execute()
+            value = response.data[0].get(field) if response.data else None
+            if not value:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            if is_blob_ref(value):
+                return blob_response(request, value, filename=f"{kind}-document")
+            # Rows written before documents moved to the blob store still hold the content;
+            # it is served from memory, not written to the store on every download
+            store = MemoryBlobStore()
+            return blob_response(request, store.put(*decode_value(value)).ref, filename=f"{kind}-document", store=store)
+        except BlobNotFound:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -0,0 +1,13 @@
+import pytest
+from django.test import override_settings
+
+from apna_lawyer.cache import shared_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_shared_cache(tmp_path):
+    """Give every test an empty shared cache so cached answers never leak between tests"""
+    with override_settings(CACHE_L2_BACKEND='sqlite', CACHE_SQLITE_PATH=str(tmp_path / 'cache.sqlite3')):
+        shared_cache.reset()
+        yield
+    shared_cache.reset()
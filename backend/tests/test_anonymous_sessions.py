@@ -0,0 +1,69 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from apna_lawyer.middleware import AnonymousIdMiddleware
+from chats.image_chat_service import image_chat_service
+
+User = get_user_model()
+
+
+@override_settings(ANONYMOUS_ID_COOKIE_NAME='anon_id')
+class AnonymousIdTestCase(TestCase):
+    def request_id(self, cookies=None):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        request.user = type('Anonymous', (), {'is_authenticated': False})()
+        session_ids = []
+
+        def view(request):
+            session_ids.append(image_chat_service.get_user_session_id(request))
+            session_ids.append(image_chat_service.get_user_session_id(request))
+            return HttpResponse()
+
+        response = AnonymousIdMiddleware(view)(request)
+        self.assertEqual(session_ids[0], session_ids[1])
+        return session_ids[0], response
+
+    def test_id_comes_from_signed_cookie_without_queries(self):
+        with self.assertNumQueries(0):
+            session_id, response = self.request_id()
+        self.assertTrue(session_id.startswith('anon_'))
+        cookie = response.cookies['anon_id']
+        self.assertTrue(cookie['httponly'])
+
+        with self.assertNumQueries(0):
+            same_id, response = self.request_id({'anon_id': cookie.value})
+        self.assertEqual(same_id, session_id)
+        self.assertNotIn('anon_id', response.cookies)
+
+        forged = cookie.value.replace(session_id[5:9], '0000')
+        self.assertNotEqual(self.request_id({'anon_id': forged})[0], session_id)
+        self.assertEqual(Session.objects.count(), 0)
+
+
+class PruneSessionsTestCase(TestCase):
+    def make_session(self, data, expires_in):
+        store = SessionStore()
+        store.update(data)
+        store.create()
+        Session.objects.filter(session_key=store.session_key).update(expire_date=timezone.now() + expires_in)
+        return store.session_key
+
+    def test_prunes_expired_and_anonymous_sessions(self):
+        user = User.objects.create_user(username='s@example.com', email='s@example.com', name='S', password='x')
+        self.make_session({}, timedelta(days=-1))
+        self.make_session({'visited': True}, timedelta(days=5))
+        logged_in = self.make_session({SESSION_KEY: str(user.pk)}, timedelta(days=5))
+
+        call_command('prune_sessions', batch_size=1, stdout=StringIO())
+        self.assertEqual(Session.objects.count(), 2)
+        call_command('prune_sessions', '--anonymous', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [logged_in])
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.answer_store import CODEC_RAW, CODEC_ZLIB, answer_hash, compress_answer, decompress_answer
+from chats.models import ChatAnswer, UserChat
+
+User = get_user_model()
+
+ANSWER = ("Under Section 138 of the Negotiable Instruments Act, a bounced cheque is an offence. "
+          "Send a legal notice within 30 days of the bank's memo. ") * 10
+
+
+class AnswerCodecTestCase(TestCase):
+    def test_round_trip(self):
+        codec, body = compress_answer(ANSWER, CODEC_ZLIB)
+        self.assertEqual(codec, CODEC_ZLIB)
+        self.assertLess(len(body), len(ANSWER))
+        self.assertEqual(decompress_answer(codec, body), ANSWER)
+        self.assertEqual(decompress_answer(*compress_answer('जमानत कैसे मिलेगी', CODEC_ZLIB)), 'जमानत कैसे मिलेगी')
+
+    def test_incompressible_text_is_kept_raw(self):
+        text = os.urandom(64).hex()[:20]
+        self.assertEqual(compress_answer(text, CODEC_ZLIB), (CODEC_RAW, text.encode()))
+        self.assertIsNone(decompress_answer(None, None))
+
+
+class AnswerStoreTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='answers@example.com', email='answers@example.com', name='Answer User', password='testpass123'
+        )
+
+    def test_identical_answers_are_stored_once(self):
+        first = UserChat.objects.create(user=self.user, user_text_input='cheque bounced', ai_text_output=ANSWER)
+        UserChat.objects.bulk_create([
+            UserChat(user=self.user, user_text_input='cheque bounce again', ai_text_output=ANSWER),
+            UserChat(user=self.user, user_text_input='no answer yet', ai_text_output=None),
+            UserChat(user=self.user, user_text_input='other', ai_text_output='A different answer'),
+        ])
+        self.assertEqual(ChatAnswer.objects.count(), 2)
+        self.assertEqual(first.answer_id, answer_hash(ANSWER))
+        self.assertEqual(UserChat.objects.filter(answer_id=answer_hash(ANSWER)).count(), 2)
+        stored = ChatAnswer.objects.get(pk=answer_hash(ANSWER))
+        self.assertEqual(stored.size, len(ANSWER))
+        self.assertLess(len(stored.body), stored.size)
+
+    def test_reads_decompress_transparently(self):
+        chat = UserChat.objects.create(user=self.user, user_text_input='q', ai_text_output=ANSWER)
+        UserChat.objects.create(user=self.user, user_text_input='q2')
+        with self.assertNumQueries(1):
+            answers = {c.user_text_input: c.ai_text_output for c in UserChat.objects.filter(user=self.user)}
+        self.assertEqual(answers, {'q': ANSWER, 'q2': None})
+
+        chat.ai_text_output = 'Edited answer'
+        chat.save(update_fields=['ai_text_output'])
+        UserChat.objects.filter(pk=chat.pk).update(user_text_input='edited')
+        chat = UserChat.objects.get(pk=chat.pk)
+        self.assertEqual((chat.user_text_input, chat.ai_text_output), ('edited', 'Edited answer'))
+        UserChat.objects.filter(pk=chat.pk).update(ai_text_output=None)
+        self.assertIsNone(UserChat.objects.get(pk=chat.pk).ai_text_output)
+
+    def test_history_api_returns_answer_text(self):
+        UserChat.objects.create(user=self.user, user_text_input='q', ai_text_output=ANSWER)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('chat_history'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['chats'][0]['ai_response'], ANSWER)
+
+    def test_prune_removes_only_unreferenced_answers(self):
+        kept = UserChat.objects.create(user=self.user, user_text_input='q', ai_text_output=ANSWER)
+        dropped = UserChat.objects.create(user=self.user, user_text_input='q', ai_text_output='Short lived')
+        dropped.delete()
+        ChatAnswer.objects.update(created_at=kept.created_at - timedelta(days=2))
+        call_command('prune_chat_answers', stdout=StringIO())
+        self.assertEqual(list(ChatAnswer.objects.values_list('pk', flat=True)), [kept.answer_id])
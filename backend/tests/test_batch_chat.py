@@ -0,0 +1,128 @@
+import json
+import os
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.ai_service import GeminiAIService
+from chats.batch_service import fan_out
+from chats.models import UserChat
+from chats.resilience import DeadlineExceeded
+
+User = get_user_model()
+
+
+class SlowAIService:
+    """Stand-in for GeminiAIService with a fixed upstream latency"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None, deadline=None):
+        time.sleep(self.delay)
+        if 'fail' in user_message:
+            raise RuntimeError('upstream exploded')
+        return f"Answer to: {user_message}"
+
+
+class FanOutTestCase(TransactionTestCase):
+    def test_results_cover_every_message(self):
+        results = list(fan_out(['a', 'b', 'c'], str.upper, max_workers=2))
+        self.assertEqual(sorted((r.index, r.response) for r in results), [(0, 'A'), (1, 'B'), (2, 'C')])
+
+    def test_errors_are_isolated_per_item(self):
+        def handler(message):
+            if message == 'bad':
+                raise ValueError('bad item')
+            return message
+
+        results = {r.index: r for r in fan_out(['ok', 'bad', 'ok'], handler)}
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+        self.assertEqual(results[1].error, 'bad item')
+        self.assertTrue(results[2].ok)
+
+
+class BatchChatAPITestCase(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('batch_chat_api')
+        self.user = User.objects.create_user(
+            username='batch@example.com',
+            email='batch@example.com',
+            name='Batch User',
+            password='testpass123'
+        )
+
+    def _post(self, payload):
+        response = self.client.post(self.url, payload, format='json')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return response, lines
+
+    @mock.patch('chats.views.get_ai_service', return_value=SlowAIService(delay=0.2))
+    def test_batch_runs_concurrently_and_saves_in_bulk(self, _):
+        """Test that wall time approaches one call and chats are saved"""
+        self.client.force_authenticate(user=self.user)
+        messages = [f"Question {i}" for i in range(8)]
+
+        started = time.monotonic()
+        response, lines = self._post({'messages': messages})
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertLess(elapsed, 0.2 * len(messages) / 2)
+
+        results = [line for line in lines if line['type'] == 'result']
+        summary = lines[-1]
+        self.assertEqual(len(results), 8)
+        self.assertEqual(summary['type'], 'summary')
+        self.assertEqual(summary['saved'], 8)
+        self.assertEqual(UserChat.objects.filter(user=self.user).count(), 8)
+        saved_ids = set(str(pk) for pk in UserChat.objects.values_list('id', flat=True))
+        self.assertEqual(saved_ids, {r['chat_id'] for r in results})
+
+    @mock.patch('chats.views.get_ai_service', return_value=SlowAIService(delay=0.01))
+    def test_failed_items_do_not_fail_the_batch(self, _):
+        """Test per-item error isolation"""
+        response, lines = self._post({'messages': ['Question one', 'please fail', '']})
+
+        results = {line['index']: line for line in lines if line['type'] == 'result'}
+        self.assertTrue(results[0]['success'])
+        self.assertFalse(results[1]['success'])
+        self.assertFalse(results[2]['success'])
+        self.assertEqual(lines[-1]['failed'], 2)
+        self.assertTrue(lines[-1]['is_anonymous'])
+        self.assertEqual(UserChat.objects.count(), 0)
+
+    def test_unanswered_items_are_failures_not_fallback_answers(self):
+        """Test that a Gemini timeout is reported as a failure instead of a saved fallback text"""
+        def complete(prompt, deadline):
+            if 'slow' in prompt:
+                raise DeadlineExceeded('Upstream did not answer within the request budget')
+            return 'Gemini answer'
+
+        with mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'}):
+            gemini = GeminiAIService()
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('chats.views.get_ai_service', return_value=gemini), \
+                mock.patch.object(gemini, '_complete', side_effect=complete):
+            _, lines = self._post({'messages': ['Question one', 'slow question']})
+
+        results = {line['index']: line for line in lines if line['type'] == 'result'}
+        self.assertEqual(results[0]['response'], 'Gemini answer')
+        self.assertFalse(results[1]['success'])
+        self.assertIn('request budget', results[1]['error'])
+        self.assertEqual((lines[-1]['failed'], lines[-1]['saved']), (1, 1))
+        self.assertEqual([chat.ai_text_output for chat in UserChat.objects.all()], ['Gemini answer'])
+
+    def test_invalid_payloads_are_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'messages': []}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'messages': ['q'] * 31}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
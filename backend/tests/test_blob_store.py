@@ -0,0 +1,150 @@
+import base64
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apna_lawyer.blob_store import (
+    BlobStore, RangeNotSatisfiable, blob_response, blob_store, convert_columns, is_blob_ref,
+    offload_value, parse_range, restore_value,
+)
+from chats.models import UserChat
+from lawyers.models import Lawyer
+from lawyers.views import LIST_COLUMNS
+
+User = get_user_model()
+
+PDF = b'%PDF-1.4\n' + bytes(range(256)) * 400
+
+
+class BlobStoreTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(BLOB_STORE_BACKEND='local', BLOB_STORE_DIR=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        blob_store.reset()
+        self.addCleanup(blob_store.reset)
+        self.store = blob_store.get()
+
+    def test_put_is_content_addressed(self):
+        info = self.store.put(PDF, 'application/pdf')
+        self.assertTrue(is_blob_ref(info.ref))
+        self.assertEqual(self.store.put(SimpleUploadedFile('a.pdf', PDF)).ref, info.ref)
+        self.assertEqual(self.store.info(info.ref).content_type, 'application/pdf')
+        self.assertEqual(self.store.read_bytes(info.ref), PDF)
+        self.assertEqual(b''.join(self.store.read(info.ref, 100, 199)), PDF[100:200])
+        self.store.delete(info.ref)
+        self.assertFalse(self.store.exists(info.ref))
+
+    def test_incomplete_backend_fails_at_construction(self):
+        class WriteOnlyStore(BlobStore):
+            def put(self, data, content_type=None):
+                pass
+
+        with self.assertRaises(TypeError):
+            WriteOnlyStore()
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range(None, 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+
+    def test_blob_response(self):
+        ref = self.store.put(PDF, 'application/pdf').ref
+        factory = RequestFactory()
+
+        response = blob_response(factory.get('/'), ref)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), PDF)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = blob_response(factory.get('/', HTTP_RANGE='bytes=10-19'), ref)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), PDF[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(PDF)}')
+
+        stale = factory.get('/', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"other"')
+        self.assertEqual(blob_response(stale, ref).status_code, 200)
+        self.assertEqual(blob_response(factory.get('/', HTTP_RANGE=f'bytes={len(PDF)}-'), ref).status_code, 416)
+        self.assertEqual(blob_response(factory.get('/', HTTP_IF_NONE_MATCH=f'"{ref}"'), ref).status_code, 304)
+
+    def test_offload_and_restore_values(self):
+        data_url = 'data:application/pdf;base64,' + base64.b64encode(PDF).decode()
+        ref = offload_value(data_url)
+        self.assertEqual(self.store.read_bytes(ref), PDF)
+        self.assertEqual(offload_value(ref), ref)
+        self.assertIsNone(offload_value(''))
+        self.assertEqual(restore_value(ref), data_url)
+        self.assertEqual(restore_value(offload_value('LLB, Delhi University')), 'LLB, Delhi University')
+
+    def test_client_values_are_only_references_to_stored_blobs(self):
+        stored = self.store.put(PDF, 'application/pdf').ref
+        lookalike = 'ab' * 32
+        supabase = mock.MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value.data = [{'id': 1}]
+        with mock.patch('lawyers.views.supabase', new=supabase):
+            APIClient().post(reverse('lawyer-create'), {
+                'name': 'A', 'education_document': stored, 'specialization_document': lookalike,
+            }, format='json')
+        data = supabase.table.return_value.insert.call_args[0][0]
+        self.assertEqual(data['education_document'], stored)
+        self.assertNotEqual(data['specialization_document'], lookalike)
+        self.assertEqual(self.store.read_bytes(data['specialization_document']), lookalike.encode())
+
+    def test_convert_columns_moves_lawyer_documents(self):
+        Lawyer.objects.create(name='A', email='a@example.com', phone_number='1', license_number='L1',
+                              education_document='LLB, Delhi University', specialization_document=None)
+        lawyers = Lawyer.objects.all()
+        self.assertEqual(convert_columns(lawyers, ['specialization_document', 'education_document'],
+                                         offload_value, batch_size=1), 1)
+        ref = Lawyer.objects.get().education_document
+        self.assertTrue(is_blob_ref(ref))
+        convert_columns(lawyers, ['specialization_document', 'education_document'], restore_value)
+        self.assertEqual(Lawyer.objects.get().education_document, 'LLB, Delhi University')
+        self.assertNotIn('education_document', LIST_COLUMNS.split(','))
+
+    def test_inline_lawyer_document_is_served_without_writing_a_blob(self):
+        supabase = mock.MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {'education_document': 'data:application/pdf;base64,' + base64.b64encode(PDF).decode()}
+        ]
+        url = reverse('lawyer-document', args=['1', 'education'])
+        with mock.patch('lawyers.views.supabase', new=supabase):
+            response = APIClient().get(url, HTTP_RANGE='bytes=0-7', HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_chat_document_download(self):
+        owner = User.objects.create_user(username='doc@example.com', email='doc@example.com',
+                                         name='Doc User', password='testpass123')
+        other = User.objects.create_user(username='other@example.com', email='other@example.com',
+                                         name='Other User', password='testpass123')
+        chat = UserChat.objects.create(user=owner, user_text_input='q',
+                                       chatbot_document=self.store.put(PDF, 'application/pdf').ref)
+        url = reverse('chat_document', args=[chat.id, 'response'])
+        client = APIClient()
+        client.force_authenticate(user=owner)
+        response = client.get(url, HTTP_RANGE='bytes=0-7', HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4')
+        self.assertEqual(client.get(reverse('chat_document', args=[chat.id, 'submission'])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        client.force_authenticate(user=other)
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
@@ -0,0 +1,167 @@
+import base64
+import io
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apna_lawyer.cache import CacheEntry, L2Store, LRUCache, SQLiteStore, TwoTierCache
+from chats.ai_service import GeminiAIService
+from chats.ocr_service import ocr_service
+from chats.resilience import Deadline
+from chats.singleflight import SingleFlight
+
+
+class BrokenStore(L2Store):
+    def get(self, key):
+        raise OSError('disk gone')
+
+    def set(self, key, entry):
+        raise OSError('disk gone')
+
+    def acquire_lock(self, name, ttl):
+        raise OSError('disk gone')
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_evicts_least_recently_used_by_size(self):
+        lru = LRUCache(max_bytes=300)
+        for key in 'abc':
+            lru.set(key, CacheEntry(key, time.time() + 60, 0), 100)
+        lru.get('a')
+        lru.set('d', CacheEntry('d', time.time() + 60, 0), 100)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual([lru.get(key).value for key in 'acd'], ['a', 'c', 'd'])
+        self.assertEqual(lru.size_bytes, 300)
+        lru.set('huge', CacheEntry('x', time.time() + 60, 0), 301)
+        self.assertIsNone(lru.get('huge'))
+
+    def test_expired_entries_are_dropped(self):
+        lru = LRUCache()
+        lru.set('a', CacheEntry('a', time.time() - 1, 0), 10)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.size_bytes, 0)
+
+
+class TwoTierCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = str(Path(tmp.name) / 'cache.sqlite3')
+
+    def worker(self, **kwargs):
+        """A cache as one gunicorn worker sees it: its own L1, the shared SQLite L2"""
+        kwargs.setdefault('beta', 0)
+        return TwoTierCache(l1=LRUCache(), l2=SQLiteStore(self.path), **kwargs)
+
+    def test_values_are_shared_through_l2(self):
+        first, second = self.worker(), self.worker()
+        first.set('lawyers', 'list', [{'name': 'A'}], ttl=60)
+        self.assertEqual(second.get('lawyers', 'list'), [{'name': 'A'}])
+        self.assertEqual(second.get('lawyers', 'list'), [{'name': 'A'}])
+        first.clear('lawyers')
+        self.assertIsNone(first.get('lawyers', 'list'))
+        self.assertEqual(second.get('lawyers', 'list', 'gone'), [{'name': 'A'}])  # until CACHE_L1_TTL
+        self.assertEqual(self.worker().get('lawyers', 'list', 'gone'), 'gone')
+
+        counters = second.stats()['namespaces']['lawyers']
+        self.assertEqual((counters['l1_hits'], counters['l2_hits'], counters['misses']), (2, 1, 0))
+
+    def test_get_or_set_computes_once_and_never_caches_errors(self):
+        cache = self.worker()
+        compute = mock.Mock(side_effect=[RuntimeError('upstream down'), 'answer'])
+        with self.assertRaises(RuntimeError):
+            cache.get_or_set('ai_answers', 'k', compute, ttl=60)
+        self.assertEqual(cache.get_or_set('ai_answers', 'k', compute, ttl=60), 'answer')
+        self.assertEqual(cache.get_or_set('ai_answers', 'k', compute, ttl=60), 'answer')
+        self.assertEqual(compute.call_count, 2)
+
+    def test_stampede_lock_lets_one_worker_compute(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return 'text'
+
+        workers = [self.worker(poll_interval=0.01) for _ in range(6)]
+        results = []
+        threads = [threading.Thread(target=lambda w=w: results.append(w.get_or_set('ocr', 'img', compute, ttl=60)))
+                   for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['text'] * 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_hot_keys_are_refreshed_before_expiry(self):
+        cache = self.worker(beta=1000)
+        cache.set('ai_answers', 'k', 'old', ttl=60, delta=1.0)
+        self.assertEqual(cache.get_or_set('ai_answers', 'k', lambda: 'new', ttl=60), 'new')
+        self.assertEqual(cache.stats()['namespaces']['ai_answers']['early_refreshes'], 1)
+
+        cache = self.worker(beta=1)
+        cache.set('ai_answers', 'k', 'fresh', ttl=3600, delta=0.01)
+        self.assertEqual(cache.get_or_set('ai_answers', 'k', lambda: 'new', ttl=60), 'fresh')
+
+    def test_broken_l2_only_costs_recomputation(self):
+        cache = TwoTierCache(l2=BrokenStore(), l1_ttl=0)
+        self.assertEqual(cache.get_or_set('ocr', 'k', lambda: 'text', ttl=60, wait_timeout=5), 'text')
+        self.assertGreater(cache.stats()['namespaces']['ocr']['l2_errors'], 0)
+
+
+class CachedServicesTestCase(SimpleTestCase):
+    databases = '__all__'
+
+    def test_lawyer_list_is_cached_until_a_write(self):
+        # new= so patching does not inspect (and build) the real client, which needs SUPABASE_URL/KEY
+        supabase = mock.MagicMock()
+        table = supabase.table.return_value
+        table.select.return_value.execute.return_value.data = [{'id': '1', 'name': 'A'}]
+        table.insert.return_value.execute.return_value.data = [{'id': '2', 'name': 'B'}]
+        client = APIClient()
+        with mock.patch('lawyers.views.supabase', new=supabase):
+            for _ in range(3):
+                self.assertEqual(client.get(reverse('lawyer-list')).data, [{'id': '1', 'name': 'A'}])
+            self.assertEqual(table.select.return_value.execute.call_count, 1)
+
+            client.post(reverse('lawyer-create'), {'name': 'B'}, format='json')
+            client.get(reverse('lawyer-list'))
+        self.assertEqual(table.select.return_value.execute.call_count, 2)
+
+    @override_settings(AI_HEDGE_ENABLED=False, AI_ANSWER_CACHE_TTL=3600)
+    @mock.patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'})
+    def test_blocked_answers_are_not_cached(self):
+        blocked = mock.Mock(status_code=200, json=lambda: {'promptFeedback': {'blockReason': 'SAFETY'}})
+        answer = mock.Mock(status_code=200, json=lambda: {'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = TwoTierCache(l1=LRUCache(), l2=SQLiteStore(str(Path(tmp.name) / 'cache.sqlite3')))
+        service = GeminiAIService()
+        with mock.patch('chats.ai_service.shared_cache', cache), \
+                mock.patch('chats.ai_service.ai_request_coalescer', SingleFlight(use_lock_table=False)), \
+                mock.patch('chats.ai_service.requests.post', side_effect=[blocked, answer]) as post:
+            first = service.generate_legal_response('What is bail?', deadline=Deadline(5))
+            second = service.generate_legal_response('What is bail?', deadline=Deadline(5))
+        self.assertTrue(first.startswith('I apologize'))
+        self.assertEqual(second, 'ok')
+        self.assertEqual(post.call_count, 2)
+
+    @mock.patch('chats.ocr_service.pytesseract.image_to_string', return_value='Notice under Section 138')
+    def test_ocr_results_are_cached_by_image_content(self, image_to_string):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 20), 'white').save(buffer, format='PNG')
+        data_url = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        for _ in range(2):
+            self.assertEqual(ocr_service.extract_text_from_base64(data_url), 'Notice under Section 138')
+        self.assertEqual(image_to_string.call_count, 1)
+
+        stats = APIClient().get(reverse('cache_stats')).data
+        self.assertEqual(stats['namespaces']['ocr']['misses'], 1)
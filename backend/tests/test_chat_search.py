@@ -0,0 +1,129 @@
+import uuid
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.chat_search import fts_match_expression, highlight, rebuild_search_index, search_chats
+from chats.models import UserChat
+
+User = get_user_model()
+
+
+class ChatSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='search@example.com', email='search@example.com', name='Search User', password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='other@example.com', email='other@example.com', name='Other User', password='testpass123'
+        )
+        self.cheque = UserChat.objects.create(
+            user=self.user, user_text_input='My cheque bounced, what can I do?',
+            ai_text_output='Under Section 138 of the Negotiable Instruments Act <you> can send a legal notice.'
+        )
+        self.bail = UserChat.objects.create(
+            user=self.user, user_text_input='अग्रिम जमानत कैसे मिलेगी',
+            ai_text_output='You can apply for anticipatory bail under Section 438 CrPC.'
+        )
+        self.notice = UserChat.objects.create(
+            user=self.user, user_text_input='How do I reply to a legal notice?',
+            ai_text_output='Reply within the time given in the notice.'
+        )
+        UserChat.objects.create(user=self.other, user_text_input='Another cheque bounce question',
+                                ai_text_output='Hidden from other users.')
+
+    def ids(self, query, user=None):
+        return [hit.id for hit in search_chats(user or self.user, query)]
+
+    def test_ranked_results_for_own_chats_only(self):
+        self.assertEqual(self.ids('cheque'), [self.cheque.id])
+        self.assertEqual(self.ids('legal notice')[0], self.notice.id)
+        self.assertEqual(set(self.ids('notice')), {self.cheque.id, self.notice.id})
+        self.assertEqual(len(self.ids('cheque', self.other)), 1)
+
+    def test_index_entries_never_reach_other_users(self):
+        """Test that ownership comes from the chat row, not from the indexed user token"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 index is SQLite only')
+        foreign = UserChat.objects.get(user=self.other)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM chats_userchat WHERE id = %s", [foreign.id.hex])
+            rowid = cursor.fetchone()[0]
+            cursor.execute("INSERT INTO chats_userchat_fts(rowid, user_key, user_text_input) "
+                           "VALUES (%s, %s, 'misfiled entry')", [rowid, f"u{self.user.pk.hex}"])
+        self.assertEqual(self.ids('misfiled'), [])
+
+    def test_writes_do_not_need_python_functions(self):
+        """Test that clients without Django's connection setup (sqlite3 shell, backup tools) can write chats"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 index is SQLite only')
+        connection.ensure_connection()
+        connection.connection.create_function('chat_answer_text', 2, None)
+        new_id = uuid.uuid4()
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO chats_userchat (id, user_id, user_text_input, answer_id, created_at) "
+                           "VALUES (%s, %s, 'Question about a tenancy', %s, %s)",
+                           [new_id.hex, self.user.pk.hex, self.bail.answer_id, timezone.now()])
+            cursor.execute("UPDATE chats_userchat SET answer_id = NULL WHERE id = %s", [self.notice.id.hex])
+            cursor.execute("DELETE FROM chats_chatanswer WHERE content_hash = %s", [self.notice.answer_id])
+            cursor.execute("DELETE FROM chats_userchat WHERE id = %s", [self.cheque.id.hex])
+        self.assertEqual(self.ids('tenancy'), [new_id])
+        self.assertEqual(set(self.ids('anticipatory')), {self.bail.id, new_id})
+        self.assertEqual(self.ids('within'), [])
+        self.assertEqual(self.ids('cheque'), [])
+
+    def test_stemming_prefix_and_hindi(self):
+        self.assertEqual(self.ids('bounce'), [self.cheque.id])
+        self.assertEqual(self.ids('anticip'), [self.bail.id])
+        self.assertEqual(self.ids('जमानत'), [self.bail.id])
+        self.assertEqual(self.ids('मिलेगी'), [self.bail.id])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        hit = search_chats(self.user, 'section 138')[0]
+        self.assertIn('<mark>Section</mark> <mark>138</mark>', hit.ai_response)
+        self.assertIn('&lt;you&gt;', hit.ai_response)
+        self.assertEqual(highlight('a <b>'), 'a &lt;b&gt;')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.cheque.user_text_input = 'Question about a tenancy'
+        self.cheque.ai_text_output = 'Rent agreements should be registered.'
+        self.cheque.save()
+        self.assertEqual(self.ids('cheque'), [])
+        self.assertEqual(self.ids('tenancy'), [self.cheque.id])
+        self.notice.delete()
+        self.assertEqual(self.ids('reply'), [])
+        UserChat.objects.filter(pk=self.bail.pk).update(ai_text_output='Updated in bulk')
+        self.assertEqual(self.ids('bulk'), [self.bail.id])
+        rebuild_search_index()
+        self.assertEqual(self.ids('bulk'), [self.bail.id])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(fts_match_expression('cheque OR "bail" NEAR(x'), '"cheque" AND "or" AND "bail" AND "near" AND "x"*')
+        self.assertIsNone(fts_match_expression('***'))
+        self.assertEqual(self.ids('cheque OR (bail'), [])
+
+    def test_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('chat_search'), {'q': 'notice', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(client.get(reverse('chat_search')).status_code, status.HTTP_400_BAD_REQUEST)
+        client.force_authenticate(user=None)
+        self.assertEqual(client.get(reverse('chat_search'), {'q': 'notice'}).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_admin_search_uses_index_and_user_fields(self):
+        model_admin = site._registry[UserChat]
+        request = RequestFactory().get('/admin/chats/userchat/')
+        queryset, _ = model_admin.get_search_results(request, UserChat.objects.all(), 'bounce')
+        self.assertEqual(queryset.count(), 2)
+        queryset, _ = model_admin.get_search_results(request, UserChat.objects.all(), 'other@example.com')
+        self.assertEqual(queryset.count(), 1)
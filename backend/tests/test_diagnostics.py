@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apna_lawyer.diagnostics import StackSampler
+
+User = get_user_model()
+
+
+class StackSamplerTestCase(SimpleTestCase):
+    def test_folded_output(self):
+        """Test that samples are written in folded-stack format"""
+        def busy_wait():
+            deadline = time.monotonic() + 0.1
+            while time.monotonic() < deadline:
+                pass
+
+        sampler = StackSampler(threading.get_ident(), interval=0.001).start()
+        busy_wait()
+        sampler.stop()
+
+        folded = sampler.folded()
+        self.assertIn('busy_wait', folded)
+        first_line = folded.splitlines()[0]
+        stack, count = first_line.rsplit(' ', 1)
+        self.assertIn(';', stack)
+        self.assertTrue(int(count) > 0)
+
+
+class DiagnosticsAPITestCase(APITestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.staff = User.objects.create_user(
+            username='staff@example.com',
+            email='staff@example.com',
+            name='Staff User',
+            password='testpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user@example.com',
+            email='user@example.com',
+            name='Regular User',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_diagnostics_require_staff(self):
+        """Test that non-staff users cannot reach diagnostics"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('diagnostics_objects'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_object_counts_report_growth(self):
+        """Test per-type object counts and growth between reports"""
+        self.client.force_authenticate(user=self.staff)
+
+        first = self.client.get(reverse('diagnostics_objects'), {'limit': 10})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['top_types']), 10)
+        self.assertIsNone(first.data['growth'])
+
+        second = self.client.get(reverse('diagnostics_objects'), {'limit': 10})
+        self.assertIsNotNone(second.data['growth'])
+
+    def test_tracemalloc_snapshot_diff(self):
+        """Test that consecutive snapshots are diffed"""
+        self.client.force_authenticate(user=self.staff)
+        url = reverse('diagnostics_tracemalloc')
+
+        try:
+            self.assertEqual(self.client.post(url, {'action': 'start'}, format='json').status_code, 200)
+            first = self.client.post(url, {'action': 'snapshot'}, format='json')
+            self.assertIsNone(first.data['diff'])
+            leak = [bytearray(1024) for _ in range(100)]
+            second = self.client.post(url, {'action': 'snapshot', 'limit': 5}, format='json')
+            self.assertIsNotNone(second.data['diff'])
+            self.assertTrue(len(second.data['diff']) <= 5)
+            del leak
+        finally:
+            self.client.post(url, {'action': 'stop'}, format='json')
+
+    def test_profile_header_writes_file_for_staff_only(self):
+        """Test that X-Profile writes a profile only for staff sessions"""
+        with override_settings(PROFILE_DIR=self.profile_dir):
+            self.client.force_login(self.user)
+            response = self.client.get(reverse('health_check'), HTTP_X_PROFILE='sample')
+            self.assertNotIn('X-Profile-File', response)
+
+            self.client.force_login(self.staff)
+            response = self.client.get(reverse('health_check'), HTTP_X_PROFILE='cprofile')
+            self.assertIn('X-Profile-File', response)
+            self.assertTrue(os.path.exists(os.path.join(self.profile_dir, response['X-Profile-File'])))
+
+    def test_user_data_header_does_not_grant_profiling(self):
+        """Test that a staff id in the unauthenticated X-User-Data header is not staff"""
+        with override_settings(PROFILE_DIR=self.profile_dir):
+            response = self.client.get(reverse('health_check'), HTTP_X_PROFILE='cprofile',
+                                       HTTP_X_USER_DATA=json.dumps({'id': str(self.staff.id)}))
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_invalid_limits_are_rejected(self):
+        """Test that a non-numeric limit is a 400, not a 500"""
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse('diagnostics_objects'), {'limit': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('diagnostics_tracemalloc'),
+                                    {'action': 'snapshot', 'limit': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
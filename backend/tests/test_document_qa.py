@@ -0,0 +1,137 @@
+import io
+import tempfile
+from unittest import mock
+
+import docx
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.document_service import document_context, document_indexes, split_document, store_document
+from chats.models import ChatDocument, DocumentChunk
+
+User = get_user_model()
+
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def make_docx(paragraphs):
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def long_contract(pages=200):
+    """A contract with one relevant clause buried among boilerplate pages"""
+    text = [f"Clause {i}. The parties agree on miscellaneous administrative matter number {i} "
+            f"regarding stationery, office hours and parking arrangements." * 4 for i in range(pages)]
+    relevant = pages * 2 // 3
+    text[relevant] = f"Clause {relevant}. Either party may terminate this agreement by giving ninety days written notice."
+    return text
+
+
+class RecordingAIService:
+    def __init__(self):
+        self.calls = []
+
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None,
+                                document_context=None, deadline=None):
+        self.calls.append({'user_message': user_message, 'document_context': document_context})
+        return 'answer'
+
+
+class DocumentServiceTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_patch = override_settings(DOCUMENT_INDEX_DIR=self.tmp.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        document_indexes.clear()
+
+    def test_pages_are_labelled(self):
+        chunks = split_document('lease.pdf', ['First page.', 'Second page.'])
+        self.assertEqual([c.citation for c in chunks], ['lease.pdf, page 1', 'lease.pdf, page 2'])
+
+    def test_context_contains_relevant_chunks_only(self):
+        """Test that a question on a long document sends kilobytes, not the whole text"""
+        pages = long_contract()
+        document = store_document('anon_x', None, 'contract.pdf', 'application/pdf', pages)
+
+        context = document_context(document, 'How much notice is needed to terminate the agreement?')
+
+        self.assertIn('ninety days written notice', context)
+        self.assertIn('[contract.pdf, page 134]', context)
+        self.assertLess(len(context), sum(len(page) for page in pages) / 20)
+        self.assertEqual(DocumentChunk.objects.filter(document=document).count(), document.chunk_count)
+
+    def test_index_is_rebuilt_from_stored_chunks(self):
+        document = store_document('anon_x', None, 'contract.pdf', 'application/pdf', long_contract(20))
+        document_indexes.clear()
+        with override_settings(DOCUMENT_INDEX_DIR=f"{self.tmp.name}/other-instance"):
+            self.assertIn('ninety days', document_context(document, 'terminate notice'))
+
+    def test_unmatched_question_gets_opening_chunks(self):
+        document = store_document('anon_x', None, 'note.docx', DOCX_TYPE, ['Opening paragraph.\n\nSecond one.'])
+        self.assertIn('Opening paragraph.', document_context(document, 'summarise'))
+
+
+class DocumentChatAPITestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_patch = override_settings(DOCUMENT_INDEX_DIR=self.tmp.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        document_indexes.clear()
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='docs@example.com', email='docs@example.com', name='Docs User', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, paragraphs):
+        upload = SimpleUploadedFile('contract.docx', make_docx(paragraphs), content_type=DOCX_TYPE)
+        return self.client.post(reverse('extract_document_api'), {'file': upload}, format='multipart')
+
+    def test_upload_returns_document_id(self):
+        response = self.upload(['Rent is due on the fifth.', 'Deposit is refundable.'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        document = ChatDocument.objects.get(id=response.data['document_id'])
+        self.assertEqual(document.user, self.user)
+        self.assertIn('Rent is due', response.data['extracted_text'])
+
+    def test_follow_up_question_sends_relevant_excerpts(self):
+        """Test that chat with a document_id sends excerpts instead of the document"""
+        document_id = self.upload(long_contract(100)).data['document_id']
+        ai_service = RecordingAIService()
+
+        with mock.patch('chats.views.get_ai_service', return_value=ai_service):
+            response = self.client.post(reverse('chatbot_api'), {
+                'message': 'How can I terminate the agreement?', 'document_id': document_id
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['document_id'], document_id)
+        context = ai_service.calls[0]['document_context']
+        self.assertIn('ninety days written notice', context)
+        self.assertLess(len(context), 5000)
+
+    def test_other_users_documents_are_not_found(self):
+        document_id = self.upload(['Private clause.']).data['document_id']
+        other = User.objects.create_user(
+            username='other@example.com', email='other@example.com', name='Other', password='testpass123'
+        )
+        self.client.force_authenticate(user=other)
+
+        response = self.client.post(reverse('chatbot_api'), {'message': 'What does it say?', 'document_id': document_id},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
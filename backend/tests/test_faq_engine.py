@@ -0,0 +1,105 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from chats.ai_service import FallbackAIService, FAQAIService, GeminiAIService, get_ai_service
+from chats.faq_engine import AhoCorasick, FAQEngine, FAQEntry, faq_engine, normalize_text
+
+
+class AhoCorasickTestCase(SimpleTestCase):
+    def test_finds_all_patterns_in_one_pass(self):
+        matcher = AhoCorasick(['bail', 'anticipatory bail', 'he', 'she', 'hers'])
+        self.assertEqual(sorted(matcher.iter_matches('anticipatory bail for hers')),
+                         [(0, 'anticipatory bail'), (13, 'bail'), (22, 'hers')])
+
+    def test_only_whole_words_match(self):
+        matcher = AhoCorasick(['fir', 'rti'])
+        self.assertEqual(list(matcher.iter_matches('first party')), [])
+        self.assertEqual(list(matcher.iter_matches('file an fir, then rti.')), [(8, 'fir'), (18, 'rti')])
+
+    def test_devanagari_vowel_signs_belong_to_the_word(self):
+        matcher = AhoCorasick(['जमान'])
+        self.assertEqual(list(matcher.iter_matches('जमानत')), [])
+
+
+class FAQEngineTestCase(SimpleTestCase):
+    def test_normalization_unifies_nukta_case_and_hyphens(self):
+        self.assertEqual(normalize_text('ज़मानत  Non-Bailable'), 'जमानत non bailable')
+
+    def test_common_questions_rank_the_right_entry(self):
+        cases = {
+            'my cheque bounced': 'cheque_bounce',
+            'Police refused to register my FIR': 'fir_refused',
+            'how to file fir': 'file_fir',
+            'How do I get anticipatory bail?': 'anticipatory_bail',
+            'अग्रिम जमानत कैसे मिलेगी': 'anticipatory_bail',
+            'अग्रिम ज़मानत कैसे मिलेगी': 'anticipatory_bail',
+            'property dispute with brother': 'property_dispute',
+        }
+        for question, entry_id in cases.items():
+            with self.subTest(question=question):
+                self.assertEqual(faq_engine.best_match(question).entry.id, entry_id)
+
+    def test_unrelated_question_has_no_match(self):
+        self.assertIsNone(faq_engine.best_match('Tell me about the weather'))
+
+    def test_first_line_requires_short_confident_question(self):
+        self.assertEqual(faq_engine.first_line_match('what is RTI').entry.id, 'rti')
+        long_question = ('I was arrested yesterday and the police took my phone, my employer also fired me '
+                         'and my landlord wants to evict me, what should I do about all of this')
+        self.assertIsNone(faq_engine.first_line_match(long_question))
+        self.assertIsNone(faq_engine.first_line_match('employment rights'))
+
+    def test_first_line_needs_every_content_word_covered(self):
+        self.assertEqual(faq_engine.first_line_match('अग्रिम जमानत कैसे मिलेगी').entry.id, 'anticipatory_bail')
+        for question in ('can I get bail for murder', 'can police refuse to file fir', 'is dowry illegal'):
+            with self.subTest(question=question):
+                self.assertIsNone(faq_engine.first_line_match(question))
+
+    def test_lookup_is_under_a_millisecond(self):
+        questions = ['my cheque bounced', 'अग्रिम जमानत कैसे मिलेगी',
+                     'My landlord is not returning my security deposit after I vacated the flat']
+        faq_engine.search(questions[0])
+        started = time.perf_counter()
+        for _ in range(200):
+            for question in questions:
+                faq_engine.search(question)
+        self.assertLess((time.perf_counter() - started) / (200 * len(questions)), 0.001)
+
+    def test_custom_entries(self):
+        engine = FAQEngine([FAQEntry('lease', 'How do I end a lease?', ['end lease', 'lease'], 'Give notice.')])
+        match = engine.best_match('can I end lease early')
+        self.assertEqual(match.matched_terms, ['end lease', 'lease'])
+        self.assertIn('Give notice.', match.entry.format())
+
+
+class FAQServiceSelectionTestCase(SimpleTestCase):
+    def setUp(self):
+        gemini = mock.patch('chats.ai_service.gemini_service', mock.Mock(get=mock.Mock(return_value=mock.Mock(
+            spec=GeminiAIService))))
+        gemini.start()
+        self.addCleanup(gemini.stop)
+
+    def test_common_question_is_answered_without_gemini(self):
+        service = get_ai_service('How do I file an FIR?')
+        self.assertIsInstance(service, FAQAIService)
+        self.assertIn('First Information Report', service.generate_legal_response('How do I file an FIR?'))
+
+    def test_complex_question_goes_to_gemini(self):
+        self.assertNotIsInstance(get_ai_service('Is a non-compete clause enforceable after resignation?'),
+                                 FAQAIService)
+        self.assertNotIsInstance(get_ai_service(None), FAQAIService)
+
+    def test_custom_system_prompt_goes_to_gemini(self):
+        self.assertNotIsInstance(get_ai_service('How do I file an FIR?', system_prompt='Answer in Marathi.'),
+                                 FAQAIService)
+
+    @override_settings(FAQ_FIRST_LINE_ENABLED=False)
+    def test_first_line_can_be_disabled(self):
+        self.assertNotIsInstance(get_ai_service('How do I file an FIR?'), FAQAIService)
+
+    def test_fallback_answers_from_faq(self):
+        response = FallbackAIService().generate_legal_response('My cheque bounced, what can I do?')
+        self.assertIn('Section 138', response)
+        self.assertIn('offline knowledge base', response)
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.history_export import decode_cursor, encode_cursor, export_rows
+from chats.models import UserChat
+
+User = get_user_model()
+
+START = datetime(2024, 5, 1, 9, 0, tzinfo=dt_timezone.utc)
+
+
+@override_settings(CHAT_EXPORT_CHUNK_SIZE=3)
+class ChatHistoryExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='export@example.com', email='export@example.com', name='Export User', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        # Ten chats, one per day, with the last two sharing a timestamp
+        for day in range(10):
+            chat = UserChat.objects.create(user=self.user, user_text_input=f'question {day}',
+                                           ai_text_output=f'answer {day}, with "quotes"\nand lines')
+            UserChat.objects.filter(pk=chat.pk).update(created_at=START + timedelta(days=min(day, 8)))
+        other = User.objects.create_user(
+            username='other@example.com', email='other@example.com', name='Other', password='testpass123'
+        )
+        UserChat.objects.create(user=other, user_text_input='not mine', ai_text_output='hidden')
+
+    def export(self, **params):
+        response = self.client.get(reverse('chat_history_export'), params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def ndjson(self, **params):
+        response, body = self.export(format='ndjson', **params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+    def test_ndjson_exports_own_chats_oldest_first(self):
+        rows = self.ndjson()
+        self.assertEqual(len(rows), 10)
+        timestamps = [row['timestamp'] for row in rows]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(rows[0]['user_message'], 'question 0')
+        self.assertEqual(rows[0]['timestamp'], '2024-05-01T09:00:00Z')
+        self.assertNotIn('not mine', [row['user_message'] for row in rows])
+
+    def test_csv_export(self):
+        response, body = self.export(format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('chat-history.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]['ai_response'], 'answer 0, with "quotes"\nand lines')
+
+    def test_date_range_filters(self):
+        rows = self.ndjson(since='2024-05-03', until='2024-05-05')
+        self.assertEqual([row['user_message'] for row in rows], ['question 2', 'question 3', 'question 4'])
+        rows = self.ndjson(since='2024-05-09T09:00:00Z')
+        self.assertEqual(len(rows), 2)
+
+    def test_cursor_resumes_after_last_row(self):
+        rows = self.ndjson()
+        # Resume in the middle of the two chats sharing a timestamp
+        resumed = self.ndjson(cursor=rows[8]['cursor'])
+        self.assertEqual([row['id'] for row in resumed], [rows[9]['id']])
+        resumed = self.ndjson(cursor=rows[3]['cursor'], until='2024-05-06')
+        self.assertEqual([row['id'] for row in resumed], [row['id'] for row in rows[4:6]])
+
+    def test_invalid_parameters(self):
+        for params in ({'format': 'xml'}, {'since': 'yesterday'}, {'cursor': 'not-a-cursor'}):
+            with self.subTest(params=params):
+                response, body = self.export(**params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('error', json.loads(body))
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response, _ = self.export()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cursor_round_trip(self):
+        chat = UserChat.objects.filter(user=self.user).first()
+        self.assertEqual(decode_cursor(encode_cursor(chat.created_at, chat.id)), (chat.created_at, chat.id))
+
+    def test_rows_are_read_in_chunks(self):
+        rows = export_rows(self.user, chunk_size=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(rows)), 10)
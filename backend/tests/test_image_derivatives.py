@@ -0,0 +1,119 @@
+import io
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageDraw
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.image_chat_service import image_chat_service
+from chats.image_derivatives import derivative_path, get_derivative, render_derivatives
+
+
+def phone_photo(size=(4000, 3000), orientation=6):
+    """A large JPEG the way phones store portrait shots: landscape pixels plus an EXIF rotation"""
+    image = Image.new('RGB', size, 'white')
+    ImageDraw.Draw(image).rectangle((100, 100, 1900, 400), fill='black')
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class RenderDerivativesTestCase(SimpleTestCase):
+    def test_copies_are_small_upright_and_typed(self):
+        rendered = render_derivatives(Image.open(io.BytesIO(phone_photo())))
+        thumb = Image.open(io.BytesIO(rendered['thumb']))
+        preview = Image.open(io.BytesIO(rendered['preview']))
+        ocr = Image.open(io.BytesIO(rendered['ocr']))
+        self.assertEqual((thumb.format, thumb.size), ('WEBP', (192, 256)))
+        self.assertEqual((preview.format, preview.size), ('WEBP', (960, 1280)))
+        self.assertEqual((ocr.format, ocr.mode), ('PNG', 'L'))
+        self.assertEqual(max(ocr.size), 2500)
+        self.assertGreater(ocr.size[1], ocr.size[0])
+
+    def test_small_images_are_not_enlarged(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (120, 80), (255, 0, 0, 128)).save(buffer, format='PNG')
+        rendered = render_derivatives(Image.open(buffer), ['thumb', 'ocr'])
+        self.assertEqual(Image.open(io.BytesIO(rendered['thumb'])).size, (120, 80))
+        self.assertEqual(Image.open(io.BytesIO(rendered['ocr'])).size, (120, 80))
+
+    def test_derivatives_sit_next_to_the_original(self):
+        self.assertEqual(derivative_path('chat_images/anon_1/abc.jpeg', 'thumb'), 'chat_images/anon_1/abc.thumb.webp')
+        self.assertEqual(derivative_path('chat_images/anon_1/abc.jpeg', 'ocr'), 'chat_images/anon_1/abc.ocr.png')
+
+
+class ChatImageApiTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def upload(self):
+        photo = SimpleUploadedFile('notice.jpg', phone_photo(), content_type='image/jpeg')
+        response = self.client.post(reverse('upload_chat_image'), {'image': photo}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stored = image_chat_service.get_image(
+            f"anon_{self.client.cookies['anon_id'].value.split(':')[0]}", response.data['image_id']
+        )
+        # Let the background run finish before the temporary MEDIA_ROOT goes away
+        get_derivative(stored.file_path, 'thumb')
+        return response.data, stored
+
+    def test_thumbnail_is_served_with_long_cache_headers(self):
+        data, stored = self.upload()
+        response = self.client.get(data['thumbnail_url'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (192, 256))
+
+        cached = self.client.get(data['thumbnail_url'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(reverse('chat_image', args=[stored.id, 'huge'])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(APIClient().get(data['thumbnail_url']).status_code, status.HTTP_404_NOT_FOUND)
+
+        listing = self.client.post(reverse('chat_with_images'), {'message': 'list images'}, format='json')
+        self.assertEqual(listing.data['thumbnails'], [data['thumbnail_url']])
+
+    def test_images_are_found_in_storage_by_any_worker(self):
+        data, stored = self.upload()
+        # Another gunicorn worker never saw the upload in memory
+        with mock.patch.object(image_chat_service.get(), 'user_images', {}):
+            response = self.client.get(data['preview_url'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            original = self.client.get(reverse('chat_image', args=[stored.id, 'original']))
+            self.assertEqual(original['Content-Type'], 'image/jpeg')
+            self.assertEqual(self.client.get(reverse('chat_image', args=['..', 'thumb'])).status_code,
+                             status.HTTP_404_NOT_FOUND)
+
+    def test_corrupt_upload_is_not_a_server_error(self):
+        user = get_user_model().objects.create_user(username='img@example.com', email='img@example.com',
+                                                    name='Image User', password='testpass123')
+        self.client.force_authenticate(user=user)
+        image_id = str(uuid.uuid4())
+        default_storage.save(f"chat_images/{user.id}/{image_id}.jpg", ContentFile(b'\xff\xd8\xff\xe0' + b'0' * 64))
+        response = self.client.get(reverse('chat_image', args=[image_id, 'thumb']))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @mock.patch('chats.image_chat_service.pytesseract.image_to_string', return_value='NOTICE')
+    def test_ocr_reads_the_grayscale_copy(self, image_to_string):
+        _, stored = self.upload()
+        self.assertEqual(image_chat_service.extract_text_from_image(stored.file_path), 'NOTICE')
+        image = image_to_string.call_args[0][0]
+        self.assertEqual((image.mode, max(image.size)), ('L', 2500))
@@ -0,0 +1,135 @@
+"""
+Import-time budget for application startup
+
+Boots Django and loads every URLconf/view module in a fresh interpreter with
+``python -X importtime``, without Supabase credentials, and fails when:
+- boot fails or prints anything (import must be side-effect free)
+- a module that should only load on first use is imported at startup
+- total import time exceeds IMPORT_TIME_BUDGET_MS, when that is set (wall-clock
+  timings depend on the machine, so the budget is only checked on request)
+"""
+
+import inspect
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from apna_lawyer.utils import LazyService
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BOOT_SCRIPT = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from apna_lawyer.wsgi import application
+"""
+
+# Packages that must only be imported when a request first needs them
+LAZY_MODULES = ('supabase', 'gotrue', 'postgrest', 'storage3', 'realtime')
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+class ImportTimeBudgetTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        env = {k: v for k, v in os.environ.items() if k not in ('SUPABASE_URL', 'SUPABASE_KEY')}
+        env['DJANGO_SETTINGS_MODULE'] = 'apna_lawyer.settings'
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+        cls.result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+        )
+        cls.modules = parse_importtime(cls.result.stderr)
+
+    def test_boot_without_supabase_is_side_effect_free(self):
+        """Test that startup succeeds without Supabase credentials and prints nothing"""
+        self.assertEqual(self.result.returncode, 0, self.result.stderr[-2000:])
+        self.assertEqual(self.result.stdout, '')
+
+    def test_lazy_modules_not_imported(self):
+        """Test that heavy clients are not imported at startup"""
+        imported = sorted(name for name in self.modules if name.split('.')[0] in LAZY_MODULES)
+        self.assertEqual(imported, [])
+
+    @skipUnless(os.getenv('IMPORT_TIME_BUDGET_MS'), 'set IMPORT_TIME_BUDGET_MS to check startup time')
+    def test_import_time_budget(self):
+        """Test that total startup import time stays within budget"""
+        budget_ms = float(os.environ['IMPORT_TIME_BUDGET_MS'])
+        total_ms = sum(self_us for self_us, _ in self.modules.values()) / 1000
+        slowest = sorted(self.modules.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        self.assertLessEqual(
+            total_ms, budget_ms,
+            f"Startup imports took {total_ms:.0f} ms (budget {budget_ms:.0f} ms). Slowest: "
+            + ', '.join(f"{name}={cumulative / 1000:.0f}ms" for name, (_, cumulative) in slowest)
+        )
+
+
+class LazyServiceTestCase(SimpleTestCase):
+    def test_constructed_once_on_first_use(self):
+        """Test that concurrent first access constructs the service once"""
+        constructed = []
+
+        class SlowService:
+            def __init__(self):
+                constructed.append(1)
+                time.sleep(0.05)
+                self.name = 'slow'
+
+        service = LazyService(SlowService)
+        self.assertFalse(service.is_initialized())
+
+        threads = [threading.Thread(target=lambda: service.name) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(constructed), 1)
+        self.assertEqual(service.name, 'slow')
+        self.assertTrue(service.is_initialized())
+
+    def test_construction_errors_surface_on_use(self):
+        """Test that a failing factory raises at first use, not at import"""
+        def factory():
+            raise ValueError("Supabase URL and Key must be set in environment variables")
+
+        service = LazyService(factory)
+        with self.assertRaises(ValueError):
+            service.table('lawyers')
+        self.assertFalse(service.is_initialized())
+
+    def test_introspection_does_not_construct(self):
+        """Test that dunder probes (inspect, mock.patch) leave the service unbuilt"""
+        def factory():
+            raise ValueError("Supabase URL and Key must be set in environment variables")
+
+        service = LazyService(factory)
+        self.assertFalse(hasattr(service, '__func__'))
+        self.assertFalse(inspect.iscoroutinefunction(service))
+        holder = SimpleNamespace(supabase=service)
+        with mock.patch.object(holder, 'supabase'):
+            pass
+        self.assertFalse(service.is_initialized())
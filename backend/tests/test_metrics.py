@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apna_lawyer import metrics
+from apna_lawyer.metrics import MetricsRegistry
+
+
+class MetricsRegistryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = MetricsRegistry(directory=self.directory)
+        self.latency = self.registry.histogram(
+            'test_duration_seconds', 'Test latency', ('dependency',), buckets=(0.1, 1.0)
+        )
+        self.calls = self.registry.counter('test_calls_total', 'Test calls', ('dependency',))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test Prometheus histogram exposition"""
+        self.latency.observe(0.05, dependency='gemini')
+        self.latency.observe(0.5, dependency='gemini')
+        self.latency.observe(5.0, dependency='gemini')
+
+        output = self.registry.render()
+
+        self.assertIn('# TYPE test_duration_seconds histogram', output)
+        self.assertIn('test_duration_seconds_bucket{dependency="gemini",le="0.1"} 1', output)
+        self.assertIn('test_duration_seconds_bucket{dependency="gemini",le="1.0"} 2', output)
+        self.assertIn('test_duration_seconds_bucket{dependency="gemini",le="+Inf"} 3', output)
+        self.assertIn('test_duration_seconds_count{dependency="gemini"} 3', output)
+
+    def test_values_aggregate_across_worker_files(self):
+        """Test that counters from other worker files are summed"""
+        self.calls.inc(dependency='supabase')
+        with open(os.path.join(self.directory, '99999.json'), 'w') as fh:
+            json.dump({'test_calls_total': {json.dumps(['supabase']): 4}}, fh)
+
+        self.assertIn('test_calls_total{dependency="supabase"} 5', self.registry.render())
+
+    def test_dead_worker_counters_are_archived(self):
+        """Test that exited workers keep contributing to counters"""
+        with open(os.path.join(self.directory, '99999.json'), 'w') as fh:
+            json.dump({'test_calls_total': {json.dumps(['supabase']): 4}}, fh)
+
+        self.registry.mark_process_dead(99999)
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '99999.json')))
+        self.assertIn('test_calls_total{dependency="supabase"} 4', self.registry.render())
+
+    def test_missing_labels_raise(self):
+        """Test that observations must carry every label"""
+        with self.assertRaises(ValueError):
+            self.calls.inc()
+
+
+class MetricsEndpointTestCase(TestCase):
+    def test_metrics_endpoint_reports_requests_and_queries(self):
+        """Test /metrics exposes request and DB query histograms"""
+        self.client.get(reverse('health_check'))
+        metrics.record_cache('lawyers', hit=True)
+        metrics.record_cache('lawyers', hit=False)
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",endpoint="health/",status="200"}', body)
+        self.assertIn('# TYPE db_query_duration_seconds histogram', body)
+        self.assertIn('cache_hit_ratio{cache="lawyers"}', body)
@@ -0,0 +1,149 @@
+import io
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.ai_service import GeminiAIService
+from chats.batch_service import fan_out
+from chats.models import UserChat
+from chats.singleflight import SingleFlight
+
+User = get_user_model()
+
+
+def page_image(grey, file_format='PNG', frames=()):
+    """Encoded image of one grey level; extra frames (greys) make a multi-page TIFF"""
+    buffer = io.BytesIO()
+    first = Image.new('L', (200, 120), grey)
+    extra = [Image.new('L', (200, 120), frame) for frame in frames]
+    first.save(buffer, format=file_format, save_all=bool(extra), append_images=extra)
+    return buffer.getvalue()
+
+
+def fake_ocr(image, lang='eng'):
+    """Reads the grey level of the page; page 0 is slow so later pages finish first"""
+    grey = image.getpixel((100, 60))[0]
+    if grey == 0:
+        time.sleep(0.1)
+    if grey == 99:
+        raise RuntimeError('Tesseract crashed')
+    return f"  Agreement page\n\n grey {grey}\n"
+
+
+class RecordingAIService:
+    def __init__(self):
+        self.calls = []
+
+    def generate_legal_response(self, user_message, system_prompt=None, image_text=None, deadline=None):
+        self.calls.append((user_message, image_text))
+        self.budget_left = deadline.remaining()
+        return 'The agreement fixes rent at Rs. 10,000.'
+
+
+@mock.patch('chats.ocr_engines.pytesseract.image_to_string', side_effect=fake_ocr)
+class OCRBatchAPITestCase(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('ocr_batch_api')
+
+    def _post(self, files, **data):
+        response = self.client.post(self.url, {'images': files, **data}, format='multipart')
+        if response.status_code != status.HTTP_200_OK:
+            return response, None
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return response, lines
+
+    def test_files_and_tiff_frames_stream_in_page_order(self, _):
+        tiff = SimpleUploadedFile('agreement.tiff', page_image(0, 'TIFF', frames=(40, 80)), content_type='image/tiff')
+        photo = SimpleUploadedFile('last.png', page_image(120), content_type='image/png')
+        response, lines = self._post([tiff, photo])
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        pages = [line for line in lines if line['type'] == 'page']
+        self.assertEqual([(page['page'], page['file_name'], page['frame']) for page in pages],
+                         [(1, 'agreement.tiff', 0), (2, 'agreement.tiff', 1), (3, 'agreement.tiff', 2), (4, 'last.png', 0)])
+        self.assertEqual([page['extracted_text'] for page in pages],
+                         [f"Agreement page grey {grey}" for grey in (0, 40, 80, 120)])
+        self.assertEqual(lines[-1], {'type': 'summary', 'total': 4, 'succeeded': 4, 'failed': 0, 'is_anonymous': True})
+
+    def test_failed_pages_do_not_fail_the_batch(self, _):
+        files = [SimpleUploadedFile(f"{grey}.png", page_image(grey), content_type='image/png') for grey in (10, 99)]
+        _, lines = self._post(files)
+        self.assertTrue(lines[0]['success'])
+        self.assertEqual((lines[1]['success'], lines[1]['error']), (False, 'Tesseract crashed'))
+        self.assertEqual(lines[-1]['failed'], 1)
+
+    def test_text_is_handed_to_the_chat(self, _):
+        user = User.objects.create_user(username='ocr@example.com', email='ocr@example.com',
+                                        name='OCR User', password='testpass123')
+        self.client.force_authenticate(user=user)
+        ai_service = RecordingAIService()
+        files = [SimpleUploadedFile(f"{grey}.png", page_image(grey), content_type='image/png') for grey in (10, 20)]
+        with mock.patch('chats.views.get_ai_service', return_value=ai_service):
+            _, lines = self._post(files, message='What rent does this agreement fix?')
+
+        chat = next(line for line in lines if line['type'] == 'chat')
+        self.assertEqual(chat['response'], 'The agreement fixes rent at Rs. 10,000.')
+        self.assertEqual(ai_service.calls, [('What rent does this agreement fix?',
+                                             'Page 1: Agreement page grey 10\n\nPage 2: Agreement page grey 20')])
+        saved = UserChat.objects.get(user=user)
+        self.assertEqual(str(saved.id), chat['chat_id'])
+        self.assertIn('Page 2: Agreement page grey 20', saved.user_text_input)
+
+    @override_settings(AI_HEDGE_ENABLED=False)
+    @mock.patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'})
+    def test_failed_chat_is_reported_and_not_saved(self, _):
+        user = User.objects.create_user(username='ocr@example.com', email='ocr@example.com',
+                                        name='OCR User', password='testpass123')
+        self.client.force_authenticate(user=user)
+        files = [SimpleUploadedFile('10.png', page_image(10), content_type='image/png')]
+        upstream = mock.Mock(status_code=400, text='API key not valid')
+        with mock.patch('chats.views.get_ai_service', return_value=GeminiAIService()), \
+                mock.patch('chats.ai_service.ai_request_coalescer', SingleFlight(use_lock_table=False)), \
+                mock.patch('chats.ai_service.requests.post', return_value=upstream):
+            _, lines = self._post(files, message='What rent does this agreement fix?')
+
+        chat = next(line for line in lines if line['type'] == 'chat')
+        self.assertFalse(chat['success'])
+        self.assertIn('API key not valid', chat['error'])
+        self.assertFalse(UserChat.objects.filter(user=user).exists())
+
+    @override_settings(AI_REQUEST_BUDGET_SECONDS=0.08)
+    def test_chat_budget_starts_after_ocr(self, _):
+        """Test that slow OCR (page 0 takes 0.1 s) does not spend the AI call's budget"""
+        ai_service = RecordingAIService()
+        files = [SimpleUploadedFile(f"{grey}.png", page_image(grey), content_type='image/png') for grey in (0, 20)]
+        with mock.patch('chats.views.get_ai_service', return_value=ai_service):
+            _, lines = self._post(files, message='What rent does this agreement fix?')
+        self.assertTrue(next(line for line in lines if line['type'] == 'chat')['success'])
+        self.assertGreater(ai_service.budget_left, 0.05)
+
+    @override_settings(OCR_BATCH_MAX_PAGES=2)
+    def test_invalid_batches_are_rejected(self, _):
+        tiff = SimpleUploadedFile('a.tiff', page_image(0, 'TIFF', frames=(40, 80)), content_type='image/tiff')
+        response, _ = self._post([tiff])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('at most 2 pages', response.data['error'])
+
+        pdf = SimpleUploadedFile('a.pdf', b'%PDF-1.4\n' + b'0' * 100, content_type='application/pdf')
+        self.assertEqual(self._post([pdf])[0].status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class OrderedFanOutTestCase(TransactionTestCase):
+    def test_results_come_in_input_order(self):
+        def handler(delay):
+            time.sleep(delay)
+            return delay
+
+        results = list(fan_out([0.1, 0.0, 0.05], handler, max_workers=3, ordered=True))
+        self.assertEqual([result.response for result in results], [0.1, 0.0, 0.05])
@@ -0,0 +1,122 @@
+import base64
+import io
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from chats import ocr_engines
+from chats.ocr_engines import OCREngine, PytesseractEngine, TesserocrEngine, create_engine, ocr_engine
+from chats.ocr_service import ocr_service
+
+
+class FakeTessBaseAPI:
+    """Stands in for tesserocr.PyTessBaseAPI; counts initialisations"""
+
+    created = []
+
+    def __init__(self, lang='eng', path=None):
+        self.lang = lang
+        self.image = None
+        self.ended = False
+        FakeTessBaseAPI.created.append(self)
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        time.sleep(0.01)
+        return f"{self.lang} text"
+
+    def Clear(self):
+        self.image = None
+
+    def End(self):
+        self.ended = True
+
+
+class TesserocrEngineTestCase(SimpleTestCase):
+    def setUp(self):
+        FakeTessBaseAPI.created = []
+        fake_tesserocr = mock.Mock(PyTessBaseAPI=FakeTessBaseAPI,
+                                   get_languages=mock.Mock(return_value=('/tessdata/', ['eng', 'hin'])),
+                                   tesseract_version=mock.Mock(return_value='tesseract 5.3.0'))
+        for patcher in (mock.patch.object(ocr_engines, 'TESSEROCR_AVAILABLE', True),
+                        mock.patch.object(ocr_engines, 'tesserocr', fake_tesserocr, create=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.image = Image.new('L', (100, 40), 255)
+
+    def test_handles_are_reused_per_language_set(self):
+        engine = TesserocrEngine(pool_size=2)
+        for _ in range(3):
+            self.assertEqual(engine.image_to_string(self.image, lang='eng'), 'eng text')
+        self.assertEqual(engine.image_to_string(self.image, lang='eng+hin'), 'eng+hin text')
+        self.assertEqual([api.lang for api in FakeTessBaseAPI.created], ['eng', 'eng+hin'])
+        self.assertEqual(engine.pool_stats(), {'eng': {'created': 1, 'idle': 1},
+                                               'eng+hin': {'created': 1, 'idle': 1}})
+        self.assertEqual(engine.describe()['languages'], ['eng', 'hin'])
+
+        engine.close()
+        self.assertTrue(all(api.ended for api in FakeTessBaseAPI.created))
+
+    def test_concurrent_pages_share_at_most_pool_size_handles(self):
+        engine = TesserocrEngine(pool_size=2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(engine.image_to_string(self.image)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['eng text'] * 8)
+        self.assertEqual(len(FakeTessBaseAPI.created), 2)
+        self.assertEqual(engine.pool_stats()['eng'], {'created': 2, 'idle': 2})
+
+    def test_forked_workers_build_their_own_handles(self):
+        engine = TesserocrEngine(pool_size=1)
+        engine.image_to_string(self.image)
+        with mock.patch('chats.ocr_engines.os.getpid', return_value=-1):
+            engine.image_to_string(self.image)
+        self.assertEqual(len(FakeTessBaseAPI.created), 2)
+
+    def test_failed_initialisation_frees_its_slot(self):
+        engine = TesserocrEngine(pool_size=1)
+        with mock.patch.object(FakeTessBaseAPI, '__init__', side_effect=RuntimeError('no hin.traineddata')):
+            with self.assertRaises(RuntimeError):
+                engine.image_to_string(self.image, lang='hin')
+        self.assertEqual(engine.image_to_string(self.image, lang='hin'), 'hin text')
+
+    @override_settings(OCR_ENGINE='tesserocr', OCR_ENGINE_POOL_SIZE=3)
+    def test_ocr_service_uses_the_configured_engine(self):
+        ocr_engine.reset()
+        self.addCleanup(ocr_engine.reset)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), 'white').save(buffer, format='PNG')
+        data_url = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        # A blank page has no script to detect, so both languages are used
+        self.assertEqual(ocr_service.extract_text_from_base64(data_url), 'eng+hin text')
+        self.assertEqual(ocr_engine.get().pool_size, 3)
+        installed, info = ocr_service.check_tesseract_installation()
+        self.assertTrue(installed)
+        self.assertEqual(info['engine'], 'tesserocr')
+
+
+class CreateEngineTestCase(SimpleTestCase):
+    def test_engine_is_chosen_by_setting(self):
+        self.assertIsInstance(create_engine(), PytesseractEngine)
+        with mock.patch.object(ocr_engines, 'TESSEROCR_AVAILABLE', False):
+            with self.assertRaises(ImportError):
+                create_engine('tesserocr')
+        with self.assertRaises(ValueError):
+            create_engine('easyocr')
+
+    def test_incomplete_engine_fails_at_construction(self):
+        class TextOnlyEngine(OCREngine):
+            def image_to_string(self, image, lang='eng'):
+                return ''
+
+        with self.assertRaises(TypeError):
+            TextOnlyEngine()
@@ -0,0 +1,136 @@
+import base64
+import io
+import random
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image, ImageDraw, ImageFont
+
+from chats.ocr_languages import BOTH, ENGLISH, HINDI, detect_script, languages_for_share, prepare_for_ocr
+from chats.ocr_service import ocr_service
+
+LATIN_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+WORDS = ('the tenant shall pay rent before the fifth day of each month and the landlord must give '
+         'notice in writing under Section 106 of the Transfer of Property Act').split()
+
+
+def devanagari_word(draw, x, y, size, rng):
+    """
+    Draw a Devanagari-like word: letter bodies hanging from a headline
+
+    No Devanagari font is installed on CI, so the shapes are drawn directly.
+    """
+    stroke = max(2, size // 12)
+    letter = int(size * 0.55)
+    headline = y + int(size * 0.35)
+    base = headline + int(size * 0.6)
+    width = rng.randint(2, 5) * letter
+    draw.rectangle((x, headline, x + width, headline + stroke - 1), fill=0)
+    for left in range(x, x + width, letter):
+        if rng.random() < 0.6:
+            draw.rectangle((left + letter - stroke - 2, headline, left + letter - 3, base), fill=0)
+        draw.arc((left + 1, headline + int(size * 0.12), left + letter - stroke, base), 90, 300,
+                 fill=0, width=stroke)
+    return width
+
+
+def page(hindi_share, size=34, seed=0, underline_every=0, underline_words=0.0):
+    """
+    A4 page at 300 dpi with each word Hindi-like with probability hindi_share
+
+    Every underline_every-th line is underlined across its width, and each
+    other word with probability underline_words.
+    """
+    rng = random.Random(seed)
+    image = Image.new('L', (2480, 3508), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(LATIN_FONT, size)
+    ascent, _ = font.getmetrics()
+    underline = int(size * 0.15)
+    for line, y in enumerate(range(200, 3200, int(size * 1.7))):
+        x = 200
+        while x < 2480 - 200 - size * 4:
+            if rng.random() < hindi_share:
+                width = devanagari_word(draw, x, y, size, rng)
+            else:
+                word = rng.choice(WORDS)
+                draw.text((x, y), word, fill=0, font=font)
+                width = int(draw.textlength(word, font=font))
+            if rng.random() < underline_words:
+                draw.rectangle((x, y + ascent + underline, x + width, y + ascent + underline + 2), fill=0)
+            x += width + int(size * 0.45)
+        if underline_every and line % underline_every == 0:
+            draw.rectangle((200, y + ascent + underline, x - int(size * 0.45), y + ascent + underline + 2), fill=0)
+    return image
+
+
+class ScriptDetectionTestCase(SimpleTestCase):
+    def test_smallest_language_set_is_chosen(self):
+        self.assertEqual(detect_script(page(0.0)).lang, ENGLISH)
+        self.assertEqual(detect_script(page(1.0)).lang, HINDI)
+        mixed = detect_script(page(0.4))
+        self.assertEqual(mixed.lang, BOTH)
+        self.assertTrue(0.2 < mixed.devanagari_share < 0.6)
+
+    def test_rotated_pages_are_turned_upright(self):
+        for hindi_share in (0.0, 1.0):
+            upright = page(hindi_share, seed=1)
+            for rotation in (90, 180, 270):
+                with self.subTest(hindi_share=hindi_share, rotation=rotation):
+                    turned = upright.rotate(-rotation, expand=True, fillcolor=255)
+                    prepared = prepare_for_ocr(turned)
+                    self.assertEqual(prepared.detection.rotation, rotation)
+                    self.assertEqual(prepared.image.size, upright.size)
+
+    def test_underlines_are_not_headlines(self):
+        for hindi_share, lang in ((0.0, ENGLISH), (1.0, HINDI)):
+            for underlines in ({'underline_every': 1}, {'underline_every': 2}, {'underline_every': 3},
+                               {'underline_words': 0.5}):
+                upright = page(hindi_share, seed=2, **underlines)
+                for rotation in (0, 180):
+                    with self.subTest(hindi_share=hindi_share, rotation=rotation, **underlines):
+                        turned = upright.rotate(-rotation, fillcolor=255) if rotation else upright
+                        detection = detect_script(turned)
+                        self.assertEqual((detection.lang, detection.rotation), (lang, rotation))
+
+    def test_weak_evidence_does_not_turn_the_page(self):
+        # One misread word against another: too close to call, so the page stays as it is
+        words = [(100, True, -1), (90, False, 1)]
+        with mock.patch('chats.ocr_languages._classify_words', return_value=words):
+            self.assertEqual(detect_script(page(0.0)).rotation, 0)
+        words = [(100, True, -1), (20, False, 1)]
+        with mock.patch('chats.ocr_languages._classify_words', return_value=words):
+            self.assertEqual(detect_script(page(0.0)).rotation, 180)
+
+    def test_blank_pages_and_disabled_detection_use_both_languages(self):
+        blank = detect_script(Image.new('RGB', (800, 600), 'white'))
+        self.assertEqual((blank.lang, blank.rotation), (BOTH, 0))
+        with override_settings(OCR_SCRIPT_DETECTION='off'):
+            self.assertEqual(detect_script(page(0.0)).lang, BOTH)
+
+    def test_osd_falls_back_to_the_heuristic(self):
+        with mock.patch('pytesseract.image_to_osd', side_effect=RuntimeError('no osd.traineddata')):
+            detection = detect_script(page(0.0), 'osd')
+        self.assertEqual((detection.lang, detection.method), (ENGLISH, 'heuristic'))
+
+        osd = {'rotate': 90, 'script': 'Devanagari', 'script_conf': 8.5}
+        with mock.patch('pytesseract.image_to_osd', return_value=osd):
+            detection = detect_script(page(0.0), 'osd')
+        self.assertEqual((detection.lang, detection.rotation), (HINDI, 270))
+
+    def test_languages_for_share(self):
+        self.assertEqual(languages_for_share(None), BOTH)
+        self.assertEqual(languages_for_share(0.95), HINDI)
+        self.assertEqual(languages_for_share(0.05), ENGLISH)
+        self.assertEqual(languages_for_share(0.5), BOTH)
+
+    @override_settings(OCR_REGION_WORKERS=1)
+    @mock.patch('chats.ocr_service.pytesseract.image_to_string', return_value='Rent agreement')
+    def test_ocr_service_uses_detected_languages(self, image_to_string):
+        buffer = io.BytesIO()
+        page(0.0).rotate(-90, expand=True, fillcolor=255).save(buffer, format='PNG')
+        data_url = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        self.assertEqual(ocr_service.extract_text_from_base64(data_url), 'Rent agreement')
+        image, = image_to_string.call_args[0]
+        self.assertEqual(image_to_string.call_args[1]['lang'], ENGLISH)
+        self.assertEqual(image.size, (2480, 3508))
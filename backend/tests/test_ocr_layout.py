@@ -0,0 +1,140 @@
+import io
+import random
+import threading
+import time
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageDraw, ImageFont
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.ocr_layout import TextBlock, recognize_page, segment_page
+
+LATIN_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+WORDS = ('the tenant shall pay rent on or before the fifth day of each month and the landlord '
+         'must give notice').split()
+
+
+def paragraph(draw, left, right, top, lines, font, rng):
+    """Draw lines of words between left and right; returns the y below the paragraph"""
+    for _ in range(lines):
+        x = left
+        while True:
+            word = rng.choice(WORDS)
+            width = draw.textlength(word, font=font)
+            if x + width > right:
+                break
+            draw.text((x, top), word, fill=0, font=font)
+            x += width + font.size * 0.4
+        top += int(font.size * 1.6)
+    return top
+
+
+def blank_page():
+    image = Image.new('L', (2480, 3508), 255)
+    return image, ImageDraw.Draw(image), ImageFont.truetype(LATIN_FONT, 34), random.Random(0)
+
+
+class SegmentPageTestCase(SimpleTestCase):
+    def test_dense_single_column_is_cut_between_lines(self):
+        image, draw, font, rng = blank_page()
+        paragraph(draw, 200, 2280, 200, 56, font, rng)
+        blocks = segment_page(image, parts=4)
+        self.assertEqual(len(blocks), 4)
+        tops = [block.bbox[1] for block in blocks]
+        self.assertEqual(tops, sorted(tops))
+        for upper, lower in zip(blocks, blocks[1:]):
+            self.assertLessEqual(upper.bbox[3] - 2, lower.bbox[1])
+        self.assertEqual(len(segment_page(image)), 1)
+
+    def test_columns_are_read_before_the_next_row(self):
+        image, draw, font, rng = blank_page()
+        draw.text((800, 150), 'RENT AGREEMENT', fill=0, font=ImageFont.truetype(LATIN_FONT, 60))
+        for left, right in ((200, 1180), (1300, 2280)):
+            top = 350
+            for _ in range(3):
+                top = paragraph(draw, left, right, top, 8, font, rng) + 60
+        blocks = segment_page(image)
+        self.assertEqual(len(blocks), 7)
+        header, body = blocks[0], blocks[1:]
+        self.assertLess(header.bbox[3], 350)
+        self.assertEqual([block.bbox[0] < 1240 for block in body], [True] * 3 + [False] * 3)
+
+    def test_list_numbers_stay_with_their_items(self):
+        image, draw, font, rng = blank_page()
+        for number in range(1, 15):
+            top = 200 + number * 55
+            draw.text((200, top), f"{number}.", fill=0, font=font)
+            paragraph(draw, 400, 2280, top, 1, font, rng)
+        self.assertEqual(len(segment_page(image)), 1)
+
+    def test_blank_page_has_no_blocks(self):
+        self.assertEqual(segment_page(Image.new('L', (1000, 800), 255)), [])
+
+
+@override_settings(OCR_REGION_WORKERS=4, OCR_REGION_MIN_PIXELS=0)
+class RecognizePageTestCase(SimpleTestCase):
+    def setUp(self):
+        # Four bands of different grey; the fake engine "reads" the grey of the band it gets
+        self.image = Image.new('L', (400, 400), 255)
+        self.blocks = []
+        for index in range(4):
+            box = (0, index * 100, 400, index * 100 + 90)
+            ImageDraw.Draw(self.image).rectangle(box, fill=index * 40)
+            self.blocks.append(TextBlock(box))
+        self.threads = set()
+
+    def read(self, image, lang='eng'):
+        self.threads.add(threading.get_ident())
+        grey = image.getpixel((image.width // 2, image.height // 2))
+        # Later blocks finish first; the text must still come out in reading order
+        time.sleep(0.05 - grey / 4000)
+        return f"block {grey // 40}"
+
+    def test_blocks_are_read_in_parallel_and_joined_in_reading_order(self):
+        engine = mock.Mock(image_to_string=self.read)
+        with mock.patch('chats.ocr_layout.segment_page', return_value=self.blocks), \
+                mock.patch('chats.ocr_layout.ocr_engine', engine):
+            layout = recognize_page(self.image, 'eng')
+        self.assertEqual(layout.text, 'block 0\n\nblock 1\n\nblock 2\n\nblock 3')
+        self.assertGreater(len(self.threads), 1)
+
+    def test_structured_output_has_boxes_and_confidence(self):
+        engine = mock.Mock(recognize=lambda image, lang: (self.read(image), 90.0))
+        with mock.patch('chats.ocr_layout.segment_page', return_value=self.blocks), \
+                mock.patch('chats.ocr_layout.ocr_engine', engine):
+            layout = recognize_page(self.image, 'eng', structured=True).as_dict()
+        self.assertEqual(layout['blocks'][2], {'bbox': (0, 200, 400, 290), 'text': 'block 2', 'confidence': 90.0})
+        self.assertEqual((layout['width'], layout['height']), (400, 400))
+
+    @override_settings(OCR_REGION_WORKERS=1)
+    def test_single_worker_reads_the_whole_page(self):
+        engine = mock.Mock(image_to_string=mock.Mock(return_value='whole page'))
+        with mock.patch('chats.ocr_layout.ocr_engine', engine):
+            self.assertEqual(recognize_page(self.image, 'eng').text, 'whole page')
+        self.assertEqual(engine.image_to_string.call_args[0][0].size, (400, 400))
+
+
+class LayoutApiTestCase(TestCase):
+    @mock.patch('chats.ocr_layout.ocr_engine')
+    def test_ocr_api_returns_blocks_on_request(self, engine):
+        engine.recognize.return_value = ('Rent  agreement\n', 87.5)
+        image, draw, font, rng = blank_page()
+        paragraph(draw, 200, 1100, 200, 5, font, rng)
+        paragraph(draw, 200, 1100, 800, 5, font, rng)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        upload = SimpleUploadedFile('scan.png', buffer.getvalue(), content_type='image/png')
+
+        response = APIClient().post(reverse('ocr_image_api'), {'image': upload, 'layout': 'true'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        layout = response.data['layout']
+        self.assertEqual(response.data['extracted_text'], 'Rent agreement Rent agreement')
+        self.assertEqual((layout['lang'], layout['rotation']), ('eng', 0))
+        self.assertEqual(len(layout['blocks']), 2)
+        self.assertEqual(layout['blocks'][0]['confidence'], 87.5)
+        left, top, right, bottom = layout['blocks'][1]['bbox']
+        self.assertTrue(top >= 790 and left >= 190 and right <= 1110)
@@ -0,0 +1,90 @@
+from django.test import SimpleTestCase, override_settings
+
+from chats.prompt_builder import PromptBuilder, estimate_tokens, split_passages
+
+SYSTEM = "You are a legal assistant."
+
+
+class EstimateTokensTestCase(SimpleTestCase):
+    def test_ascii_and_devanagari(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('a' * 40), 10)
+        self.assertGreater(estimate_tokens('धारा ४२०'), estimate_tokens('abcdefgh'))
+
+    def test_long_paragraphs_are_split_on_sentences(self):
+        paragraph = ' '.join(f"Sentence number {i} is here." for i in range(100))
+        passages = split_passages(paragraph, max_tokens=50)
+        self.assertGreater(len(passages), 1)
+        self.assertTrue(all(estimate_tokens(p) <= 50 for p in passages))
+
+
+    def test_unpunctuated_text_is_split_between_words(self):
+        text = ' '.join(f"word{i}" for i in range(1000))
+        passages = split_passages(text, max_tokens=50)
+        self.assertGreater(len(passages), 1)
+        self.assertTrue(all(estimate_tokens(p) <= 50 for p in passages))
+        self.assertEqual(' '.join(passages), text)
+
+
+class PromptBuilderTestCase(SimpleTestCase):
+    def test_image_text_is_sent_once(self):
+        """Test that OCR text in the question and in image_text appears once"""
+        ocr = "Notice under Section 138 of the Negotiable Instruments Act for a dishonoured cheque"
+        message = f"What should I do?\n\n[Image contains text: {ocr}]"
+
+        built = PromptBuilder(max_tokens=1000).build(SYSTEM, message, [('Extracted Text from Image', ocr)])
+
+        self.assertEqual(built.text.count(ocr), 1)
+        self.assertIn('User Question: What should I do?\n', built.text)
+        self.assertEqual(built.duplicate_passages, 1)
+
+    def test_repeated_passages_are_dropped(self):
+        document = "Clause 1: rent is due monthly.\n\nClause 2: deposit is refundable.\n\nClause 1: rent is due monthly."
+        built = PromptBuilder(max_tokens=1000).build(SYSTEM, 'Summarise', [('Document', document)])
+        self.assertEqual(built.text.count('rent is due monthly'), 1)
+
+    def test_small_context_is_kept_verbatim(self):
+        built = PromptBuilder(max_tokens=1000).build(SYSTEM, 'Question?', [('Extracted Text from Image', 'Short text')])
+        self.assertEqual(built.text, f"{SYSTEM}\n\nUser Question: Question?\n\nExtracted Text from Image: Short text")
+        self.assertFalse(built.trimmed)
+
+    def test_long_context_keeps_relevant_passages_within_budget(self):
+        """Test that trimming keeps the passages that match the question"""
+        filler = [f"Paragraph {i} describes unrelated boilerplate about office furniture and stationery." for i in range(200)]
+        filler.insert(150, "The tenant may terminate the lease with two months written notice.")
+        document = '\n\n'.join(filler)
+
+        built = PromptBuilder(max_tokens=300).build(SYSTEM, 'How can the tenant terminate the lease?',
+                                                    [('Document', document)])
+
+        self.assertLessEqual(built.tokens, 300)
+        self.assertTrue(built.trimmed)
+        self.assertIn('terminate the lease with two months', built.text)
+        self.assertLess(built.tokens, estimate_tokens(document))
+
+    def test_long_single_line_ocr_text_is_kept_up_to_the_budget(self):
+        """Test that unpunctuated OCR text (one line after cleanup) is cut to fit, not dropped"""
+        lines = [f"line {i} rent deposit tenant landlord premises clause" for i in range(400)]
+        ocr = ' '.join(lines)  # normalize_text() joins OCR lines with spaces
+
+        built = PromptBuilder(max_tokens=2000).build(SYSTEM, 'What is the deposit?',
+                                                     [('Extracted Text from Image', ocr)])
+
+        self.assertEqual(built.sections, ['Extracted Text from Image'])
+        self.assertLessEqual(built.tokens, 2000)
+        self.assertGreater(built.context_tokens, 1500)
+        self.assertTrue(built.trimmed)
+        self.assertIn('line 0 rent deposit', built.text)
+
+    def test_passage_larger_than_the_budget_is_truncated(self):
+        builder = PromptBuilder(max_tokens=120, passage_tokens=1000)
+        built = builder.build(SYSTEM, 'Question?', [('Document', 'clause ' * 500)])
+        self.assertLessEqual(built.tokens, 120)
+        self.assertEqual((built.dropped_passages, built.truncated_passages), (0, 1))
+        self.assertGreater(built.context_tokens, 80)
+
+    @override_settings(AI_PROMPT_MAX_TOKENS=50)
+    def test_budget_comes_from_settings(self):
+        built = PromptBuilder().build(SYSTEM, 'Question?', [('Document', 'word ' * 500)])
+        self.assertLessEqual(built.tokens, 50)
+        self.assertTrue(0 < built.context_tokens < estimate_tokens('word ' * 500))
@@ -0,0 +1,111 @@
+import gzip
+import io
+import unittest
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from apna_lawyer import middleware
+from apna_lawyer.middleware import CompressionMiddleware
+from apna_lawyer.parsers import ORJSONParser
+from apna_lawyer.renderers import MSGPACK_AVAILABLE, MessagePackRenderer, ORJSONRenderer
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    def test_output_matches_stock_renderer(self):
+        data = {
+            'id': uuid.UUID('6abf82b1-bed9-4520-a7c1-8c8e9c4a3a11'),
+            'timestamp': datetime(2024, 5, 1, 10, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'fee': Decimal('1500.50'),
+            'text': 'जमानत याचिका',
+            'big': 2 ** 70,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_from_accept_header(self):
+        rendered = ORJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ORJSONParserTestCase(SimpleTestCase):
+    def test_parses_bytes(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"message": "जमानत"}'.encode())), {'message': 'जमानत'})
+
+    def test_invalid_json_raises_parse_error(self):
+        for body in (b'{"message": ', b'{"value": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+
+@unittest.skipUnless(MSGPACK_AVAILABLE, 'msgpack is not installed')
+class MessagePackTestCase(SimpleTestCase):
+    def test_round_trip_uses_json_strings(self):
+        import msgpack
+        data = {'id': uuid.UUID('6abf82b1-bed9-4520-a7c1-8c8e9c4a3a11'),
+                'timestamp': datetime(2024, 5, 1, tzinfo=dt_timezone.utc)}
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data)),
+                         {'id': '6abf82b1-bed9-4520-a7c1-8c8e9c4a3a11', 'timestamp': '2024-05-01T00:00:00Z'})
+
+
+@override_settings(COMPRESSION_MIN_BYTES=100)
+class CompressionMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b'{"chats": [' + b','.join([b'{"ai_response": "The court granted bail."}'] * 50) + b']}'
+
+    def run_middleware(self, response, accept_encoding='gzip, deflate, br'):
+        request = self.factory.get('/chats/chat/history/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_json_is_gzipped(self):
+        response = self.run_middleware(HttpResponse(self.body, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_brotli_preferred_when_available(self):
+        fake_brotli = mock.Mock(compress=mock.Mock(return_value=b'br'))
+        with mock.patch.object(middleware, 'BROTLI_AVAILABLE', True), \
+                mock.patch.object(middleware, 'brotli', fake_brotli, create=True):
+            response = self.run_middleware(HttpResponse(self.body, content_type='application/json'))
+            self.assertEqual(response['Content-Encoding'], 'br')
+            response = self.run_middleware(HttpResponse(self.body, content_type='application/json'), 'gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_streaming_and_unaccepted_responses_are_untouched(self):
+        cases = [
+            (HttpResponse(b'{"ok": true}', content_type='application/json'), 'gzip'),
+            (HttpResponse(self.body, content_type='application/json'), 'identity'),
+            (HttpResponse(self.body, content_type='application/json'), 'gzip;q=0'),
+            (HttpResponse(self.body, content_type='image/png'), 'gzip'),
+            (StreamingHttpResponse(iter([self.body]), content_type='application/x-ndjson'), 'gzip'),
+        ]
+        for response, accept_encoding in cases:
+            with self.subTest(content_type=response['Content-Type'], accept_encoding=accept_encoding):
+                self.assertFalse(self.run_middleware(response, accept_encoding).has_header('Content-Encoding'))
+
+    def test_responses_with_secrets_are_not_compressed(self):
+        token = b'{"access": "eyJhbGciOiJIUzI1NiJ9.eyJ1c2VyX2lkIjoxfQ.sig", "user": ' + self.body + b'}'
+        response = self.run_middleware(HttpResponse(token, content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        request = self.factory.get('/api/profile/', HTTP_ACCEPT_ENCODING='gzip')
+        request.resolver_match = resolve('/api/profile/')
+        response = CompressionMiddleware(lambda request: HttpResponse(self.body, content_type='application/json'))(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_choose_encoding(self):
+        self.assertEqual(CompressionMiddleware.choose_encoding('*'), 'gzip')
+        self.assertEqual(CompressionMiddleware.choose_encoding('br;q=1.0, gzip;q=0.5'), 'gzip')
+        self.assertIsNone(CompressionMiddleware.choose_encoding(''))
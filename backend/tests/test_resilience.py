@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from chats.ai_service import GeminiAIService, GeminiAPIError
+from chats.resilience import (
+    Deadline, DeadlineExceeded, LatencyTracker, RetryableError, RetryPolicy, hedged_call
+)
+from chats.singleflight import SingleFlight
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None, body=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.body = body
+
+    def json(self):
+        if self.body is not None:
+            return self.body
+        return {'candidates': [{'content': {'parts': [{'text': self.text}]}}]}
+
+
+class RetryPolicyTestCase(SimpleTestCase):
+    def test_retries_until_success(self):
+        """Test that retryable failures are retried with backoff"""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RetryableError('503')
+            return 'ok'
+
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02, min_attempt_time=0)
+        self.assertEqual(policy.call(flaky, Deadline(5)), 'ok')
+        self.assertEqual(len(attempts), 3)
+
+    def test_no_retry_without_budget(self):
+        """Test that a retry is skipped when the budget cannot cover it"""
+        def always_throttled():
+            raise RetryableError('429', retry_after=2)
+
+        policy = RetryPolicy(max_attempts=5, min_attempt_time=0.5)
+        with self.assertRaises(DeadlineExceeded):
+            policy.call(always_throttled, Deadline(1))
+
+    def test_backoff_respects_cap_and_retry_after(self):
+        policy = RetryPolicy(base_delay=1, max_delay=3)
+        self.assertTrue(all(0 <= policy.backoff(5) <= 3 for _ in range(50)))
+        self.assertEqual(policy.backoff(0, retry_after=2), 2)
+
+
+class HedgedCallTestCase(SimpleTestCase):
+    def test_slow_primary_is_hedged(self):
+        """Test that a second request races a slow first one"""
+        calls = []
+        lock = threading.Lock()
+
+        def upstream(timeout):
+            with lock:
+                calls.append(timeout)
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.05)
+            return 'primary' if first else 'hedge'
+
+        hedges = []
+        started = time.monotonic()
+        result = hedged_call(upstream, Deadline(5), hedge_after=0.1, on_hedge=lambda: hedges.append(1))
+
+        self.assertEqual(result, 'hedge')
+        self.assertEqual(len(hedges), 1)
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_fast_primary_is_not_hedged(self):
+        hedges = []
+        result = hedged_call(lambda timeout: 'fast', Deadline(5), hedge_after=0.5,
+                             on_hedge=lambda: hedges.append(1))
+        self.assertEqual(result, 'fast')
+        self.assertEqual(hedges, [])
+
+    def test_deadline_bounds_the_wait(self):
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            hedged_call(lambda timeout: time.sleep(2), Deadline(0.2), hedge_after=None)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_attempt_timeout_is_taken_when_it_starts(self):
+        """Test that an attempt queued behind a busy pool gets only the budget left"""
+        busy_pool = ThreadPoolExecutor(max_workers=1)
+        busy_pool.submit(time.sleep, 0.3)
+        timeouts = []
+
+        def upstream(timeout):
+            timeouts.append(timeout)
+            return 'answer'
+
+        with mock.patch('chats.resilience._hedge_executor', busy_pool):
+            self.assertEqual(hedged_call(upstream, Deadline(1.0), hedge_after=None), 'answer')
+            self.assertLess(timeouts[0], 0.75)
+
+            busy_pool.submit(time.sleep, 0.3)
+            with self.assertRaises(DeadlineExceeded):
+                hedged_call(upstream, Deadline(0.1), hedge_after=None)
+            busy_pool.shutdown(wait=True)
+        self.assertEqual(len(timeouts), 1)
+
+    def test_latency_percentile(self):
+        tracker = LatencyTracker(min_samples=10)
+        self.assertIsNone(tracker.percentile(95))
+        for value in range(1, 101):
+            tracker.record(value / 100)
+        self.assertAlmostEqual(tracker.percentile(95), 0.95, places=2)
+
+
+@override_settings(AI_HEDGE_ENABLED=False)
+class GeminiDeadlineTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        coalescer = mock.patch('chats.ai_service.ai_request_coalescer', SingleFlight(use_lock_table=False))
+        coalescer.start()
+        self.addCleanup(coalescer.stop)
+        self.service = GeminiAIService()
+        self.service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02, min_attempt_time=0)
+
+    @mock.patch('chats.ai_service.requests.post')
+    def test_retryable_status_is_retried(self, post):
+        post.side_effect = [FakeResponse(503), FakeResponse(200, 'Section 420 covers cheating.')]
+        response = self.service.generate_legal_response('What is Section 420?', deadline=Deadline(5))
+        self.assertEqual(response, 'Section 420 covers cheating.')
+        self.assertEqual(post.call_count, 2)
+
+    @mock.patch('chats.ai_service.requests.post')
+    def test_exhausted_budget_degrades_to_fallback(self, post):
+        """Test that timeouts within the budget end in a fallback answer"""
+        post.side_effect = requests.exceptions.Timeout('read timed out')
+        response = self.service.generate_legal_response('Is my contract valid?', deadline=Deadline(1))
+        self.assertTrue(response.startswith('Legal Assistant:'))
+
+    @mock.patch('chats.ai_service.requests.post')
+    def test_attempt_timeout_never_exceeds_budget(self, post):
+        post.return_value = FakeResponse(200, 'ok')
+        self.service.generate_legal_response('What is bail?', deadline=Deadline(2))
+        self.assertLessEqual(post.call_args.kwargs['timeout'], 2)
+
+    @mock.patch('chats.ai_service.requests.post')
+    def test_blocked_prompt_raises_instead_of_answering(self, post):
+        """Test that a 200 without candidates is an error, not an answer to store"""
+        post.return_value = FakeResponse(200, body={'promptFeedback': {'blockReason': 'SAFETY'}})
+        with self.assertRaisesRegex(GeminiAPIError, 'SAFETY'):
+            self.service.generate_text('Summarize this section.', deadline=Deadline(2))
+        self.assertEqual(post.call_count, 1)
+
+        response = self.service.generate_legal_response('What is bail?', deadline=Deadline(2))
+        self.assertTrue(response.startswith('I apologize'))
@@ -0,0 +1,141 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from chats.models import InflightRequest
+from chats.singleflight import SingleFlight, normalize_prompt, prompt_key
+
+
+class PromptKeyTestCase(SimpleTestCase):
+    def test_normalization_ignores_case_and_whitespace(self):
+        """Test that trivially different prompts share a key"""
+        self.assertEqual(normalize_prompt("  What is   IPC 420?\n"), "what is ipc 420?")
+        self.assertEqual(prompt_key("What is IPC 420?"), prompt_key("what  is ipc 420? "))
+        self.assertNotEqual(prompt_key("What is IPC 420?"), prompt_key("What is IPC 302?"))
+
+
+class InProcessSingleFlightTestCase(SimpleTestCase):
+    def setUp(self):
+        self.flight = SingleFlight(use_lock_table=False)
+
+    def _run_concurrently(self, count, fn):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(self.flight.do('same-key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_duplicates_share_one_call(self):
+        """Test that concurrent identical calls hit upstream once"""
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            time.sleep(0.2)
+            return "shared answer"
+
+        results, errors = self._run_concurrently(5, upstream)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(results, ["shared answer"] * 5)
+        self.assertEqual(len(calls), 1)
+        stats = self.flight.stats()
+        self.assertEqual(stats['upstream_calls'], 1)
+        self.assertEqual(stats['saved_calls'], 4)
+
+    def test_errors_propagate_to_waiters(self):
+        """Test that a failed upstream call fails every waiter"""
+        def upstream():
+            time.sleep(0.2)
+            raise RuntimeError("upstream down")
+
+        results, errors = self._run_concurrently(3, upstream)
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+
+    def test_sequential_calls_are_not_cached(self):
+        """Test that finished calls do not serve later requests"""
+        self.flight.do('key', lambda: "first")
+        self.assertEqual(self.flight.do('key', lambda: "second"), "second")
+        self.assertEqual(self.flight.stats()['upstream_calls'], 2)
+
+
+class LockTableSingleFlightTestCase(TransactionTestCase):
+    def test_leader_records_result(self):
+        """Test that the leader stores its result in the lock table"""
+        flight = SingleFlight(result_grace=0.3)
+        self.assertEqual(flight.do('table-key', lambda: "answer"), "answer")
+
+        row = InflightRequest.objects.get(key='table-key')
+        self.assertEqual(row.result, "answer")
+        self.assertIsNotNone(row.completed_at)
+
+    def test_finished_row_is_deleted_after_the_grace_period(self):
+        """Test that the stored answer does not outlive the grace period"""
+        flight = SingleFlight(result_grace=0.2)
+        flight.do('table-key', lambda: "answer")
+        time.sleep(0.6)
+        self.assertFalse(InflightRequest.objects.filter(key='table-key').exists())
+
+    def test_follower_waits_for_other_worker(self):
+        """Test that a call owned by another worker is awaited, not repeated"""
+        InflightRequest.objects.create(key='remote-key', owner='other-worker')
+        flight = SingleFlight(poll_interval=0.05)
+        results = []
+
+        thread = threading.Thread(
+            target=lambda: results.append(flight.do('remote-key', lambda: "duplicate call"))
+        )
+        thread.start()
+        time.sleep(0.2)
+
+        InflightRequest.objects.filter(key='remote-key').update(
+            result="remote answer", completed_at=timezone.now()
+        )
+        thread.join(timeout=5)
+
+        self.assertEqual(results, ["remote answer"])
+        self.assertEqual(flight.stats()['coalesced_remote'], 1)
+        self.assertEqual(flight.stats()['upstream_calls'], 0)
+
+    def test_failed_leader_releases_lock(self):
+        """Test that a failed upstream call removes its lock row"""
+        flight = SingleFlight()
+
+        def upstream():
+            raise RuntimeError("upstream down")
+
+        with self.assertRaises(RuntimeError):
+            flight.do('failing-key', upstream)
+        self.assertFalse(InflightRequest.objects.filter(key='failing-key').exists())
+
+    def test_prune_command_deletes_expired_rows(self):
+        """Test that rows left by crashed workers are swept, live ones kept"""
+        now = timezone.now()
+        InflightRequest.objects.create(key='finished', owner='dead-worker', result="old answer")
+        InflightRequest.objects.create(key='abandoned', owner='dead-worker')
+        InflightRequest.objects.create(key='in-flight', owner='live-worker')
+        InflightRequest.objects.filter(key='finished').update(completed_at=now - timedelta(minutes=5))
+        InflightRequest.objects.filter(key='abandoned').update(created_at=now - timedelta(hours=1))
+
+        out = StringIO()
+        call_command('prune_inflight_requests', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Deleted 2 expired coalescing rows', out.getvalue())
+        self.assertEqual(list(InflightRequest.objects.values_list('key', flat=True)), ['in-flight'])
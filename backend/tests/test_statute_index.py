@@ -0,0 +1,113 @@
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from chats.ai_service import FallbackAIService, GeminiAIService
+from chats.singleflight import SingleFlight
+from chats.chunk_index import Chunk, ChunkIndex
+from chats.statute_index import load_corpus, load_statute_index, relevant_statutes
+
+
+class StatuteIndexTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = ChunkIndex.build(load_corpus(settings.STATUTE_CORPUS_DIR))
+
+    def test_corpus_covers_core_acts(self):
+        citations = {self.index.chunk(i).citation.split(' - ')[0] for i in range(self.index.n_chunks)}
+        self.assertTrue({'Indian Penal Code, 1860', 'Code of Criminal Procedure, 1973',
+                         'Indian Contract Act, 1872'} <= citations)
+
+    def test_search_ranks_matching_section_first(self):
+        """Test that lay questions retrieve the governing section"""
+        cases = {
+            'My cheque bounced, what can I do?': 'Negotiable Instruments Act, 1881 - Section 138',
+            'Police refused to register my FIR': 'Code of Criminal Procedure, 1973 - Section 154',
+            'How do I get anticipatory bail?': 'Code of Criminal Procedure, 1973 - Section 438',
+            'Is a non-compete clause valid?': 'Indian Contract Act, 1872 - Section 27',
+        }
+        for question, citation in cases.items():
+            with self.subTest(question=question):
+                self.assertTrue(self.index.search(question, k=3)[0].citation.startswith(citation))
+
+    def test_unrelated_query_has_no_hits(self):
+        self.assertEqual(self.index.search('hello there', min_score=2.0), [])
+
+    def test_saved_index_is_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.index.save(Path(directory) / 'index')
+            loaded = ChunkIndex.load(Path(directory) / 'index')
+
+            self.assertIsInstance(loaded.postings_doc, np.memmap)
+            question = 'punishment for criminal breach of trust'
+            self.assertEqual([h.citation for h in loaded.search(question)],
+                             [h.citation for h in self.index.search(question)])
+
+    def test_query_latency_at_scale(self):
+        """Test that top-k over 20k chunks stays in the millisecond range"""
+        chunks = [Chunk(f"Act - Section {i}", f"term{i % 500} clause{i % 37} common words here")
+                  for i in range(20_000)]
+        index = ChunkIndex.build(chunks)
+        index.search('term7 clause3 common')
+
+        started = time.perf_counter()
+        for _ in range(20):
+            hits = index.search('term7 clause3 common', k=5)
+        self.assertLess((time.perf_counter() - started) / 20, 0.05)
+        self.assertEqual(len(hits), 5)
+
+
+class StatuteIndexLoadingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.corpus_dir = Path(self.tmp.name) / 'corpus'
+        self.corpus_dir.mkdir()
+        self.write_corpus('Rent is payable monthly.')
+
+    def write_corpus(self, text):
+        record = {'act': 'Test Act', 'section': '1', 'title': 'Rent', 'text': text}
+        (self.corpus_dir / 'test.jsonl').write_text(json.dumps(record) + '\n')
+
+    def test_index_is_rebuilt_when_corpus_changes(self):
+        with override_settings(STATUTE_CORPUS_DIR=self.corpus_dir, STATUTE_INDEX_DIR=Path(self.tmp.name) / 'index'):
+            self.assertEqual(load_statute_index().search('rent')[0].text, 'Rent is payable monthly.')
+            self.write_corpus('Rent is payable every quarter in advance.')
+            self.assertEqual(load_statute_index().search('rent')[0].text,
+                             'Rent is payable every quarter in advance.')
+
+
+class StatuteGroundingTestCase(SimpleTestCase):
+    @override_settings(STATUTE_RETRIEVAL_ENABLED=False)
+    def test_retrieval_can_be_disabled(self):
+        self.assertIsNone(relevant_statutes('My cheque bounced'))
+
+    def test_index_failure_is_not_fatal(self):
+        broken = mock.Mock(search=mock.Mock(side_effect=OSError('disk full')))
+        with mock.patch('chats.statute_index.statute_index', broken):
+            self.assertIsNone(relevant_statutes('My cheque bounced'))
+
+    @mock.patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'})
+    @mock.patch('chats.ai_service.ai_request_coalescer', SingleFlight(use_lock_table=False))
+    @mock.patch('chats.ai_service.requests.post')
+    def test_prompt_includes_relevant_sections(self, post):
+        """Test that retrieved sections are sent with the question"""
+        post.return_value = mock.Mock(
+            status_code=200, json=lambda: {'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]}
+        )
+        GeminiAIService().generate_legal_response('My cheque bounced, what are my options?')
+
+        prompt = post.call_args.kwargs['json']['contents'][0]['parts'][0]['text']
+        self.assertIn('Relevant Statutes:', prompt)
+        self.assertIn('Negotiable Instruments Act, 1881 - Section 138', prompt)
+
+    def test_fallback_answers_from_statutes(self):
+        response = FallbackAIService().generate_legal_response('Police refused to register my FIR')
+        self.assertIn('Section 154', response)
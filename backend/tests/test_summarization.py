@@ -0,0 +1,154 @@
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.document_service import store_document
+from chats.models import SummaryJob
+from chats.summarization import MERGE_INSTRUCTION, Summarizer, expire_stale_job, split_sections
+
+
+def judgment(paragraphs=120):
+    return [f"Paragraph {i}. The court examined evidence item {i} and the submissions of counsel "
+            f"regarding the disputed payment schedule in detail." * 3 for i in range(paragraphs)]
+
+
+class FakeSummarizer:
+    """summarize_fn that records calls and peak concurrency"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, instruction, text):
+        with self.lock:
+            self.calls.append(instruction)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        kind = 'merged' if instruction == MERGE_INSTRUCTION else 'section'
+        return f"{kind} summary of {len(text)} chars"
+
+
+class SplitSectionsTestCase(TestCase):
+    def test_sections_respect_size_limit(self):
+        sections = split_sections(judgment(), max_tokens=600)
+        self.assertGreater(len(sections), 5)
+        self.assertEqual('\n\n'.join(sections), '\n\n'.join(judgment()))
+
+    def test_edit_only_changes_nearby_sections(self):
+        """Test that content-defined boundaries keep later sections stable after an edit"""
+        original = judgment()
+        edited = list(original)
+        edited[3] = "Paragraph 3. This paragraph was rewritten after the first upload."
+
+        before = set(split_sections(original, max_tokens=600))
+        after = split_sections(edited, max_tokens=600)
+
+        self.assertLessEqual(sum(section not in before for section in after), 2)
+
+
+class SummarizerTestCase(TestCase):
+    def test_map_reduce_produces_one_summary(self):
+        fake = FakeSummarizer()
+        summarizer = Summarizer(fake, max_workers=4, section_tokens=600, fan_in=3)
+
+        summary = summarizer.summarize(judgment())
+
+        self.assertTrue(summary.startswith('merged summary'))
+        self.assertIn(MERGE_INSTRUCTION, fake.calls)
+        self.assertEqual(summarizer.completed_steps, len(fake.calls))
+        self.assertEqual(summarizer.stage, 'done')
+
+    def test_concurrency_is_capped(self):
+        fake = FakeSummarizer(delay=0.02)
+        Summarizer(fake, max_workers=3, section_tokens=600).summarize(judgment())
+        self.assertGreater(fake.peak, 1)
+        self.assertLessEqual(fake.peak, 3)
+
+    def test_resummarizing_an_edited_document_reuses_cached_sections(self):
+        """Test that only changed sections and their merges are recomputed"""
+        original = judgment()
+        first = FakeSummarizer()
+        Summarizer(first, section_tokens=600, fan_in=3).summarize(original)
+
+        unchanged = FakeSummarizer()
+        Summarizer(unchanged, section_tokens=600, fan_in=3).summarize(original)
+        self.assertEqual(unchanged.calls, [])
+
+        edited = list(original)
+        edited[100] = "Paragraph 100. The court allowed the appeal in part."
+        second = FakeSummarizer()
+        summarizer = Summarizer(second, section_tokens=600, fan_in=3)
+        summarizer.summarize(edited)
+
+        self.assertLess(len(second.calls), len(first.calls) / 2)
+        self.assertGreater(summarizer.cached_steps, 0)
+
+    def test_failures_propagate(self):
+        def broken(instruction, text):
+            raise RuntimeError('Gemini down')
+
+        with self.assertRaises(RuntimeError):
+            Summarizer(broken, section_tokens=600).summarize(judgment(10))
+
+
+class SummaryJobAPITestCase(TransactionTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_patch = override_settings(DOCUMENT_INDEX_DIR=self.tmp.name, SUMMARY_SECTION_TOKENS=600)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.client = APIClient()
+
+    def session_id(self):
+        # The signed cookie value starts with the id itself
+        return f"anon_{self.client.cookies['anon_id'].value.split(':')[0]}"
+
+    @mock.patch('chats.summarization.gemini_summarize', new_callable=lambda: FakeSummarizer(delay=0.01))
+    def test_job_reports_progress_and_result(self, fake):
+        # The first request sets the anonymous id cookie of the document's owner
+        self.client.post(reverse('summarize_document', args=['00000000-0000-0000-0000-000000000000']))
+        document = store_document(self.session_id(), None, 'judgment.pdf', 'application/pdf', judgment())
+
+        response = self.client.post(reverse('summarize_document', args=[document.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        status_url = reverse('summary_job_status', args=[response.data['job_id']])
+
+        for _ in range(200):
+            job = self.client.get(status_url).data
+            if job['status'] in ('completed', 'failed'):
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(job['status'], 'completed', job['error'])
+        self.assertTrue(job['summary'].startswith('merged summary'))
+        self.assertEqual(job['progress']['percent'], 100)
+        self.assertEqual(job['progress']['completed_steps'], len(fake.calls))
+
+    def test_unknown_document_is_not_found(self):
+        response = self.client.post(reverse('summarize_document', args=['00000000-0000-0000-0000-000000000000']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StaleJobTestCase(TestCase):
+    def test_interrupted_job_is_marked_failed(self):
+        document = store_document('anon_x', None, 'a.pdf', 'application/pdf', ['Some text.'])
+        job = SummaryJob.objects.create(document=document, user_session_id='anon_x', status='running')
+        SummaryJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        job = expire_stale_job(SummaryJob.objects.get(pk=job.pk))
+        self.assertEqual(job.status, 'failed')
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpRequest
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apna_lawyer.uploads import DOCX_TYPE, StreamingUploadHandler, sniff_content_type, upload_rejection
+from chats.image_chat_service import image_chat_service
+from chats.image_derivatives import get_derivative
+
+CHUNK = 64 * 1024
+
+
+def png_bytes(size=(60, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class SniffContentTypeTestCase(SimpleTestCase):
+    def test_magic_bytes_decide_the_type(self):
+        self.assertEqual(sniff_content_type(png_bytes()[:16]), 'image/png')
+        self.assertEqual(sniff_content_type(b'\xff\xd8\xff\xe0\x00\x10JFIF'), 'image/jpeg')
+        self.assertEqual(sniff_content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(sniff_content_type(b'%PDF-1.7\n', 'scan.png', 'image/png'), 'application/pdf')
+        self.assertEqual(sniff_content_type(b'PK\x03\x04\x14\x00', 'contract.docx'), DOCX_TYPE)
+        self.assertEqual(sniff_content_type(b'PK\x03\x04\x14\x00', 'archive.zip'), 'application/zip')
+        self.assertIsNone(sniff_content_type(b'#!/bin/sh\nrm -rf'))
+
+
+class StreamingUploadHandlerTestCase(SimpleTestCase):
+    def receive(self, request, chunks, name='scan.tiff', content_type='image/tiff'):
+        handler = StreamingUploadHandler(request)
+        handler.new_file('image', name, content_type, None)
+        size = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, size)
+            size += len(chunk)
+        return handler.file_complete(size)
+
+    def test_hashes_while_streaming_with_constant_memory(self):
+        header = b'II*\x00' + b'\x00' * (CHUNK - 4)
+        body = os.urandom(CHUNK)
+        expected = hashlib.sha256(header)
+        for _ in range(159):
+            expected.update(body)
+
+        tracemalloc.start()
+        try:
+            upload = self.receive(HttpRequest(), (header if i == 0 else body for i in range(160)))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.addCleanup(upload.close)
+
+        self.assertEqual(upload.size, 160 * CHUNK)  # 10 MB
+        self.assertEqual(upload.sha256, expected.hexdigest())
+        self.assertEqual(upload.content_type, 'image/tiff')
+        self.assertEqual(os.path.getsize(upload.temporary_file_path()), upload.size)
+        self.assertLess(peak, 1024 * 1024)
+
+    @override_settings(UPLOAD_MAX_IMAGE_BYTES=2 * CHUNK)
+    def test_oversize_file_is_dropped_mid_stream(self):
+        from django.core.files.uploadhandler import SkipFile
+
+        request = HttpRequest()
+        handler = StreamingUploadHandler(request)
+        handler.new_file('image', 'big.png', 'image/png', None)
+        handler.receive_data_chunk(png_bytes() + b'\x00' * CHUNK, 0)
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'\x00' * CHUNK, CHUNK)
+        self.assertFalse(os.path.exists(handler.file.temporary_file_path()))
+        self.assertEqual(upload_rejection(request, 'image').status_code, 413)
+
+    def test_tiny_unknown_file_is_rejected_on_completion(self):
+        request = HttpRequest()
+        self.assertIsNone(self.receive(request, [b'hello'], name='a.png', content_type='image/png'))
+        self.assertEqual(upload_rejection(request, 'image').status_code, 415)
+
+
+class UploadApiTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def test_disguised_file_is_rejected_by_content(self):
+        fake = SimpleUploadedFile('photo.png', b'%PDF-1.4\n' + b'0' * 1000, content_type='image/png')
+        response = self.client.post(reverse('ocr_image_api'), {'image': fake}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        script = SimpleUploadedFile('photo.png', b'#!/bin/sh\n' + b'0' * 1000, content_type='image/png')
+        response = self.client.post(reverse('ocr_image_api'), {'image': script}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    @override_settings(UPLOAD_MAX_IMAGE_BYTES=1000)
+    def test_oversize_image_is_rejected(self):
+        image = SimpleUploadedFile('scan.png', png_bytes() + b'\x00' * CHUNK * 3, content_type='image/png')
+        response = self.client.post(reverse('ocr_image_api'), {'image': image}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn('limit', response.data['error'])
+
+    @mock.patch('chats.ocr_service.pytesseract.image_to_string', return_value='Rent agreement\n\nPune')
+    def test_ocr_reads_the_streamed_file(self, image_to_string):
+        image = SimpleUploadedFile('scan.png', png_bytes(), content_type='application/octet-stream')
+        response = self.client.post(reverse('ocr_image_api'), {'image': image}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['extracted_text'], 'Rent agreement Pune')
+
+    def test_chat_image_is_stored_with_its_hash(self):
+        data = png_bytes()
+        image = SimpleUploadedFile('receipt.png', data, content_type='image/png')
+        response = self.client.post(reverse('upload_chat_image'), {'image': image}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stored = next(
+            stored for images in image_chat_service.user_images.values() for stored in images
+            if stored.id == response.data['image_id']
+        )
+        self.assertEqual((stored.sha256, stored.size), (hashlib.sha256(data).hexdigest(), len(data)))
+        get_derivative(stored.file_path, 'thumb')  # Background run done before MEDIA_ROOT is removed
@@ -0,0 +1,89 @@
+import gc
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apna_lawyer import worker_lifecycle
+
+
+class FakeLog:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message, *args):
+        self.messages.append(message % args)
+
+
+class FakeWorker:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.alive = True
+        self.log = FakeLog()
+
+
+class PlanWorkersTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {}, clear=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ('GUNICORN_WORKERS', 'GUNICORN_THREADS', 'WORKER_RSS_BUDGET_MB',
+                     'MASTER_MEMORY_MB', 'WORKER_MEMORY_MB', 'MEMORY_HEADROOM_PERCENT'):
+            os.environ.pop(name, None)
+
+    def test_starter_instance_runs_several_workers(self):
+        """Test that a 512 MB instance gets more than one worker"""
+        plan = worker_lifecycle.plan_workers(memory_limit_mb=512, cpu_count=1)
+        self.assertGreater(plan['workers'], 1)
+        self.assertLess(plan['rss_budget_mb'], 512)
+
+    def test_memory_bound_hosts_add_threads(self):
+        """Test that threads make up for workers capped by memory"""
+        plan = worker_lifecycle.plan_workers(memory_limit_mb=512, cpu_count=4)
+        self.assertGreater(plan['threads'], 1)
+        self.assertEqual(plan['worker_class'], 'gthread')
+
+    def test_tiny_instances_keep_one_worker(self):
+        """Test that at least one worker is always planned"""
+        plan = worker_lifecycle.plan_workers(memory_limit_mb=128, cpu_count=1)
+        self.assertEqual(plan['workers'], 1)
+
+    def test_environment_overrides(self):
+        """Test explicit worker settings win over the memory plan"""
+        os.environ.update({'GUNICORN_WORKERS': '2', 'GUNICORN_THREADS': '1', 'WORKER_RSS_BUDGET_MB': '200'})
+        plan = worker_lifecycle.plan_workers(memory_limit_mb=4096, cpu_count=8)
+        self.assertEqual((plan['workers'], plan['threads'], plan['rss_budget_mb']), (2, 1, 200))
+        self.assertEqual(plan['worker_class'], 'sync')
+
+
+class WorkerRecyclingTestCase(SimpleTestCase):
+    def test_worker_under_budget_keeps_running(self):
+        worker = FakeWorker()
+        with mock.patch.object(worker_lifecycle, 'current_rss_mb', return_value=100.0):
+            worker_lifecycle.check_worker_memory(worker, rss_budget_mb=200)
+        self.assertTrue(worker.alive)
+
+    def test_worker_over_budget_is_retired(self):
+        """Test that crossing the RSS budget retires the worker gracefully"""
+        worker = FakeWorker()
+        with mock.patch.object(worker_lifecycle, 'current_rss_mb', return_value=250.0):
+            worker_lifecycle.check_worker_memory(worker, rss_budget_mb=200)
+        self.assertFalse(worker.alive)
+        self.assertIn('recycling', worker.log.messages[0])
+
+
+class PreloadTestCase(SimpleTestCase):
+    def test_freeze_moves_objects_to_permanent_generation(self):
+        try:
+            self.assertGreater(worker_lifecycle.freeze_preloaded_heap(), 0)
+        finally:
+            gc.unfreeze()
+
+    def test_registered_warmups_run(self):
+        calls = []
+        warmup = worker_lifecycle.register_warmup(lambda: calls.append('warm'))
+        try:
+            worker_lifecycle.warm_shared_data(log=lambda message: None)
+        finally:
+            worker_lifecycle._warmups.remove(warmup)
+        self.assertEqual(calls, ['warm'])
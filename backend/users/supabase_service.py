@@ -4,10 +4,11 @@ Handles creating and updating user data in Supabase database.
 """
 
 import os
-from supabase import create_client, Client
 from django.conf import settings
 from typing import Dict, Optional
 import logging
+from apna_lawyer.metrics import instrument_supabase_client
+from apna_lawyer.utils import LazyService
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +18,18 @@ class SupabaseUserService:
     
     def __init__(self):
         """Initialize Supabase client."""
+        # Imported here: the supabase package is slow to import and only needed once used
+        from supabase import create_client, Client
+
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_KEY')
         
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Supabase URL and Key must be set in environment variables")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = instrument_supabase_client(
+            create_client(self.supabase_url, self.supabase_key)
+        )
 
     def create_user_in_supabase(self, user_data: Dict) -> Optional[Dict]:
         """
@@ -176,5 +182,5 @@ class SupabaseUserService:
             return self.create_user_in_supabase(user_data)
 
 
-# Global instance
-supabase_user_service = SupabaseUserService()
\ No newline at end of file
+# Global instance, constructed on first use so boot works without Supabase
+supabase_user_service = LazyService(SupabaseUserService)
\ No newline at end of file
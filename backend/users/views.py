@@ -56,11 +56,13 @@ class SignupView(APIView):
                     # Create user in Django
                     user = serializer.save()
                     
-                    # Sync user to Supabase
-                    supabase_result = supabase_user_service.sync_user_to_supabase(user)
-                    
-                    if not supabase_result:
-                        logger.warning(f"Failed to sync user {user.email} to Supabase")
+                    # Sync user to Supabase (don't fail registration if Supabase is unavailable)
+                    try:
+                        supabase_result = supabase_user_service.sync_user_to_supabase(user)
+                        if not supabase_result:
+                            logger.warning(f"Failed to sync user {user.email} to Supabase")
+                    except Exception as e:
+                        logger.warning(f"Supabase sync error for user {user.email}: {str(e)}")
                     
                     # Generate JWT tokens
                     refresh = RefreshToken.for_user(user)